@@ -23,10 +23,25 @@ API_SERVICE_OPTS = [
     cfg.IntOpt('port',
                default=6385,
                help='The port for the Ironic API server.'),
+    cfg.IntOpt('api_workers',
+               help='Number of worker processes for the Ironic API '
+                    'server. They share its listening socket. Defaults '
+                    'to the number of CPUs available.'),
     cfg.IntOpt('max_limit',
                default=1000,
                help='The maximum number of items returned in a single '
                     'response from a collection resource.'),
+    cfg.IntOpt('collection_stream_threshold',
+               default=1000,
+               help='Node lists requested with a limit above this number '
+                    'are not built in memory, but read from the database '
+                    'and sent to the client in chunks of this many nodes. '
+                    '0 disables the streaming.'),
+    cfg.IntOpt('node_statistics_cache_ttl',
+               default=0,
+               help='Number of seconds during which the node statistics '
+                    'are cached by each API process. 0 disables the '
+                    'caching.'),
     ]
 
 CONF = cfg.CONF
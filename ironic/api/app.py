@@ -47,6 +47,9 @@ def setup_app(pecan_config=None, extra_hooks=None):
                  hooks.DBHook(),
                  hooks.ContextHook(pecan_config.app.acl_public_routes),
                  hooks.RPCHook(),
+                 # NOTE: after() hooks run in reverse order, the stream
+                 # must not be read by NoExceptionTracebackHook.
+                 hooks.StreamHook(),
                  hooks.NoExceptionTracebackHook()]
     if extra_hooks:
         app_hooks.extend(extra_hooks)
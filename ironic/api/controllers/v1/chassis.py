@@ -159,6 +159,10 @@ class ChassisController(rest.RestController):
         chassis = objects.Chassis.list(pecan.request.context, limit,
                                        marker_obj, sort_key=sort_key,
                                        sort_dir=sort_dir)
+        timestamps = [api_utils.get_timestamps(c) for c in chassis]
+        if api_utils.check_etag(api_utils.get_etag(objects.Chassis.VERSION,
+                                                   timestamps)):
+            return None
         return ChassisCollection.convert_with_links(chassis, limit,
                                                     url=resource_url,
                                                     expand=expand,
@@ -205,6 +209,10 @@ class ChassisController(rest.RestController):
         """
         rpc_chassis = objects.Chassis.get_by_uuid(pecan.request.context,
                                                   chassis_uuid)
+        etag = api_utils.get_etag(objects.Chassis.VERSION,
+                                  [api_utils.get_timestamps(rpc_chassis)])
+        if api_utils.check_etag(etag):
+            return None
         return Chassis.convert_with_links(rpc_chassis)
 
     @wsme_pecan.wsexpose(Chassis, body=Chassis, status_code=201)
@@ -38,11 +38,16 @@ class Collection(base.APIBase):
         if not self.has_next(limit):
             return wtypes.Unset
 
-        resource_url = url or self._type
-        q_args = ''.join(['%s=%s&' % (key, kwargs[key]) for key in kwargs])
-        next_args = '?%(args)slimit=%(limit)d&marker=%(marker)s' % {
-                                            'args': q_args, 'limit': limit,
-                                            'marker': self.collection[-1].uuid}
-
-        return link.Link.make_link('next', pecan.request.host_url,
-                                   resource_url, next_args).href
+        return get_next_link(pecan.request.host_url, url or self._type,
+                             limit, self.collection[-1].uuid, **kwargs)
+
+
+def get_next_link(host_url, resource_url, limit, marker, **kwargs):
+    """Return a link to the subset of a collection after marker."""
+    q_args = ''.join(['%s=%s&' % (key, kwargs[key]) for key in kwargs])
+    next_args = '?%(args)slimit=%(limit)d&marker=%(marker)s' % {
+                                        'args': q_args, 'limit': limit,
+                                        'marker': marker}
+
+    return link.Link.make_link('next', host_url, resource_url,
+                               next_args).href
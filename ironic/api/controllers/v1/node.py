@@ -13,13 +13,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import datetime
+import json
+import time
 
+from eventlet import greenpool
 from oslo.config import cfg
+from oslo import messaging
 import pecan
 from pecan import rest
 import six
 import wsme
+from wsme.rest import json as wsme_json
 from wsme import types as wtypes
 import wsmeext.pecan as wsme_pecan
 
@@ -31,6 +37,8 @@ from ironic.api.controllers.v1 import types
 from ironic.api.controllers.v1 import utils as api_utils
 from ironic.common import exception
 from ironic.common.i18n import _
+from ironic.common.i18n import _LE
+from ironic.common.i18n import _LW
 from ironic.common import states as ir_states
 from ironic.common import utils
 from ironic import objects
@@ -53,6 +61,35 @@ LOG = log.getLogger(__name__)
 # versions, the API service should be restarted.
 _VENDOR_METHODS = {}
 
+# The fields of the nodes and ports enrolled in bulk which are stored
+_BULK_NODE_FIELDS = ('uuid', 'instance_uuid', 'maintenance', 'driver',
+                     'driver_info', 'instance_info', 'extra', 'properties')
+_BULK_PORT_FIELDS = ('uuid', 'address', 'extra')
+
+# The target states of a bulk node state change
+_BULK_STATE_TARGETS = (ir_states.POWER_ON, ir_states.POWER_OFF,
+                       ir_states.REBOOT, ir_states.ACTIVE,
+                       ir_states.REBUILD, ir_states.DELETED)
+
+# The rows returned by the get_node_statistics() DB API method, cached
+# until the expires_at time when [api]node_statistics_cache_ttl is set.
+_NODE_STATISTICS = {'rows': None, 'expires_at': 0}
+
+
+def _get_node_statistics_rows():
+    ttl = CONF.api.node_statistics_cache_ttl
+    now = time.time()
+    if ttl > 0 and _NODE_STATISTICS['rows'] is not None and (
+            now < _NODE_STATISTICS['expires_at']):
+        return _NODE_STATISTICS['rows']
+
+    # NOTE: statistics can tolerate replication lag.
+    rows = pecan.request.dbapi.get_node_statistics(use_slave=True)
+    if ttl > 0:
+        _NODE_STATISTICS['rows'] = rows
+        _NODE_STATISTICS['expires_at'] = now + ttl
+    return rows
+
 
 class NodePatchType(types.JsonPatchType):
 
@@ -225,6 +262,9 @@ class NodeStates(base.APIBase):
 
     last_error = wtypes.text
 
+    agent_last_heartbeat = datetime.datetime
+    """When the deploy agent running on the node last heartbeated"""
+
     @staticmethod
     def convert(rpc_node):
         attr_list = ['console_enabled', 'last_error', 'power_state',
@@ -233,6 +273,9 @@ class NodeStates(base.APIBase):
         states = NodeStates()
         for attr in attr_list:
             setattr(states, attr, getattr(rpc_node, attr))
+        # NOTE: the heartbeat is read from the slave, like the node.
+        states.agent_last_heartbeat = rpc_node.get_agent_heartbeat(
+            use_slave=True)
         return states
 
     @classmethod
@@ -242,6 +285,7 @@ class NodeStates(base.APIBase):
                      last_error=None,
                      console_enabled=False,
                      provision_updated_at=None,
+                     agent_last_heartbeat=None,
                      power_state=ir_states.POWER_ON,
                      provision_state=None)
         return sample
@@ -266,7 +310,8 @@ class NodeStatesController(rest.RestController):
         # NOTE(lucasagomes): All these state values come from the
         # DB. Ironic counts with a periodic task that verify the current
         # power states of the nodes and update the DB accordingly.
-        rpc_node = objects.Node.get_by_uuid(pecan.request.context, node_uuid)
+        rpc_node = objects.Node.get_by_uuid(pecan.request.context, node_uuid,
+                                            use_slave=True)
         return NodeStates.convert(rpc_node)
 
     @wsme_pecan.wsexpose(None, types.uuid, wtypes.text, status_code=202)
@@ -476,8 +521,10 @@ class Node(base.APIBase):
         setattr(self, 'chassis_uuid', kwargs.get('chassis_id', wtypes.Unset))
 
     @staticmethod
-    def _convert_with_links(node, url, expand=True):
-        if not expand:
+    def _convert_with_links(node, url, expand=True, fields=None):
+        if fields is not None:
+            node.unset_fields_except(['uuid'] + fields)
+        elif not expand:
             except_list = ['instance_uuid', 'maintenance', 'power_state',
                            'provision_state', 'uuid']
             node.unset_fields_except(except_list)
@@ -501,10 +548,39 @@ class Node(base.APIBase):
         return node
 
     @classmethod
-    def convert_with_links(cls, rpc_node, expand=True):
-        node = Node(**rpc_node.as_dict())
+    def convert_with_links(cls, rpc_node, expand=True, fields=None):
+        node = Node(**cls._get_rpc_values(rpc_node, fields))
         return cls._convert_with_links(node, pecan.request.host_url,
-                                       expand)
+                                       expand, fields)
+
+    @classmethod
+    def _get_rpc_values(cls, rpc_node, fields=None):
+        if fields is None:
+            return rpc_node.as_dict()
+        # NOTE: only the requested fields are read from the node, so
+        #       its other JSON fields are not decoded.
+        return dict((f, getattr(rpc_node, f))
+                    for f in cls.get_object_fields(fields))
+
+    @classmethod
+    def get_object_fields(cls, fields):
+        """Return the fields of a Node object holding some API fields.
+
+        The uuid and the timestamps are always included, the links and
+        the ETag are built from them.
+
+        :param fields: a list of fields of the API representation.
+        :raises: ClientSideError if some of the fields do not exist.
+        """
+        api_utils.validate_fields(fields, [f for f in cls().fields
+                                           if f != 'chassis_id'])
+        obj_fields = ['uuid', 'created_at', 'updated_at']
+        for field in fields:
+            if field == 'chassis_uuid':
+                field = 'chassis_id'
+            if field not in obj_fields:
+                obj_fields.append(field)
+        return obj_fields
 
     @classmethod
     def sample(cls, expand=True):
@@ -528,19 +604,45 @@ class Node(base.APIBase):
         return cls._convert_with_links(sample, 'http://localhost:6385', expand)
 
 
+class NodeDeletion(base.APIBase):
+    """API representation of the deletion of a node."""
+
+    uuid = types.uuid
+    """The UUID of the deleted node"""
+
+    deleted_at = datetime.datetime
+    """The time at which the node was deleted"""
+
+    @classmethod
+    def convert(cls, db_deletion):
+        return cls(uuid=db_deletion.node_uuid,
+                   deleted_at=db_deletion.deleted_at)
+
+    @classmethod
+    def sample(cls):
+        return cls(uuid='1be26c0b-03f2-4d2e-ae87-c02d7f33c123',
+                   deleted_at=datetime.datetime(2000, 1, 1, 12, 0, 0))
+
+
 class NodeCollection(collection.Collection):
     """API representation of a collection of nodes."""
 
     nodes = [Node]
     """A list containing nodes objects"""
 
+    deleted_nodes = [NodeDeletion]
+    """The nodes deleted since the time given by the changes_since
+    parameter, only in the first page of the collection"""
+
     def __init__(self, **kwargs):
         self._type = 'nodes'
 
     @staticmethod
-    def convert_with_links(nodes, limit, url=None, expand=False, **kwargs):
+    def convert_with_links(nodes, limit, url=None, expand=False, fields=None,
+                           **kwargs):
         collection = NodeCollection()
-        collection.nodes = [Node.convert_with_links(n, expand) for n in nodes]
+        collection.nodes = [Node.convert_with_links(n, expand, fields)
+                            for n in nodes]
         collection.next = collection.get_next(limit, url=url, **kwargs)
         return collection
 
@@ -552,6 +654,251 @@ class NodeCollection(collection.Collection):
         return sample
 
 
+def _stream_nodes_collection(context, host_url, nodes, chunk_size, limit,
+                             list_kwargs, expand, fields, resource_url,
+                             parameters, deletions):
+    """Yield the JSON document of a NodeCollection, chunk by chunk.
+
+    It is the document wsme would make of the collection, but only
+    chunk_size nodes are read from the database and kept in memory at a
+    time. The document is made once the request was handled, so
+    pecan.request can not be used here.
+
+    :param nodes: the first chunk of nodes, read in advance so that the
+                  errors of the query are still reported to the client.
+    :param list_kwargs: the other arguments of objects.Node.list().
+    :param deletions: the node deletions to list, or None.
+    """
+    chassis_uuids = {}
+    count = 0
+    yield b'{"nodes": ['
+    while nodes:
+        items = []
+        for rpc_node in nodes:
+            values = Node._get_rpc_values(rpc_node, fields)
+            # NOTE: Node() would get the chassis with pecan.request, and
+            #       once for each node.
+            chassis_id = values.pop('chassis_id', None)
+            node = Node(**values)
+            if chassis_id is not None:
+                if chassis_id not in chassis_uuids:
+                    chassis_uuids[chassis_id] = objects.Chassis.get(
+                        context, chassis_id).uuid
+                node._chassis_uuid = chassis_uuids[chassis_id]
+            node = Node._convert_with_links(node, host_url, expand, fields)
+            items.append(wsme_json.encode_result(node, Node))
+        yield ((', ' if count else '') + ', '.join(items)).encode('utf-8')
+        count += len(nodes)
+        marker = nodes[-1]
+        if len(nodes) < chunk_size or count >= limit:
+            break
+        nodes = objects.Node.list(context, min(chunk_size, limit - count),
+                                  marker, **list_kwargs)
+    yield b']'
+
+    if count == limit:
+        next_link = collection.get_next_link(host_url,
+                                             resource_url or 'nodes',
+                                             limit, marker.uuid,
+                                             **parameters)
+        yield (', "next": %s' % json.dumps(next_link)).encode('utf-8')
+    if deletions is not None:
+        items = [wsme_json.encode_result(NodeDeletion.convert(d),
+                                         NodeDeletion)
+                 for d in deletions]
+        yield (', "deleted_nodes": [%s]' % ', '.join(items)).encode('utf-8')
+    yield b'}'
+
+
+class BulkNodePort(base.APIBase):
+    """API representation of a port of a node enrolled in bulk."""
+
+    uuid = types.uuid
+    """Unique UUID for this port"""
+
+    address = wsme.wsattr(types.macaddress, mandatory=True)
+    """MAC Address for this port"""
+
+    extra = {wtypes.text: types.MultiType(wtypes.text, six.integer_types)}
+    """This port's meta data"""
+
+
+class BulkNode(base.APIBase):
+    """API representation of a node enrolled in bulk, with its ports."""
+
+    uuid = types.uuid
+    """Unique UUID for this node"""
+
+    instance_uuid = types.uuid
+    """The UUID of the instance in nova-compute"""
+
+    chassis_uuid = types.uuid
+    """The UUID of the chassis this node belongs"""
+
+    maintenance = types.boolean
+    """Indicates whether the node is in maintenance mode."""
+
+    driver = wsme.wsattr(wtypes.text, mandatory=True)
+    """The driver responsible for controlling the node"""
+
+    driver_info = {wtypes.text: types.MultiType(wtypes.text,
+                                                six.integer_types)}
+    """This node's driver configuration"""
+
+    instance_info = {wtypes.text: types.MultiType(wtypes.text,
+                                                  six.integer_types)}
+    """This node's instance info."""
+
+    extra = {wtypes.text: types.MultiType(wtypes.text, six.integer_types)}
+    """This node's meta data"""
+
+    properties = {wtypes.text: types.MultiType(wtypes.text,
+                                               six.integer_types)}
+    """The physical characteristics of this node"""
+
+    ports = [BulkNodePort]
+    """The ports of this node"""
+
+
+class BulkNodeResult(base.APIBase):
+    """API representation of the result of the bulk enrollment of a node."""
+
+    uuid = types.uuid
+    """The UUID of the node"""
+
+    error = wtypes.text
+    """Why the node was not created, if it was not"""
+
+    port_uuids = [types.uuid]
+    """The UUIDs of the new ports of the node"""
+
+    links = wsme.wsattr([link.Link], readonly=True)
+    """A list containing a self link and associated node links"""
+
+    @classmethod
+    def convert_with_links(cls, rpc_node, rpc_ports):
+        url = pecan.request.host_url
+        return cls(uuid=rpc_node.uuid,
+                   port_uuids=[p.uuid for p in rpc_ports],
+                   links=[link.Link.make_link('self', url, 'nodes',
+                                              rpc_node.uuid),
+                          link.Link.make_link('bookmark', url, 'nodes',
+                                              rpc_node.uuid, bookmark=True)
+                         ])
+
+    @classmethod
+    def convert_error(cls, node, error):
+        return cls(uuid=node.uuid, error=error.format_message())
+
+
+class BulkNodeResultCollection(base.APIBase):
+    """API representation of the results of a bulk node enrollment."""
+
+    nodes = [BulkNodeResult]
+    """The results, in the order of the nodes of the request"""
+
+
+class BulkNodeStates(base.APIBase):
+    """API representation of a state change of many nodes."""
+
+    nodes = wsme.wsattr([types.uuid], mandatory=True)
+    """The UUIDs of the nodes"""
+
+    target = wsme.wsattr(wtypes.text, mandatory=True)
+    """The desired power or provision state of the nodes"""
+
+
+class BulkNodeStateResult(base.APIBase):
+    """API representation of the result of the state change of a node."""
+
+    uuid = types.uuid
+    """The UUID of the node"""
+
+    error = wtypes.text
+    """Why the state change was not accepted, if it was not"""
+
+    unknown = types.boolean
+    """Set when the conductor did not answer in time, so it is not known
+    whether the state change was accepted"""
+
+
+class BulkNodeStateResultCollection(base.APIBase):
+    """API representation of the results of a bulk node state change."""
+
+    nodes = [BulkNodeStateResult]
+    """The results, in the order of the nodes of the request"""
+
+
+class NodeCounts(base.APIBase):
+    """API representation of the number of nodes by state."""
+
+    total = int
+    """The number of nodes"""
+
+    provision_state = {wtypes.text: int}
+    """The number of nodes in each provision state. Nodes without a
+    provision state are counted under "None"."""
+
+    power_state = {wtypes.text: int}
+    """The number of nodes in each power state. Nodes without a power
+    state are counted under "None"."""
+
+    maintenance = int
+    """The number of nodes in maintenance mode"""
+
+    associated = int
+    """The number of nodes associated with an instance"""
+
+    def __init__(self, **kwargs):
+        super(NodeCounts, self).__init__(**kwargs)
+        self.total = 0
+        self.provision_state = {}
+        self.power_state = {}
+        self.maintenance = 0
+        self.associated = 0
+
+    def add(self, provision_state, power_state, maintenance, associated,
+            count):
+        """Count nodes with the given states."""
+        self.total += count
+        provision_state = six.text_type(provision_state)
+        self.provision_state[provision_state] = (
+            self.provision_state.get(provision_state, 0) + count)
+        power_state = six.text_type(power_state)
+        self.power_state[power_state] = (
+            self.power_state.get(power_state, 0) + count)
+        if maintenance:
+            self.maintenance += count
+        if associated:
+            self.associated += count
+
+
+class NodeStatistics(NodeCounts):
+    """API representation of the number of nodes by state and driver."""
+
+    drivers = {wtypes.text: NodeCounts}
+    """The number of nodes by state, for each driver"""
+
+    @classmethod
+    def convert(cls, rows):
+        statistics = cls()
+        statistics.drivers = {}
+        for row in rows:
+            driver_name, counts = row[0], row[1:]
+            statistics.add(*counts)
+            if driver_name not in statistics.drivers:
+                statistics.drivers[driver_name] = NodeCounts()
+            statistics.drivers[driver_name].add(*counts)
+        return statistics
+
+    @classmethod
+    def sample(cls):
+        return cls.convert([('fake', ir_states.ACTIVE, ir_states.POWER_ON,
+                             False, True, 2),
+                            ('fake', ir_states.NOSTATE, ir_states.POWER_OFF,
+                             True, False, 1)])
+
+
 class NodeVendorPassthruController(rest.RestController):
     """REST controller for VendorPassthru.
 
@@ -678,22 +1025,34 @@ class NodesController(rest.RestController):
     _custom_actions = {
         'detail': ['GET'],
         'validate': ['GET'],
+        'bulk': ['POST'],
+        'bulk_states': ['PUT'],
+        'statistics': ['GET'],
     }
 
     def _get_nodes_collection(self, chassis_uuid, instance_uuid, associated,
                               maintenance, marker, limit, sort_key, sort_dir,
-                              expand=False, resource_url=None):
+                              expand=False, resource_url=None,
+                              changes_since=None, fields=None):
         if self.from_chassis and not chassis_uuid:
             raise exception.MissingParameterValue(_(
                   "Chassis id not specified."))
 
         limit = api_utils.validate_limit(limit)
         sort_dir = api_utils.validate_sort_dir(sort_dir)
+        obj_fields = None
+        if fields is not None:
+            obj_fields = Node.get_object_fields(fields)
+        if changes_since is not None:
+            changes_since = api_utils.validate_changes_since(changes_since)
 
         marker_obj = None
         if marker:
             marker_obj = objects.Node.get_by_uuid(pecan.request.context,
-                                                  marker)
+                                                  marker, use_slave=True)
+        parameters = self._get_collection_parameters(
+            sort_key, sort_dir, associated, maintenance, changes_since,
+            fields)
         if instance_uuid:
             nodes = self._get_nodes_by_instance(instance_uuid)
         else:
@@ -704,20 +1063,100 @@ class NodesController(rest.RestController):
                 filters['associated'] = associated
             if maintenance is not None:
                 filters['maintenance'] = maintenance
+            if changes_since is not None:
+                filters['changes_since'] = changes_since
+
+            list_kwargs = {'sort_key': sort_key, 'sort_dir': sort_dir,
+                           'filters': filters, 'use_slave': True,
+                           'fields': obj_fields}
+            if api_utils.use_streaming(limit):
+                return self._stream_nodes(marker_obj, limit, list_kwargs,
+                                          changes_since, expand, fields,
+                                          resource_url, parameters)
+            nodes = objects.Node.list(pecan.request.context, limit,
+                                      marker_obj, **list_kwargs)
+
+        deletions = self._get_node_deletions(changes_since, marker_obj)
+        return self._convert_nodes_collection(nodes, deletions, limit,
+                                              expand, fields, resource_url,
+                                              parameters)
 
-            nodes = objects.Node.list(pecan.request.context, limit, marker_obj,
-                                      sort_key=sort_key, sort_dir=sort_dir,
-                                      filters=filters)
-
+    @staticmethod
+    def _get_collection_parameters(sort_key, sort_dir, associated,
+                                   maintenance, changes_since, fields):
+        """Get the query parameters of the next link of a collection."""
         parameters = {'sort_key': sort_key, 'sort_dir': sort_dir}
         if associated:
             parameters['associated'] = associated
         if maintenance:
             parameters['maintenance'] = maintenance
-        return NodeCollection.convert_with_links(nodes, limit,
-                                                 url=resource_url,
-                                                 expand=expand,
-                                                 **parameters)
+        if changes_since is not None:
+            parameters['changes_since'] = changes_since.isoformat()
+        if fields is not None:
+            parameters['fields'] = ','.join(fields)
+        return parameters
+
+    @staticmethod
+    def _get_node_deletions(changes_since, marker_obj):
+        """Get the node deletions to list with the first page of nodes.
+
+        :returns: the node deletions, or None when they are not listed.
+        """
+        if changes_since is None or marker_obj is not None:
+            return None
+        return pecan.request.dbapi.get_node_deletions(changes_since,
+                                                      use_slave=True)
+
+    def _stream_nodes(self, marker_obj, limit, list_kwargs, changes_since,
+                      expand, fields, resource_url, parameters):
+        """Have the nodes streamed to the client, chunk by chunk.
+
+        Only the first chunk is read here, the others are read while the
+        response is sent.
+
+        :returns: an empty NodeCollection, in place of the streamed one.
+        """
+        chunk_size = CONF.api.collection_stream_threshold
+        obj_fields = list_kwargs['fields']
+        if obj_fields is not None:
+            # NOTE: the last node of a chunk is the marker of the next
+            #       one, it needs the columns the nodes are sorted by.
+            list_kwargs = dict(list_kwargs, fields=obj_fields + [
+                f for f in ('id', list_kwargs['sort_key'])
+                if f in objects.Node.fields and f not in obj_fields])
+        nodes = objects.Node.list(pecan.request.context, chunk_size,
+                                  marker_obj, **list_kwargs)
+        deletions = self._get_node_deletions(changes_since, marker_obj)
+        pecan.request.json_stream = _stream_nodes_collection(
+            pecan.request.context, pecan.request.host_url, nodes,
+            chunk_size, limit, list_kwargs, expand, fields,
+            resource_url, parameters, deletions)
+        return NodeCollection()
+
+    @staticmethod
+    def _convert_nodes_collection(nodes, deletions, limit, expand, fields,
+                                  resource_url, parameters):
+        """Convert the nodes into a NodeCollection, unless not modified.
+
+        :returns: the NodeCollection, or None when the client already has
+                  it, as told by its ETag.
+        """
+        timestamps = [api_utils.get_timestamps(n) for n in nodes]
+        timestamps.extend((d.node_uuid, d.deleted_at, None)
+                          for d in deletions or [])
+        if api_utils.check_etag(api_utils.get_etag(objects.Node.VERSION,
+                                                   timestamps)):
+            return None
+
+        collection = NodeCollection.convert_with_links(nodes, limit,
+                                                       url=resource_url,
+                                                       expand=expand,
+                                                       fields=fields,
+                                                       **parameters)
+        if deletions is not None:
+            collection.deleted_nodes = [NodeDeletion.convert(d)
+                                        for d in deletions]
+        return collection
 
     def _get_nodes_by_instance(self, instance_uuid):
         """Retrieve a node by its instance uuid.
@@ -726,17 +1165,18 @@ class NodesController(rest.RestController):
         """
         try:
             node = objects.Node.get_by_instance_uuid(pecan.request.context,
-                                                     instance_uuid)
+                                                     instance_uuid,
+                                                     use_slave=True)
             return [node]
         except exception.InstanceNotFound:
             return []
 
     @wsme_pecan.wsexpose(NodeCollection, types.uuid, types.uuid,
                types.boolean, types.boolean, types.uuid, int, wtypes.text,
-               wtypes.text)
+               wtypes.text, datetime.datetime, types.listtype)
     def get_all(self, chassis_uuid=None, instance_uuid=None, associated=None,
                 maintenance=None, marker=None, limit=None, sort_key='id',
-                sort_dir='asc'):
+                sort_dir='asc', changes_since=None, fields=None):
         """Retrieve a list of nodes.
 
         :param chassis_uuid: Optional UUID of a chassis, to get only nodes for
@@ -753,17 +1193,25 @@ class NodesController(rest.RestController):
         :param limit: maximum number of resources to return in a single result.
         :param sort_key: column to sort results by. Default: id.
         :param sort_dir: direction to sort. "asc" or "desc". Default: asc.
+        :param changes_since: Optional ISO 8601 UTC time, to get only the
+                              nodes created or updated since then. The
+                              first page also lists the nodes deleted
+                              since then.
+        :param fields: Optional comma-separated list of the fields to
+                       return, in addition to the uuid and the links.
         """
         return self._get_nodes_collection(chassis_uuid, instance_uuid,
                                           associated, maintenance, marker,
-                                          limit, sort_key, sort_dir)
+                                          limit, sort_key, sort_dir,
+                                          changes_since=changes_since,
+                                          fields=fields)
 
     @wsme_pecan.wsexpose(NodeCollection, types.uuid, types.uuid,
             types.boolean, types.boolean, types.uuid, int, wtypes.text,
-            wtypes.text)
+            wtypes.text, datetime.datetime, types.listtype)
     def detail(self, chassis_uuid=None, instance_uuid=None, associated=None,
                maintenance=None, marker=None, limit=None, sort_key='id',
-               sort_dir='asc'):
+               sort_dir='asc', changes_since=None, fields=None):
         """Retrieve a list of nodes with detail.
 
         :param chassis_uuid: Optional UUID of a chassis, to get only nodes for
@@ -780,6 +1228,12 @@ class NodesController(rest.RestController):
         :param limit: maximum number of resources to return in a single result.
         :param sort_key: column to sort results by. Default: id.
         :param sort_dir: direction to sort. "asc" or "desc". Default: asc.
+        :param changes_since: Optional ISO 8601 UTC time, to get only the
+                              nodes created or updated since then. The
+                              first page also lists the nodes deleted
+                              since then.
+        :param fields: Optional comma-separated list of the fields to
+                       return, in addition to the uuid and the links.
         """
         # /detail should only work agaist collections
         parent = pecan.request.path.split('/')[:-1][-1]
@@ -791,7 +1245,19 @@ class NodesController(rest.RestController):
         return self._get_nodes_collection(chassis_uuid, instance_uuid,
                                           associated, maintenance, marker,
                                           limit, sort_key, sort_dir, expand,
-                                          resource_url)
+                                          resource_url, changes_since, fields)
+
+    @wsme_pecan.wsexpose(NodeStatistics)
+    def statistics(self):
+        """Retrieve the number of nodes by state, in total and per driver.
+
+        The statistics may be cached for [api]node_statistics_cache_ttl
+        seconds.
+        """
+        if self.from_chassis:
+            raise exception.OperationNotPermitted
+
+        return NodeStatistics.convert(_get_node_statistics_rows())
 
     @wsme_pecan.wsexpose(wtypes.text, types.uuid)
     def validate(self, node_uuid):
@@ -805,17 +1271,33 @@ class NodesController(rest.RestController):
         return pecan.request.rpcapi.validate_driver_interfaces(
                 pecan.request.context, rpc_node.uuid, topic)
 
-    @wsme_pecan.wsexpose(Node, types.uuid)
-    def get_one(self, node_uuid):
+    @wsme_pecan.wsexpose(Node, types.uuid, types.listtype)
+    def get_one(self, node_uuid, fields=None):
         """Retrieve information about the given node.
 
         :param node_uuid: UUID of a node.
+        :param fields: Optional comma-separated list of the fields to
+                       return, in addition to the uuid and the links.
         """
         if self.from_chassis:
             raise exception.OperationNotPermitted
 
-        rpc_node = objects.Node.get_by_uuid(pecan.request.context, node_uuid)
-        return Node.convert_with_links(rpc_node)
+        # NOTE: when the client has a tag, only the timestamps of the node
+        #       are read to check it, so an unchanged node is not loaded.
+        #       An unknown node is left to get_by_uuid() below.
+        if pecan.request.if_none_match:
+            timestamps = pecan.request.dbapi.get_nodeinfo_list(
+                columns=['uuid', 'created_at', 'updated_at'],
+                filters={'uuid': node_uuid}, use_slave=True)
+            if timestamps and api_utils.check_etag(
+                    api_utils.get_etag(objects.Node.VERSION, timestamps)):
+                return None
+
+        rpc_node = objects.Node.get_by_uuid(pecan.request.context, node_uuid,
+                                            use_slave=True)
+        api_utils.check_etag(api_utils.get_etag(
+            objects.Node.VERSION, [api_utils.get_timestamps(rpc_node)]))
+        return Node.convert_with_links(rpc_node, fields=fields)
 
     @wsme_pecan.wsexpose(Node, body=Node, status_code=201)
     def post(self, node):
@@ -849,6 +1331,162 @@ class NodesController(rest.RestController):
         pecan.response.location = link.build_url('nodes', new_node.uuid)
         return Node.convert_with_links(new_node)
 
+    @wsme_pecan.wsexpose(BulkNodeResultCollection, body=[BulkNode])
+    def bulk(self, nodes):
+        """Create many nodes, and their ports, in a single transaction.
+
+        The nodes are checked and created independently of each other:
+        a node which can not be created is reported in the results, and
+        does not prevent the creation of the other nodes.
+
+        :param nodes: a list of nodes, with their ports, within the
+                      request body.
+        :returns: the result for each node, in the order of the request.
+        """
+        if self.from_chassis:
+            raise exception.OperationNotPermitted
+
+        if len(nodes) > CONF.api.max_limit:
+            raise wsme.exc.ClientSideError(
+                _("Too many nodes: at most %d nodes can be enrolled "
+                  "at once.") % CONF.api.max_limit)
+
+        context = pecan.request.context
+        # NOTE: drivers and chassis are checked once each, not once
+        # per node.
+        unknown_drivers = set()
+        for driver_name in set(node.driver for node in nodes):
+            try:
+                pecan.request.rpcapi.get_topic_for_driver(driver_name)
+            except exception.DriverNotFound:
+                unknown_drivers.add(driver_name)
+        chassis_ids = {}
+        for chassis_uuid in set(node.chassis_uuid for node in nodes):
+            if chassis_uuid in (None, wtypes.Unset):
+                continue
+            try:
+                chassis = objects.Chassis.get_by_uuid(context, chassis_uuid)
+                chassis_ids[chassis_uuid] = chassis.id
+            except exception.ChassisNotFound:
+                pass
+
+        results = []
+        nodes_values = []
+        for node in nodes:
+            if node.driver in unknown_drivers:
+                error = exception.NoValidHost(
+                    reason=_('No conductor service registered which '
+                             'supports driver %s.') % node.driver)
+                results.append(BulkNodeResult.convert_error(node, error))
+                continue
+            values = dict((field, getattr(node, field))
+                          for field in _BULK_NODE_FIELDS
+                          if getattr(node, field) != wtypes.Unset)
+            if node.chassis_uuid not in (None, wtypes.Unset):
+                if node.chassis_uuid not in chassis_ids:
+                    error = exception.ChassisNotFound(
+                        chassis=node.chassis_uuid)
+                    results.append(BulkNodeResult.convert_error(node, error))
+                    continue
+                values['chassis_id'] = chassis_ids[node.chassis_uuid]
+            if node.ports != wtypes.Unset:
+                values['ports'] = [
+                    dict((field, getattr(p, field))
+                         for field in _BULK_PORT_FIELDS
+                         if getattr(p, field) != wtypes.Unset)
+                    for p in node.ports]
+            # Filled in once the nodes are created
+            results.append(None)
+            nodes_values.append(values)
+
+        created = iter(objects.Node.create_bulk(context, nodes_values))
+        for index, result in enumerate(results):
+            if result is not None:
+                continue
+            result = next(created)
+            if isinstance(result, exception.IronicException):
+                results[index] = BulkNodeResult.convert_error(nodes[index],
+                                                              result)
+            else:
+                results[index] = BulkNodeResult.convert_with_links(*result)
+        return BulkNodeResultCollection(nodes=results)
+
+    @wsme_pecan.wsexpose(BulkNodeStateResultCollection, body=BulkNodeStates,
+                         status_code=202)
+    def bulk_states(self, states):
+        """Change the power or provision state of many nodes.
+
+        The nodes are grouped by conductor, and each conductor gets all
+        its nodes in a single RPC call. As for the states/power and
+        states/provision resources of a node, the state change of each
+        node is only accepted here, it is done in the background. When a
+        conductor does not answer in time, its nodes are marked unknown.
+
+        :param states: the nodes and their target state, within the
+                       request body.
+        :returns: whether the state change of each node was accepted, in
+                  the order of the request.
+        """
+        if self.from_chassis:
+            raise exception.OperationNotPermitted
+
+        if states.target not in _BULK_STATE_TARGETS:
+            raise wsme.exc.ClientSideError(
+                _("Invalid target state '%s'.") % states.target)
+        if len(states.nodes) > CONF.api.max_limit:
+            raise wsme.exc.ClientSideError(
+                _("Too many nodes: the state of at most %d nodes can be "
+                  "changed at once.") % CONF.api.max_limit)
+
+        context = pecan.request.context
+        rpcapi = pecan.request.rpcapi
+        errors = {}
+        unknown = set()
+        node_uuids = collections.defaultdict(list)
+        rows = pecan.request.dbapi.get_nodeinfo_list(
+            columns=['uuid', 'driver'], filters={'uuid_in': states.nodes})
+        for row in rows:
+            try:
+                node_uuids[rpcapi.get_topic_for(row)].append(row.uuid)
+            except exception.NoValidHost as e:
+                errors[row.uuid] = e.format_message()
+        found = set(row.uuid for row in rows)
+        for node_uuid in states.nodes:
+            if node_uuid not in found:
+                errors[node_uuid] = exception.NodeNotFound(
+                    node=node_uuid).format_message()
+
+        # NOTE: pecan.request is not available in the green threads.
+        def change(topic):
+            try:
+                return rpcapi.change_node_states(context, node_uuids[topic],
+                                                 states.target, topic)
+            except messaging.MessagingTimeout:
+                # The conductor may still be changing the states.
+                LOG.warning(_LW('Timed out changing the state of nodes '
+                                'through topic %s.'), topic)
+                unknown.update(node_uuids[topic])
+                return {}
+            except Exception as e:
+                LOG.exception(_LE('Failed to change the state of nodes '
+                                  'through topic %s.'), topic)
+                return dict((node_uuid, six.text_type(e))
+                            for node_uuid in node_uuids[topic])
+
+        pool = greenpool.GreenPool()
+        for topic_errors in pool.imap(change, list(node_uuids)):
+            errors.update(topic_errors)
+
+        results = []
+        for node_uuid in states.nodes:
+            result = BulkNodeStateResult(uuid=node_uuid)
+            if errors.get(node_uuid):
+                result.error = errors[node_uuid]
+            elif node_uuid in unknown:
+                result.unknown = True
+            results.append(result)
+        return BulkNodeStateResultCollection(nodes=results)
+
     @wsme.validate(types.uuid, [NodePatchType])
     @wsme_pecan.wsexpose(Node, types.uuid, body=[NodePatchType])
     def patch(self, node_uuid, patch):
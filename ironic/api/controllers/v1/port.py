@@ -57,7 +57,11 @@ class Port(base.APIBase):
                 # FIXME(comstud): One should only allow UUID here, but
                 # there seems to be a bug in that tests are passing an
                 # ID. See bug #1301046 for more details.
-                node = objects.Node.get(pecan.request.context, value)
+                # NOTE: the node is only read when a port is shown or
+                # listed, so the read-only slave database can be used.
+                node = objects.Node.get(
+                    pecan.request.context, value,
+                    use_slave=(pecan.request.method == 'GET'))
                 self._node_uuid = node.uuid
                 # NOTE(lucasagomes): Create the node_id attribute on-the-fly
                 #                    to satisfy the api -> rpc object
@@ -108,8 +112,10 @@ class Port(base.APIBase):
         setattr(self, 'node_uuid', kwargs.get('node_id', wtypes.Unset))
 
     @staticmethod
-    def _convert_with_links(port, url, expand=True):
-        if not expand:
+    def _convert_with_links(port, url, expand=True, fields=None):
+        if fields is not None:
+            port.unset_fields_except(['uuid'] + fields)
+        elif not expand:
             port.unset_fields_except(['uuid', 'address'])
 
         # never expose the node_id attribute
@@ -124,9 +130,34 @@ class Port(base.APIBase):
         return port
 
     @classmethod
-    def convert_with_links(cls, rpc_port, expand=True):
-        port = Port(**rpc_port.as_dict())
-        return cls._convert_with_links(port, pecan.request.host_url, expand)
+    def convert_with_links(cls, rpc_port, expand=True, fields=None):
+        if fields is None:
+            port = Port(**rpc_port.as_dict())
+        else:
+            port = Port(**dict((f, getattr(rpc_port, f))
+                               for f in cls.get_object_fields(fields)))
+        return cls._convert_with_links(port, pecan.request.host_url, expand,
+                                       fields)
+
+    @classmethod
+    def get_object_fields(cls, fields):
+        """Return the fields of a Port object holding some API fields.
+
+        The uuid and the timestamps are always included, the links and
+        the ETag are built from them.
+
+        :param fields: a list of fields of the API representation.
+        :raises: ClientSideError if some of the fields do not exist.
+        """
+        api_utils.validate_fields(fields, [f for f in cls().fields
+                                           if f != 'node_id'])
+        obj_fields = ['uuid', 'created_at', 'updated_at']
+        for field in fields:
+            if field == 'node_uuid':
+                field = 'node_id'
+            if field not in obj_fields:
+                obj_fields.append(field)
+        return obj_fields
 
     @classmethod
     def sample(cls, expand=True):
@@ -151,9 +182,10 @@ class PortCollection(collection.Collection):
         self._type = 'ports'
 
     @staticmethod
-    def convert_with_links(rpc_ports, limit, url=None, expand=False, **kwargs):
+    def convert_with_links(rpc_ports, limit, url=None, expand=False,
+                           fields=None, **kwargs):
         collection = PortCollection()
-        collection.ports = [Port.convert_with_links(p, expand)
+        collection.ports = [Port.convert_with_links(p, expand, fields)
                             for p in rpc_ports]
         collection.next = collection.get_next(limit, url=url, **kwargs)
         return collection
@@ -178,41 +210,56 @@ class PortsController(rest.RestController):
 
     def _get_ports_collection(self, node_uuid, address, marker, limit,
                               sort_key, sort_dir, expand=False,
-                              resource_url=None):
+                              resource_url=None, fields=None):
         if self.from_nodes and not node_uuid:
             raise exception.MissingParameterValue(_(
                   "Node id not specified."))
 
         limit = api_utils.validate_limit(limit)
         sort_dir = api_utils.validate_sort_dir(sort_dir)
+        obj_fields = None
+        if fields is not None:
+            obj_fields = Port.get_object_fields(fields)
 
         marker_obj = None
         if marker:
             marker_obj = objects.Port.get_by_uuid(pecan.request.context,
-                                                  marker)
+                                                  marker, use_slave=True)
 
         if node_uuid:
             # FIXME(comstud): Since all we need is the node ID, we can
             #                 make this more efficient by only querying
             #                 for that column. This will get cleaned up
             #                 as we move to the object interface.
-            node = objects.Node.get_by_uuid(pecan.request.context, node_uuid)
+            node = objects.Node.get_by_uuid(pecan.request.context, node_uuid,
+                                            use_slave=True)
             ports = objects.Port.list_by_node_id(pecan.request.context,
                                                  node.id, limit, marker_obj,
                                                  sort_key=sort_key,
-                                                 sort_dir=sort_dir)
+                                                 sort_dir=sort_dir,
+                                                 use_slave=True,
+                                                 fields=obj_fields)
         elif address:
             ports = self._get_ports_by_address(address)
         else:
             ports = objects.Port.list(pecan.request.context, limit,
                                       marker_obj, sort_key=sort_key,
-                                      sort_dir=sort_dir)
+                                      sort_dir=sort_dir, use_slave=True,
+                                      fields=obj_fields)
+
+        timestamps = [api_utils.get_timestamps(p) for p in ports]
+        if api_utils.check_etag(api_utils.get_etag(objects.Port.VERSION,
+                                                   timestamps)):
+            return None
 
+        parameters = {'sort_key': sort_key, 'sort_dir': sort_dir}
+        if fields is not None:
+            parameters['fields'] = ','.join(fields)
         return PortCollection.convert_with_links(ports, limit,
                                                  url=resource_url,
                                                  expand=expand,
-                                                 sort_key=sort_key,
-                                                 sort_dir=sort_dir)
+                                                 fields=fields,
+                                                 **parameters)
 
     def _get_ports_by_address(self, address):
         """Retrieve a port by its address.
@@ -223,15 +270,17 @@ class PortsController(rest.RestController):
 
         """
         try:
-            port = objects.Port.get_by_address(pecan.request.context, address)
+            port = objects.Port.get_by_address(pecan.request.context, address,
+                                               use_slave=True)
             return [port]
         except exception.PortNotFound:
             return []
 
     @wsme_pecan.wsexpose(PortCollection, types.uuid, types.macaddress,
-                         types.uuid, int, wtypes.text, wtypes.text)
+                         types.uuid, int, wtypes.text, wtypes.text,
+                         types.listtype)
     def get_all(self, node_uuid=None, address=None, marker=None, limit=None,
-                sort_key='id', sort_dir='asc'):
+                sort_key='id', sort_dir='asc', fields=None):
         """Retrieve a list of ports.
 
         :param node_uuid: UUID of a node, to get only ports for that node.
@@ -241,14 +290,17 @@ class PortsController(rest.RestController):
         :param limit: maximum number of resources to return in a single result.
         :param sort_key: column to sort results by. Default: id.
         :param sort_dir: direction to sort. "asc" or "desc". Default: asc.
+        :param fields: Optional comma-separated list of the fields to
+                       return, in addition to the uuid and the links.
         """
         return self._get_ports_collection(node_uuid, address, marker, limit,
-                                          sort_key, sort_dir)
+                                          sort_key, sort_dir, fields=fields)
 
     @wsme_pecan.wsexpose(PortCollection, types.uuid, types.macaddress,
-                         types.uuid, int, wtypes.text, wtypes.text)
+                         types.uuid, int, wtypes.text, wtypes.text,
+                         types.listtype)
     def detail(self, node_uuid=None, address=None, marker=None, limit=None,
-                sort_key='id', sort_dir='asc'):
+                sort_key='id', sort_dir='asc', fields=None):
         """Retrieve a list of ports with detail.
 
         :param node_uuid: UUID of a node, to get only ports for that node.
@@ -258,6 +310,8 @@ class PortsController(rest.RestController):
         :param limit: maximum number of resources to return in a single result.
         :param sort_key: column to sort results by. Default: id.
         :param sort_dir: direction to sort. "asc" or "desc". Default: asc.
+        :param fields: Optional comma-separated list of the fields to
+                       return, in addition to the uuid and the links.
         """
         # NOTE(lucasagomes): /detail should only work agaist collections
         parent = pecan.request.path.split('/')[:-1][-1]
@@ -268,19 +322,35 @@ class PortsController(rest.RestController):
         resource_url = '/'.join(['ports', 'detail'])
         return self._get_ports_collection(node_uuid, address, marker, limit,
                                           sort_key, sort_dir, expand,
-                                          resource_url)
+                                          resource_url, fields)
 
-    @wsme_pecan.wsexpose(Port, types.uuid)
-    def get_one(self, port_uuid):
+    @wsme_pecan.wsexpose(Port, types.uuid, types.listtype)
+    def get_one(self, port_uuid, fields=None):
         """Retrieve information about the given port.
 
         :param port_uuid: UUID of a port.
+        :param fields: Optional comma-separated list of the fields to
+                       return, in addition to the uuid and the links.
         """
         if self.from_nodes:
             raise exception.OperationNotPermitted
 
-        rpc_port = objects.Port.get_by_uuid(pecan.request.context, port_uuid)
-        return Port.convert_with_links(rpc_port)
+        # NOTE: when the client has a tag, only the timestamps of the port
+        #       are read to check it, so an unchanged port is not loaded.
+        #       An unknown port is left to get_by_uuid() below.
+        if pecan.request.if_none_match:
+            timestamps = pecan.request.dbapi.get_portinfo_list(
+                columns=['uuid', 'created_at', 'updated_at'],
+                filters={'uuid': port_uuid}, use_slave=True)
+            if timestamps and api_utils.check_etag(
+                    api_utils.get_etag(objects.Port.VERSION, timestamps)):
+                return None
+
+        rpc_port = objects.Port.get_by_uuid(pecan.request.context, port_uuid,
+                                            use_slave=True)
+        api_utils.check_etag(api_utils.get_etag(
+            objects.Port.VERSION, [api_utils.get_timestamps(rpc_port)]))
+        return Port.convert_with_links(rpc_port, fields=fields)
 
     @wsme_pecan.wsexpose(Port, body=Port, status_code=201)
     def post(self, port):
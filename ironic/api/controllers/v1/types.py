@@ -96,9 +96,38 @@ class BooleanType(wtypes.UserType):
         return BooleanType.validate(value)
 
 
+class ListType(wtypes.UserType):
+    """A simple list type, of comma-separated strings."""
+
+    basetype = wtypes.text
+    name = 'list'
+    # FIXME(lucasagomes): When used with wsexpose decorator WSME will try
+    # to get the name of the type by accessing it's __name__ attribute.
+    # Remove this __name__ attribute once it's fixed in WSME.
+    # https://bugs.launchpad.net/wsme/+bug/1265590
+    __name__ = name
+
+    @staticmethod
+    def validate(value):
+        """Return the list of the distinct non-empty items, in order."""
+        items = []
+        for item in value.split(','):
+            item = item.strip()
+            if item and item not in items:
+                items.append(item)
+        return items
+
+    @staticmethod
+    def frombasetype(value):
+        if value is None:
+            return None
+        return ListType.validate(value)
+
+
 macaddress = MacAddressType()
 uuid = UuidType()
 boolean = BooleanType()
+listtype = ListType()
 
 
 class JsonPatchType(wtypes.Base):
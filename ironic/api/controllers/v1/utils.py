@@ -13,13 +13,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import hashlib
+
 import jsonpatch
 from oslo.config import cfg
+from oslo.utils import timeutils
+import pecan
+import six
 import wsme
 
 from ironic.common.i18n import _
 
 CONF = cfg.CONF
+CONF.import_opt('node_deletion_log_retention', 'ironic.db.api',
+                group='database')
 
 
 JSONPATCH_EXCEPTIONS = (jsonpatch.JsonPatchException,
@@ -34,6 +42,18 @@ def validate_limit(limit):
     return min(CONF.api.max_limit, limit) or CONF.api.max_limit
 
 
+def use_streaming(limit):
+    """Return whether a collection of up to limit items should be streamed.
+
+    Only JSON collections are streamed, see [api]collection_stream_threshold.
+    """
+    threshold = CONF.api.collection_stream_threshold
+    if not threshold or limit <= threshold:
+        return False
+    return pecan.request.accept.best_match(
+        ['application/json', 'application/xml']) != 'application/xml'
+
+
 def validate_sort_dir(sort_dir):
     if sort_dir not in ['asc', 'desc']:
         raise wsme.exc.ClientSideError(_("Invalid sort direction: %s. "
@@ -42,6 +62,69 @@ def validate_sort_dir(sort_dir):
     return sort_dir
 
 
+def validate_fields(fields, allowed_fields):
+    invalid = [f for f in fields if f not in allowed_fields]
+    if invalid:
+        raise wsme.exc.ClientSideError(_("Invalid fields: %s")
+                                       % ', '.join(invalid))
+    return fields
+
+
+def validate_changes_since(changes_since):
+    changes_since = timeutils.normalize_time(changes_since)
+    retention = CONF.database.node_deletion_log_retention
+    if changes_since < timeutils.utcnow() - datetime.timedelta(
+            seconds=retention):
+        raise wsme.exc.ClientSideError(_("changes_since must be within "
+                                         "the last %d seconds; older node "
+                                         "deletions are not recorded.")
+                                       % retention)
+    return changes_since
+
+
+def get_etag(version, timestamps):
+    """Return an entity tag for a representation of API resources.
+
+    The tag covers the request URL, which determines the fields and the
+    links of the representation, the version of the objects, and the
+    identity and last change of each resource.
+
+    :param version: the version of the objects of the resources.
+    :param timestamps: a list of (uuid, created_at, updated_at) tuples,
+                       one for each resource.
+    """
+    digest = hashlib.sha1()
+    parts = [pecan.request.url, version]
+    for resource in timestamps:
+        parts.extend(resource)
+    for part in parts:
+        if isinstance(part, datetime.datetime):
+            part = timeutils.normalize_time(part).isoformat()
+        digest.update(six.text_type(part).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def get_timestamps(obj):
+    """Return the (uuid, created_at, updated_at) tuple of an object."""
+    return obj.uuid, obj.created_at, obj.updated_at
+
+
+def check_etag(etag):
+    """Set the ETag of the response, and return whether the client has it.
+
+    The tag is sent as a weak one: updated_at is stored with a one second
+    precision, so two changes within the same second share a tag.
+
+    When the client sent the same tag in If-None-Match, the response is
+    turned into an empty 304 Not Modified, so the caller does not need
+    to build its body.
+    """
+    pecan.response.etag = (etag, False)
+    pecan.response.conditional_response = True
+    return etag in pecan.request.if_none_match
+
+
 def apply_jsonpatch(doc, patch):
     for p in patch:
         if p['op'] == 'add' and p['path'].count('/') == 1:
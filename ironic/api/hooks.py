@@ -109,6 +109,23 @@ class AdminAuthHook(hooks.PecanHook):
             raise exc.HTTPForbidden()
 
 
+class StreamHook(hooks.PecanHook):
+    """Send the body of a response from a generator.
+
+    wsme serializes the whole value returned by a controller at once. A
+    controller returning a large document can instead attach a generator
+    of its JSON chunks to the request as json_stream, which replaces the
+    body of a successful response.
+
+    """
+    def after(self, state):
+        stream = getattr(state.request, 'json_stream', None)
+        if stream is None or state.response.status_int != 200:
+            return
+        state.response.app_iter = stream
+        state.response.content_length = None
+
+
 class NoExceptionTracebackHook(hooks.PecanHook):
     """Workaround rpc.common: deserialize_remote_exception.
 
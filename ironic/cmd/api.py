@@ -18,45 +18,48 @@
 """The Ironic Service API."""
 
 import logging
+import multiprocessing
 import sys
-from wsgiref import simple_server
 
 from oslo.config import cfg
-from six.moves import socketserver
 
 from ironic.api import app
 from ironic.common.i18n import _LI
 from ironic.common import service as ironic_service
 from ironic.openstack.common import log
+from ironic.openstack.common import service
 
 CONF = cfg.CONF
 
 
-class ThreadedSimpleServer(socketserver.ThreadingMixIn,
-                           simple_server.WSGIServer):
-    """A Mixin class to make the API service greenthread-able."""
-    pass
+def _get_workers():
+    workers = CONF.api.api_workers
+    if workers is None:
+        try:
+            workers = multiprocessing.cpu_count()
+        except NotImplementedError:
+            workers = 1
+    return workers
 
 
 def main():
     # Pase config file and command line options, then start logging
     ironic_service.prepare_service(sys.argv)
 
-    # Build and start the WSGI app
+    # Build the WSGI app and bind the listening socket, which the worker
+    # processes share
     host = CONF.api.host_ip
     port = CONF.api.port
-    wsgi = simple_server.make_server(
-            host, port,
-            app.VersionSelectorApplication(),
-            server_class=ThreadedSimpleServer)
+    server = ironic_service.WSGIService(app.VersionSelectorApplication(),
+                                        host, port)
+    workers = _get_workers()
 
     LOG = log.getLogger(__name__)
-    LOG.info(_LI("Serving on http://%(host)s:%(port)s"),
-             {'host': host, 'port': port})
+    LOG.info(_LI("Serving on http://%(host)s:%(port)s with %(workers)d "
+                 "worker process(es)"),
+             {'host': host, 'port': port, 'workers': workers})
     LOG.info(_LI("Configuration:"))
     CONF.log_opt_values(LOG, logging.INFO)
 
-    try:
-        wsgi.serve_forever()
-    except KeyboardInterrupt:
-        pass
+    launcher = service.launch(server, workers=workers)
+    launcher.wait()
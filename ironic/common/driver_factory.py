@@ -19,6 +19,7 @@ from stevedore import dispatch
 
 from ironic.common import exception
 from ironic.common.i18n import _LI
+from ironic.common import metrics
 from ironic.openstack.common import log
 
 
@@ -118,8 +119,11 @@ class DriverFactory(object):
                         _check_func,
                         invoke_on_load=True,
                         on_load_failure_callback=_catch_driver_not_found))
-        LOG.info(_LI("Loaded the following drivers: %s"),
-                cls._extension_manager.names())
+        names = cls._extension_manager.names()
+        LOG.info(_LI("Loaded the following drivers: %s"), names)
+
+        for name in names:
+            metrics.instrument_driver(name, cls._extension_manager[name].obj)
 
     @property
     def names(self):
@@ -392,6 +392,11 @@ class NodeNotLocked(Invalid):
     message = _("Node %(node)s found not to be locked on release")
 
 
+class NodeFiltersNotMatched(InvalidState):
+    message = _("Node %(node)s could not be reserved because it does not "
+                "match the requested filters.")
+
+
 class NoFreeConductorWorker(TemporaryFailure):
     message = _('Requested action cannot be performed due to lack of free '
                 'conductor workers.')
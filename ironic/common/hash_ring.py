@@ -13,9 +13,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import array
 import bisect
 import hashlib
 import threading
+import time
 
 from oslo.config import cfg
 
@@ -46,12 +48,47 @@ hash_opts = [
                     'conductor services to prepare deployment environments '
                     'and potentially allow the Ironic cluster to recover '
                     'more quickly if a conductor instance is terminated.'),
+    cfg.IntOpt('hash_ring_reset_interval',
+               default=180,
+               help='Interval (in seconds) between checks for changes in '
+                    'the set of active conductors, after which the hash '
+                    'rings are reloaded if needed. The hash rings are also '
+                    'reset when a driver is unknown or a conductor could '
+                    'not be reached, so this bounds how long a new '
+                    'conductor may go unnoticed.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(hash_opts)
 
 
+def get_partition_key(data):
+    """Get the key at which the supplied data is placed on hash rings.
+
+    The key only depends on the data, not on the hosts of a ring, so it
+    can be stored alongside the data and compared against the ranges
+    returned by :meth:`HashRing.get_key_ranges`.
+
+    :param data: A string identifier to be mapped across the ring.
+    :returns: An integer between 0 and 2^60 - 1.
+    """
+    return int(hashlib.md5(data).hexdigest()[:15], 16)
+
+
+def _key_array(keys):
+    """Pack partition keys into an array of unsigned 64-bit integers.
+
+    Falls back to a list on platforms without a 64-bit array type.
+    """
+    for typecode in ('L', 'Q'):
+        try:
+            if array.array(typecode).itemsize == 8:
+                return array.array(typecode, keys)
+        except ValueError:
+            pass
+    return list(keys)
+
+
 class HashRing(object):
     """A stable hash ring.
 
@@ -63,6 +100,10 @@ class HashRing(object):
     - we hash each host many times to spread load more finely
       as otherwise adding a host gets (on average) 50% of the load of
       just one other host assigned to it.
+
+    The dividers are kept as the first 60 bits of their MD5 digests in a
+    sorted array, with a parallel array holding the index of the host
+    each divider belongs to.
     """
 
     def __init__(self, hosts, replicas=None):
@@ -84,24 +125,32 @@ class HashRing(object):
             raise exception.Invalid(
                     _("Invalid hosts supplied when building HashRing."))
 
-        self._host_hashes = {}
-        for host in hosts:
+        self._hosts = list(hosts)
+        host_indexes = {}
+        num_partitions = 2 ** CONF.hash_partition_exponent
+        for index, host in enumerate(self._hosts):
             key = str(host).encode('utf8')
             key_hash = hashlib.md5(key)
-            for p in range(2 ** CONF.hash_partition_exponent):
-                key_hash.update(key)
-                hashed_key = self._hash2int(key_hash)
-                self._host_hashes[hashed_key] = host
+            update = key_hash.update
+            hexdigest = key_hash.hexdigest
+            for p in range(num_partitions):
+                update(key)
+                host_indexes[int(hexdigest()[:15], 16)] = index
         # Gather the (possibly colliding) resulting hashes into a bisectable
-        # list.
-        self._partitions = sorted(self._host_hashes.keys())
+        # array.
+        partitions = sorted(host_indexes)
+        self._partitions = _key_array(partitions)
+        self._host_indexes = array.array(
+                'H' if len(self._hosts) <= 0xffff else 'I',
+                map(host_indexes.__getitem__, partitions))
+        self._key_ranges = {}
 
     def _hash2int(self, key_hash):
         """Convert the given hash's digest to a numerical value for the ring.
 
-        :returns: An integer equivalent value of the digest.
+        :returns: An integer equivalent to the first 60 bits of the digest.
         """
-        return int(key_hash.hexdigest(), 16)
+        return int(key_hash.hexdigest()[:15], 16)
 
     def _get_partition(self, data):
         try:
@@ -126,13 +175,60 @@ class HashRing(object):
                   this `HashRing` was created with. It may be less than this
                   if ignore_hosts is not None.
         """
-        hosts = []
+        ignore_hosts = self._get_ignore_hosts(ignore_hosts)
+        return self._get_hosts_for_partition(self._get_partition(data),
+                                             ignore_hosts)
+
+    def get_hosts_bulk(self, data_list, ignore_hosts=None):
+        """Get the lists of hosts which several pieces of data map onto.
+
+        This gives the same results as calling :meth:`get_hosts` for each
+        item, with less overhead per item.
+
+        :param data_list: An iterable of string identifiers to be mapped
+                          across the ring.
+        :param ignore_hosts: A list of hosts to skip when performing the hash.
+                             Default: None.
+        :returns: a dictionary mapping each identifier to its list of hosts,
+                  as returned by :meth:`get_hosts`.
+        """
+        ignore_hosts = self._get_ignore_hosts(ignore_hosts)
+        partitions = self._partitions
+        num_partitions = len(partitions)
+        host_indexes = self._host_indexes
+        hosts = self._hosts
+        find = bisect.bisect
+        md5 = hashlib.md5
+        hash2int = self._hash2int
+        # NOTE: without replicas or ignored hosts, a partition maps to its
+        # own host, so the linear probing can be skipped.
+        simple = self.replicas == 1 and not ignore_hosts
+
+        result = {}
+        for data in data_list:
+            try:
+                position = find(partitions, hash2int(md5(data)))
+            except TypeError:
+                raise exception.Invalid(
+                        _("Invalid data supplied to HashRing.get_hosts."))
+            if position >= num_partitions:
+                position = 0
+            if simple:
+                result[data] = [hosts[host_indexes[position]]]
+            else:
+                result[data] = self._get_hosts_for_partition(position,
+                                                             ignore_hosts)
+        return result
+
+    def _get_ignore_hosts(self, ignore_hosts):
         if ignore_hosts is None:
-            ignore_hosts = set()
-        else:
-            ignore_hosts = set(ignore_hosts)
-            ignore_hosts.intersection_update(self.hosts)
-        partition = self._get_partition(data)
+            return set()
+        ignore_hosts = set(ignore_hosts)
+        ignore_hosts.intersection_update(self.hosts)
+        return ignore_hosts
+
+    def _get_hosts_for_partition(self, partition, ignore_hosts):
+        hosts = []
         for replica in range(0, self.replicas):
             if len(hosts) + len(ignore_hosts) == len(self.hosts):
                 # prevent infinite loop - cannot allocate more fallbacks.
@@ -147,6 +243,60 @@ class HashRing(object):
             hosts.append(host)
         return hosts
 
+    def get_key_ranges(self, host):
+        """Get the ranges of partition keys which map onto a host.
+
+        Data maps onto the host, as one of its replicas, if and only if
+        its partition key (see :func:`get_partition_key`) falls in one of
+        the ranges. The result is cached for each host.
+
+        :param host: A host of the ring.
+        :returns: a sorted list of (start, end) tuples for the half-open
+                  ranges start <= key < end. start is None for the first
+                  range if it is unbounded, and end is None for the last
+                  range if it is unbounded.
+        """
+        if host in self._key_ranges:
+            return self._key_ranges[host]
+
+        if host not in self.hosts:
+            self._key_ranges[host] = []
+            return []
+
+        num_partitions = len(self._partitions)
+        if self.replicas == 1:
+            # Duplicated hosts all hash to the same keys, so the last one
+            # is the one found in the partition map.
+            index = len(self._hosts) - 1 - self._hosts[::-1].index(host)
+            owned = [self._host_indexes[p] == index
+                     for p in range(num_partitions)]
+        else:
+            owned = [host in self._get_hosts_for_partition(p, set())
+                     for p in range(num_partitions)]
+
+        # Partition p holds the keys between the dividers p - 1 and p,
+        # and partition 0 also holds the keys above the last divider.
+        ranges = []
+        for p in range(num_partitions):
+            if not owned[p]:
+                continue
+            start = self._partitions[p - 1] if p > 0 else None
+            end = self._partitions[p]
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        if num_partitions and owned[0]:
+            start = self._partitions[-1]
+            if ranges and ranges[-1][1] == start:
+                # The host also owns the last partition, the ranges merge
+                ranges[-1] = (ranges[-1][0], None)
+            else:
+                ranges.append((start, None))
+
+        self._key_ranges[host] = ranges
+        return ranges
+
     def _get_host(self, partition):
         """Find what host is serving a partition.
 
@@ -154,28 +304,61 @@ class HashRing(object):
             e.g. 0 is the first partition, 1 is the second.
         :return: The host object the ring was constructed with.
         """
-        return self._host_hashes[self._partitions[partition]]
+        return self._hosts[self._host_indexes[partition]]
 
 
 class HashRingManager(object):
     _hash_rings = None
+    _generation = None
+    _updated_at = None
     _lock = threading.Lock()
 
     def __init__(self):
         self.dbapi = dbapi.get_instance()
 
+    def _is_expired(self):
+        interval = CONF.hash_ring_reset_interval
+        return time.time() - self._updated_at >= interval
+
     @property
     def ring(self):
         # Hot path, no lock
-        if self._hash_rings is not None:
-            return self._hash_rings
+        rings = self._hash_rings
+        if rings is not None and not self._is_expired():
+            return rings
 
         with self._lock:
-            if self._hash_rings is None:
-                rings = self._load_hash_rings()
-                self.__class__._hash_rings = rings
+            if self._hash_rings is None or self._is_expired():
+                self._update()
             return self._hash_rings
 
+    def _update(self):
+        # NOTE: read the generation before the rings, so that a change
+        # while the rings are loading is picked up by the next update.
+        generation = self.dbapi.get_conductor_generation()
+        changed = (self._hash_rings is None or
+                   generation != self._generation)
+        if changed:
+            rings = self._load_hash_rings()
+        # NOTE: set the timestamp first, readers on the hot path
+        # expect it to be set whenever the rings are.
+        self.__class__._updated_at = time.time()
+        if changed:
+            self.__class__._generation = generation
+            self.__class__._hash_rings = rings
+        return changed
+
+    def update(self):
+        """Reload the hash rings if the set of active conductors changed.
+
+        This only reads the conductor generation from the database,
+        unless the rings need to be reloaded.
+
+        :returns: True if the hash rings were reloaded, False otherwise.
+        """
+        with self._lock:
+            return self._update()
+
     def _load_hash_rings(self):
         rings = {}
         d2c = self.dbapi.get_active_driver_dict()
@@ -0,0 +1,242 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+In-process runtime metrics.
+
+Metrics are kept in memory by a :class:`Registry`, and can be written to a
+file as JSON with :meth:`Registry.dump`. There are three kinds of metrics:
+
+- counters, incremented with :func:`incr`;
+- histograms of durations, in seconds, updated with :func:`observe`, or
+  with the :func:`timer` context manager and the :func:`timed` decorator;
+- gauges, whose value is read from a callable when a snapshot is taken,
+  registered with :func:`register_gauge`.
+
+Updating a metric only costs a few dictionary and arithmetic operations,
+so they can be left on in production.
+"""
+
+import bisect
+import contextlib
+import functools
+import json
+import os
+import tempfile
+import time
+
+from oslo.config import cfg
+import six
+
+from ironic.common.i18n import _LW
+from ironic.openstack.common import log
+
+LOG = log.getLogger(__name__)
+
+metrics_opts = [
+    cfg.StrOpt('dump_file',
+               help='File which the metrics of the conductor are written '
+                    'to, in JSON, every dump_interval seconds. Metrics are '
+                    'not written if it is not set.'),
+    cfg.IntOpt('dump_interval',
+               default=60,
+               help='Seconds between two writes of the metrics to '
+                    'dump_file.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(metrics_opts, 'metrics')
+
+# Upper bounds, in seconds, of the buckets of the histograms. The last
+# bucket counts the values greater than the last bound.
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+
+class Histogram(object):
+    """Distribution of a duration, in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+
+    def to_dict(self):
+        buckets = dict(('le_%s' % bound, count)
+                       for bound, count in zip(BUCKETS, self.buckets))
+        buckets['inf'] = self.buckets[-1]
+        return {'count': self.count,
+                'sum': self.sum,
+                'min': self.min,
+                'max': self.max,
+                'buckets': buckets}
+
+
+class Registry(object):
+    """Registry of the metrics of a process."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget all the metrics."""
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def incr(self, name, value=1):
+        """Increment a counter."""
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """Add a duration, in seconds, to a histogram."""
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram()
+        histogram.add(value)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Context manager adding the duration of its block to a histogram.
+
+        The duration is added even if the block raises an exception.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start)
+
+    def timed(self, name):
+        """Decorator adding the duration of each call to a histogram."""
+        def decorator(f):
+            @functools.wraps(f)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return f(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register_gauge(self, name, func):
+        """Register a gauge, whose value is the result of func()."""
+        self._gauges[name] = func
+
+    def unregister_gauge(self, name):
+        """Unregister a gauge, if it is registered."""
+        self._gauges.pop(name, None)
+
+    def snapshot(self):
+        """Get the current value of every metric.
+
+        :returns: a dict with the 'counters', 'gauges' and 'histograms'
+                  dicts, mapping the names of the metrics to their
+                  values, and the 'timestamp' of the snapshot.
+        """
+        gauges = {}
+        for name, func in six.iteritems(self._gauges):
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                LOG.warning(_LW('Failed to get the value of the %(name)s '
+                                'gauge: %(error)s'),
+                            {'name': name, 'error': e})
+        return {'timestamp': time.time(),
+                'counters': self._counters.copy(),
+                'gauges': gauges,
+                'histograms': dict((name, histogram.to_dict())
+                                   for name, histogram
+                                   in six.iteritems(self._histograms))}
+
+    def dump(self, path):
+        """Write a snapshot of the metrics to a file, in JSON.
+
+        The file is replaced atomically, so readers never see a partially
+        written file.
+        """
+        data = json.dumps(self.snapshot(), sort_keys=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.rename(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+_REGISTRY = Registry()
+
+
+def get_registry():
+    """Get the metrics registry of this process."""
+    return _REGISTRY
+
+
+def incr(name, value=1):
+    _REGISTRY.incr(name, value)
+
+
+def observe(name, value):
+    _REGISTRY.observe(name, value)
+
+
+def timer(name):
+    return _REGISTRY.timer(name)
+
+
+def timed(name):
+    return _REGISTRY.timed(name)
+
+
+def register_gauge(name, func):
+    _REGISTRY.register_gauge(name, func)
+
+
+def instrument_driver(driver_name, driver, interfaces=None):
+    """Time the calls to the methods of the interfaces of a driver.
+
+    The public methods of each interface of the driver are replaced by
+    wrappers which add the duration of each call to the
+    'driver.<driver name>.<interface>.<method>' histogram.
+
+    :param driver_name: the name of the driver.
+    :param driver: an instance of a class which implements
+                   :class:`ironic.drivers.base.BaseDriver`.
+    :param interfaces: the names of the interfaces to instrument. Defaults
+                       to all the core and standard interfaces.
+    """
+    if interfaces is None:
+        interfaces = driver.core_interfaces + driver.standard_interfaces
+    for iface_name in interfaces:
+        iface = getattr(driver, iface_name, None)
+        if iface is None:
+            continue
+        for method_name in dir(iface):
+            if method_name.startswith('_'):
+                continue
+            method = getattr(iface, method_name)
+            if not callable(method) or hasattr(method, '_metric_name'):
+                continue
+            name = 'driver.%s.%s.%s' % (driver_name, iface_name, method_name)
+            wrapper = timed(name)(method)
+            wrapper._metric_name = name
+            setattr(iface, method_name, wrapper)
@@ -17,7 +17,9 @@
 # under the License.
 
 import socket
+from wsgiref import simple_server
 
+from eventlet import greenpool
 from oslo.config import cfg
 from oslo import messaging
 from oslo.utils import importutils
@@ -97,6 +99,60 @@ class RPCService(service.Service):
                  {'service': self.topic, 'host': self.host})
 
 
+class WSGIServer(simple_server.WSGIServer):
+    """A WSGI server handling each request in a green thread.
+
+    The green threads are tracked, so that the requests being served can
+    be completed before the server is stopped.
+    """
+
+    def __init__(self, *args, **kwargs):
+        simple_server.WSGIServer.__init__(self, *args, **kwargs)
+        self.pool = greenpool.GreenPool()
+
+    def process_request(self, request, client_address):
+        self.pool.spawn_n(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class WSGIService(service.Service):
+    """Serves a WSGI application.
+
+    The listening socket is bound when the service is created, so the
+    worker processes forked by a ProcessLauncher all accept connections
+    on the same socket.
+    """
+
+    def __init__(self, app, host, port):
+        super(WSGIService, self).__init__()
+        self.server = simple_server.make_server(host, port, app,
+                                                server_class=WSGIServer)
+        self._serving = False
+
+    def start(self):
+        super(WSGIService, self).start()
+        self.tg.add_thread(self.server.serve_forever)
+        self._serving = True
+
+    def stop(self):
+        # NOTE: shutdown() waits for serve_forever() to return, so it must
+        #       not be called if the server was never started.
+        if self._serving:
+            # Stop accepting connections, then let the requests being
+            # served complete.
+            self.server.shutdown()
+            self.server.pool.waitall()
+            self._serving = False
+        super(WSGIService, self).stop()
+
+
 def prepare_service(argv=[]):
     config.parse_args(argv)
     cfg.set_defaults(log.log_opts,
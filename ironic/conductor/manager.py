@@ -43,7 +43,9 @@ a change, etc.
 
 import collections
 import datetime
+import itertools
 import threading
+import time
 
 import eventlet
 from eventlet import greenpool
@@ -51,7 +53,7 @@ from oslo.config import cfg
 from oslo.db import exception as db_exception
 from oslo import messaging
 from oslo.utils import excutils
-from oslo_concurrency import lockutils
+import six
 
 from ironic.common import dhcp_factory
 from ironic.common import driver_factory
@@ -63,19 +65,32 @@ from ironic.common.i18n import _LE
 from ironic.common.i18n import _LI
 from ironic.common.i18n import _LW
 from ironic.common import keystone
+from ironic.common import metrics
 from ironic.common import rpc
 from ironic.common import states
 from ironic.common import utils as ironic_utils
+from ironic.conductor import periodic
 from ironic.conductor import task_manager
 from ironic.conductor import utils
+from ironic.conductor import workers
 from ironic.db import api as dbapi
-from ironic import objects
 from ironic.openstack.common import context as ironic_context
 from ironic.openstack.common import log
 from ironic.openstack.common import periodic_task
 
 MANAGER_TOPIC = 'ironic.conductor_manager'
-WORKER_SPAWN_lOCK = "conductor_worker_spawn"
+
+# Maximum number of ranges of hash partition keys a periodic task filters
+# the nodes of a driver on; beyond that the query would get too large.
+MAX_HASH_RANGES = 128
+
+# Number of nodes read by a periodic task which are mapped onto the hash
+# rings at once.
+MAPPING_CHUNK_SIZE = 1000
+
+# The default size of the oslo.messaging pool of RPC greenthreads, used
+# while its rpc_thread_pool_size option is not registered yet.
+DEFAULT_RPC_THREAD_POOL_SIZE = 64
 
 LOG = log.getLogger(__name__)
 
@@ -115,6 +130,21 @@ conductor_opts = [
                         'number of times Ironic should try syncing the '
                         'hardware node power state with the node power state '
                         'in DB'),
+        cfg.IntOpt('sync_power_state_workers',
+                   default=1,
+                   help='Maximum number of nodes whose power state is synced '
+                        'concurrently during a single run of the power '
+                        'state sync periodic task. Each sync is run in its '
+                        'own greenthread from a dedicated pool of this '
+                        'size. A value of 1 syncs the nodes one at a time.'),
+        cfg.IntOpt('sync_power_state_batch_size',
+                   default=100,
+                   help='Maximum number of nodes whose power state is '
+                        'requested at once from drivers which can get the '
+                        'power state of several nodes with a single request '
+                        '(eg. one SSH command for all the VMs of a host). '
+                        'Nodes whose power state does not match the '
+                        'database are then synced one by one.'),
         cfg.IntOpt('periodic_max_workers',
                    default=8,
                    help='Maximum number of worker threads that can be started '
@@ -123,6 +153,26 @@ conductor_opts = [
         cfg.IntOpt('workers_pool_size',
                    default=100,
                    help='The size of the workers greenthread pool.'),
+        cfg.IntOpt('workers_queue_size',
+                   default=32,
+                   help='Maximum number of requests waiting for a free '
+                        'worker when all the workers are busy. Requests '
+                        'made through the API are served before those of '
+                        'periodic tasks. Requests beyond this number fail '
+                        'straight away. Set it to 0 to never wait for a '
+                        'worker. Each waiting request holds an RPC '
+                        'greenthread, so it is capped at half of '
+                        '[DEFAULT]rpc_thread_pool_size.'),
+        cfg.IntOpt('workers_queue_timeout',
+                   default=10,
+                   help='Maximum time, in seconds, a request waits for a '
+                        'free worker before failing.'),
+        cfg.IntOpt('bulk_state_change_workers',
+                   default=8,
+                   help='Maximum number of nodes of a bulk state change '
+                        'which are locked and validated concurrently, '
+                        'before their actions are handed over to the '
+                        'workers pool.'),
         cfg.IntOpt('node_locked_retry_attempts',
                    default=3,
                    help='Number of attempts to grab a node lock.'),
@@ -152,6 +202,13 @@ conductor_opts = [
                         'conductor will check for nodes that it should '
                         '"take over". Set it to a negative value to disable '
                         'the check entirely.'),
+        cfg.BoolOpt('independent_periodic_tasks',
+                   default=False,
+                   help='Run each periodic task in its own greenthread, on '
+                        'its own interval, instead of running all of them '
+                        'one after the other every periodic_interval '
+                        'seconds. A slow periodic task then does not delay '
+                        'the others.'),
 ]
 
 CONF = cfg.CONF
@@ -162,7 +219,7 @@ class ConductorManager(periodic_task.PeriodicTasks):
     """Ironic Conductor manager main class."""
 
     # NOTE(rloo): This must be in sync with rpcapi.ConductorAPI's.
-    RPC_API_VERSION = '1.21'
+    RPC_API_VERSION = '1.22'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -174,6 +231,9 @@ class ConductorManager(periodic_task.PeriodicTasks):
         self.topic = topic
         self.power_state_sync_count = collections.defaultdict(int)
         self.notifier = rpc.get_notifier()
+        # When this conductor last marked the dead conductors offline
+        self._conductors_expired_at = 0
+        self._periodic_scheduler = None
 
     def _get_driver(self, driver_name):
         """Get the driver.
@@ -189,6 +249,33 @@ class ConductorManager(periodic_task.PeriodicTasks):
         except KeyError:
             raise exception.DriverNotFound(driver_name=driver_name)
 
+    def _get_workers_queue_size(self):
+        """Get the size of the queue of requests for a worker.
+
+        A request waiting for a worker holds one of the greenthreads
+        serving RPC calls. Were they all waiting, the conductor could
+        not answer any other call, so the queue is capped at half of
+        them.
+
+        :returns: [conductor]workers_queue_size, capped at half of
+                  [DEFAULT]rpc_thread_pool_size.
+        """
+        queue_size = CONF.conductor.workers_queue_size
+        try:
+            rpc_threads = CONF.rpc_thread_pool_size
+        except cfg.NoSuchOptError:
+            # NOTE: oslo.messaging registers it when the RPC server is
+            # created, after init_host().
+            rpc_threads = DEFAULT_RPC_THREAD_POOL_SIZE
+        max_queue_size = rpc_threads // 2
+        if queue_size > max_queue_size:
+            LOG.warning(_LW('[conductor]workers_queue_size %(size)d is '
+                            'capped at %(max)d, half of the RPC thread '
+                            'pool size.'),
+                        {'size': queue_size, 'max': max_queue_size})
+            queue_size = max_queue_size
+        return queue_size
+
     def init_host(self):
         self.dbapi = dbapi.get_instance()
 
@@ -215,9 +302,19 @@ class ConductorManager(periodic_task.PeriodicTasks):
         self.ring_manager = hash.HashRingManager()
         """Consistent hash ring which maps drivers to conductors."""
 
-        self._worker_pool = greenpool.GreenPool(
-                                size=CONF.conductor.workers_pool_size)
-        """GreenPool of background workers for performing tasks async."""
+        self._worker_pool = workers.WorkerPool(
+                size=CONF.conductor.workers_pool_size,
+                queue_size=self._get_workers_queue_size(),
+                queue_timeout=CONF.conductor.workers_queue_timeout)
+        """Pool of background workers for performing tasks async."""
+
+        metrics.register_gauge('conductor.workers.free',
+                               self._worker_pool.free)
+        metrics.register_gauge('conductor.workers.running',
+                               self._worker_pool.running)
+        metrics.register_gauge(
+                'conductor.workers.queue_depth',
+                lambda: self._worker_pool.get_stats()['queue_depth'])
 
         # Spawn a dedicated greenthread for the keepalive
         try:
@@ -231,8 +328,16 @@ class ConductorManager(periodic_task.PeriodicTasks):
                 LOG.critical(_LC('Failed to start keepalive'))
                 self.del_host()
 
+        if CONF.conductor.independent_periodic_tasks:
+            self._periodic_scheduler = periodic.PeriodicTaskScheduler(
+                    self, ironic_context.get_admin_context())
+            self._periodic_scheduler.start()
+
     def del_host(self):
         self._keepalive_evt.set()
+        if self._periodic_scheduler is not None:
+            self._periodic_scheduler.stop()
+            self._periodic_scheduler = None
         try:
             # Inform the cluster that this conductor is shutting down.
             # Note that rebalancing won't begin until after heartbeat timeout.
@@ -244,9 +349,27 @@ class ConductorManager(periodic_task.PeriodicTasks):
             pass
 
     def periodic_tasks(self, context, raise_on_error=False):
-        """Periodic tasks are run at pre-specified interval."""
+        """Periodic tasks are run at pre-specified interval.
+
+        If [conductor]independent_periodic_tasks is set, the periodic tasks
+        are run by their own greenthreads instead, and this does nothing.
+        """
+        if self._periodic_scheduler is not None:
+            return periodic_task.DEFAULT_INTERVAL
         return self.run_periodic_tasks(context, raise_on_error=raise_on_error)
 
+    def get_periodic_task_stats(self):
+        """Get the statistics of the independently run periodic tasks.
+
+        :returns: a dict mapping the name of each periodic task to its
+                  statistics, as returned by
+                  :meth:`periodic.PeriodicTaskScheduler.get_stats`, or an
+                  empty dict if the periodic tasks are not run independently.
+        """
+        if self._periodic_scheduler is None:
+            return {}
+        return self._periodic_scheduler.get_stats()
+
     @messaging.expected_exceptions(exception.InvalidParameterValue,
                                    exception.MissingParameterValue,
                                    exception.NodeLocked,
@@ -342,20 +465,62 @@ class ConductorManager(periodic_task.PeriodicTasks):
                   % {'node': node_id, 'state': new_state})
 
         with task_manager.acquire(context, node_id, shared=False) as task:
-            task.driver.power.validate(task)
-            # Set the target_power_state and clear any last_error, since we're
-            # starting a new operation. This will expose to other processes
-            # and clients that work is in progress.
-            if new_state == states.REBOOT:
-                task.node.target_power_state = states.POWER_ON
-            else:
-                task.node.target_power_state = new_state
-            task.node.last_error = None
-            task.node.save()
-            task.set_spawn_error_hook(self._power_state_error_handler,
-                                      task.node, task.node.power_state)
-            task.spawn_after(self._spawn_worker, utils.node_power_action,
-                             task, new_state)
+            self._start_power_state_change(task, new_state,
+                                           self._spawn_worker)
+
+    def _start_power_state_change(self, task, new_state, spawn_method):
+        """Validate a node and have a worker change its power state.
+
+        :param task: a TaskManager instance with an exclusive lock.
+        :param new_state: the desired power state of the node.
+        :param spawn_method: the method starting the worker.
+        """
+        task.driver.power.validate(task)
+        # Set the target_power_state and clear any last_error, since we're
+        # starting a new operation. This will expose to other processes
+        # and clients that work is in progress.
+        if new_state == states.REBOOT:
+            task.node.target_power_state = states.POWER_ON
+        else:
+            task.node.target_power_state = new_state
+        task.node.last_error = None
+        task.node.save()
+        task.set_spawn_error_hook(self._power_state_error_handler,
+                                  task.node, task.node.power_state)
+        task.spawn_after(spawn_method, utils.node_power_action,
+                         task, new_state)
+
+    def _vendor_passthru_requires_exclusive_lock(self, context, node_id,
+                                                 driver_method):
+        """Whether a node vendor method must run under an exclusive lock.
+
+        Only the methods registered with ``require_exclusive_lock=False``
+        may run under a shared lock. Unknown methods and drivers still
+        implementing their own vendor_passthru() lock exclusively.
+
+        :param context: an admin context.
+        :param node_id: the id or uuid of a node.
+        :param driver_method: the name of the vendor method.
+        :returns: True unless the vendor method opted out of the lock.
+        """
+        # NOTE: only the driver of the node is read here, the node itself
+        #       is loaded once by task_manager.acquire().
+        if ironic_utils.is_int_like(node_id):
+            filters = {'id': node_id}
+        elif ironic_utils.is_uuid_like(node_id):
+            filters = {'uuid': node_id}
+        else:
+            raise exception.InvalidIdentity(identity=node_id)
+        rows = self.dbapi.get_nodeinfo_list(columns=['driver'],
+                                            filters=filters)
+        if not rows:
+            raise exception.NodeNotFound(node=node_id)
+        vendor_iface = getattr(self._get_driver(rows[0][0]), 'vendor', None)
+        if (vendor_iface is None or
+                hasattr(vendor_iface, 'vendor_passthru')):
+            return True
+        vendor_opts = vendor_iface.vendor_routes.get(driver_method)
+        return vendor_opts is None or vendor_opts['require_exclusive_lock']
 
     @messaging.expected_exceptions(exception.NoFreeConductorWorker,
                                    exception.NodeLocked,
@@ -393,8 +558,11 @@ class ConductorManager(periodic_task.PeriodicTasks):
         # NOTE(max_lobur): Even though not all vendor_passthru calls may
         # require an exclusive lock, we need to do so to guarantee that the
         # state doesn't unexpectedly change between doing a vendor.validate
-        # and vendor.vendor_passthru.
-        with task_manager.acquire(context, node_id, shared=False) as task:
+        # and vendor.vendor_passthru. Only the vendor methods which opted
+        # out of it start with a shared lock.
+        shared = not self._vendor_passthru_requires_exclusive_lock(
+            context, node_id, driver_method)
+        with task_manager.acquire(context, node_id, shared=shared) as task:
             if not getattr(task.driver, 'vendor', None):
                 raise exception.UnsupportedDriverExtension(
                     driver=task.node.driver,
@@ -413,6 +581,7 @@ class ConductorManager(periodic_task.PeriodicTasks):
                                 "of vendor_passthru() has been deprecated. "
                                 "Please update the code to use the "
                                 "@passthru decorator."))
+                task.upgrade_lock()
                 vendor_iface.validate(task, method=driver_method,
                                             **info)
                 task.spawn_after(self._spawn_worker,
@@ -434,6 +603,11 @@ class ConductorManager(periodic_task.PeriodicTasks):
                     _('The method %(method)s does not support HTTP %(http)s') %
                     {'method': driver_method, 'http': http_method})
 
+            # NOTE: the node's driver may have changed since the lock
+            # mode was chosen; upgrading an exclusive lock is a no-op.
+            if vendor_opts['require_exclusive_lock']:
+                task.upgrade_lock()
+
             vendor_iface.validate(task, method=driver_method,
                                   http_method=http_method, **info)
 
@@ -650,48 +824,61 @@ class ConductorManager(periodic_task.PeriodicTasks):
         # to have locked this node, we'll fail to acquire the lock. The
         # client should perhaps retry in this case unless we decide we
         # want to add retries or extra synchronization here.
-        with task_manager.acquire(context, node_id, shared=False) as task:
-            node = task.node
-            if node.maintenance:
-                raise exception.NodeInMaintenance(op=_('provisioning'),
-                                                  node=node.uuid)
-            try:
-                task.driver.power.validate(task)
-                task.driver.deploy.validate(task)
-            except (exception.InvalidParameterValue,
-                    exception.MissingParameterValue) as e:
-                raise exception.InstanceDeployFailure(_(
-                    "RPC do_node_deploy failed to validate deploy or "
-                    "power info. Error: %(msg)s") % {'msg': e})
+        # The deploy interfaces need the node's ports to set up DHCP and
+        # the boot configuration, so load them along with the node.
+        with task_manager.acquire(context, node_id, shared=False,
+                                  load_ports=True) as task:
+            self._start_deploy(task, rebuild, self._spawn_worker)
 
-            if rebuild:
-                event = 'rebuild'
-            else:
-                event = 'deploy'
+    def _start_deploy(self, task, rebuild, spawn_method):
+        """Validate a node and have a worker deploy it.
 
-            # Save the previous states so we can rollback the node to a
-            # consistent state in case there's no free workers to do the
-            # deploy work
-            previous_prov_state = node.provision_state
-            previous_tgt_provision_state = node.target_provision_state
+        :param task: a TaskManager instance with an exclusive lock.
+        :param rebuild: True if this is a rebuild request.
+        :param spawn_method: the method starting the worker.
+        :raises: InstanceDeployFailure
+        :raises: NodeInMaintenance if the node is in maintenance mode.
+        """
+        node = task.node
+        if node.maintenance:
+            raise exception.NodeInMaintenance(op=_('provisioning'),
+                                              node=node.uuid)
+        try:
+            task.driver.power.validate(task)
+            task.driver.deploy.validate(task)
+        except (exception.InvalidParameterValue,
+                exception.MissingParameterValue) as e:
+            raise exception.InstanceDeployFailure(_(
+                "RPC do_node_deploy failed to validate deploy or "
+                "power info. Error: %(msg)s") % {'msg': e})
+
+        if rebuild:
+            event = 'rebuild'
+        else:
+            event = 'deploy'
 
-            try:
-                task.process_event(event)
-                node.last_error = None
-                node.save()
-            except exception.InvalidState:
-                raise exception.InstanceDeployFailure(_(
-                    "Request received to %(what)s %(node)s, but "
-                    "this is not possible in the current state of "
-                    "'%(state)s'. ") % {'what': event,
-                                        'node': node.uuid,
-                                        'state': node.provision_state})
-            else:
-                task.set_spawn_error_hook(self._provisioning_error_handler,
-                                          node, previous_prov_state,
-                                          previous_tgt_provision_state)
-                task.spawn_after(self._spawn_worker,
-                                 self._do_node_deploy, task)
+        # Save the previous states so we can rollback the node to a
+        # consistent state in case there's no free workers to do the
+        # deploy work
+        previous_prov_state = node.provision_state
+        previous_tgt_provision_state = node.target_provision_state
+
+        try:
+            task.process_event(event)
+            node.last_error = None
+            node.save()
+        except exception.InvalidState:
+            raise exception.InstanceDeployFailure(_(
+                "Request received to %(what)s %(node)s, but "
+                "this is not possible in the current state of "
+                "'%(state)s'. ") % {'what': event,
+                                    'node': node.uuid,
+                                    'state': node.provision_state})
+        else:
+            task.set_spawn_error_hook(self._provisioning_error_handler,
+                                      node, previous_prov_state,
+                                      previous_tgt_provision_state)
+            task.spawn_after(spawn_method, self._do_node_deploy, task)
 
     def _do_node_deploy(self, task):
         """Prepare the environment and deploy a node."""
@@ -747,40 +934,112 @@ class ConductorManager(periodic_task.PeriodicTasks):
         """
         LOG.debug("RPC do_node_tear_down called for node %s." % node_id)
 
-        with task_manager.acquire(context, node_id, shared=False) as task:
-            node = task.node
-            try:
-                # NOTE(ghe): Valid power driver values are needed to perform
-                # a tear-down. Deploy info is useful to purge the cache but not
-                # required for this method.
-                task.driver.power.validate(task)
-            except (exception.InvalidParameterValue,
-                    exception.MissingParameterValue) as e:
-                raise exception.InstanceDeployFailure(_(
-                    "RPC do_node_tear_down failed to validate power info. "
-                    "Error: %(msg)s") % {'msg': e})
+        with task_manager.acquire(context, node_id, shared=False,
+                                  load_ports=True) as task:
+            self._start_tear_down(task, self._spawn_worker)
+
+    def _start_tear_down(self, task, spawn_method):
+        """Validate a node and have a worker tear it down.
 
-            # save the previous states so we can rollback the node to a
-            # consistent state in case there's no free workers to do the
-            # tear down work
-            previous_prov_state = node.provision_state
-            previous_tgt_provision_state = node.target_provision_state
+        :param task: a TaskManager instance with an exclusive lock.
+        :param spawn_method: the method starting the worker.
+        :raises: InstanceDeployFailure
+        """
+        node = task.node
+        try:
+            # NOTE(ghe): Valid power driver values are needed to perform
+            # a tear-down. Deploy info is useful to purge the cache but not
+            # required for this method.
+            task.driver.power.validate(task)
+        except (exception.InvalidParameterValue,
+                exception.MissingParameterValue) as e:
+            raise exception.InstanceDeployFailure(_(
+                "RPC do_node_tear_down failed to validate power info. "
+                "Error: %(msg)s") % {'msg': e})
+
+        # save the previous states so we can rollback the node to a
+        # consistent state in case there's no free workers to do the
+        # tear down work
+        previous_prov_state = node.provision_state
+        previous_tgt_provision_state = node.target_provision_state
+
+        try:
+            task.process_event('delete')
+            node.last_error = None
+            node.save()
+        except exception.InvalidState:
+            raise exception.InstanceDeployFailure(_(
+                "RPC do_node_tear_down "
+                "not allowed for node %(node)s in state %(state)s")
+                % {'node': node.uuid, 'state': node.provision_state})
+        else:
+            task.set_spawn_error_hook(self._provisioning_error_handler,
+                                      node, previous_prov_state,
+                                      previous_tgt_provision_state)
+            task.spawn_after(spawn_method, self._do_node_tear_down, task)
+
+    @messaging.expected_exceptions(exception.InvalidParameterValue)
+    def change_node_states(self, context, node_ids, target):
+        """RPC method to change the power or provision state of many nodes.
+
+        Each node is handled like by :meth:`change_node_power_state`,
+        :meth:`do_node_deploy` or :meth:`do_node_tear_down`: it is locked
+        and validated synchronously, then its action is done by a worker.
+        Up to [conductor]bulk_state_change_workers nodes are locked and
+        validated at the same time. To answer quickly, the nodes which are
+        locked are not retried, and the actions are not queued when no
+        worker is free; those nodes fail with NodeLocked and
+        NoFreeConductorWorker.
+
+        :param context: an admin context.
+        :param node_ids: the ids or uuids of the nodes.
+        :param target: the desired power or provision state of the nodes.
+        :raises: InvalidParameterValue if the target state is not valid.
+        :returns: a dict mapping each node id or uuid to None if the state
+                  change was accepted, or else to the error message.
+
+        """
+        LOG.debug("RPC change_node_states called for %(count)d nodes. "
+                  "The desired new state is %(state)s."
+                  % {'count': len(node_ids), 'state': target})
+
+        spawn = self._spawn_worker_nowait
+        load_ports = True
+        if target in (states.POWER_ON, states.POWER_OFF, states.REBOOT):
+            def action(task):
+                self._start_power_state_change(task, target, spawn)
+            load_ports = False
+        elif target in (states.ACTIVE, states.REBUILD):
+            def action(task):
+                self._start_deploy(task, target == states.REBUILD, spawn)
+        elif target == states.DELETED:
+            def action(task):
+                self._start_tear_down(task, spawn)
+        else:
+            raise exception.InvalidParameterValue(
+                _("Invalid target state '%s'.") % target)
 
+        # NOTE: the whole batch must be answered within the RPC timeout,
+        # so locked nodes and a busy worker pool fail straight away
+        # instead of being retried or queued.
+        def change(node_id):
             try:
-                task.process_event('delete')
-                node.last_error = None
-                node.save()
-            except exception.InvalidState:
-                raise exception.InstanceDeployFailure(_(
-                    "RPC do_node_tear_down "
-                    "not allowed for node %(node)s in state %(state)s")
-                    % {'node': node_id, 'state': node.provision_state})
-            else:
-                task.set_spawn_error_hook(self._provisioning_error_handler,
-                                          node, previous_prov_state,
-                                          previous_tgt_provision_state)
-                task.spawn_after(self._spawn_worker,
-                                self._do_node_tear_down, task)
+                with task_manager.acquire(context, node_id, shared=False,
+                                          retry=False,
+                                          load_ports=load_ports) as task:
+                    action(task)
+            except exception.IronicException as e:
+                return node_id, e.format_message()
+            except Exception as e:
+                LOG.exception(_LE('Unexpected error while changing the '
+                                  'state of node %(node)s to %(state)s.'),
+                              {'node': node_id, 'state': target})
+                return node_id, six.text_type(e)
+            return node_id, None
+
+        pool = greenpool.GreenPool(
+                            size=CONF.conductor.bulk_state_change_workers)
+        return dict(pool.imap(change, node_ids))
 
     def _do_node_tear_down(self, task):
         """Internal RPC method to tear down an existing node deployment."""
@@ -819,6 +1078,13 @@ class ConductorManager(periodic_task.PeriodicTasks):
         while not self._keepalive_evt.is_set():
             try:
                 self.dbapi.touch_conductor(self.host)
+                # NOTE: every conductor expires the dead ones, there is
+                # no need to do it more often than they can die.
+                now = time.time()
+                if (now - self._conductors_expired_at >=
+                        CONF.conductor.heartbeat_timeout):
+                    self.dbapi.expire_conductors()
+                    self._conductors_expired_at = now
             except db_exception.DBConnectionError:
                 LOG.warning(_LW('Conductor could not connect to database '
                                 'while heartbeating.'))
@@ -926,6 +1192,7 @@ class ConductorManager(periodic_task.PeriodicTasks):
 
     @periodic_task.periodic_task(
             spacing=CONF.conductor.sync_power_state_interval)
+    @metrics.timed('conductor.periodic.sync_power_states')
     def _sync_power_states(self, context):
         """Periodic task to sync power states for the nodes.
 
@@ -943,49 +1210,188 @@ class ConductorManager(periodic_task.PeriodicTasks):
         cause a deploy callback to fail. There's not much we can do
         here to avoid failing a brand new deploy to a node that we've
         locked here, though.
+
+        If the [conductor]sync_power_state_workers option is greater than
+        one, the nodes are synced concurrently by a pool of that many
+        greenthreads, so that one slow BMC does not hold up the whole pass.
+
+        Nodes whose driver can get the power state of several nodes at
+        once are synced in batches; see :meth:`_sync_power_states_batch`.
         """
-        # FIXME(comstud): Since our initial state checks are outside
-        # of the lock (to try to avoid the lock), some checks are
-        # repeated after grabbing the lock so we can unlock quickly.
-        # The node mapping is not re-checked because it doesn't much
-        # matter if things happened to re-balance.
-        #
-        # This is inefficient and racey. We end up with calling DB API's
-        # get_node() twice (once here, and once in acquire(). Ideally we
-        # add a way to pass constraints to task_manager.acquire()
-        # (through to its DB API call) so that we can eliminate our call
-        # and first set of checks below.
-
-        filters = {'reserved': False, 'maintenance': False}
+        filters = {'reserved': False, 'maintenance': False,
+                   'hash_ranges': self._get_hash_ranges()}
         columns = ['id', 'uuid', 'driver']
-        node_list = self.dbapi.get_nodeinfo_list(columns=columns,
-                                                 filters=filters)
+        node_list = self.dbapi.iter_nodeinfo_list(columns=columns,
+                                                  filters=filters)
+
+        stats = collections.Counter()
+        start_time = time.time()
+        pool = None
+        if CONF.conductor.sync_power_state_workers > 1:
+            pool = greenpool.GreenPool(
+                                size=CONF.conductor.sync_power_state_workers)
+
+        def run(func, *args):
+            if pool is None:
+                func(*args)
+            else:
+                # NOTE: spawn_n() blocks while the pool is full, which
+                # bounds the number of in-flight BMC requests.
+                pool.spawn_n(func, *args)
+
+        batch_size = CONF.conductor.sync_power_state_batch_size
+        batchable = {}
+        batches = collections.defaultdict(list)
+        node_list = self._filter_mapped_to_this_conductor(node_list, 1, 2)
         for (node_id, node_uuid, driver) in node_list:
-            try:
-                if not self._mapped_to_this_conductor(node_uuid, driver):
+            if driver not in batchable:
+                batchable[driver] = self._supports_batch_power_state(driver)
+            if batchable[driver]:
+                batches[driver].append((node_id, node_uuid))
+                if len(batches[driver]) == batch_size:
+                    run(self._sync_power_states_batch, context, driver,
+                        batches.pop(driver), stats)
+                continue
+            run(self._sync_power_state_for_node, context, node_id, node_uuid,
+                stats)
+
+        for driver, nodes in batches.items():
+            run(self._sync_power_states_batch, context, driver, nodes, stats)
+
+        if pool is not None:
+            pool.waitall()
+
+        LOG.debug('Power state sync finished in %(time).2f seconds: '
+                  '%(checked)d node(s) checked, %(skipped)d skipped, '
+                  '%(failed)d failed.',
+                  {'time': time.time() - start_time,
+                   'checked': stats['checked'],
+                   'skipped': stats['skipped'],
+                   'failed': stats['failed']})
+
+    def _supports_batch_power_state(self, driver_name):
+        """Check whether a driver can get the power state of many nodes.
+
+        :param driver_name: the name of the driver.
+        :returns: True if the driver's power interface implements
+                  get_power_states() with batched requests.
+        """
+        try:
+            driver = driver_factory.get_driver(driver_name)
+        except exception.DriverNotFound:
+            return False
+        return driver.power.supports_batch_power_state is True
+
+    def _sync_power_states_batch(self, context, driver, nodes, stats):
+        """Sync the power states of nodes using a single driver request.
+
+        The power states are read with shared locks. Nodes whose power
+        state matches the one recorded in the database need nothing more;
+        the others go through the per-node sync, which locks the node,
+        queries it again and fixes the mismatch.
+
+        :param context: request context.
+        :param driver: the name of the nodes' driver.
+        :param nodes: a list of (node id, node uuid) tuples.
+        :param stats: a collections.Counter updated with the outcome
+                      ('checked', 'skipped' or 'failed') for each node.
+
+        """
+        tasks = []
+        unsynced = []
+        try:
+            for node_id, node_uuid in nodes:
+                try:
+                    task = task_manager.acquire(context, node_id,
+                                                shared=True)
+                except exception.NodeNotFound:
+                    stats['skipped'] += 1
                     continue
-                node = objects.Node.get_by_id(context, node_id)
+                node = task.node
                 if (node.provision_state == states.DEPLOYWAIT or
                         node.maintenance or node.reservation is not None):
+                    task.release_resources()
+                    stats['skipped'] += 1
                     continue
-                with task_manager.acquire(context, node_id) as task:
-                    if (task.node.provision_state != states.DEPLOYWAIT and
-                            not task.node.maintenance):
-                        self._do_sync_power_state(task)
-            except exception.NodeNotFound:
-                LOG.info(_LI("During sync_power_state, node %(node)s was not "
-                             "found and presumed deleted by another process."),
-                         {'node': node_uuid})
-            except exception.NodeLocked:
-                LOG.info(_LI("During sync_power_state, node %(node)s was "
-                             "already locked by another process. Skip."),
-                         {'node': node_uuid})
-            finally:
-                # Yield on every iteration
-                eventlet.sleep(0)
+                tasks.append(task)
+
+            power_states = {}
+            if tasks:
+                try:
+                    power_states = tasks[0].driver.power.get_power_states(
+                                                                    tasks)
+                except Exception as e:
+                    LOG.warning(_LW("During sync_power_state, could not get "
+                                    "the power states of nodes %(nodes)s. "
+                                    "Error: %(err)s."),
+                                {'nodes': [t.node.uuid for t in tasks],
+                                 'err': e})
+
+            for task in tasks:
+                node = task.node
+                if (node.power_state is not None and
+                        power_states.get(node.uuid) == node.power_state):
+                    self.power_state_sync_count.pop(node.uuid, None)
+                    stats['checked'] += 1
+                else:
+                    unsynced.append((node.id, node.uuid))
+        finally:
+            for task in tasks:
+                task.release_resources()
+            # Yield after every batch
+            eventlet.sleep(0)
+
+        for node_id, node_uuid in unsynced:
+            self._sync_power_state_for_node(context, node_id, node_uuid,
+                                            stats)
+
+    def _sync_power_state_for_node(self, context, node_id, node_uuid, stats):
+        """Sync the power state of a single node, if it is eligible.
+
+        :param context: request context.
+        :param node_id: the id of the node.
+        :param node_uuid: the uuid of the node.
+        :param stats: a collections.Counter updated with the outcome
+                      ('checked', 'skipped' or 'failed') for this node.
+
+        """
+        # NOTE(comstud): The node mapping is not re-checked after
+        # grabbing the lock because it doesn't much matter if things
+        # happened to re-balance.
+        filters = {'maintenance': False,
+                   'provision_state_not_in': [states.DEPLOYWAIT]}
+        try:
+            # NOTE: The maintenance and provision_state checks are done
+            # atomically with the reservation, and a node locked by
+            # someone else is skipped rather than waited for.
+            with task_manager.acquire(context, node_id, filters=filters,
+                                      retry=False) as task:
+                self._do_sync_power_state(task)
+                stats['checked'] += 1
+        except exception.NodeFiltersNotMatched:
+            stats['skipped'] += 1
+        except exception.NodeNotFound:
+            LOG.info(_LI("During sync_power_state, node %(node)s was not "
+                         "found and presumed deleted by another process."),
+                     {'node': node_uuid})
+            stats['skipped'] += 1
+        except exception.NodeLocked:
+            LOG.debug("During sync_power_state, node %(node)s was "
+                      "already locked by another process. Skip.",
+                      {'node': node_uuid})
+            stats['skipped'] += 1
+        except Exception:
+            LOG.exception(_LE("During sync_power_state, an unexpected error "
+                              "occurred while syncing node %(node)s."),
+                          {'node': node_uuid})
+            stats['failed'] += 1
+        finally:
+            # Yield on every iteration
+            eventlet.sleep(0)
 
     @periodic_task.periodic_task(
             spacing=CONF.conductor.check_provision_state_interval)
+    @metrics.timed('conductor.periodic.check_deploy_timeouts')
     def _check_deploy_timeouts(self, context):
         callback_timeout = CONF.conductor.deploy_callback_timeout
         if not callback_timeout:
@@ -994,7 +1400,8 @@ class ConductorManager(periodic_task.PeriodicTasks):
         filters = {'reserved': False,
                    'provision_state': states.DEPLOYWAIT,
                    'maintenance': False,
-                   'provisioned_before': callback_timeout}
+                   'provisioned_before': callback_timeout,
+                   'hash_ranges': self._get_hash_ranges()}
         columns = ['uuid', 'driver']
         node_list = self.dbapi.get_nodeinfo_list(
                                     columns=columns,
@@ -1002,25 +1409,25 @@ class ConductorManager(periodic_task.PeriodicTasks):
                                     sort_key='provision_updated_at',
                                     sort_dir='asc')
 
+        # NOTE(comstud): Recheck maintenance, provision_state and
+        # provision_updated_at when grabbing the lock, as they may have
+        # changed since the call to get_nodeinfo_list.
+        reserve_filters = filters.copy()
+        del reserve_filters['reserved']
+        del reserve_filters['hash_ranges']
+
         workers_count = 0
+        node_list = self._filter_mapped_to_this_conductor(node_list, 0, 1)
         for node_uuid, driver in node_list:
-            if not self._mapped_to_this_conductor(node_uuid, driver):
-                continue
             try:
-                with task_manager.acquire(context, node_uuid) as task:
-                    # NOTE(comstud): Recheck maintenance and provision_state
-                    # now that we have the lock. We don't need to re-check
-                    # updated_at unless we expect the state to have flipped
-                    # to something else and then back to DEPLOYWAIT between
-                    # the call to get_nodeinfo_list and now.
-                    if (task.node.maintenance or
-                            task.node.provision_state != states.DEPLOYWAIT):
-                        continue
-                    task.spawn_after(self._spawn_worker,
+                with task_manager.acquire(context, node_uuid,
+                                          filters=reserve_filters) as task:
+                    task.spawn_after(self._spawn_periodic_worker,
                                      utils.cleanup_after_timeout, task)
             except exception.NoFreeConductorWorker:
                 break
-            except (exception.NodeLocked, exception.NodeNotFound):
+            except (exception.NodeLocked, exception.NodeNotFound,
+                    exception.NodeFiltersNotMatched):
                 continue
             workers_count += 1
             if workers_count == CONF.conductor.periodic_max_workers:
@@ -1038,6 +1445,7 @@ class ConductorManager(periodic_task.PeriodicTasks):
 
     @periodic_task.periodic_task(
             spacing=CONF.conductor.sync_local_state_interval)
+    @metrics.timed('conductor.periodic.sync_local_state')
     def _sync_local_state(self, context):
         """Perform any actions necessary to sync local state.
 
@@ -1046,21 +1454,30 @@ class ConductorManager(periodic_task.PeriodicTasks):
         determines which, if any, nodes need to be "taken over".
         The ensuing actions could include preparing a PXE environment,
         updating the DHCP server, and so on.
+
+        The hash rings are only reloaded when the conductor generation
+        changed. The nodes are scanned on every run, since nodes may become
+        candidates for a takeover without any change of the rings (eg. when
+        they leave maintenance), but only those in the hash ranges of this
+        conductor are read from the database.
         """
-        self.ring_manager.reset()
+        self.ring_manager.update()
         filters = {'reserved': False,
                    'maintenance': False,
-                   'provision_state': states.ACTIVE}
+                   'provision_state': states.ACTIVE,
+                   'hash_ranges': self._get_hash_ranges()}
         columns = ['id', 'uuid', 'driver', 'conductor_affinity']
-        node_list = self.dbapi.get_nodeinfo_list(
+        node_list = self.dbapi.iter_nodeinfo_list(
                                     columns=columns,
                                     filters=filters)
+        reserve_filters = filters.copy()
+        del reserve_filters['reserved']
+        del reserve_filters['hash_ranges']
 
         admin_context = None
         workers_count = 0
+        node_list = self._filter_mapped_to_this_conductor(node_list, 1, 2)
         for node_id, node_uuid, driver, conductor_affinity in node_list:
-            if not self._mapped_to_this_conductor(node_uuid, driver):
-                continue
             if conductor_affinity == self.conductor.id:
                 continue
 
@@ -1073,40 +1490,95 @@ class ConductorManager(periodic_task.PeriodicTasks):
 
             # Node is mapped here, but not updated by this conductor last
             try:
-                with task_manager.acquire(admin_context, node_id) as task:
-                    # NOTE(deva): now that we have the lock, check again to
-                    # avoid racing with deletes and other state changes
-                    node = task.node
-                    if (node.maintenance or
-                            node.conductor_affinity == self.conductor.id or
-                            node.provision_state != states.ACTIVE):
+                # NOTE(deva): check the state again when grabbing the lock
+                # to avoid racing with deletes and other state changes
+                with task_manager.acquire(admin_context, node_id,
+                                          filters=reserve_filters) as task:
+                    if task.node.conductor_affinity == self.conductor.id:
                         continue
 
-                    task.spawn_after(self._spawn_worker,
+                    task.spawn_after(self._spawn_periodic_worker,
                                      self._do_takeover, task)
 
             except exception.NoFreeConductorWorker:
                 break
-            except (exception.NodeLocked, exception.NodeNotFound):
+            except (exception.NodeLocked, exception.NodeNotFound,
+                    exception.NodeFiltersNotMatched):
                 continue
             workers_count += 1
             if workers_count == CONF.conductor.periodic_max_workers:
                 break
 
-    def _mapped_to_this_conductor(self, node_uuid, driver):
-        """Check that node is mapped to this conductor.
+    def _get_hash_ranges(self):
+        """Get the 'hash_ranges' node filter for this conductor.
+
+        Periodic tasks use it to only read the nodes which are mapped to
+        this conductor from the database. The mapping of each node must
+        still be checked with :meth:`_filter_mapped_to_this_conductor`.
+
+        :returns: a dict mapping the name of each driver whose hash ring
+                  includes this conductor to the ranges of partition keys
+                  mapped to it, or to None if there are too many ranges
+                  to filter on.
+        """
+        hash_ranges = {}
+        for driver, ring in self.ring_manager.ring.items():
+            if self.host not in ring.hosts:
+                continue
+            ranges = ring.get_key_ranges(self.host)
+            if len(ranges) > MAX_HASH_RANGES:
+                ranges = None
+            hash_ranges[driver] = ranges
+        return hash_ranges
+
+    def _get_nodes_mapped_to_this_conductor(self, node_uuids, driver):
+        """Get those of the nodes of a driver mapped to this conductor.
 
         Note that because mappings are eventually consistent, it is possible
         for two conductors to simultaneously believe that a node is mapped to
         them. Any operation that depends on exclusive control of a node should
         take out a lock.
+
+        :param node_uuids: the uuids of nodes using the driver.
+        :param driver: the name of the driver.
+        :returns: a set with the uuids of the nodes mapped to this conductor.
         """
         try:
             ring = self.ring_manager[driver]
         except exception.DriverNotFound:
-            return False
+            return set()
+
+        return set(node_uuid for node_uuid, hosts
+                   in ring.get_hosts_bulk(node_uuids).items()
+                   if self.host in hosts)
 
-        return self.host in ring.get_hosts(node_uuid)
+    def _filter_mapped_to_this_conductor(self, node_list, uuid_index,
+                                         driver_index):
+        """Yield the rows of the nodes which are mapped to this conductor.
+
+        The nodes are mapped onto the hash rings MAPPING_CHUNK_SIZE at a
+        time, and the rows are yielded in the order of node_list.
+
+        :param node_list: an iterable of rows of nodes.
+        :param uuid_index: the index of the node uuid in a row.
+        :param driver_index: the index of the driver name in a row.
+        """
+        node_list = iter(node_list)
+        while True:
+            chunk = list(itertools.islice(node_list, MAPPING_CHUNK_SIZE))
+            if not chunk:
+                return
+            node_uuids = collections.OrderedDict()
+            for row in chunk:
+                node_uuids.setdefault(row[driver_index], []).append(
+                    row[uuid_index])
+            mapped = set()
+            for driver, uuids in node_uuids.items():
+                mapped.update(self._get_nodes_mapped_to_this_conductor(
+                    uuids, driver))
+            for row in chunk:
+                if row[uuid_index] in mapped:
+                    yield row
 
     @messaging.expected_exceptions(exception.NodeLocked)
     def validate_driver_interfaces(self, context, node_id):
@@ -1144,22 +1616,56 @@ class ConductorManager(periodic_task.PeriodicTasks):
                     ret_dict[iface_name]['reason'] = reason
         return ret_dict
 
-    @lockutils.synchronized(WORKER_SPAWN_lOCK, 'ironic-')
     def _spawn_worker(self, func, *args, **kwargs):
 
         """Create a greenthread to run func(*args, **kwargs).
 
-        Spawns a greenthread if there are free slots in pool, otherwise raises
-        exception. Execution control returns immediately to the caller.
+        Spawns a greenthread if there are free slots in pool, otherwise waits
+        for one to become free, for up to [conductor]workers_queue_timeout
+        seconds. Execution control returns to the caller as soon as the
+        greenthread is spawned.
+
+        :returns: GreenThread object.
+        :raises: NoFreeConductorWorker if worker pool is currently full and
+                 its queue is full too, or no worker became free in time.
+
+        """
+        return self._worker_pool.spawn(workers.USER_PRIORITY,
+                                       func, *args, **kwargs)
+
+    def _spawn_worker_nowait(self, func, *args, **kwargs):
+        """Create a greenthread to run func(*args, **kwargs) right away.
+
+        Same as :meth:`_spawn_worker`, except that it never waits for a
+        worker to become free.
 
         :returns: GreenThread object.
         :raises: NoFreeConductorWorker if worker pool is currently full.
 
         """
-        if self._worker_pool.free():
-            return self._worker_pool.spawn(func, *args, **kwargs)
-        else:
-            raise exception.NoFreeConductorWorker()
+        return self._worker_pool.spawn_nowait(func, *args, **kwargs)
+
+    def _spawn_periodic_worker(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in a greenthread for a periodic task.
+
+        Same as :meth:`_spawn_worker`, except that requests for a worker made
+        through the API are served first.
+
+        :returns: GreenThread object.
+        :raises: NoFreeConductorWorker if worker pool is currently full and
+                 its queue is full too, or no worker became free in time.
+
+        """
+        return self._worker_pool.spawn(workers.PERIODIC_PRIORITY,
+                                       func, *args, **kwargs)
+
+    def get_worker_pool_stats(self):
+        """Get statistics about the worker pool and its queue.
+
+        :returns: a dict, as returned by
+                  :meth:`workers.WorkerPool.get_stats`.
+        """
+        return self._worker_pool.get_stats()
 
     @messaging.expected_exceptions(exception.NodeLocked,
                                    exception.NodeAssociated,
@@ -1343,21 +1849,21 @@ class ConductorManager(periodic_task.PeriodicTasks):
 
     @periodic_task.periodic_task(
             spacing=CONF.conductor.send_sensor_data_interval)
+    @metrics.timed('conductor.periodic.send_sensor_data')
     def _send_sensor_data(self, context):
         # do nothing if send_sensor_data option is False
         if not CONF.conductor.send_sensor_data:
             return
 
-        filters = {'associated': True}
+        filters = {'associated': True,
+                   'hash_ranges': self._get_hash_ranges()}
         columns = ['uuid', 'driver', 'instance_uuid']
-        node_list = self.dbapi.get_nodeinfo_list(columns=columns,
-                                                 filters=filters)
+        node_list = self.dbapi.iter_nodeinfo_list(columns=columns,
+                                                  filters=filters)
 
+        # only handle the nodes mapped to this conductor
+        node_list = self._filter_mapped_to_this_conductor(node_list, 0, 1)
         for (node_uuid, driver, instance_uuid) in node_list:
-            # only handle the nodes mapped to this conductor
-            if not self._mapped_to_this_conductor(node_uuid, driver):
-                continue
-
             # populate the message which will be sent to ceilometer
             message = {'message_id': ironic_utils.generate_uuid(),
                        'instance_uuid': instance_uuid,
@@ -1401,6 +1907,19 @@ class ConductorManager(periodic_task.PeriodicTasks):
                 # Yield on every iteration
                 eventlet.sleep(0)
 
+    @periodic_task.periodic_task(spacing=CONF.metrics.dump_interval)
+    def _dump_metrics(self, context):
+        # do nothing if the metrics are not to be written to a file
+        if not CONF.metrics.dump_file:
+            return
+
+        try:
+            metrics.get_registry().dump(CONF.metrics.dump_file)
+        except EnvironmentError as e:
+            LOG.warning(_LW('Failed to write the metrics to %(file)s: '
+                            '%(error)s'),
+                        {'file': CONF.metrics.dump_file, 'error': e})
+
     def _filter_out_unsupported_types(self, sensors_data):
         # support the CONF.send_sensor_data_types sensor types only
         allowed = set(x.lower() for x in CONF.conductor.send_sensor_data_types)
@@ -0,0 +1,141 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Independent scheduling of periodic tasks.
+
+:meth:`ironic.openstack.common.periodic_task.PeriodicTasks.run_periodic_tasks`
+runs all the periodic tasks of a manager one after the other from a single
+timer, so a slow task delays all the others. :class:`PeriodicTaskScheduler`
+instead runs each periodic task in its own greenthread, on its own spacing.
+"""
+
+import threading
+import time
+
+import eventlet
+
+from ironic.common.i18n import _LE
+from ironic.common.i18n import _LW
+from ironic.openstack.common import log
+
+LOG = log.getLogger(__name__)
+
+
+class PeriodicTaskScheduler(object):
+    """Run each periodic task of an object in a dedicated greenthread.
+
+    A task is never run concurrently with itself: if a run is due while the
+    previous one is still in progress, it is skipped and counted as an
+    overrun.
+
+    :param obj: an instance of
+                :class:`ironic.openstack.common.periodic_task.PeriodicTasks`.
+    :param context: the context the tasks are called with.
+    """
+
+    def __init__(self, obj, context):
+        self._obj = obj
+        self._context = context
+        self._stop_evt = threading.Event()
+        self._threads = []
+        self._locks = {}
+        self._stats = {}
+        for name, task in obj._periodic_tasks:
+            self._locks[name] = threading.Lock()
+            self._stats[name] = {'runs': 0,
+                                 'failures': 0,
+                                 'overruns': 0,
+                                 'last_run': None,
+                                 'last_duration': None,
+                                 'last_lag': None}
+
+    def start(self):
+        """Start one greenthread per periodic task."""
+        self._stop_evt.clear()
+        for name, task in self._obj._periodic_tasks:
+            spacing = self._obj._periodic_spacing[name]
+            self._threads.append(
+                eventlet.spawn(self._run_loop, name, task, spacing))
+
+    def stop(self):
+        """Stop scheduling the periodic tasks.
+
+        Runs in progress are allowed to finish; this does not wait for them.
+        """
+        self._stop_evt.set()
+        self._threads = []
+
+    def get_stats(self):
+        """Get the statistics of each periodic task.
+
+        :returns: a dict mapping the name of each periodic task to a dict
+                  with the number of 'runs', 'failures' and 'overruns'
+                  (runs skipped because the previous run was still in
+                  progress), and the time of the 'last_run', its
+                  'last_duration' and 'last_lag' behind schedule, in
+                  seconds.
+        """
+        return dict((name, stats.copy())
+                    for name, stats in self._stats.items())
+
+    def _run_loop(self, name, task, spacing):
+        next_run = time.time()
+        if not task._periodic_immediate:
+            next_run += spacing
+
+        while not self._stop_evt.is_set():
+            delay = next_run - time.time()
+            if delay > 0:
+                self._stop_evt.wait(delay)
+                continue
+
+            self._run_task(name, task, next_run)
+
+            next_run += spacing
+            now = time.time()
+            if next_run < now:
+                # The run took longer than the spacing, skip the runs which
+                # were missed instead of running them back to back.
+                missed = int((now - next_run) // spacing) + 1
+                self._stats[name]['overruns'] += missed
+                LOG.warning(_LW('Periodic task %(task)s took longer than '
+                                'its spacing of %(spacing)s seconds; '
+                                'skipped %(missed)d run(s).'),
+                            {'task': name, 'spacing': spacing,
+                             'missed': missed})
+                next_run += missed * spacing
+
+    def _run_task(self, name, task, scheduled):
+        stats = self._stats[name]
+        lock = self._locks[name]
+        if not lock.acquire(False):
+            stats['overruns'] += 1
+            LOG.warning(_LW('Periodic task %s is still running, skipping '
+                            'this run.'), name)
+            return
+
+        try:
+            start = time.time()
+            stats['last_run'] = start
+            stats['last_lag'] = start - scheduled
+            LOG.debug('Running periodic task %s', name)
+            try:
+                task(self._obj, self._context)
+            except Exception as e:
+                stats['failures'] += 1
+                LOG.exception(_LE('Error during periodic task %(task)s: '
+                                  '%(e)s'), {'task': name, 'e': e})
+            stats['runs'] += 1
+            stats['last_duration'] = time.time() - start
+        finally:
+            lock.release()
@@ -18,9 +18,11 @@
 Client side of the conductor RPC API.
 """
 
+import functools
 import random
 
 from oslo import messaging
+from oslo.utils import excutils
 
 from ironic.common import exception
 from ironic.common import hash_ring
@@ -30,6 +32,24 @@ from ironic.conductor import manager
 from ironic.objects import base as objects_base
 
 
+def reset_ring_on_timeout(f):
+    """Decorator to reset the hash rings when an RPC call times out.
+
+    The hash rings are cached, so they may still map nodes to a conductor
+    which went away. A timeout is how an unreachable topic shows up, so
+    the rings are reloaded to route the next request elsewhere.
+
+    """
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return f(self, *args, **kwargs)
+        except messaging.MessagingTimeout:
+            with excutils.save_and_reraise_exception():
+                self.ring_manager.reset()
+    return wrapper
+
+
 class ConductorAPI(object):
     """Client side of the conductor RPC API.
 
@@ -64,11 +84,12 @@ class ConductorAPI(object):
     |           driver_vendor_passthru
     |    1.21 - Added get_node_vendor_passthru_methods and
     |           get_driver_vendor_passthru_methods
+    |    1.22 - Added change_node_states.
 
     """
 
     # NOTE(rloo): This must be in sync with manager.ConductorManager's.
-    RPC_API_VERSION = '1.21'
+    RPC_API_VERSION = '1.22'
 
     def __init__(self, topic=None):
         super(ConductorAPI, self).__init__()
@@ -93,10 +114,8 @@ class ConductorAPI(object):
         :raises: NoValidHost
 
         """
-        self.ring_manager.reset()
-
         try:
-            ring = self.ring_manager[node.driver]
+            ring = self._get_ring(node.driver)
             dest = ring.get_hosts(node.uuid)
             return self.topic + "." + dest[0]
         except exception.DriverNotFound:
@@ -116,12 +135,29 @@ class ConductorAPI(object):
         :raises: DriverNotFound
 
         """
-        self.ring_manager.reset()
-
-        hash_ring = self.ring_manager[driver_name]
+        hash_ring = self._get_ring(driver_name)
         host = random.choice(list(hash_ring.hosts))
         return self.topic + "." + host
 
+    def _get_ring(self, driver_name):
+        """Get the hash ring for a driver, reloading the rings if needed.
+
+        The rings are cached by the ring manager. If the driver is not in
+        the cached rings, a conductor supporting it may have registered
+        since they were loaded, so they are reloaded before giving up.
+
+        :param driver_name: the name of the driver.
+        :returns: a HashRing.
+        :raises: DriverNotFound
+
+        """
+        try:
+            return self.ring_manager[driver_name]
+        except exception.DriverNotFound:
+            self.ring_manager.reset()
+            return self.ring_manager[driver_name]
+
+    @reset_ring_on_timeout
     def update_node(self, context, node_obj, topic=None):
         """Synchronously, have a conductor update the node's information.
 
@@ -143,6 +179,7 @@ class ConductorAPI(object):
         cctxt = self.client.prepare(topic=topic or self.topic, version='1.1')
         return cctxt.call(context, 'update_node', node_obj=node_obj)
 
+    @reset_ring_on_timeout
     def change_node_power_state(self, context, node_id, new_state, topic=None):
         """Change a node's power state.
 
@@ -161,6 +198,31 @@ class ConductorAPI(object):
         return cctxt.call(context, 'change_node_power_state', node_id=node_id,
                           new_state=new_state)
 
+    def change_node_states(self, context, node_ids, target, topic=None):
+        """Change the power or provision state of many nodes.
+
+        Synchronously, lock and validate each node and start a conductor
+        background task to change its state, as change_node_power_state,
+        do_node_deploy and do_node_tear_down do for a single node.
+
+        :param context: request context.
+        :param node_ids: the ids or uuids of the nodes.
+        :param target: one of ironic.common.states power state values, or
+                       ACTIVE, REBUILD or DELETED.
+        :param topic: RPC topic. Defaults to self.topic.
+        :raises: InvalidParameterValue if the target state is not valid.
+        :raises: MessagingTimeout if the conductor did not answer in time.
+                 Unlike for the other calls, the hash rings are not reset:
+                 a timeout may only mean that the batch was too large.
+        :returns: a dict mapping each node id or uuid to None if the state
+                  change was accepted, or else to the error message.
+
+        """
+        cctxt = self.client.prepare(topic=topic or self.topic, version='1.22')
+        return cctxt.call(context, 'change_node_states', node_ids=node_ids,
+                          target=target)
+
+    @reset_ring_on_timeout
     def vendor_passthru(self, context, node_id, driver_method, http_method,
                         info, topic=None):
         """Receive requests for vendor-specific actions.
@@ -196,6 +258,7 @@ class ConductorAPI(object):
                           http_method=http_method,
                           info=info)
 
+    @reset_ring_on_timeout
     def driver_vendor_passthru(self, context, driver_name, driver_method,
                                http_method, info, topic=None):
         """Pass vendor-specific calls which don't specify a node to a driver.
@@ -233,6 +296,7 @@ class ConductorAPI(object):
                           http_method=http_method,
                           info=info)
 
+    @reset_ring_on_timeout
     def get_node_vendor_passthru_methods(self, context, node_id, topic=None):
         """Retrieve information about vendor methods of the given node.
 
@@ -246,6 +310,7 @@ class ConductorAPI(object):
         return cctxt.call(context, 'get_node_vendor_passthru_methods',
                           node_id=node_id)
 
+    @reset_ring_on_timeout
     def get_driver_vendor_passthru_methods(self, context, driver_name,
                                             topic=None):
         """Retrieve information about vendor methods of the given driver.
@@ -260,6 +325,7 @@ class ConductorAPI(object):
         return cctxt.call(context, 'get_driver_vendor_passthru_methods',
                           driver_name=driver_name)
 
+    @reset_ring_on_timeout
     def do_node_deploy(self, context, node_id, rebuild, topic=None):
         """Signal to conductor service to perform a deployment.
 
@@ -281,6 +347,7 @@ class ConductorAPI(object):
         return cctxt.call(context, 'do_node_deploy', node_id=node_id,
                           rebuild=rebuild)
 
+    @reset_ring_on_timeout
     def do_node_tear_down(self, context, node_id, topic=None):
         """Signal to conductor service to tear down a deployment.
 
@@ -300,6 +367,7 @@ class ConductorAPI(object):
         cctxt = self.client.prepare(topic=topic or self.topic, version='1.6')
         return cctxt.call(context, 'do_node_tear_down', node_id=node_id)
 
+    @reset_ring_on_timeout
     def validate_driver_interfaces(self, context, node_id, topic=None):
         """Validate the `core` and `standardized` interfaces for drivers.
 
@@ -314,6 +382,7 @@ class ConductorAPI(object):
         return cctxt.call(context, 'validate_driver_interfaces',
                           node_id=node_id)
 
+    @reset_ring_on_timeout
     def destroy_node(self, context, node_id, topic=None):
         """Delete a node.
 
@@ -328,6 +397,7 @@ class ConductorAPI(object):
         cctxt = self.client.prepare(topic=topic or self.topic, version='1.9')
         return cctxt.call(context, 'destroy_node', node_id=node_id)
 
+    @reset_ring_on_timeout
     def get_console_information(self, context, node_id, topic=None):
         """Get connection information about the console.
 
@@ -342,6 +412,7 @@ class ConductorAPI(object):
         cctxt = self.client.prepare(topic=topic or self.topic, version='1.11')
         return cctxt.call(context, 'get_console_information', node_id=node_id)
 
+    @reset_ring_on_timeout
     def set_console_mode(self, context, node_id, enabled, topic=None):
         """Enable/Disable the console.
 
@@ -361,6 +432,7 @@ class ConductorAPI(object):
         return cctxt.call(context, 'set_console_mode', node_id=node_id,
                           enabled=enabled)
 
+    @reset_ring_on_timeout
     def update_port(self, context, port_obj, topic=None):
         """Synchronously, have a conductor update the port's information.
 
@@ -377,6 +449,7 @@ class ConductorAPI(object):
         cctxt = self.client.prepare(topic=topic or self.topic, version='1.13')
         return cctxt.call(context, 'update_port', port_obj=port_obj)
 
+    @reset_ring_on_timeout
     def get_driver_properties(self, context, driver_name, topic=None):
         """Get the properties of the driver.
 
@@ -392,6 +465,7 @@ class ConductorAPI(object):
         return cctxt.call(context, 'get_driver_properties',
                           driver_name=driver_name)
 
+    @reset_ring_on_timeout
     def set_boot_device(self, context, node_id, device, persistent=False,
                         topic=None):
         """Set the boot device for a node.
@@ -416,6 +490,7 @@ class ConductorAPI(object):
         return cctxt.call(context, 'set_boot_device', node_id=node_id,
                           device=device, persistent=persistent)
 
+    @reset_ring_on_timeout
     def get_boot_device(self, context, node_id, topic=None):
         """Get the current boot device.
 
@@ -440,6 +515,7 @@ class ConductorAPI(object):
         cctxt = self.client.prepare(topic=topic or self.topic, version='1.17')
         return cctxt.call(context, 'get_boot_device', node_id=node_id)
 
+    @reset_ring_on_timeout
     def get_supported_boot_devices(self, context, node_id, topic=None):
         """Get the list of supported devices.
 
@@ -49,7 +49,10 @@ attributes that you may access:
     task.node
         The Node object
     task.ports
-        Ports belonging to the Node
+        Ports belonging to the Node. They are loaded from the database on
+        first access, unless the TaskManager was created with
+        "load_ports=True", in which case they are loaded together with
+        the Node.
     task.driver
         The Driver for the Node, or the Driver based on the
         'driver_name' kwarg of TaskManager().
@@ -97,6 +100,7 @@ code when the spawned task generates an exception:
 """
 
 import functools
+import time
 
 from oslo.config import cfg
 from oslo.utils import excutils
@@ -105,6 +109,7 @@ import retrying
 from ironic.common import driver_factory
 from ironic.common import exception
 from ironic.common.i18n import _LW
+from ironic.common import metrics
 from ironic.common import states
 from ironic import objects
 from ironic.openstack.common import log as logging
@@ -131,7 +136,8 @@ def require_exclusive_lock(f):
     return wrapper
 
 
-def acquire(context, node_id, shared=False, driver_name=None):
+def acquire(context, node_id, shared=False, driver_name=None,
+            filters=None, retry=True, load_ports=False):
     """Shortcut for acquiring a lock on a Node.
 
     :param context: Request context.
@@ -139,11 +145,18 @@ def acquire(context, node_id, shared=False, driver_name=None):
     :param shared: Boolean indicating whether to take a shared or exclusive
                    lock. Default: False.
     :param driver_name: Name of Driver. Default: None.
+    :param filters: Filters the node must match for an exclusive lock to
+                    be taken. Default: None.
+    :param retry: Whether to retry taking an exclusive lock if the node is
+                  locked. Default: True.
+    :param load_ports: Whether to load the node's ports together with the
+                       node, rather than on first access. Default: False.
     :returns: An instance of :class:`TaskManager`.
 
     """
     return TaskManager(context, node_id, shared=shared,
-                       driver_name=driver_name)
+                       driver_name=driver_name, filters=filters, retry=retry,
+                       load_ports=load_ports)
 
 
 class TaskManager(object):
@@ -154,7 +167,8 @@ class TaskManager(object):
 
     """
 
-    def __init__(self, context, node_id, shared=False, driver_name=None):
+    def __init__(self, context, node_id, shared=False, driver_name=None,
+                 filters=None, retry=True, load_ports=False):
         """Create a new TaskManager.
 
         Acquire a lock on a node. The lock can be either shared or
@@ -168,9 +182,21 @@ class TaskManager(object):
                        lock. Default: False.
         :param driver_name: The name of the driver to load, if different
                             from the Node's current driver.
+        :param filters: Filters the node must match for an exclusive lock
+                        to be taken. They are checked in the same database
+                        query that reserves the node, which saves callers
+                        from loading the node beforehand. Not used for
+                        shared locks. Default: None.
+        :param retry: Whether to retry taking an exclusive lock if the node
+                      is locked. Default: True.
+        :param load_ports: Whether to load the node's ports in the same
+                           database query as the node. Otherwise they are
+                           only loaded when task.ports is first accessed.
+                           Default: False.
         :raises: DriverNotFound
         :raises: NodeNotFound
         :raises: NodeLocked
+        :raises: NodeFiltersNotMatched
 
         """
 
@@ -179,28 +205,25 @@ class TaskManager(object):
 
         self.context = context
         self.node = None
+        self._ports = None
         self.shared = shared
+        self._reserved_at = None
 
         self.fsm = states.machine.copy()
 
         # NodeLocked exceptions can be annoying. Let's try to alleviate
-        # some of that pain by retrying our lock attempts. The retrying
-        # module expects a wait_fixed value in milliseconds.
-        @retrying.retry(
-            retry_on_exception=lambda e: isinstance(e, exception.NodeLocked),
-            stop_max_attempt_number=CONF.conductor.node_locked_retry_attempts,
-            wait_fixed=CONF.conductor.node_locked_retry_interval * 1000)
-        def reserve_node():
-            LOG.debug("Attempting to reserve node %(node)s",
-                      {'node': node_id})
-            self.node = objects.Node.reserve(context, CONF.host, node_id)
+        # some of that pain by retrying our lock attempts.
+        self._lock_attempts = (CONF.conductor.node_locked_retry_attempts
+                               if retry else 1)
 
         try:
             if not self.shared:
-                reserve_node()
+                self._lock(node_id, filters=filters, load_ports=load_ports)
+            elif load_ports:
+                self.node, self._ports = objects.Node.get_with_ports(context,
+                                                                     node_id)
             else:
                 self.node = objects.Node.get(context, node_id)
-            self.ports = objects.Port.list_by_node_id(context, self.node.id)
             self.driver = driver_factory.get_driver(driver_name or
                                                     self.node.driver)
             self.fsm.initialize(self.node.provision_state)
@@ -209,6 +232,67 @@ class TaskManager(object):
             with excutils.save_and_reraise_exception():
                 self.release_resources()
 
+    def _lock(self, node_id, filters=None, load_ports=False):
+        """Reserve the node, retrying while it is locked."""
+        # The retrying module expects a wait_fixed value in milliseconds.
+        @retrying.retry(
+            retry_on_exception=lambda e: isinstance(e, exception.NodeLocked),
+            stop_max_attempt_number=self._lock_attempts,
+            wait_fixed=CONF.conductor.node_locked_retry_interval * 1000)
+        def reserve_node():
+            LOG.debug("Attempting to reserve node %(node)s",
+                      {'node': node_id})
+            try:
+                if load_ports:
+                    self.node, self._ports = objects.Node.reserve_with_ports(
+                        self.context, CONF.host, node_id, filters=filters)
+                else:
+                    self.node = objects.Node.reserve(self.context, CONF.host,
+                                                     node_id, filters=filters)
+            except exception.NodeLocked:
+                metrics.incr('conductor.task.node_locked')
+                raise
+
+        with metrics.timer('conductor.task.reserve'):
+            reserve_node()
+        self.shared = False
+        self._reserved_at = time.time()
+
+    def upgrade_lock(self, filters=None):
+        """Upgrade a shared lock to an exclusive lock.
+
+        The node is reloaded from the database when it is reserved, so
+        any change made to task.node beforehand is lost. Does nothing if
+        the lock is already exclusive.
+
+        :param filters: Filters the node must match for the exclusive lock
+                        to be taken. Default: None.
+        :raises: NodeLocked if the node is locked by another conductor.
+        :raises: NodeFiltersNotMatched if the node does not match the
+                 filters.
+        """
+        if not self.shared:
+            return
+
+        LOG.debug('Upgrading shared lock on node %s to exclusive',
+                  self.node.uuid)
+        self._lock(self.node.id, filters=filters)
+        # The ports may have changed while the lock was shared
+        self._ports = None
+        self.fsm.initialize(self.node.provision_state)
+
+    @property
+    def ports(self):
+        """The ports of the node, loaded on first access."""
+        if self._ports is None and self.node is not None:
+            self._ports = objects.Port.list_by_node_id(self.context,
+                                                       self.node.id)
+        return self._ports
+
+    @ports.setter
+    def ports(self, value):
+        self._ports = value
+
     def spawn_after(self, _spawn_method, *args, **kwargs):
         """Call this to spawn a thread to complete the task."""
         self._spawn_method = _spawn_method
@@ -247,6 +331,10 @@ class TaskManager(object):
                 # squelch the exception if the node was deleted
                 # within the task's context.
                 pass
+            if self._reserved_at is not None:
+                metrics.observe('conductor.task.lock_held',
+                                time.time() - self._reserved_at)
+                self._reserved_at = None
         self.node = None
         self.driver = None
         self.ports = None
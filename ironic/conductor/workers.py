@@ -0,0 +1,165 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Pool of conductor workers with a bounded, prioritized queue of requests.
+
+When every worker is busy, :meth:`WorkerPool.spawn` waits for a worker to
+become free instead of failing straight away, as long as the number of
+waiting requests and the time spent waiting stay within the configured
+bounds. Waiting requests are served by priority, then in arrival order.
+"""
+
+import itertools
+import threading
+import time
+
+from eventlet import greenpool
+
+from ironic.common import exception
+from ironic.common import metrics
+
+# Priorities of the requests for a worker; lower values are served first.
+USER_PRIORITY = 0
+"""Actions requested through the API, eg. power and provisioning."""
+
+PERIODIC_PRIORITY = 1
+"""Actions started by periodic tasks, eg. takeovers and timeouts."""
+
+
+class WorkerPool(object):
+    """A pool of greenthreads, with a bounded queue in front of it.
+
+    :param size: the number of greenthreads in the pool.
+    :param queue_size: the maximum number of requests waiting for a
+                       worker. Zero disables queueing.
+    :param queue_timeout: the maximum time, in seconds, a request waits
+                          for a worker.
+    """
+
+    def __init__(self, size, queue_size=0, queue_timeout=0):
+        self._pool = greenpool.GreenPool(size=size)
+        self._queue_size = queue_size
+        self._queue_timeout = queue_timeout
+        # List of [priority, sequence number, event] for waiting requests
+        self._waiters = []
+        # Number of free workers handed to waiters which did not take
+        # them yet.
+        self._handed_off = 0
+        self._counter = itertools.count()
+        self._stats = {'queued': 0,
+                       'rejected': 0,
+                       'timed_out': 0,
+                       'max_queue_depth': 0,
+                       'last_wait': 0.0,
+                       'max_wait': 0.0,
+                       'total_wait': 0.0}
+
+    def free(self):
+        """Return the number of free workers."""
+        return self._pool.free() - self._handed_off
+
+    def running(self):
+        """Return the number of busy workers."""
+        return self._pool.running()
+
+    def waitall(self):
+        """Wait for all the workers to be done."""
+        self._pool.waitall()
+
+    def spawn(self, priority, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in a worker.
+
+        Waits for a worker to become free if there is none.
+
+        :param priority: the priority of the request; one of
+                         USER_PRIORITY or PERIODIC_PRIORITY.
+        :returns: GreenThread object.
+        :raises: NoFreeConductorWorker if there is no free worker, and the
+                 queue is full or no worker became free in time.
+        """
+        if not self._waiters and self.free() > 0:
+            return self._spawn(func, *args, **kwargs)
+
+        if len(self._waiters) >= self._queue_size:
+            self._stats['rejected'] += 1
+            metrics.incr('conductor.workers.no_free_worker')
+            raise exception.NoFreeConductorWorker()
+
+        waiter = [priority, next(self._counter), threading.Event()]
+        self._waiters.append(waiter)
+        self._stats['queued'] += 1
+        self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'],
+                                             len(self._waiters))
+        start = time.time()
+        try:
+            waiter[2].wait(self._queue_timeout)
+        finally:
+            wait = time.time() - start
+            self._stats['last_wait'] = wait
+            self._stats['max_wait'] = max(self._stats['max_wait'], wait)
+            self._stats['total_wait'] += wait
+            metrics.observe('conductor.workers.queue_wait', wait)
+
+        if waiter in self._waiters:
+            # Not woken up before the timeout
+            self._waiters.remove(waiter)
+            self._stats['timed_out'] += 1
+            metrics.incr('conductor.workers.no_free_worker')
+            raise exception.NoFreeConductorWorker()
+
+        self._handed_off -= 1
+        return self._spawn(func, *args, **kwargs)
+
+    def spawn_nowait(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in a worker if one is free right away.
+
+        Unlike :meth:`spawn`, never waits in the queue, nor jumps ahead of
+        the requests already waiting in it.
+
+        :returns: GreenThread object.
+        :raises: NoFreeConductorWorker if there is no free worker.
+        """
+        if self._waiters or self.free() <= 0:
+            self._stats['rejected'] += 1
+            metrics.incr('conductor.workers.no_free_worker')
+            raise exception.NoFreeConductorWorker()
+        return self._spawn(func, *args, **kwargs)
+
+    def get_stats(self):
+        """Get statistics about the pool and its queue.
+
+        :returns: a dict with the number of 'running' workers, the current
+                  'queue_depth' and its 'max_queue_depth', the number of
+                  requests which were 'queued', 'rejected' because the
+                  queue was full and 'timed_out' in the queue, and the
+                  'last_wait', 'max_wait' and 'total_wait' time of the
+                  queued requests, in seconds.
+        """
+        stats = self._stats.copy()
+        stats['running'] = self.running()
+        stats['queue_depth'] = len(self._waiters)
+        return stats
+
+    def _spawn(self, func, *args, **kwargs):
+        thread = self._pool.spawn(func, *args, **kwargs)
+        thread.link(self._worker_done)
+        return thread
+
+    def _worker_done(self, thread):
+        # NOTE: GreenPool links its own callback, which frees the worker,
+        # before ours is linked, so the worker is free at this point.
+        while self._waiters and self.free() > 0:
+            waiter = min(self._waiters)
+            self._waiters.remove(waiter)
+            self._handed_off += 1
+            waiter[2].set()
@@ -24,6 +24,16 @@ from oslo.db import api as db_api
 import six
 
 
+db_opts = [
+    cfg.IntOpt('node_deletion_log_retention',
+               default=86400,
+               help='Number of seconds during which the deletions of nodes '
+                    'are recorded, so that they can be reported to the '
+                    'clients listing the nodes changed since a given time.'),
+]
+
+cfg.CONF.register_opts(db_opts, 'database')
+
 _BACKEND_MAPPING = {'sqlalchemy': 'ironic.db.sqlalchemy.api'}
 IMPL = db_api.DBAPI.from_config(cfg.CONF, backend_mapping=_BACKEND_MAPPING,
                                 lazy=True)
@@ -44,7 +54,8 @@ class Connection(object):
 
     @abc.abstractmethod
     def get_nodeinfo_list(self, columns=None, filters=None, limit=None,
-                          marker=None, sort_key=None, sort_dir=None):
+                          marker=None, sort_key=None, sort_dir=None,
+                          use_slave=False):
         """Get specific columns for matching nodes.
 
         Return a list of the specified columns for all nodes that match the
@@ -58,23 +69,61 @@ class Connection(object):
                         :reserved: True | False
                         :maintenance: True | False
                         :chassis_uuid: uuid of chassis
+                        :id: id of the node
+                        :uuid: uuid of the node
+                        :uuid_in: list of uuids of nodes
                         :driver: driver's name
                         :provision_state: provision state of node
+                        :provision_state_not_in:
+                            list of provision states the node must not be in
                         :provisioned_before:
                             nodes with provision_updated_at field before this
                             interval in seconds
+                        :hash_ranges:
+                            dict mapping driver names to the list of
+                            (start, end) ranges of hash partition keys to
+                            select for nodes with that driver, or to None
+                            to select all of them, as returned by
+                            HashRing.get_key_ranges(); nodes of other
+                            drivers are not selected
+                        :changes_since:
+                            nodes created or updated at or after this
+                            datetime
         :param limit: Maximum number of nodes to return.
         :param marker: the last item of the previous page; we return the next
                        result set.
         :param sort_key: Attribute by which results should be sorted.
         :param sort_dir: direction in which results should be sorted.
                          (asc, desc)
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         :returns: A list of tuples of the specified columns.
         """
 
+    @abc.abstractmethod
+    def iter_nodeinfo_list(self, columns=None, filters=None,
+                           chunk_size=1000, use_slave=False):
+        """Iterate over specific columns of matching nodes.
+
+        Like :meth:`get_nodeinfo_list`, but the nodes are read from the
+        database in chunks, in the order of their ids, as the iteration
+        goes. This keeps memory usage low when going through many nodes.
+
+        :param columns: List of column names to return.
+                        Defaults to 'id' column when columns == None.
+        :param filters: Filters to apply, as for :meth:`get_nodeinfo_list`.
+                        Defaults to None.
+        :param chunk_size: Number of nodes read from the database at once.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
+        :returns: An iterator of tuples of the specified columns.
+        """
+
     @abc.abstractmethod
     def get_node_list(self, filters=None, limit=None, marker=None,
-                      sort_key=None, sort_dir=None):
+                      sort_key=None, sort_dir=None, use_slave=False):
         """Return a list of nodes.
 
         :param filters: Filters to apply. Defaults to None.
@@ -83,21 +132,66 @@ class Connection(object):
                         :reserved: True | False
                         :maintenance: True | False
                         :chassis_uuid: uuid of chassis
+                        :id: id of the node
+                        :uuid: uuid of the node
+                        :uuid_in: list of uuids of nodes
                         :driver: driver's name
                         :provision_state: provision state of node
+                        :provision_state_not_in:
+                            list of provision states the node must not be in
                         :provisioned_before:
                             nodes with provision_updated_at field before this
                             interval in seconds
+                        :hash_ranges:
+                            dict mapping driver names to the list of
+                            (start, end) ranges of hash partition keys to
+                            select for nodes with that driver, or to None
+                            to select all of them, as returned by
+                            HashRing.get_key_ranges(); nodes of other
+                            drivers are not selected
+                        :changes_since:
+                            nodes created or updated at or after this
+                            datetime
         :param limit: Maximum number of nodes to return.
         :param marker: the last item of the previous page; we return the next
                        result set.
         :param sort_key: Attribute by which results should be sorted.
         :param sort_dir: direction in which results should be sorted.
                          (asc, desc)
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
+        """
+
+    @abc.abstractmethod
+    def get_node_statistics(self, use_slave=False):
+        """Count the nodes, grouped by driver and states.
+
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
+        :returns: A list of tuples (driver, provision_state, power_state,
+                  maintenance, associated, count), one for each
+                  combination of these values which some nodes have.
+                  associated is True for the nodes with an instance.
+        """
+
+    @abc.abstractmethod
+    def get_node_deletions(self, since, use_slave=False):
+        """Return the nodes deleted at or after a given time.
+
+        The deletions are only recorded for the number of seconds set by
+        the [database]node_deletion_log_retention option.
+
+        :param since: A datetime.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
+        :returns: A list of NodeDeletion objects, sorted by deletion time.
         """
 
     @abc.abstractmethod
-    def reserve_node(self, tag, node_id):
+    def reserve_node(self, tag, node_id, filters=None):
         """Reserve a node.
 
         To prevent other ManagerServices from manipulating the given
@@ -105,9 +199,34 @@ class Connection(object):
 
         :param tag: A string uniquely identifying the reservation holder.
         :param node_id: A node id or uuid.
+        :param filters: Filters the node must match in order to be
+                        reserved, checked atomically with the reservation.
+                        Accepts the same filters as :meth:`get_node_list`.
+                        Defaults to None.
         :returns: A Node object.
         :raises: NodeNotFound if the node is not found.
         :raises: NodeLocked if the node is already reserved.
+        :raises: NodeFiltersNotMatched if the node does not match the
+                 filters.
+        """
+
+    @abc.abstractmethod
+    def reserve_node_with_ports(self, tag, node_id, filters=None):
+        """Reserve a node and load its ports.
+
+        Behaves like :meth:`reserve_node`, but the node is read back
+        together with its ports in a single joined query.
+
+        :param tag: A string uniquely identifying the reservation holder.
+        :param node_id: A node id or uuid.
+        :param filters: Filters the node must match in order to be
+                        reserved. See :meth:`reserve_node`.
+        :returns: A tuple of the Node object and a list of its Port
+                  objects.
+        :raises: NodeNotFound if the node is not found.
+        :raises: NodeLocked if the node is already reserved.
+        :raises: NodeFiltersNotMatched if the node does not match the
+                 filters.
         """
 
     @abc.abstractmethod
@@ -146,33 +265,107 @@ class Connection(object):
         """
 
     @abc.abstractmethod
-    def get_node_by_id(self, node_id):
+    def create_nodes(self, values_list):
+        """Create many nodes, and their ports, in a single transaction.
+
+        The nodes which conflict with existing nodes or ports, or with
+        a node earlier in the list, are not created; the others are.
+
+        :param values_list: A list of dicts of node values, as for
+                            :meth:`create_node`. Each dict may contain a
+                            'ports' item: a list of dicts of port values,
+                            as for :meth:`create_port`, without node_id.
+        :returns: A list with, for each item of values_list, either a
+                  tuple of the new node and the list of its new ports, or
+                  the exception explaining why the node was not created:
+                  NodeAlreadyExists, InstanceAssociated, MACAlreadyExists
+                  or PortAlreadyExists.
+        :raises: Conflict if conflicting nodes or ports are created
+                 concurrently; then no node is created.
+        """
+
+    @abc.abstractmethod
+    def get_node_by_id(self, node_id, use_slave=False):
         """Return a node.
 
         :param node_id: The id of a node.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         :returns: A node.
         """
 
     @abc.abstractmethod
-    def get_node_by_uuid(self, node_uuid):
+    def get_node_by_uuid(self, node_uuid, use_slave=False):
         """Return a node.
 
         :param node_uuid: The uuid of a node.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         :returns: A node.
         """
 
     @abc.abstractmethod
-    def get_node_by_instance(self, instance):
+    def get_node_by_instance(self, instance, use_slave=False):
         """Return a node.
 
         :param instance: The instance name or uuid to search for.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
+        :returns: A node.
+        """
+
+    @abc.abstractmethod
+    def get_node_with_ports(self, node_id):
+        """Return a node and its ports, loaded in a single joined query.
+
+        :param node_id: A node id or uuid.
+        :returns: A tuple of the Node object and a list of its Port
+                  objects.
+        :raises: NodeNotFound if the node is not found.
+        """
+
+    @abc.abstractmethod
+    def get_node_by_port_addresses(self, addresses):
+        """Find the node which has ports with the given MAC addresses.
+
+        Addresses which match no port are ignored.
+
+        :param addresses: list of port MAC addresses.
         :returns: A node.
+        :raises: NodeNotFound if the addresses match no ports, or ports
+                 of several nodes.
+        """
+
+    @abc.abstractmethod
+    def touch_agent_heartbeat(self, node_id):
+        """Record a heartbeat from the deploy agent running on a node.
+
+        The heartbeat is stored apart from the node, so recording it
+        neither requires nor modifies the node's reservation.
+
+        :param node_id: The id of a node.
+        """
+
+    @abc.abstractmethod
+    def get_agent_heartbeat(self, node_id, use_slave=False):
+        """Return when the deploy agent running on a node last heartbeated.
+
+        :param node_id: The id of a node.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
+        :returns: A datetime, or None if the agent never heartbeated.
         """
 
     @abc.abstractmethod
     def destroy_node(self, node_id):
         """Destroy a node and all associated interfaces.
 
+        The deletion is recorded, see :meth:`get_node_deletions`.
+
         :param node_id: The id or uuid of a node.
         """
 
@@ -200,32 +393,41 @@ class Connection(object):
         """
 
     @abc.abstractmethod
-    def get_port_by_id(self, port_id):
+    def get_port_by_id(self, port_id, use_slave=False):
         """Return a network port representation.
 
         :param port_id: The id of a port.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         :returns: A port.
         """
 
     @abc.abstractmethod
-    def get_port_by_uuid(self, port_uuid):
+    def get_port_by_uuid(self, port_uuid, use_slave=False):
         """Return a network port representation.
 
         :param port_uuid: The uuid of a port.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         :returns: A port.
         """
 
     @abc.abstractmethod
-    def get_port_by_address(self, address):
+    def get_port_by_address(self, address, use_slave=False):
         """Return a network port representation.
 
         :param address: The MAC address of a port.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         :returns: A port.
         """
 
     @abc.abstractmethod
     def get_port_list(self, limit=None, marker=None,
-                      sort_key=None, sort_dir=None):
+                      sort_key=None, sort_dir=None, use_slave=False):
         """Return a list of ports.
 
         :param limit: Maximum number of ports to return.
@@ -234,11 +436,14 @@ class Connection(object):
         :param sort_key: Attribute by which results should be sorted.
         :param sort_dir: direction in which results should be sorted.
                          (asc, desc)
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         """
 
     @abc.abstractmethod
     def get_ports_by_node_id(self, node_id, limit=None, marker=None,
-                             sort_key=None, sort_dir=None):
+                             sort_key=None, sort_dir=None, use_slave=False):
         """List all the ports for a given node.
 
         :param node_id: The integer node ID.
@@ -248,9 +453,39 @@ class Connection(object):
         :param sort_key: Attribute by which results should be sorted
         :param sort_dir: direction in which results should be sorted
                          (asc, desc)
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         :returns: A list of ports.
         """
 
+    @abc.abstractmethod
+    def get_portinfo_list(self, columns=None, filters=None, limit=None,
+                          marker=None, sort_key=None, sort_dir=None,
+                          use_slave=False):
+        """Get specific columns for matching ports.
+
+        Return a list of the specified columns for all ports that match the
+        specified filters.
+
+        :param columns: List of column names to return.
+                        Defaults to 'id' column when columns == None.
+        :param filters: Filters to apply. Defaults to None.
+
+                        :node_id: The integer ID of the node of the ports.
+                        :uuid: The uuid of the port.
+        :param limit: Maximum number of ports to return.
+        :param marker: the last item of the previous page; we return the next
+                       result set.
+        :param sort_key: Attribute by which results should be sorted.
+        :param sort_dir: direction in which results should be sorted.
+                         (asc, desc)
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
+        :returns: A list of tuples of the specified columns.
+        """
+
     @abc.abstractmethod
     def create_port(self, values):
         """Create a new port.
@@ -258,6 +493,21 @@ class Connection(object):
         :param values: Dict of values.
         """
 
+    @abc.abstractmethod
+    def create_ports(self, values_list):
+        """Create many ports in a single transaction.
+
+        The ports which conflict with existing ports, or with a port
+        earlier in the list, are not created; the others are.
+
+        :param values_list: A list of dicts of port values.
+        :returns: A list with, for each item of values_list, either the
+                  new port, or the exception explaining why the port was
+                  not created: MACAlreadyExists or PortAlreadyExists.
+        :raises: Conflict if conflicting ports are created concurrently;
+                 then no port is created.
+        """
+
     @abc.abstractmethod
     def update_port(self, port_id, values):
         """Update properties of an port.
@@ -282,24 +532,30 @@ class Connection(object):
         """
 
     @abc.abstractmethod
-    def get_chassis_by_id(self, chassis_id):
+    def get_chassis_by_id(self, chassis_id, use_slave=False):
         """Return a chassis representation.
 
         :param chassis_id: The id of a chassis.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         :returns: A chassis.
         """
 
     @abc.abstractmethod
-    def get_chassis_by_uuid(self, chassis_uuid):
+    def get_chassis_by_uuid(self, chassis_uuid, use_slave=False):
         """Return a chassis representation.
 
         :param chassis_uuid: The uuid of a chassis.
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         :returns: A chassis.
         """
 
     @abc.abstractmethod
     def get_chassis_list(self, limit=None, marker=None,
-                         sort_key=None, sort_dir=None):
+                         sort_key=None, sort_dir=None, use_slave=False):
         """Return a list of chassis.
 
         :param limit: Maximum number of chassis to return.
@@ -308,6 +564,9 @@ class Connection(object):
         :param sort_key: Attribute by which results should be sorted.
         :param sort_dir: direction in which results should be sorted.
                          (asc, desc)
+        :param use_slave: Whether the query may be sent to the read-only
+                          slave database, when one is configured. Only for
+                          reads which can tolerate replication lag.
         """
 
     @abc.abstractmethod
@@ -330,6 +589,8 @@ class Connection(object):
     def register_conductor(self, values, update_existing=False):
         """Register an active conductor with the cluster.
 
+        This increments the conductor generation.
+
         :param values: A dict of values which must contain the following:
 
                        ::
@@ -360,6 +621,8 @@ class Connection(object):
     def unregister_conductor(self, hostname):
         """Remove this conductor from the service registry immediately.
 
+        This increments the conductor generation.
+
         :param hostname: The hostname of this conductor service.
         :raises: ConductorNotFound
         """
@@ -368,10 +631,36 @@ class Connection(object):
     def touch_conductor(self, hostname):
         """Mark a conductor as active by updating its 'updated_at' property.
 
+        If the conductor was offline or its heartbeat had expired, the
+        conductor generation is incremented.
+
         :param hostname: The hostname of this conductor service.
         :raises: ConductorNotFound
         """
 
+    @abc.abstractmethod
+    def expire_conductors(self, interval=None):
+        """Mark the conductors whose heartbeat has expired as offline.
+
+        If any conductor is marked offline, the conductor generation is
+        incremented.
+
+        :param interval: Seconds since last check-in of a conductor.
+                         Default: CONF.conductor.heartbeat_timeout.
+        :returns: The number of conductors marked offline.
+        """
+
+    @abc.abstractmethod
+    def get_conductor_generation(self):
+        """Retrieve the generation of the set of active conductors.
+
+        The generation is incremented whenever a conductor registers,
+        unregisters, or goes offline or back online, so that callers
+        can detect membership changes with a single row read.
+
+        :returns: An integer.
+        """
+
     @abc.abstractmethod
     def get_active_driver_dict(self, interval):
         """Retrieve drivers for the registered and active conductors.
@@ -0,0 +1,44 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add conductor_membership
+
+Revision ID: 1e1d5ace7dc6
+Revises: 242cc6a923b3
+Create Date: 2014-11-20 14:12:08.462130
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1e1d5ace7dc6'
+down_revision = '242cc6a923b3'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    membership = op.create_table(
+        'conductor_membership',
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('generation', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        mysql_ENGINE='InnoDB',
+        mysql_DEFAULT_CHARSET='UTF8'
+    )
+    op.bulk_insert(membership, [{'id': 1, 'generation': 0}])
+
+
+def downgrade():
+    op.drop_table('conductor_membership')
@@ -0,0 +1,42 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add indexes for the node filters of periodic tasks
+
+Revision ID: 2984a88447d3
+Revises: 4f399b21ae71
+Create Date: 2014-11-26 15:42:17.613904
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2984a88447d3'
+down_revision = '4f399b21ae71'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('node_driver_hash_partition_key_idx', 'nodes',
+                    ['driver', 'hash_partition_key'])
+    op.create_index('node_reservation_maintenance_idx', 'nodes',
+                    ['reservation', 'maintenance'])
+    op.create_index('node_provision_state_updated_at_idx', 'nodes',
+                    ['provision_state', 'provision_updated_at'])
+    op.create_index('port_node_id_idx', 'ports', ['node_id'])
+
+
+def downgrade():
+    op.drop_index('port_node_id_idx', 'ports')
+    op.drop_index('node_provision_state_updated_at_idx', 'nodes')
+    op.drop_index('node_reservation_maintenance_idx', 'nodes')
+    op.drop_index('node_driver_hash_partition_key_idx', 'nodes')
@@ -0,0 +1,51 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add node_deletions and the indexes for the changes-since node filter
+
+Revision ID: 3f8a2e5c7b14
+Revises: 5a8c4a1d3b27
+Create Date: 2014-12-09 14:12:53.370825
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f8a2e5c7b14'
+down_revision = '5a8c4a1d3b27'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index('node_created_at_idx', 'nodes', ['created_at'])
+    op.create_index('node_updated_at_idx', 'nodes', ['updated_at'])
+    op.create_table(
+        'node_deletions',
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('node_uuid', sa.String(length=36), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        mysql_ENGINE='InnoDB',
+        mysql_DEFAULT_CHARSET='UTF8'
+    )
+    op.create_index('node_deletion_deleted_at_idx', 'node_deletions',
+                    ['deleted_at'])
+
+
+def downgrade():
+    op.drop_index('node_deletion_deleted_at_idx', 'node_deletions')
+    op.drop_table('node_deletions')
+    op.drop_index('node_updated_at_idx', 'nodes')
+    op.drop_index('node_created_at_idx', 'nodes')
@@ -0,0 +1,59 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add Node.hash_partition_key
+
+Revision ID: 4f399b21ae71
+Revises: 1e1d5ace7dc6
+Create Date: 2014-11-24 11:08:52.281310
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4f399b21ae71'
+down_revision = '1e1d5ace7dc6'
+
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def _partition_key(uuid):
+    # NOTE: this must match ironic.common.hash_ring.get_partition_key()
+    return int(hashlib.md5(uuid).hexdigest()[:15], 16)
+
+
+def upgrade():
+    op.add_column('nodes', sa.Column('hash_partition_key',
+                                     sa.BigInteger(),
+                                     nullable=True))
+    op.create_index('node_hash_partition_key_idx', 'nodes',
+                    ['hash_partition_key'])
+
+    nodes = sa.sql.table('nodes',
+                         sa.sql.column('id', sa.Integer),
+                         sa.sql.column('uuid', sa.String),
+                         sa.sql.column('hash_partition_key', sa.BigInteger))
+    conn = op.get_bind()
+    rows = conn.execute(sa.select([nodes.c.id, nodes.c.uuid])).fetchall()
+    for node_id, uuid in rows:
+        if uuid is None:
+            continue
+        conn.execute(nodes.update()
+                     .where(nodes.c.id == node_id)
+                     .values(hash_partition_key=_partition_key(uuid)))
+
+
+def downgrade():
+    op.drop_index('node_hash_partition_key_idx', 'nodes')
+    op.drop_column('nodes', 'hash_partition_key')
@@ -19,14 +19,18 @@
 import collections
 import datetime
 
+import eventlet
 from oslo.config import cfg
 from oslo.db import exception as db_exc
 from oslo.db.sqlalchemy import session as db_session
 from oslo.db.sqlalchemy import utils as db_utils
 from oslo.utils import timeutils
+from sqlalchemy.orm.exc import MultipleResultsFound
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy import sql
 
 from ironic.common import exception
+from ironic.common import hash_ring
 from ironic.common.i18n import _
 from ironic.common import states
 from ironic.common import utils
@@ -44,6 +48,9 @@ LOG = log.getLogger(__name__)
 
 _FACADE = None
 
+# Maximum number of values in the IN clause of a query
+_IN_CHUNK_SIZE = 500
+
 
 def _create_facade_lazily():
     global _FACADE
@@ -52,14 +59,14 @@ def _create_facade_lazily():
     return _FACADE
 
 
-def get_engine():
+def get_engine(use_slave=False):
     facade = _create_facade_lazily()
-    return facade.get_engine()
+    return facade.get_engine(use_slave=use_slave)
 
 
-def get_session(**kwargs):
+def get_session(use_slave=False, **kwargs):
     facade = _create_facade_lazily()
-    return facade.get_session(**kwargs)
+    return facade.get_session(use_slave=use_slave, **kwargs)
 
 
 def get_backend():
@@ -71,9 +78,14 @@ def model_query(model, *args, **kwargs):
     """Query helper for simpler session usage.
 
     :param session: if present, the session to use
+    :param use_slave: if True, and no session is given, the query is
+                      sent to the read-only slave database when one is
+                      configured with the [database]slave_connection
+                      option, and to the main database otherwise.
     """
 
-    session = kwargs.get('session') or get_session()
+    session = (kwargs.get('session') or
+               get_session(use_slave=kwargs.get('use_slave', False)))
     query = session.query(model, *args)
     return query
 
@@ -141,10 +153,86 @@ def _check_port_change_forbidden(port, session):
                                        host=node_ref['reservation'])
 
 
+def _node_with_ports(query):
+    """Run a node query joined with the node's ports.
+
+    :param query: A query which selects a single node.
+    :returns: A tuple of the node and a list of its ports.
+    :raises: NoResultFound if the query matches no node.
+    """
+    query = (query.add_entity(models.Port)
+             .outerjoin(models.Port, models.Port.node_id == models.Node.id)
+             .order_by(models.Port.id))
+    rows = query.all()
+    if not rows:
+        raise NoResultFound()
+    ports = [port for node, port in rows if port is not None]
+    return rows[0][0], ports
+
+
+def _bump_conductor_generation(session):
+    """Record a change in the set of active conductors."""
+    query = (model_query(models.ConductorMembership, session=session)
+             .filter_by(id=1))
+    count = query.update(
+        {'generation': models.ConductorMembership.generation + 1})
+    if count == 0:
+        ref = models.ConductorMembership()
+        ref.update({'id': 1, 'generation': 1})
+        ref.save(session)
+
+
+def _set_new_node_defaults(values):
+    """Ensure defaults are present in the values of a new node."""
+    if not values.get('uuid'):
+        values['uuid'] = utils.generate_uuid()
+    if not values.get('power_state'):
+        values['power_state'] = states.NOSTATE
+    if not values.get('provision_state'):
+        values['provision_state'] = states.NOSTATE
+    values['hash_partition_key'] = hash_ring.get_partition_key(
+                                                        values['uuid'])
+
+
+def _get_existing_values(session, column, values):
+    """Return which of the given values are already in a column.
+
+    The values are looked up in chunks, as databases limit the number of
+    parameters of a query.
+    """
+    values = list(set(value for value in values if value is not None))
+    existing = set()
+    for start in range(0, len(values), _IN_CHUNK_SIZE):
+        query = (model_query(column, session=session)
+                 .filter(column.in_(values[start:start + _IN_CHUNK_SIZE])))
+        existing.update(row[0] for row in query)
+    return existing
+
+
+def _take_new_port(values, taken_uuids, taken_addresses):
+    """Check that a new port conflicts with no port, and record it.
+
+    :param values: the values of the new port.
+    :param taken_uuids: set of the UUIDs already in use, updated with
+                        the UUID of the port when it does not conflict.
+    :param taken_addresses: set of the MAC addresses already in use,
+                            updated like taken_uuids.
+    :returns: the exception describing the conflict, or None.
+    """
+    address = values.get('address')
+    if address is not None and address in taken_addresses:
+        return exception.MACAlreadyExists(mac=address)
+    if values['uuid'] in taken_uuids:
+        return exception.PortAlreadyExists(uuid=values['uuid'])
+    taken_uuids.add(values['uuid'])
+    if address is not None:
+        taken_addresses.add(address)
+
+
 def _paginate_query(model, limit=None, marker=None, sort_key=None,
-                    sort_dir=None, query=None):
+                    sort_dir=None, query=None, use_slave=False):
     if not query:
-        query = model_query(model)
+        query = model_query(model, use_slave=use_slave)
     sort_keys = ['id']
     if sort_key and sort_key not in sort_keys:
         sort_keys.insert(0, sort_key)
@@ -159,15 +247,22 @@ class Connection(api.Connection):
     def __init__(self):
         pass
 
-    def _add_nodes_filters(self, query, filters):
+    def _add_nodes_filters(self, query, filters, use_slave=False):
         if filters is None:
             filters = []
 
         if 'chassis_uuid' in filters:
             # get_chassis_by_uuid() to raise an exception if the chassis
             # is not found
-            chassis_obj = self.get_chassis_by_uuid(filters['chassis_uuid'])
+            chassis_obj = self.get_chassis_by_uuid(filters['chassis_uuid'],
+                                                   use_slave=use_slave)
             query = query.filter_by(chassis_id=chassis_obj.id)
+        if 'id' in filters:
+            query = query.filter_by(id=filters['id'])
+        if 'uuid' in filters:
+            query = query.filter_by(uuid=filters['uuid'])
+        if 'uuid_in' in filters:
+            query = query.filter(models.Node.uuid.in_(filters['uuid_in']))
         if 'associated' in filters:
             if filters['associated']:
                 query = query.filter(models.Node.instance_uuid != None)
@@ -184,15 +279,54 @@ class Connection(api.Connection):
             query = query.filter_by(driver=filters['driver'])
         if 'provision_state' in filters:
             query = query.filter_by(provision_state=filters['provision_state'])
+        if 'provision_state_not_in' in filters:
+            # NOTE: NOT IN is never true for NULL, which is how NOSTATE
+            # is stored, so those nodes have to be matched explicitly.
+            query = query.filter(sql.or_(
+                models.Node.provision_state == None,
+                ~models.Node.provision_state.in_(
+                    filters['provision_state_not_in'])))
         if 'provisioned_before' in filters:
             limit = timeutils.utcnow() - datetime.timedelta(
                                          seconds=filters['provisioned_before'])
             query = query.filter(models.Node.provision_updated_at < limit)
+        if 'hash_ranges' in filters:
+            query = query.filter(
+                self._get_hash_ranges_clause(filters['hash_ranges']))
+        if 'changes_since' in filters:
+            # NOTE: updated_at is only set by the first update of a node.
+            since = filters['changes_since']
+            query = query.filter(sql.or_(models.Node.created_at >= since,
+                                         models.Node.updated_at >= since))
 
         return query
 
+    def _get_hash_ranges_clause(self, hash_ranges):
+        key = models.Node.hash_partition_key
+        clauses = []
+        for driver, ranges in hash_ranges.items():
+            if ranges is None:
+                clauses.append(models.Node.driver == driver)
+                continue
+            # NOTE: nodes without a partition key are always selected,
+            # callers still have to check the mapping of each node.
+            range_clauses = [key == None]
+            for start, end in ranges:
+                bounds = []
+                if start is not None:
+                    bounds.append(key >= start)
+                if end is not None:
+                    bounds.append(key < end)
+                range_clauses.append(sql.and_(*bounds))
+            clauses.append(sql.and_(models.Node.driver == driver,
+                                    sql.or_(*range_clauses)))
+        if not clauses:
+            return sql.false()
+        return sql.or_(*clauses)
+
     def get_nodeinfo_list(self, columns=None, filters=None, limit=None,
-                          marker=None, sort_key=None, sort_dir=None):
+                          marker=None, sort_key=None, sort_dir=None,
+                          use_slave=False):
         # list-ify columns default values because it is bad form
         # to include a mutable list in function definitions.
         if columns is None:
@@ -200,34 +334,99 @@ class Connection(api.Connection):
         else:
             columns = [getattr(models.Node, c) for c in columns]
 
-        query = model_query(*columns, base_model=models.Node)
-        query = self._add_nodes_filters(query, filters)
+        query = model_query(*columns, base_model=models.Node,
+                            use_slave=use_slave)
+        query = self._add_nodes_filters(query, filters, use_slave=use_slave)
         return _paginate_query(models.Node, limit, marker,
                                sort_key, sort_dir, query)
 
+    def iter_nodeinfo_list(self, columns=None, filters=None,
+                           chunk_size=1000, use_slave=False):
+        if columns is None:
+            columns = ['id']
+        query_columns = [getattr(models.Node, c) for c in columns]
+        # NOTE: the id of the last node of a chunk is where the next
+        # chunk starts, so it is always read.
+        add_id = 'id' not in columns
+        if add_id:
+            query_columns.append(models.Node.id)
+            id_index = -1
+        else:
+            id_index = columns.index('id')
+
+        last_id = None
+        while True:
+            query = model_query(*query_columns, base_model=models.Node,
+                                use_slave=use_slave)
+            query = self._add_nodes_filters(query, filters,
+                                            use_slave=use_slave)
+            if last_id is not None:
+                query = query.filter(models.Node.id > last_id)
+            rows = query.order_by(models.Node.id).limit(chunk_size).all()
+            for row in rows:
+                yield tuple(row[:-1]) if add_id else row
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][id_index]
+            # Let other greenthreads run between two chunks
+            eventlet.sleep(0)
+
     def get_node_list(self, filters=None, limit=None, marker=None,
-                      sort_key=None, sort_dir=None):
-        query = model_query(models.Node)
-        query = self._add_nodes_filters(query, filters)
+                      sort_key=None, sort_dir=None, use_slave=False):
+        query = model_query(models.Node, use_slave=use_slave)
+        query = self._add_nodes_filters(query, filters, use_slave=use_slave)
         return _paginate_query(models.Node, limit, marker,
                                sort_key, sort_dir, query)
 
-    def reserve_node(self, tag, node_id):
+    def get_node_statistics(self, use_slave=False):
+        associated = (models.Node.instance_uuid != None).label('associated')
+        group_by = [models.Node.driver, models.Node.provision_state,
+                    models.Node.power_state, models.Node.maintenance,
+                    associated]
+        query = (model_query(*(group_by + [sql.func.count(models.Node.id)]),
+                             use_slave=use_slave)
+                 .group_by(*group_by))
+        return [(driver, provision_state, power_state, bool(maintenance),
+                 bool(is_associated), count)
+                for (driver, provision_state, power_state, maintenance,
+                     is_associated, count) in query]
+
+    def get_node_deletions(self, since, use_slave=False):
+        query = (model_query(models.NodeDeletion, use_slave=use_slave)
+                 .filter(models.NodeDeletion.deleted_at >= since)
+                 .order_by(models.NodeDeletion.deleted_at,
+                           models.NodeDeletion.id))
+        return query.all()
+
+    def reserve_node(self, tag, node_id, filters=None):
+        return self._reserve_node(tag, node_id, filters)
+
+    def reserve_node_with_ports(self, tag, node_id, filters=None):
+        return self._reserve_node(tag, node_id, filters, with_ports=True)
+
+    def _reserve_node(self, tag, node_id, filters, with_ports=False):
         session = get_session()
         with session.begin():
             query = model_query(models.Node, session=session)
             query = add_identity_filter(query, node_id)
+            update_query = self._add_nodes_filters(query, filters)
             # be optimistic and assume we usually create a reservation
-            count = query.filter_by(reservation=None).update(
+            count = update_query.filter_by(reservation=None).update(
                         {'reservation': tag}, synchronize_session=False)
             try:
-                node = query.one()
+                if with_ports:
+                    node, ports = _node_with_ports(query)
+                else:
+                    node = query.one()
                 if count != 1:
-                    # Nothing updated and node exists. Must already be
-                    # locked.
-                    raise exception.NodeLocked(node=node_id,
-                                               host=node['reservation'])
-                return node
+                    if node['reservation'] is not None:
+                        # Nothing updated and node exists. Must already be
+                        # locked.
+                        raise exception.NodeLocked(node=node_id,
+                                                   host=node['reservation'])
+                    # Not locked, so the node did not match the filters.
+                    raise exception.NodeFiltersNotMatched(node=node_id)
+                return (node, ports) if with_ports else node
             except NoResultFound:
                 raise exception.NodeNotFound(node_id)
 
@@ -251,13 +450,7 @@ class Connection(api.Connection):
                 raise exception.NodeNotFound(node_id)
 
     def create_node(self, values):
-        # ensure defaults are present for new nodes
-        if not values.get('uuid'):
-            values['uuid'] = utils.generate_uuid()
-        if not values.get('power_state'):
-            values['power_state'] = states.NOSTATE
-        if not values.get('provision_state'):
-            values['provision_state'] = states.NOSTATE
+        _set_new_node_defaults(values)
 
         node = models.Node()
         node.update(values)
@@ -271,25 +464,125 @@ class Connection(api.Connection):
             raise exception.NodeAlreadyExists(uuid=values['uuid'])
         return node
 
-    def get_node_by_id(self, node_id):
-        query = model_query(models.Node).filter_by(id=node_id)
+    def create_nodes(self, values_list):
+        nodes = []
+        for values in values_list:
+            values = dict(values)
+            ports_values = [dict(port_values) for port_values in
+                            values.pop('ports', None) or []]
+            _set_new_node_defaults(values)
+            for port_values in ports_values:
+                if not port_values.get('uuid'):
+                    port_values['uuid'] = utils.generate_uuid()
+            nodes.append((values, ports_values))
+        all_ports = [port_values for values, ports_values in nodes
+                     for port_values in ports_values]
+
+        results = []
+        created = []
+        session = get_session()
+        try:
+            with session.begin():
+                taken_uuids = _get_existing_values(
+                    session, models.Node.uuid,
+                    [values['uuid'] for values, ports_values in nodes])
+                taken_instances = _get_existing_values(
+                    session, models.Node.instance_uuid,
+                    [values.get('instance_uuid')
+                     for values, ports_values in nodes])
+                taken_port_uuids = _get_existing_values(
+                    session, models.Port.uuid,
+                    [port_values['uuid'] for port_values in all_ports])
+                taken_addresses = _get_existing_values(
+                    session, models.Port.address,
+                    [port_values.get('address') for port_values in all_ports])
+
+                for values, ports_values in nodes:
+                    instance_uuid = values.get('instance_uuid')
+                    if values['uuid'] in taken_uuids:
+                        results.append(exception.NodeAlreadyExists(
+                            uuid=values['uuid']))
+                        continue
+                    if instance_uuid is not None and (instance_uuid in
+                                                      taken_instances):
+                        results.append(exception.InstanceAssociated(
+                            instance_uuid=instance_uuid,
+                            node=values['uuid']))
+                        continue
+
+                    error = None
+                    new_port_uuids = set()
+                    new_addresses = set()
+                    for port_values in ports_values:
+                        error = _take_new_port(port_values, taken_port_uuids,
+                                               taken_addresses)
+                        if error:
+                            break
+                        new_port_uuids.add(port_values['uuid'])
+                        new_addresses.add(port_values.get('address'))
+                    if error:
+                        # Release the ports of this node which were taken
+                        taken_port_uuids -= new_port_uuids
+                        taken_addresses -= new_addresses
+                        results.append(error)
+                        continue
+
+                    taken_uuids.add(values['uuid'])
+                    if instance_uuid is not None:
+                        taken_instances.add(instance_uuid)
+                    node = models.Node()
+                    node.update(values)
+                    session.add(node)
+                    created.append((len(results), node, ports_values))
+                    results.append(None)
+
+                # The ids of the new nodes are needed by their ports
+                session.flush()
+                for index, node, ports_values in created:
+                    ports = []
+                    for port_values in ports_values:
+                        port = models.Port()
+                        port.update(port_values)
+                        port.node_id = node.id
+                        session.add(port)
+                        ports.append(port)
+                    results[index] = (node, ports)
+        except db_exc.DBDuplicateEntry as exc:
+            # Nodes or ports were created concurrently with the same
+            # UUIDs or MAC addresses
+            raise exception.Conflict(
+                _('Nodes or ports conflicting with the new ones were '
+                  'created concurrently: %s') % exc)
+        return results
+
+    def get_node_by_id(self, node_id, use_slave=False):
+        query = (model_query(models.Node, use_slave=use_slave)
+                 .filter_by(id=node_id))
         try:
             return query.one()
         except NoResultFound:
             raise exception.NodeNotFound(node=node_id)
 
-    def get_node_by_uuid(self, node_uuid):
-        query = model_query(models.Node).filter_by(uuid=node_uuid)
+    def get_node_by_uuid(self, node_uuid, use_slave=False):
+        query = (model_query(models.Node, use_slave=use_slave)
+                 .filter_by(uuid=node_uuid))
         try:
             return query.one()
         except NoResultFound:
             raise exception.NodeNotFound(node=node_uuid)
 
-    def get_node_by_instance(self, instance):
+    def get_node_with_ports(self, node_id):
+        query = add_identity_filter(model_query(models.Node), node_id)
+        try:
+            return _node_with_ports(query)
+        except NoResultFound:
+            raise exception.NodeNotFound(node=node_id)
+
+    def get_node_by_instance(self, instance, use_slave=False):
         if not utils.is_uuid_like(instance):
             raise exception.InvalidUUID(uuid=instance)
 
-        query = (model_query(models.Node)
+        query = (model_query(models.Node, use_slave=use_slave)
                  .filter_by(instance_uuid=instance))
 
         try:
@@ -299,6 +592,51 @@ class Connection(api.Connection):
 
         return result
 
+    def get_node_by_port_addresses(self, addresses):
+        if not addresses:
+            raise exception.NodeNotFound(
+                _('No ports matching the given MAC addresses %s exist in '
+                  'the database.') % addresses)
+
+        node_ids = (model_query(models.Port.node_id)
+                    .filter(models.Port.address.in_(addresses))
+                    .subquery())
+        query = model_query(models.Node).filter(models.Node.id.in_(node_ids))
+        try:
+            return query.one()
+        except NoResultFound:
+            raise exception.NodeNotFound(
+                _('No ports matching the given MAC addresses %s exist in '
+                  'the database.') % addresses)
+        except MultipleResultsFound:
+            raise exception.NodeNotFound(
+                _('Ports matching the MAC addresses %s belong to multiple '
+                  'nodes.') % addresses)
+
+    def touch_agent_heartbeat(self, node_id):
+        values = {'last_heartbeat': timeutils.utcnow()}
+        query = model_query(models.AgentHeartbeat).filter_by(node_id=node_id)
+        # be optimistic and assume the agent has heartbeated before
+        if query.update(values, synchronize_session=False):
+            return
+
+        heartbeat = models.AgentHeartbeat()
+        heartbeat.update(values)
+        heartbeat.node_id = node_id
+        try:
+            heartbeat.save()
+        except db_exc.DBDuplicateEntry:
+            # A concurrent heartbeat from the same agent recorded it first
+            query.update(values, synchronize_session=False)
+
+    def get_agent_heartbeat(self, node_id, use_slave=False):
+        result = (model_query(models.AgentHeartbeat.last_heartbeat,
+                              base_model=models.AgentHeartbeat,
+                              use_slave=use_slave)
+                  .filter_by(node_id=node_id)
+                  .first())
+        return result[0] if result else None
+
     def destroy_node(self, node_id):
         session = get_session()
         with session.begin():
@@ -319,8 +657,26 @@ class Connection(api.Connection):
             port_query = add_port_filter_by_node(port_query, node_id)
             port_query.delete()
 
+            heartbeat_query = model_query(models.AgentHeartbeat,
+                                          session=session)
+            heartbeat_query.filter_by(node_id=node_id).delete()
+
             query.delete()
 
+            now = timeutils.utcnow()
+            deletion = models.NodeDeletion()
+            deletion.update({'node_uuid': node_ref['uuid'],
+                             'deleted_at': now})
+            session.add(deletion)
+
+            # NOTE: the log only has to cover the retention period, so the
+            #       older deletions are pruned as the new ones are recorded.
+            expired = now - datetime.timedelta(
+                seconds=CONF.database.node_deletion_log_retention)
+            (model_query(models.NodeDeletion, session=session)
+             .filter(models.NodeDeletion.deleted_at < expired)
+             .delete(synchronize_session=False))
+
     def update_node(self, node_id, values):
         # NOTE(dtantsur): this can lead to very strange errors
         if 'uuid' in values:
@@ -355,39 +711,57 @@ class Connection(api.Connection):
             ref.update(values)
         return ref
 
-    def get_port_by_id(self, port_id):
-        query = model_query(models.Port).filter_by(id=port_id)
+    def get_port_by_id(self, port_id, use_slave=False):
+        query = (model_query(models.Port, use_slave=use_slave)
+                 .filter_by(id=port_id))
         try:
             return query.one()
         except NoResultFound:
             raise exception.PortNotFound(port=port_id)
 
-    def get_port_by_uuid(self, port_uuid):
-        query = model_query(models.Port).filter_by(uuid=port_uuid)
+    def get_port_by_uuid(self, port_uuid, use_slave=False):
+        query = (model_query(models.Port, use_slave=use_slave)
+                 .filter_by(uuid=port_uuid))
         try:
             return query.one()
         except NoResultFound:
             raise exception.PortNotFound(port=port_uuid)
 
-    def get_port_by_address(self, address):
-        query = model_query(models.Port).filter_by(address=address)
+    def get_port_by_address(self, address, use_slave=False):
+        query = (model_query(models.Port, use_slave=use_slave)
+                 .filter_by(address=address))
         try:
             return query.one()
         except NoResultFound:
             raise exception.PortNotFound(port=address)
 
     def get_port_list(self, limit=None, marker=None,
-                      sort_key=None, sort_dir=None):
+                      sort_key=None, sort_dir=None, use_slave=False):
         return _paginate_query(models.Port, limit, marker,
-                               sort_key, sort_dir)
+                               sort_key, sort_dir, use_slave=use_slave)
 
     def get_ports_by_node_id(self, node_id, limit=None, marker=None,
-                             sort_key=None, sort_dir=None):
-        query = model_query(models.Port)
+                             sort_key=None, sort_dir=None, use_slave=False):
+        query = model_query(models.Port, use_slave=use_slave)
         query = query.filter_by(node_id=node_id)
         return _paginate_query(models.Port, limit, marker,
                                sort_key, sort_dir, query)
 
+    def get_portinfo_list(self, columns=None, filters=None, limit=None,
+                          marker=None, sort_key=None, sort_dir=None,
+                          use_slave=False):
+        if columns is None:
+            columns = ['id']
+        query = model_query(*[getattr(models.Port, c) for c in columns],
+                            base_model=models.Port, use_slave=use_slave)
+        filters = filters or {}
+        if 'node_id' in filters:
+            query = query.filter_by(node_id=filters['node_id'])
+        if 'uuid' in filters:
+            query = query.filter_by(uuid=filters['uuid'])
+        return _paginate_query(models.Port, limit, marker,
+                               sort_key, sort_dir, query)
+
     def create_port(self, values):
         if not values.get('uuid'):
             values['uuid'] = utils.generate_uuid()
@@ -401,6 +775,38 @@ class Connection(api.Connection):
             raise exception.PortAlreadyExists(uuid=values['uuid'])
         return port
 
+    def create_ports(self, values_list):
+        ports_values = [dict(values) for values in values_list]
+        for values in ports_values:
+            if not values.get('uuid'):
+                values['uuid'] = utils.generate_uuid()
+
+        results = []
+        session = get_session()
+        try:
+            with session.begin():
+                taken_uuids = _get_existing_values(
+                    session, models.Port.uuid,
+                    [values['uuid'] for values in ports_values])
+                taken_addresses = _get_existing_values(
+                    session, models.Port.address,
+                    [values.get('address') for values in ports_values])
+                for values in ports_values:
+                    error = _take_new_port(values, taken_uuids,
+                                           taken_addresses)
+                    if error:
+                        results.append(error)
+                        continue
+                    port = models.Port()
+                    port.update(values)
+                    session.add(port)
+                    results.append(port)
+        except db_exc.DBDuplicateEntry as exc:
+            raise exception.Conflict(
+                _('Ports conflicting with the new ones were created '
+                  'concurrently: %s') % exc)
+        return results
+
     def update_port(self, port_id, values):
         # NOTE(dtantsur): this can lead to very strange errors
         if 'uuid' in values:
@@ -434,24 +840,26 @@ class Connection(api.Connection):
 
             query.delete()
 
-    def get_chassis_by_id(self, chassis_id):
-        query = model_query(models.Chassis).filter_by(id=chassis_id)
+    def get_chassis_by_id(self, chassis_id, use_slave=False):
+        query = (model_query(models.Chassis, use_slave=use_slave)
+                 .filter_by(id=chassis_id))
         try:
             return query.one()
         except NoResultFound:
             raise exception.ChassisNotFound(chassis=chassis_id)
 
-    def get_chassis_by_uuid(self, chassis_uuid):
-        query = model_query(models.Chassis).filter_by(uuid=chassis_uuid)
+    def get_chassis_by_uuid(self, chassis_uuid, use_slave=False):
+        query = (model_query(models.Chassis, use_slave=use_slave)
+                 .filter_by(uuid=chassis_uuid))
         try:
             return query.one()
         except NoResultFound:
             raise exception.ChassisNotFound(chassis=chassis_uuid)
 
     def get_chassis_list(self, limit=None, marker=None,
-                         sort_key=None, sort_dir=None):
+                         sort_key=None, sort_dir=None, use_slave=False):
         return _paginate_query(models.Chassis, limit, marker,
-                               sort_key, sort_dir)
+                               sort_key, sort_dir, use_slave=use_slave)
 
     def create_chassis(self, values):
         if not values.get('uuid'):
@@ -520,6 +928,7 @@ class Connection(api.Connection):
             ref.update({'updated_at': timeutils.utcnow(),
                         'online': True})
             ref.save(session)
+            _bump_conductor_generation(session)
         return ref
 
     def get_conductor(self, hostname):
@@ -538,18 +947,51 @@ class Connection(api.Connection):
             count = query.update({'online': False})
             if count == 0:
                 raise exception.ConductorNotFound(conductor=hostname)
+            _bump_conductor_generation(session)
 
     def touch_conductor(self, hostname):
+        limit = (timeutils.utcnow() -
+                 datetime.timedelta(seconds=CONF.conductor.heartbeat_timeout))
         session = get_session()
         with session.begin():
             query = (model_query(models.Conductor, session=session)
                      .filter_by(hostname=hostname))
+            # A conductor which was offline or whose heartbeat had expired
+            # is joining the cluster again.
+            rejoined = (query.filter(sql.or_(
+                            models.Conductor.online == sql.false(),
+                            models.Conductor.updated_at < limit))
+                        .count())
             # since we're not changing any other field, manually set updated_at
             # and since we're heartbeating, make sure that online=True
             count = query.update({'updated_at': timeutils.utcnow(),
                                   'online': True})
             if count == 0:
                 raise exception.ConductorNotFound(conductor=hostname)
+            if rejoined:
+                _bump_conductor_generation(session)
+
+    def expire_conductors(self, interval=None):
+        if interval is None:
+            interval = CONF.conductor.heartbeat_timeout
+
+        limit = timeutils.utcnow() - datetime.timedelta(seconds=interval)
+        session = get_session()
+        with session.begin():
+            query = (model_query(models.Conductor, session=session)
+                     .filter_by(online=True)
+                     .filter(models.Conductor.updated_at < limit))
+            count = query.update({'online': False},
+                                 synchronize_session=False)
+            if count:
+                _bump_conductor_generation(session)
+        return count
+
+    def get_conductor_generation(self):
+        result = (model_query(models.ConductorMembership.generation)
+                  .filter_by(id=1)
+                  .first())
+        return result[0] if result else 0
 
     def get_active_driver_dict(self, interval=None):
         if interval is None:
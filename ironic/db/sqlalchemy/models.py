@@ -24,9 +24,9 @@ from oslo.config import cfg
 from oslo.db import options as db_options
 from oslo.db.sqlalchemy import models
 import six.moves.urllib.parse as urlparse
-from sqlalchemy import Boolean, Column, DateTime
-from sqlalchemy import ForeignKey, Integer
-from sqlalchemy import schema, String, Text
+from sqlalchemy import BigInteger, Boolean, Column, DateTime
+from sqlalchemy import ForeignKey, Index, Integer
+from sqlalchemy import schema, String, Text, type_coerce
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.types import TypeDecorator, TEXT
 
@@ -36,7 +36,7 @@ from ironic.common import paths
 sql_opts = [
     cfg.StrOpt('mysql_engine',
                default='InnoDB',
-               help='MySQL engine to use.')
+               help='MySQL engine to use.'),
 ]
 
 _DEFAULT_SQL_CONNECTION = 'sqlite:///' + paths.state_path_def('ironic.sqlite')
@@ -88,6 +88,46 @@ class JSONEncodedList(JsonEncodedType):
     type = list
 
 
+class LazyJSONEncodedDict(object):
+    """A dict attribute which is decoded from JSON on first access.
+
+    The JSON string is mapped to another attribute of the model, as a
+    plain Text column, so loading a row does not decode it. It is decoded
+    when this attribute is first read, and the result is cached until the
+    JSON string changes. Setting a dict encodes it right away, and only
+    that column is written when the model is flushed.
+
+    On the model class, the attribute is a column expression which
+    decodes the JSON, so it can still be selected in queries.
+    """
+
+    def __init__(self, name, raw_attr):
+        self.name = name
+        self.raw_attr = raw_attr
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return type_coerce(getattr(objtype, self.raw_attr),
+                               JSONEncodedDict).label(self.name)
+        raw = getattr(obj, self.raw_attr)
+        cache = obj.__dict__.setdefault('_json_cache', {})
+        cached = cache.get(self.name)
+        if cached is None or cached[0] is not raw:
+            value = json.loads(raw) if raw is not None else None
+            cached = cache[self.name] = (raw, value)
+        return cached[1]
+
+    def __set__(self, obj, value):
+        if value is None:
+            value = {}
+        elif not isinstance(value, dict):
+            raise TypeError("%s supposes to store dict objects, but %s given"
+                            % (self.name, type(value).__name__))
+        raw = json.dumps(value)
+        setattr(obj, self.raw_attr, raw)
+        obj.__dict__.setdefault('_json_cache', {})[self.name] = (raw, value)
+
+
 class IronicBase(models.TimestampMixin,
                  models.ModelBase):
 
@@ -138,6 +178,15 @@ class Conductor(Base):
     online = Column(Boolean, default=True)
 
 
+class ConductorMembership(Base):
+    """Represents the generation of the set of active conductors."""
+
+    __tablename__ = 'conductor_membership'
+    __table_args__ = table_args()
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+
 class Node(Base):
     """Represents a bare metal node."""
 
@@ -146,6 +195,15 @@ class Node(Base):
         schema.UniqueConstraint('uuid', name='uniq_nodes0uuid'),
         schema.UniqueConstraint('instance_uuid',
                                 name='uniq_nodes0instance_uuid'),
+        Index('node_hash_partition_key_idx', 'hash_partition_key'),
+        Index('node_driver_hash_partition_key_idx', 'driver',
+              'hash_partition_key'),
+        Index('node_reservation_maintenance_idx', 'reservation',
+              'maintenance'),
+        Index('node_provision_state_updated_at_idx', 'provision_state',
+              'provision_updated_at'),
+        Index('node_created_at_idx', 'created_at'),
+        Index('node_updated_at_idx', 'updated_at'),
         table_args())
     id = Column(Integer, primary_key=True)
     uuid = Column(String(36))
@@ -160,10 +218,15 @@ class Node(Base):
     target_provision_state = Column(String(15), nullable=True)
     provision_updated_at = Column(DateTime, nullable=True)
     last_error = Column(Text, nullable=True)
-    instance_info = Column(JSONEncodedDict)
-    properties = Column(JSONEncodedDict)
+    # NOTE: the JSON columns are only decoded when they are read; see
+    #       LazyJSONEncodedDict.
+    _instance_info = Column('instance_info', Text, default='{}')
+    instance_info = LazyJSONEncodedDict('instance_info', '_instance_info')
+    _properties = Column('properties', Text, default='{}')
+    properties = LazyJSONEncodedDict('properties', '_properties')
     driver = Column(String(15))
-    driver_info = Column(JSONEncodedDict)
+    _driver_info = Column('driver_info', Text, default='{}')
+    driver_info = LazyJSONEncodedDict('driver_info', '_driver_info')
 
     # NOTE(deva): this is the host name of the conductor which has
     #             acquired a TaskManager lock on the node.
@@ -182,7 +245,12 @@ class Node(Base):
     maintenance = Column(Boolean, default=False)
     maintenance_reason = Column(Text, nullable=True)
     console_enabled = Column(Boolean, default=False)
-    extra = Column(JSONEncodedDict)
+    _extra = Column('extra', Text, default='{}')
+    extra = LazyJSONEncodedDict('extra', '_extra')
+
+    # NOTE: the key at which the node's UUID is placed on the hash rings,
+    #       which lets conductors select the nodes mapped to them.
+    hash_partition_key = Column(BigInteger, nullable=True)
 
 
 class Port(Base):
@@ -192,9 +260,31 @@ class Port(Base):
     __table_args__ = (
         schema.UniqueConstraint('address', name='uniq_ports0address'),
         schema.UniqueConstraint('uuid', name='uniq_ports0uuid'),
+        Index('port_node_id_idx', 'node_id'),
         table_args())
     id = Column(Integer, primary_key=True)
     uuid = Column(String(36))
     address = Column(String(18))
     node_id = Column(Integer, ForeignKey('nodes.id'), nullable=True)
     extra = Column(JSONEncodedDict)
+
+
+class AgentHeartbeat(Base):
+    """Represents the last heartbeat of the deploy agent on a node."""
+
+    __tablename__ = 'agent_heartbeats'
+    __table_args__ = table_args()
+    node_id = Column(Integer, ForeignKey('nodes.id'), primary_key=True)
+    last_heartbeat = Column(DateTime, nullable=False)
+
+
+class NodeDeletion(Base):
+    """Represents the deletion of a node."""
+
+    __tablename__ = 'node_deletions'
+    __table_args__ = (
+        Index('node_deletion_deleted_at_idx', 'deleted_at'),
+        table_args())
+    id = Column(Integer, primary_key=True)
+    node_uuid = Column(String(36), nullable=False)
+    deleted_at = Column(DateTime, nullable=False)
@@ -27,6 +27,7 @@ import six
 
 from ironic.common import exception
 from ironic.common.i18n import _LE
+from ironic.common.i18n import _LW
 from ironic.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
@@ -220,6 +221,14 @@ class DeployInterface(object):
 class PowerInterface(object):
     """Interface for power-related actions."""
 
+    supports_batch_power_state = False
+    """Whether :meth:`get_power_states` queries many nodes at once.
+
+    Drivers which override :meth:`get_power_states` to query the power
+    state of several nodes with a single request should set this to True,
+    so that the conductor batches nodes when syncing power states.
+    """
+
     @abc.abstractmethod
     def get_properties(self):
         """Return the properties of the interface.
@@ -250,6 +259,28 @@ class PowerInterface(object):
         :returns: a power state. One of :mod:`ironic.common.states`.
         """
 
+    def get_power_states(self, tasks):
+        """Return the power states of several nodes.
+
+        The default implementation calls :meth:`get_power_state` for
+        each node in turn.
+
+        :param tasks: a list of TaskManager instances, each containing a
+                      node to act on. The tasks may hold shared locks.
+        :returns: a dictionary mapping the UUID of each node to its power
+                  state. Nodes whose power state could not be determined
+                  are left out.
+        """
+        power_states = {}
+        for task in tasks:
+            try:
+                power_states[task.node.uuid] = self.get_power_state(task)
+            except Exception as e:
+                LOG.warning(_LW("Could not get the power state of node "
+                                "%(node)s. Error: %(error)s"),
+                            {'node': task.node.uuid, 'error': e})
+        return power_states
+
     @abc.abstractmethod
     def set_power_state(self, task, power_state):
         """Set the power state of the task's node.
@@ -362,7 +393,7 @@ VendorMetadata = collections.namedtuple('VendorMetadata', ['method',
 
 
 def _passthru(http_methods, method=None, async=True, driver_passthru=False,
-              description=None):
+              description=None, require_exclusive_lock=True):
     """A decorator for registering a function as a passthru function.
 
     Decorator ensures function is ready to catch any ironic exceptions
@@ -384,6 +415,15 @@ def _passthru(http_methods, method=None, async=True, driver_passthru=False,
                             passthru method, and False if it is a node
                             vendor passthru method.
     :param description: a string shortly describing what the method does.
+    :param require_exclusive_lock: Boolean value. Only valid for node passthru
+                                   methods. If True, lock the node before
+                                   validate() and invoking the vendor method.
+                                   The node remains locked during the
+                                   execution of the method, so it may
+                                   modify the node. If False, the method
+                                   is invoked with a shared lock and must
+                                   call task.upgrade_lock() before modifying
+                                   the node. Defaults to True.
 
     """
     def handle_passthru(func):
@@ -393,9 +433,12 @@ def _passthru(http_methods, method=None, async=True, driver_passthru=False,
 
         supported_ = [i.upper() for i in http_methods]
         description_ = description or ''
-        metadata = VendorMetadata(api_method, {'http_methods': supported_,
-                                               'async': async,
-                                               'description': description_})
+        metadata = VendorMetadata(api_method,
+                                  {'http_methods': supported_,
+                                   'async': async,
+                                   'description': description_,
+                                   'require_exclusive_lock':
+                                       require_exclusive_lock})
         if driver_passthru:
             func._driver_metadata = metadata
         else:
@@ -418,9 +461,11 @@ def _passthru(http_methods, method=None, async=True, driver_passthru=False,
     return handle_passthru
 
 
-def passthru(http_methods, method=None, async=True, description=None):
+def passthru(http_methods, method=None, async=True, description=None,
+             require_exclusive_lock=True):
     return _passthru(http_methods, method, async, driver_passthru=False,
-                     description=description)
+                     description=description,
+                     require_exclusive_lock=require_exclusive_lock)
 
 
 def driver_passthru(http_methods, method=None, async=True, description=None):
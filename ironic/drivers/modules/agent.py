@@ -13,7 +13,6 @@
 # limitations under the License.
 
 import os
-import time
 
 from oslo.config import cfg
 from oslo.utils import excutils
@@ -63,11 +62,6 @@ CONF.register_opts(agent_opts, group='agent')
 LOG = log.getLogger(__name__)
 
 
-def _time():
-    """Broken out for testing."""
-    return time.time()
-
-
 def _get_client():
     client = agent_client.AgentClient()
     return client
@@ -315,7 +309,7 @@ class AgentVendorInterface(base.VendorInterface):
                                                     'payload version: %s')
                                                     % version)
 
-    @base.passthru(['POST'])
+    @base.passthru(['POST'], require_exclusive_lock=False)
     def heartbeat(self, task, **kwargs):
         """Method for agent to periodically check in.
 
@@ -327,39 +321,68 @@ class AgentVendorInterface(base.VendorInterface):
          }
 
         AGENT_PORT defaults to 9999.
+
+        The heartbeat is recorded with a shared lock. The lock is only
+        upgraded to an exclusive one when the node must be modified: when
+        the agent_url changes or driver_info still holds the heartbeat
+        recorded by older releases, or when the heartbeat advances the
+        deploy.
         """
-        node = task.node
-        driver_info = node.driver_info
-        LOG.debug(
-            'Heartbeat from %(node)s, last heartbeat at %(heartbeat)s.',
-            {'node': node.uuid,
-             'heartbeat': driver_info.get('agent_last_heartbeat')})
-        driver_info['agent_last_heartbeat'] = int(_time())
         try:
-            driver_info['agent_url'] = kwargs['agent_url']
+            agent_url = kwargs['agent_url']
         except KeyError:
             raise exception.MissingParameterValue(_('For heartbeat operation, '
                                                     '"agent_url" must be '
                                                     'specified.'))
 
-        node.driver_info = driver_info
-        node.save()
+        node = task.node
+        LOG.debug('Heartbeat from %(node)s.', {'node': node.uuid})
+        node.touch_agent_heartbeat()
 
         # Async call backs don't set error state on their own
         # TODO(jimrollenhagen) improve error messages here
         msg = _('Failed checking if deploy is done.')
         try:
+            # NOTE: agent_last_heartbeat was kept in driver_info before the
+            #       heartbeats got their own table; drop the stale value.
+            if (node.driver_info.get('agent_url') != agent_url or
+                    'agent_last_heartbeat' in node.driver_info):
+                task.upgrade_lock()
+                node = task.node
+                driver_info = node.driver_info
+                driver_info['agent_url'] = agent_url
+                driver_info.pop('agent_last_heartbeat', None)
+                node.driver_info = driver_info
+                node.save()
+
             if node.provision_state == states.DEPLOYWAIT:
                 msg = _('Node failed to get image for deploy.')
+                task.upgrade_lock(
+                    filters={'provision_state': states.DEPLOYWAIT})
                 self._continue_deploy(task, **kwargs)
             elif (node.provision_state == states.DEPLOYING
                     and self._deploy_is_done(node)):
                 msg = _('Node failed to move to active state.')
+                task.upgrade_lock(
+                    filters={'provision_state': states.DEPLOYING})
                 self._reboot_to_instance(task, **kwargs)
+        except (exception.NodeLocked, exception.NodeFiltersNotMatched):
+            # Another operation holds the node, or has moved it to another
+            # state since the heartbeat was received. The agent keeps
+            # heartbeating, so the next heartbeat will try again.
+            LOG.debug('Could not lock node %s to continue the deploy on '
+                      'heartbeat.', node.uuid)
         except Exception:
             LOG.exception(_LE('Async exception for %(node)s: %(msg)s'),
                           {'node': node,
                            'msg': msg})
+            try:
+                task.upgrade_lock()
+            except exception.NodeLocked:
+                LOG.warning(_LW('Could not lock node %s to set it in the '
+                                'failed state, the next heartbeat will '
+                                'try again.'), node.uuid)
+                return
             deploy_utils.set_failed_state(task, msg)
 
     def _deploy_is_done(self, node):
@@ -513,70 +536,17 @@ class AgentVendorInterface(base.VendorInterface):
         return mac_addresses
 
     def _find_node_by_macs(self, context, mac_addresses):
-        """Get nodes for a given list of MAC addresses.
+        """Get the node for a given list of MAC addresses.
 
-        Given a list of MAC addresses, find the ports that match the MACs
-        and return the node they are all connected to.
+        Given a list of MAC addresses, find the node that the ports
+        matching them are all connected to, with a single database query.
 
         :raises: NodeNotFound if the ports point to multiple nodes or no
         nodes.
         """
-        ports = self._find_ports_by_macs(context, mac_addresses)
-        if not ports:
-            raise exception.NodeNotFound(_(
-                'No ports matching the given MAC addresses %sexist in the '
-                'database.') % mac_addresses)
-        node_id = self._get_node_id(ports)
         try:
-            node = objects.Node.get_by_id(context, node_id)
+            return objects.Node.get_by_port_addresses(context, mac_addresses)
         except exception.NodeNotFound:
             with excutils.save_and_reraise_exception():
                 LOG.exception(_LE('Could not find matching node for the '
                                   'provided MACs %s.'), mac_addresses)
-
-        return node
-
-    def _find_ports_by_macs(self, context, mac_addresses):
-        """Get ports for a given list of MAC addresses.
-
-        Given a list of MAC addresses, find the ports that match the MACs
-        and return them as a list of Port objects, or an empty list if there
-        are no matches
-        """
-        ports = []
-        for mac in mac_addresses:
-            # Will do a search by mac if the mac isn't malformed
-            try:
-                port_ob = objects.Port.get_by_address(context, mac)
-                ports.append(port_ob)
-
-            except exception.PortNotFound:
-                LOG.warning(_LW('MAC address %s not found in database'), mac)
-
-        return ports
-
-    def _get_node_id(self, ports):
-        """Get a node ID for a list of ports.
-
-        Given a list of ports, either return the node_id they all share or
-        raise a NotFound if there are multiple node_ids, which indicates some
-        ports are connected to one node and the remaining port(s) are connected
-        to one or more other nodes.
-
-        :raises: NodeNotFound if the MACs match multiple nodes. This
-        could happen if you swapped a NIC from one server to another and
-        don't notify Ironic about it or there is a MAC collision (since
-        they're not guaranteed to be unique).
-        """
-        # See if all the ports point to the same node
-        node_ids = set(port_ob.node_id for port_ob in ports)
-        if len(node_ids) > 1:
-            raise exception.NodeNotFound(_(
-                'Ports matching mac addresses match multiple nodes. MACs: '
-                '%(macs)s. Port ids: %(port_ids)s') %
-                {'macs': [port_ob.address for port_ob in ports], 'port_ids':
-                 [port_ob.uuid for port_ob in ports]}
-            )
-
-        # Only have one node_id left, return it.
-        return node_ids.pop()
@@ -26,6 +26,7 @@ Currently supported environments are:
     Parallels   (parallels)
 """
 
+import collections
 import os
 
 from oslo.config import cfg
@@ -419,6 +420,85 @@ def _get_hosts_name_for_node(ssh_obj, driver_info):
     return matched_name
 
 
+def _get_hosts_names_for_nodes(ssh_obj, driver_infos):
+    """Get the names the host uses to reference several nodes.
+
+    Unlike calling :func:`_get_hosts_name_for_node` for each node, this
+    lists the VMs and reads their MAC addresses only once.
+
+    :param ssh_obj: paramiko.SSHClient, an active ssh connection.
+    :param driver_infos: a list of information for accessing the nodes,
+                         all on the same host.
+    :returns: a dictionary mapping the UUID of each node which was found
+              to its name.
+
+    """
+    cmd_set = driver_infos[0]['cmd_set']
+    unmatched = dict((info['uuid'], info['macs']) for info in driver_infos)
+    names = {}
+    cmd_to_exec = "%s %s" % (cmd_set['base_cmd'], cmd_set['list_all'])
+    full_node_list = _ssh_execute(ssh_obj, cmd_to_exec)
+    LOG.debug("Retrieved Node List: %s" % repr(full_node_list))
+    for node in full_node_list:
+        if not unmatched:
+            break
+        if not node:
+            continue
+        cmd_to_exec = "%s %s" % (cmd_set['base_cmd'],
+                                 cmd_set['get_node_macs'])
+        cmd_to_exec = cmd_to_exec.replace('{_NodeName_}', node)
+        hosts_node_mac_list = [_normalize_mac(mac) for mac in
+                               _ssh_execute(ssh_obj, cmd_to_exec) if mac]
+
+        for uuid, node_macs in list(unmatched.items()):
+            if any(host_mac in _normalize_mac(node_mac)
+                   for host_mac in hosts_node_mac_list
+                   for node_mac in node_macs if node_mac):
+                names[uuid] = node
+                del unmatched[uuid]
+
+    return names
+
+
+def _get_power_statuses(ssh_obj, driver_infos):
+    """Returns the current power states of several nodes.
+
+    :param ssh_obj: paramiko.SSHClient, an active ssh connection.
+    :param driver_infos: a list of information for accessing the nodes,
+                         all on the same host.
+    :returns: a dictionary mapping the UUID of each node which was found
+              to one of ironic.common.states POWER_OFF, POWER_ON.
+
+    """
+    cmd_set = driver_infos[0]['cmd_set']
+    names = _get_hosts_names_for_nodes(ssh_obj, driver_infos)
+    for info in driver_infos:
+        if info['uuid'] not in names:
+            LOG.error(_LE('Node "%(host)s" with MAC address %(mac)s not '
+                          'found.'), {'host': info['host'],
+                                      'mac': info['macs']})
+
+    cmd_to_exec = "%s %s" % (cmd_set['base_cmd'], cmd_set['list_running'])
+    running_list = None
+    if '{_NodeName_}' not in cmd_to_exec:
+        # One command lists the running VMs for all the nodes.
+        running_list = _ssh_execute(ssh_obj, cmd_to_exec)
+
+    power_states = {}
+    for uuid, node_name in names.items():
+        node_running_list = running_list
+        if node_running_list is None:
+            node_running_list = _ssh_execute(
+                ssh_obj, cmd_to_exec.replace('{_NodeName_}', node_name))
+        power_states[uuid] = states.POWER_OFF
+        for node in node_running_list:
+            if node and node_name in node:
+                power_states[uuid] = states.POWER_ON
+                break
+
+    return power_states
+
+
 def _power_on(ssh_obj, driver_info):
     """Power ON this node.
 
@@ -478,9 +558,12 @@ class SSHPower(base.PowerInterface):
     state of virtual machines via SSH.
 
     NOTE: This driver supports VirtualBox and Virsh commands.
-    NOTE: This driver does not currently support multi-node operations.
+    NOTE: This driver only supports multi-node operations for getting
+    the power state.
     """
 
+    supports_batch_power_state = True
+
     def get_properties(self):
         return COMMON_PROPERTIES
 
@@ -524,6 +607,48 @@ class SSHPower(base.PowerInterface):
         ssh_obj = _get_connection(task.node)
         return _get_power_status(ssh_obj, driver_info)
 
+    def get_power_states(self, tasks):
+        """Get the current power states of several nodes.
+
+        The nodes are grouped by the host and credentials used to reach
+        them, and the VMs of each host are listed only once per group.
+
+        :param tasks: a list of TaskManager instances, each containing a
+                      node to act on.
+        :returns: a dictionary mapping the UUID of each node to its power
+                  state. Nodes whose power state could not be determined
+                  are left out.
+        """
+        groups = collections.defaultdict(list)
+        for task in tasks:
+            try:
+                driver_info = _parse_driver_info(task.node)
+            except (exception.InvalidParameterValue,
+                    exception.MissingParameterValue) as e:
+                LOG.warning(_LW("Could not get the power state of node "
+                                "%(node)s. Error: %(error)s"),
+                            {'node': task.node.uuid, 'error': e})
+                continue
+            driver_info['macs'] = driver_utils.get_node_mac_addresses(task)
+            key = tuple((k, driver_info.get(k)) for k in
+                        ('host', 'port', 'username', 'password',
+                         'key_contents', 'key_filename', 'virt_type'))
+            groups[key].append((task.node, driver_info))
+
+        power_states = {}
+        for members in groups.values():
+            try:
+                ssh_obj = _get_connection(members[0][0])
+                power_states.update(_get_power_statuses(
+                    ssh_obj, [info for node, info in members]))
+            except (exception.SSHConnectFailed,
+                    exception.SSHCommandFailed) as e:
+                LOG.warning(_LW("Could not get the power state of nodes "
+                                "%(nodes)s. Error: %(error)s"),
+                            {'nodes': [n.uuid for n, i in members],
+                             'error': e})
+        return power_states
+
     @task_manager.require_exclusive_lock
     def set_power_state(self, task, pstate):
         """Turn the power on or off.
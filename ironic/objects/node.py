@@ -17,6 +17,7 @@ from ironic.common import exception
 from ironic.common import utils
 from ironic.db import api as db_api
 from ironic.objects import base
+from ironic.objects import port as port_obj
 from ironic.objects import utils as obj_utils
 
 
@@ -31,7 +32,17 @@ class Node(base.IronicObject):
     # Version 1.6: Add reserve() and release()
     # Version 1.7: Add conductor_affinity
     # Version 1.8: Add maintenance_reason
-    VERSION = '1.8'
+    # Version 1.9: Add filters to reserve()
+    # Version 1.10: Add get_by_port_addresses()
+    # Version 1.11: Add get_with_ports() and reserve_with_ports()
+    # Version 1.12: Add touch_agent_heartbeat()
+    # Version 1.13: Add use_slave to get(), get_by_id(), get_by_uuid(),
+    #               get_by_instance_uuid() and list()
+    # Version 1.14: Add create_bulk()
+    # Version 1.15: Add fields to list()
+    # Version 1.16: Add get_agent_heartbeat()
+    # Version 1.17: Add use_slave to get_agent_heartbeat()
+    VERSION = '1.17'
 
     dbapi = db_api.get_instance()
 
@@ -76,64 +87,148 @@ class Node(base.IronicObject):
             'extra': obj_utils.dict_or_none,
             }
 
+    # Fields stored as JSON in the database. They are only decoded when
+    # they are first accessed.
+    _json_fields = ('driver_info', 'instance_info', 'properties', 'extra')
+
+    def __init__(self, context, **kwargs):
+        # Maps the JSON fields which have not been decoded yet to the
+        # database entity holding them.
+        self._pending_json = {}
+        super(Node, self).__init__(context, **kwargs)
+
     @staticmethod
-    def _from_db_object(node, db_node):
-        """Converts a database entity to a formal object."""
-        for field in node.fields:
-            node[field] = db_node[field]
+    def _from_db_object(node, db_node, fields=None):
+        """Converts a database entity to a formal object.
+
+        :param fields: the fields to set, all of them by default. The
+                       other fields are left unset.
+        """
+        for field in (node.fields if fields is None else fields):
+            if field in Node._json_fields:
+                node._pending_json[field] = db_node
+            else:
+                node[field] = db_node[field]
         node.obj_reset_changes()
         return node
 
+    def obj_load_attr(self, attrname):
+        """Decode a JSON field from the database entity on first access."""
+        try:
+            db_node = self._pending_json.pop(attrname)
+        except KeyError:
+            return super(Node, self).obj_load_attr(attrname)
+        # Set the value directly, so the field isn't marked as changed
+        setattr(self, base.get_attrname(attrname),
+                self.fields[attrname](db_node[attrname]))
+
+    def _load_pending_json(self):
+        for field in list(self._pending_json):
+            getattr(self, field)
+        self._pending_json.clear()
+
+    def obj_attr_is_set(self, attrname):
+        return (attrname in self._pending_json or
+                super(Node, self).obj_attr_is_set(attrname))
+
+    def __contains__(self, name):
+        return (name in self._pending_json or
+                super(Node, self).__contains__(name))
+
+    def iteritems(self):
+        self._load_pending_json()
+        return super(Node, self).iteritems()
+
+    def obj_to_primitive(self):
+        self._load_pending_json()
+        return super(Node, self).obj_to_primitive()
+
     @base.remotable_classmethod
-    def get(cls, context, node_id):
+    def get(cls, context, node_id, use_slave=False):
         """Find a node based on its id or uuid and return a Node object.
 
         :param node_id: the id *or* uuid of a node.
+        :param use_slave: whether the node may be read from the read-only
+                          slave database, if one is configured.
         :returns: a :class:`Node` object.
         """
         if utils.is_int_like(node_id):
-            return cls.get_by_id(context, node_id)
+            return cls.get_by_id(context, node_id, use_slave=use_slave)
         elif utils.is_uuid_like(node_id):
-            return cls.get_by_uuid(context, node_id)
+            return cls.get_by_uuid(context, node_id, use_slave=use_slave)
         else:
             raise exception.InvalidIdentity(identity=node_id)
 
     @base.remotable_classmethod
-    def get_by_id(cls, context, node_id):
+    def get_by_id(cls, context, node_id, use_slave=False):
         """Find a node based on its integer id and return a Node object.
 
         :param node_id: the id of a node.
+        :param use_slave: whether the node may be read from the read-only
+                          slave database, if one is configured.
         :returns: a :class:`Node` object.
         """
-        db_node = cls.dbapi.get_node_by_id(node_id)
+        db_node = cls.dbapi.get_node_by_id(node_id, use_slave=use_slave)
         node = Node._from_db_object(cls(context), db_node)
         return node
 
     @base.remotable_classmethod
-    def get_by_uuid(cls, context, uuid):
+    def get_by_uuid(cls, context, uuid, use_slave=False):
         """Find a node based on uuid and return a Node object.
 
         :param uuid: the uuid of a node.
+        :param use_slave: whether the node may be read from the read-only
+                          slave database, if one is configured.
         :returns: a :class:`Node` object.
         """
-        db_node = cls.dbapi.get_node_by_uuid(uuid)
+        db_node = cls.dbapi.get_node_by_uuid(uuid, use_slave=use_slave)
         node = Node._from_db_object(cls(context), db_node)
         return node
 
     @base.remotable_classmethod
-    def get_by_instance_uuid(cls, context, instance_uuid):
+    def get_by_instance_uuid(cls, context, instance_uuid, use_slave=False):
         """Find a node based on the instance uuid and return a Node object.
 
         :param uuid: the uuid of the instance.
+        :param use_slave: whether the node may be read from the read-only
+                          slave database, if one is configured.
         :returns: a :class:`Node` object.
         """
-        db_node = cls.dbapi.get_node_by_instance(instance_uuid)
+        db_node = cls.dbapi.get_node_by_instance(instance_uuid,
+                                                 use_slave=use_slave)
+        node = Node._from_db_object(cls(context), db_node)
+        return node
+
+    @base.remotable_classmethod
+    def get_with_ports(cls, context, node_id):
+        """Find a node and its ports, in a single database query.
+
+        :param node_id: the id *or* uuid of a node.
+        :returns: a tuple of a :class:`Node` object and a list of
+                  :class:`ironic.objects.port.Port` objects.
+        """
+        db_node, db_ports = cls.dbapi.get_node_with_ports(node_id)
+        node = Node._from_db_object(cls(context), db_node)
+        ports = port_obj.Port._from_db_object_list(db_ports, port_obj.Port,
+                                                   context)
+        return node, ports
+
+    @base.remotable_classmethod
+    def get_by_port_addresses(cls, context, addresses):
+        """Find the node which has ports with the given MAC addresses.
+
+        :param addresses: list of port MAC addresses.
+        :returns: a :class:`Node` object.
+        :raises: NodeNotFound if the addresses match no ports, or ports
+                 of several nodes.
+        """
+        db_node = cls.dbapi.get_node_by_port_addresses(addresses)
         node = Node._from_db_object(cls(context), db_node)
         return node
 
     @base.remotable_classmethod
     def list(cls, context, limit=None, marker=None, sort_key=None,
-             sort_dir=None, filters=None):
+             sort_dir=None, filters=None, use_slave=False, fields=None):
         """Return a list of Node objects.
 
         :param context: Security context.
@@ -142,16 +237,33 @@ class Node(base.IronicObject):
         :param sort_key: column to sort results by.
         :param sort_dir: direction to sort. "asc" or "desc".
         :param filters: Filters to apply.
+        :param use_slave: whether the nodes may be read from the read-only
+                          slave database, if one is configured.
+        :param fields: the fields to load, all of them by default. Only
+                       their columns are read from the database, and the
+                       other fields of the nodes are left unset.
         :returns: a list of :class:`Node` object.
 
         """
-        db_nodes = cls.dbapi.get_node_list(filters=filters, limit=limit,
-                                           marker=marker, sort_key=sort_key,
-                                           sort_dir=sort_dir)
-        return [Node._from_db_object(cls(context), obj) for obj in db_nodes]
+        if fields is None:
+            db_nodes = cls.dbapi.get_node_list(filters=filters, limit=limit,
+                                               marker=marker,
+                                               sort_key=sort_key,
+                                               sort_dir=sort_dir,
+                                               use_slave=use_slave)
+        else:
+            rows = cls.dbapi.get_nodeinfo_list(columns=fields,
+                                               filters=filters, limit=limit,
+                                               marker=marker,
+                                               sort_key=sort_key,
+                                               sort_dir=sort_dir,
+                                               use_slave=use_slave)
+            db_nodes = [dict(zip(fields, row)) for row in rows]
+        return [Node._from_db_object(cls(context), obj, fields)
+                for obj in db_nodes]
 
     @base.remotable_classmethod
-    def reserve(cls, context, tag, node_id):
+    def reserve(cls, context, tag, node_id, filters=None):
         """Get and reserve a node.
 
         To prevent other ManagerServices from manipulating the given
@@ -160,14 +272,43 @@ class Node(base.IronicObject):
         :param context: Security context.
         :param tag: A string uniquely identifying the reservation holder.
         :param node_id: A node id or uuid.
+        :param filters: Filters the node must match in order to be reserved.
+                        See :meth:`ironic.db.api.Connection.reserve_node`.
         :raises: NodeNotFound if the node is not found.
+        :raises: NodeFiltersNotMatched if the node does not match the
+                 filters.
         :returns: a :class:`Node` object.
 
         """
-        db_node = cls.dbapi.reserve_node(tag, node_id)
+        db_node = cls.dbapi.reserve_node(tag, node_id, filters=filters)
         node = Node._from_db_object(cls(context), db_node)
         return node
 
+    @base.remotable_classmethod
+    def reserve_with_ports(cls, context, tag, node_id, filters=None):
+        """Get and reserve a node, and load its ports.
+
+        The node and its ports are read in a single database query.
+
+        :param context: Security context.
+        :param tag: A string uniquely identifying the reservation holder.
+        :param node_id: A node id or uuid.
+        :param filters: Filters the node must match in order to be reserved.
+                        See :meth:`ironic.db.api.Connection.reserve_node`.
+        :raises: NodeNotFound if the node is not found.
+        :raises: NodeFiltersNotMatched if the node does not match the
+                 filters.
+        :returns: a tuple of a :class:`Node` object and a list of
+                  :class:`ironic.objects.port.Port` objects.
+
+        """
+        db_node, db_ports = cls.dbapi.reserve_node_with_ports(
+            tag, node_id, filters=filters)
+        node = Node._from_db_object(cls(context), db_node)
+        ports = port_obj.Port._from_db_object_list(db_ports, port_obj.Port,
+                                                   context)
+        return node, ports
+
     @base.remotable_classmethod
     def release(cls, context, tag, node_id):
         """Release the reservation on a node.
@@ -201,6 +342,35 @@ class Node(base.IronicObject):
         db_node = self.dbapi.create_node(values)
         self._from_db_object(self, db_node)
 
+    @base.remotable_classmethod
+    def create_bulk(cls, context, nodes_values):
+        """Create many nodes, and their ports, in a single transaction.
+
+        :param context: Security context.
+        :param nodes_values: a list of dicts of node fields. Each dict
+                             may contain a 'ports' item: a list of dicts
+                             of port fields, without node_id.
+        :returns: a list with, for each item of nodes_values, either a
+                  tuple of the new :class:`Node` object and the list of
+                  its new :class:`ironic.objects.port.Port` objects, or
+                  the exception explaining why the node was not created.
+                  See :meth:`ironic.db.api.Connection.create_nodes`.
+        :raises: Conflict if conflicting nodes or ports are created
+                 concurrently; then no node is created.
+        """
+        results = []
+        for result in cls.dbapi.create_nodes(nodes_values):
+            if isinstance(result, Exception):
+                results.append(result)
+                continue
+            db_node, db_ports = result
+            node = Node._from_db_object(cls(context), db_node)
+            ports = port_obj.Port._from_db_object_list(db_ports,
+                                                       port_obj.Port,
+                                                       context)
+            results.append((node, ports))
+        return results
+
     @base.remotable
     def destroy(self, context=None):
         """Delete the Node from the DB.
@@ -248,6 +418,44 @@ class Node(base.IronicObject):
         """
         current = self.__class__.get_by_uuid(self._context, self.uuid)
         for field in self.fields:
-            if (hasattr(self, base.get_attrname(field)) and
+            if field in self._pending_json:
+                if field in current._pending_json:
+                    # Not decoded yet, decode it from the new entity
+                    self._pending_json[field] = current._pending_json[field]
+                    continue
+                del self._pending_json[field]
+                self[field] = current[field]
+            elif (hasattr(self, base.get_attrname(field)) and
                     self[field] != current[field]):
                 self[field] = current[field]
+
+    @base.remotable
+    def touch_agent_heartbeat(self, context=None):
+        """Record a heartbeat from the deploy agent running on this Node.
+
+        This does not require the Node to be reserved.
+
+        :param context: Security context. NOTE: This should only
+                        be used internally by the indirection_api.
+                        Unfortunately, RPC requires context as the first
+                        argument, even though we don't use it.
+                        A context should be set when instantiating the
+                        object, e.g.: Node(context)
+        """
+        self.dbapi.touch_agent_heartbeat(self.id)
+
+    @base.remotable
+    def get_agent_heartbeat(self, context=None, use_slave=False):
+        """Return when the deploy agent on this Node last heartbeated.
+
+        :param context: Security context. NOTE: This should only
+                        be used internally by the indirection_api.
+                        Unfortunately, RPC requires context as the first
+                        argument, even though we don't use it.
+                        A context should be set when instantiating the
+                        object, e.g.: Node(context)
+        :param use_slave: whether the heartbeat may be read from the
+                          read-only slave database, if one is configured.
+        :returns: A datetime, or None if the agent never heartbeated.
+        """
+        return self.dbapi.get_agent_heartbeat(self.id, use_slave=use_slave)
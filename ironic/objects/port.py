@@ -27,7 +27,10 @@ class Port(base.IronicObject):
     # Version 1.2: Add create() and destroy()
     # Version 1.3: Add list()
     # Version 1.4: Add list_by_node_id()
-    VERSION = '1.4'
+    # Version 1.5: Add use_slave to get(), get_by_id(), get_by_uuid(),
+    #              get_by_address(), list() and list_by_node_id()
+    # Version 1.6: Add fields to list() and list_by_node_id()
+    VERSION = '1.6'
 
     dbapi = dbapi.get_instance()
 
@@ -40,73 +43,99 @@ class Port(base.IronicObject):
     }
 
     @staticmethod
-    def _from_db_object(port, db_port):
-        """Converts a database entity to a formal object."""
-        for field in port.fields:
+    def _from_db_object(port, db_port, fields=None):
+        """Converts a database entity to a formal object.
+
+        :param fields: the fields to set, all of them by default. The
+                       other fields are left unset.
+        """
+        for field in (port.fields if fields is None else fields):
             port[field] = db_port[field]
 
         port.obj_reset_changes()
         return port
 
     @staticmethod
-    def _from_db_object_list(db_objects, cls, context):
+    def _from_db_object_list(db_objects, cls, context, fields=None):
         """Converts a list of database entities to a list of formal objects."""
-        return [Port._from_db_object(cls(context), obj) for obj in db_objects]
+        return [Port._from_db_object(cls(context), obj, fields)
+                for obj in db_objects]
+
+    @classmethod
+    def _list_fields(cls, context, fields, filters=None, limit=None,
+                     marker=None, sort_key=None, sort_dir=None,
+                     use_slave=False):
+        rows = cls.dbapi.get_portinfo_list(columns=fields, filters=filters,
+                                           limit=limit, marker=marker,
+                                           sort_key=sort_key,
+                                           sort_dir=sort_dir,
+                                           use_slave=use_slave)
+        return Port._from_db_object_list([dict(zip(fields, row))
+                                          for row in rows],
+                                         cls, context, fields)
 
     @base.remotable_classmethod
-    def get(cls, context, port_id):
+    def get(cls, context, port_id, use_slave=False):
         """Find a port based on its id or uuid and return a Port object.
 
         :param port_id: the id *or* uuid of a port.
+        :param use_slave: whether the port may be read from the read-only
+                          slave database, if one is configured.
         :returns: a :class:`Port` object.
         """
         if utils.is_int_like(port_id):
-            return cls.get_by_id(context, port_id)
+            return cls.get_by_id(context, port_id, use_slave=use_slave)
         elif utils.is_uuid_like(port_id):
-            return cls.get_by_uuid(context, port_id)
+            return cls.get_by_uuid(context, port_id, use_slave=use_slave)
         elif utils.is_valid_mac(port_id):
-            return cls.get_by_address(context, port_id)
+            return cls.get_by_address(context, port_id, use_slave=use_slave)
         else:
             raise exception.InvalidIdentity(identity=port_id)
 
     @base.remotable_classmethod
-    def get_by_id(cls, context, port_id):
+    def get_by_id(cls, context, port_id, use_slave=False):
         """Find a port based on its integer id and return a Port object.
 
         :param port_id: the id of a port.
+        :param use_slave: whether the port may be read from the read-only
+                          slave database, if one is configured.
         :returns: a :class:`Port` object.
         """
-        db_port = cls.dbapi.get_port_by_id(port_id)
+        db_port = cls.dbapi.get_port_by_id(port_id, use_slave=use_slave)
         port = Port._from_db_object(cls(context), db_port)
         return port
 
     @base.remotable_classmethod
-    def get_by_uuid(cls, context, uuid):
+    def get_by_uuid(cls, context, uuid, use_slave=False):
         """Find a port based on uuid and return a :class:`Port` object.
 
         :param uuid: the uuid of a port.
         :param context: Security context
+        :param use_slave: whether the port may be read from the read-only
+                          slave database, if one is configured.
         :returns: a :class:`Port` object.
         """
-        db_port = cls.dbapi.get_port_by_uuid(uuid)
+        db_port = cls.dbapi.get_port_by_uuid(uuid, use_slave=use_slave)
         port = Port._from_db_object(cls(context), db_port)
         return port
 
     @base.remotable_classmethod
-    def get_by_address(cls, context, address):
+    def get_by_address(cls, context, address, use_slave=False):
         """Find a port based on address and return a :class:`Port` object.
 
         :param address: the address of a port.
         :param context: Security context
+        :param use_slave: whether the port may be read from the read-only
+                          slave database, if one is configured.
         :returns: a :class:`Port` object.
         """
-        db_port = cls.dbapi.get_port_by_address(address)
+        db_port = cls.dbapi.get_port_by_address(address, use_slave=use_slave)
         port = Port._from_db_object(cls(context), db_port)
         return port
 
     @base.remotable_classmethod
     def list(cls, context, limit=None, marker=None,
-             sort_key=None, sort_dir=None):
+             sort_key=None, sort_dir=None, use_slave=False, fields=None):
         """Return a list of Port objects.
 
         :param context: Security context.
@@ -114,18 +143,29 @@ class Port(base.IronicObject):
         :param marker: pagination marker for large data sets.
         :param sort_key: column to sort results by.
         :param sort_dir: direction to sort. "asc" or "desc".
+        :param use_slave: whether the ports may be read from the read-only
+                          slave database, if one is configured.
+        :param fields: the fields to load, all of them by default. Only
+                       their columns are read from the database, and the
+                       other fields of the ports are left unset.
         :returns: a list of :class:`Port` object.
 
         """
+        if fields is not None:
+            return cls._list_fields(context, fields, limit=limit,
+                                    marker=marker, sort_key=sort_key,
+                                    sort_dir=sort_dir, use_slave=use_slave)
         db_ports = cls.dbapi.get_port_list(limit=limit,
                                            marker=marker,
                                            sort_key=sort_key,
-                                           sort_dir=sort_dir)
+                                           sort_dir=sort_dir,
+                                           use_slave=use_slave)
         return Port._from_db_object_list(db_ports, cls, context)
 
     @base.remotable_classmethod
     def list_by_node_id(cls, context, node_id, limit=None, marker=None,
-                        sort_key=None, sort_dir=None):
+                        sort_key=None, sort_dir=None, use_slave=False,
+                        fields=None):
         """Return a list of Port objects associated with a given node ID.
 
         :param context: Security context.
@@ -134,13 +174,25 @@ class Port(base.IronicObject):
         :param marker: pagination marker for large data sets.
         :param sort_key: column to sort results by.
         :param sort_dir: direction to sort. "asc" or "desc".
+        :param use_slave: whether the ports may be read from the read-only
+                          slave database, if one is configured.
+        :param fields: the fields to load, all of them by default. Only
+                       their columns are read from the database, and the
+                       other fields of the ports are left unset.
         :returns: a list of :class:`Port` object.
 
         """
+        if fields is not None:
+            return cls._list_fields(context, fields,
+                                    filters={'node_id': node_id},
+                                    limit=limit, marker=marker,
+                                    sort_key=sort_key, sort_dir=sort_dir,
+                                    use_slave=use_slave)
         db_ports = cls.dbapi.get_ports_by_node_id(node_id, limit=limit,
                                                   marker=marker,
                                                   sort_key=sort_key,
-                                                  sort_dir=sort_dir)
+                                                  sort_dir=sort_dir,
+                                                  use_slave=use_slave)
         return Port._from_db_object_list(db_ports, cls, context)
 
     @base.remotable
@@ -60,6 +60,40 @@ class TestListChassis(api_base.FunctionalTest):
         self.assertIn('extra', data)
         self.assertIn('nodes', data)
 
+    def test_get_one_etag(self):
+        chassis = obj_utils.create_test_chassis(self.context)
+        response = self.get_json('/chassis/%s' % chassis.uuid,
+                                 expect_errors=True)
+        etag = response.headers['ETag']
+
+        response = self.get_json('/chassis/%s' % chassis.uuid,
+                                 headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(304, response.status_int)
+        self.assertEqual(b'', response.body)
+
+        self.dbapi.update_chassis(chassis.id, {'extra': {'foo': 'bar'}})
+        response = self.get_json('/chassis/%s' % chassis.uuid,
+                                 headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(200, response.status_int)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+    def test_collection_etag(self):
+        obj_utils.create_test_chassis(self.context)
+        response = self.get_json('/chassis', expect_errors=True)
+        etag = response.headers['ETag']
+
+        response = self.get_json('/chassis',
+                                 headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(304, response.status_int)
+
+        response = self.get_json('/chassis/detail',
+                                 headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(200, response.status_int)
+
     def test_detail(self):
         chassis = obj_utils.create_test_chassis(self.context)
         data = self.get_json('/chassis/detail')
@@ -20,6 +20,7 @@ import json
 
 import mock
 from oslo.config import cfg
+from oslo import messaging
 from oslo.utils import timeutils
 from six.moves.urllib import parse as urlparse
 from testtools.matchers import HasLength
@@ -145,6 +146,108 @@ class TestListNodes(api_base.FunctionalTest):
         # never expose the chassis_id
         self.assertNotIn('chassis_id', data['nodes'][0])
 
+    def test_fields(self):
+        node = obj_utils.create_test_node(self.context)
+        for path in ('/nodes', '/nodes/detail'):
+            data = self.get_json(
+                path + '?fields=power_state,provision_state,chassis_uuid')
+            self.assertEqual(['chassis_uuid', 'links', 'power_state',
+                              'provision_state', 'uuid'],
+                             sorted(data['nodes'][0]))
+            self.assertEqual(node.uuid, data['nodes'][0]['uuid'])
+
+    def test_fields_only_reads_columns(self):
+        obj_utils.create_test_node(self.context)
+        with mock.patch.object(self.dbapi, 'get_nodeinfo_list',
+                               wraps=self.dbapi.get_nodeinfo_list) as gnl:
+            with mock.patch.object(self.dbapi, 'get_node_list') as gl:
+                self.get_json('/nodes/detail?fields=uuid,driver,extra')
+                self.assertFalse(gl.called)
+            self.assertEqual(['uuid', 'created_at', 'updated_at', 'driver',
+                              'extra'],
+                             gnl.call_args[1]['columns'])
+
+    def test_fields_next_link(self):
+        for id in range(3):
+            obj_utils.create_test_node(self.context, id=id + 1,
+                                       uuid=utils.generate_uuid())
+        data = self.get_json('/nodes?fields=driver&limit=2')
+        self.assertEqual(2, len(data['nodes']))
+        self.assertIn('fields=driver', data['next'])
+        self.assertIn(data['nodes'][-1]['uuid'], data['next'])
+
+    def test_get_one_fields(self):
+        node = obj_utils.create_test_node(self.context)
+        data = self.get_json('/nodes/%s?fields=driver,properties' % node.uuid)
+        self.assertEqual(['driver', 'links', 'properties', 'uuid'],
+                         sorted(data))
+        self.assertEqual(node.properties, data['properties'])
+
+    def test_get_one_etag(self):
+        node = obj_utils.create_test_node(self.context)
+        with mock.patch.object(self.dbapi, 'get_nodeinfo_list') as mock_gnl:
+            response = self.get_json('/nodes/%s' % node.uuid,
+                                     expect_errors=True)
+            self.assertFalse(mock_gnl.called)
+        self.assertEqual(200, response.status_int)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        with mock.patch.object(objects.Node, 'get_by_uuid') as mock_get:
+            response = self.get_json('/nodes/%s' % node.uuid,
+                                     headers={'If-None-Match': etag},
+                                     expect_errors=True)
+            self.assertFalse(mock_get.called)
+        self.assertEqual(304, response.status_int)
+        self.assertEqual(b'', response.body)
+
+    def test_get_one_etag_changes(self):
+        node = obj_utils.create_test_node(self.context)
+        response = self.get_json('/nodes/%s' % node.uuid, expect_errors=True)
+        etag = response.headers['ETag']
+
+        response = self.get_json('/nodes/%s?fields=driver' % node.uuid,
+                                 headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(200, response.status_int)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+        self.dbapi.update_node(node.id, {'extra': {'foo': 'bar'}})
+        response = self.get_json('/nodes/%s' % node.uuid,
+                                 headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual({'foo': 'bar'}, response.json['extra'])
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+    def test_get_one_etag_not_found(self):
+        response = self.get_json('/nodes/%s' % utils.generate_uuid(),
+                                 headers={'If-None-Match': '*'},
+                                 expect_errors=True)
+        self.assertEqual(404, response.status_int)
+
+    def test_collection_etag(self):
+        obj_utils.create_test_node(self.context)
+        response = self.get_json('/nodes', expect_errors=True)
+        etag = response.headers['ETag']
+
+        response = self.get_json('/nodes', headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(304, response.status_int)
+
+        obj_utils.create_test_node(self.context, id=2,
+                                   uuid=utils.generate_uuid())
+        response = self.get_json('/nodes', headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual(2, len(response.json['nodes']))
+
+    def test_fields_invalid(self):
+        response = self.get_json('/nodes?fields=driver,chassis_id,foo',
+                                 expect_errors=True)
+        self.assertEqual(400, response.status_int)
+        self.assertIn('chassis_id, foo', response.json['error_message'])
+
     def test_detail_against_single(self):
         node = obj_utils.create_test_node(self.context)
         response = self.get_json('/nodes/%s/detail' % node['uuid'],
@@ -163,6 +266,67 @@ class TestListNodes(api_base.FunctionalTest):
         uuids = [n['uuid'] for n in data['nodes']]
         self.assertEqual(sorted(nodes), sorted(uuids))
 
+    def _create_nodes_to_stream(self):
+        chassis = obj_utils.create_test_chassis(self.context)
+        for id in range(5):
+            obj_utils.create_test_node(self.context, id=id + 1,
+                                       uuid=utils.generate_uuid(),
+                                       chassis_id=chassis.id)
+
+    def test_streamed(self):
+        self._create_nodes_to_stream()
+        expected = self.get_json('/nodes/detail?limit=4')
+        self.assertIn('next', expected)
+
+        self.config(collection_stream_threshold=3, group='api')
+        with mock.patch.object(objects.Node, 'list',
+                               wraps=objects.Node.list) as mock_list:
+            response = self.get_json('/nodes/detail?limit=4',
+                                     expect_errors=True)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual(expected, response.json)
+        self.assertNotIn('ETag', response.headers)
+        # read in chunks of at most 3 nodes
+        self.assertEqual([3, 1], [c[0][1] for c in mock_list.call_args_list])
+
+    def test_streamed_last_page(self):
+        self._create_nodes_to_stream()
+        expected = self.get_json('/nodes?limit=10')
+        self.assertNotIn('next', expected)
+
+        self.config(collection_stream_threshold=2, group='api')
+        self.assertEqual(expected, self.get_json('/nodes?limit=10'))
+
+    def test_streamed_fields(self):
+        self._create_nodes_to_stream()
+        path = '/nodes?limit=4&sort_key=uuid&fields=driver,chassis_uuid'
+        expected = self.get_json(path)
+
+        self.config(collection_stream_threshold=3, group='api')
+        self.assertEqual(expected, self.get_json(path))
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_streamed_changes_since(self, mock_utcnow):
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 0)
+        self._create_nodes_to_stream()
+        self.dbapi.destroy_node(5)
+        path = '/nodes?limit=2&changes_since=2000-01-01T00:00:00'
+        expected = self.get_json(path)
+        self.assertEqual(1, len(expected['deleted_nodes']))
+
+        self.config(collection_stream_threshold=1, group='api')
+        self.assertEqual(expected, self.get_json(path))
+
+    def test_not_streamed_xml(self):
+        self._create_nodes_to_stream()
+        self.config(collection_stream_threshold=3, group='api')
+        with mock.patch.object(api_node, '_stream_nodes_collection') as ms:
+            response = self.get_json('/nodes?limit=4',
+                                     headers={'Accept': 'application/xml'},
+                                     expect_errors=True)
+            self.assertFalse(ms.called)
+        self.assertEqual(200, response.status_int)
+
     def test_links(self):
         uuid = utils.generate_uuid()
         obj_utils.create_test_node(self.context, uuid=uuid)
@@ -257,6 +421,22 @@ class TestListNodes(api_base.FunctionalTest):
         self.assertEqual(test_time, prov_up_at)
         self.assertEqual(fake_error, data['last_error'])
         self.assertFalse(data['console_enabled'])
+        self.assertIsNone(data['agent_last_heartbeat'])
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_node_states_agent_heartbeat(self, mock_utcnow):
+        test_time = datetime.datetime(2000, 1, 1, 0, 0)
+        mock_utcnow.return_value = test_time
+        node = obj_utils.create_test_node(self.context)
+        self.dbapi.touch_agent_heartbeat(node.id)
+
+        with mock.patch.object(self.dbapi, 'get_agent_heartbeat',
+                               wraps=self.dbapi.get_agent_heartbeat) as gah:
+            data = self.get_json('/nodes/%s/states' % node.uuid)
+            gah.assert_called_once_with(node.id, use_slave=True)
+        heartbeat = timeutils.parse_isotime(
+                        data['agent_last_heartbeat']).replace(tzinfo=None)
+        self.assertEqual(test_time, heartbeat)
 
     def test_node_by_instance_uuid(self):
         node = obj_utils.create_test_node(self.context,
@@ -409,6 +589,79 @@ class TestListNodes(api_base.FunctionalTest):
         uuids = [n['uuid'] for n in data['nodes']]
         self.assertIn(node.uuid, uuids)
 
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_changes_since(self, mock_utcnow):
+        before = datetime.datetime(2000, 1, 1, 0, 0)
+        since = datetime.datetime(2000, 1, 1, 0, 1)
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 2)
+        obj_utils.create_test_node(self.context, uuid=utils.generate_uuid(),
+                                   created_at=before)
+        created = obj_utils.create_test_node(self.context,
+                                             uuid=utils.generate_uuid(),
+                                             created_at=since)
+        updated = obj_utils.create_test_node(self.context,
+                                             uuid=utils.generate_uuid(),
+                                             created_at=before,
+                                             updated_at=since)
+        deleted = obj_utils.create_test_node(self.context,
+                                             uuid=utils.generate_uuid(),
+                                             created_at=before)
+        self.dbapi.destroy_node(deleted.id)
+
+        for path in ('/nodes', '/nodes/detail'):
+            data = self.get_json(path + '?changes_since=2000-01-01T00:01:00')
+            self.assertEqual(sorted([created.uuid, updated.uuid]),
+                             sorted(n['uuid'] for n in data['nodes']))
+            self.assertEqual([deleted.uuid],
+                             [d['uuid'] for d in data['deleted_nodes']])
+            deleted_at = timeutils.parse_isotime(
+                data['deleted_nodes'][0]['deleted_at']).replace(tzinfo=None)
+            self.assertEqual(mock_utcnow.return_value, deleted_at)
+
+    def test_no_changes_since(self):
+        obj_utils.create_test_node(self.context)
+        data = self.get_json('/nodes')
+        self.assertNotIn('deleted_nodes', data)
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_changes_since_next_link(self, mock_utcnow):
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 2)
+        for id in range(1, 4):
+            obj_utils.create_test_node(self.context, id=id,
+                                       uuid=utils.generate_uuid(),
+                                       created_at=mock_utcnow.return_value)
+        deleted = obj_utils.create_test_node(self.context, id=4,
+                                             uuid=utils.generate_uuid())
+        self.dbapi.destroy_node(deleted.id)
+
+        data = self.get_json('/nodes?changes_since=2000-01-01T00:01:00'
+                             '&limit=2')
+        self.assertEqual(2, len(data['nodes']))
+        self.assertEqual([deleted.uuid],
+                         [d['uuid'] for d in data['deleted_nodes']])
+        self.assertIn('changes_since=2000-01-01T00:01:00', data['next'])
+
+        # The deletions are only listed in the first page
+        data = self.get_json('/nodes?changes_since=2000-01-01T00:01:00'
+                             '&limit=2&marker=%s' % data['nodes'][-1]['uuid'])
+        self.assertEqual(1, len(data['nodes']))
+        self.assertNotIn('deleted_nodes', data)
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_changes_since_too_old(self, mock_utcnow):
+        self.config(node_deletion_log_retention=60, group='database')
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 2)
+        response = self.get_json('/nodes?changes_since=2000-01-01T00:00:59',
+                                 expect_errors=True)
+        self.assertEqual('application/json', response.content_type)
+        self.assertEqual(400, response.status_code)
+        self.assertTrue(response.json['error_message'])
+
+    def test_changes_since_invalid(self):
+        response = self.get_json('/nodes?changes_since=yesterday',
+                                 expect_errors=True)
+        self.assertEqual(400, response.status_code)
+
     def test_get_console_information(self):
         node = obj_utils.create_test_node(self.context)
         expected_console_info = {'test': 'test-data'}
@@ -990,6 +1243,279 @@ class TestPost(api_base.FunctionalTest):
         self.assertFalse(get_methods_mock.called)
 
 
+class TestBulkPost(api_base.FunctionalTest):
+
+    def setUp(self):
+        super(TestBulkPost, self).setUp()
+        self.chassis = obj_utils.create_test_chassis(self.context)
+        p = mock.patch.object(rpcapi.ConductorAPI, 'get_topic_for_driver')
+        self.mock_gtfd = p.start()
+        self.mock_gtfd.return_value = 'test-topic'
+        self.addCleanup(p.stop)
+
+    def _get_node(self, **kw):
+        node = {'uuid': utils.generate_uuid(), 'driver': 'fake',
+                'chassis_uuid': self.chassis.uuid}
+        node.update(kw)
+        return node
+
+    def test_bulk_create(self):
+        nodes = [self._get_node(ports=[{'address': '52:54:00:cf:2d:01'},
+                                       {'address': '52:54:00:cf:2d:02'}],
+                                extra={'foo': 'bar'}),
+                 self._get_node()]
+
+        response = self.post_json('/nodes/bulk', nodes)
+
+        self.assertEqual(200, response.status_int)
+        results = response.json['nodes']
+        self.assertEqual([n['uuid'] for n in nodes],
+                         [r['uuid'] for r in results])
+        self.assertNotIn('error', results[0])
+        self.assertThat(results[0]['port_uuids'], HasLength(2))
+        self.assertEqual([], results[1]['port_uuids'])
+        self.assertIn('links', results[0])
+        result = self.get_json('/nodes/%s' % nodes[0]['uuid'])
+        self.assertEqual({'foo': 'bar'}, result['extra'])
+        self.assertEqual(self.chassis.uuid, result['chassis_uuid'])
+        result = self.get_json('/nodes/%s/ports' % nodes[0]['uuid'])
+        self.assertEqual(sorted(results[0]['port_uuids']),
+                         sorted(p['uuid'] for p in result['ports']))
+        # Each driver is only checked once
+        self.mock_gtfd.assert_called_once_with('fake')
+
+    def test_bulk_create_errors(self):
+        existing = obj_utils.create_test_node(self.context)
+
+        def get_topic_for_driver(driver_name):
+            if driver_name == 'bad-driver':
+                raise exception.DriverNotFound(driver_name=driver_name)
+            return 'test-topic'
+
+        self.mock_gtfd.side_effect = get_topic_for_driver
+        nodes = [self._get_node(uuid=existing.uuid),
+                 self._get_node(driver='bad-driver'),
+                 self._get_node(chassis_uuid=utils.generate_uuid()),
+                 self._get_node(ports=[{'address': '52:54:00:cf:2d:01'}]),
+                 self._get_node(ports=[{'address': '52:54:00:cf:2d:01'}])]
+
+        response = self.post_json('/nodes/bulk', nodes)
+
+        self.assertEqual(200, response.status_int)
+        results = response.json['nodes']
+        self.assertEqual([n['uuid'] for n in nodes],
+                         [r['uuid'] for r in results])
+        for index in (0, 1, 2, 4):
+            self.assertTrue(results[index]['error'])
+            self.assertNotIn('links', results[index])
+        self.assertNotIn('error', results[3])
+        self.assertThat(self.get_json('/nodes')['nodes'], HasLength(2))
+
+    def test_bulk_create_too_many(self):
+        self.config(max_limit=1, group='api')
+        nodes = [self._get_node(), self._get_node()]
+
+        response = self.post_json('/nodes/bulk', nodes, expect_errors=True)
+
+        self.assertEqual(400, response.status_int)
+        self.assertTrue(response.json['error_message'])
+        self.assertThat(self.get_json('/nodes')['nodes'], HasLength(0))
+
+    def test_bulk_create_missing_driver(self):
+        node = self._get_node()
+        del node['driver']
+
+        response = self.post_json('/nodes/bulk', [node], expect_errors=True)
+
+        self.assertEqual(400, response.status_int)
+        self.assertThat(self.get_json('/nodes')['nodes'], HasLength(0))
+
+
+class TestNodeStatistics(api_base.FunctionalTest):
+
+    def setUp(self):
+        super(TestNodeStatistics, self).setUp()
+        self.addCleanup(api_node._NODE_STATISTICS.update,
+                        {'rows': None, 'expires_at': 0})
+        api_node._NODE_STATISTICS.update({'rows': None, 'expires_at': 0})
+
+    def test_statistics(self):
+        for i in range(2):
+            obj_utils.create_test_node(self.context,
+                                       uuid=utils.generate_uuid(),
+                                       provision_state=states.ACTIVE,
+                                       power_state=states.POWER_ON,
+                                       instance_uuid=utils.generate_uuid())
+        obj_utils.create_test_node(self.context,
+                                   uuid=utils.generate_uuid(),
+                                   driver='fake-2',
+                                   power_state=states.POWER_OFF,
+                                   maintenance=True)
+
+        data = self.get_json('/nodes/statistics')
+
+        self.assertEqual(3, data['total'])
+        self.assertEqual({states.ACTIVE: 2, 'None': 1},
+                         data['provision_state'])
+        self.assertEqual({states.POWER_ON: 2, states.POWER_OFF: 1},
+                         data['power_state'])
+        self.assertEqual(1, data['maintenance'])
+        self.assertEqual(2, data['associated'])
+        self.assertEqual(['fake', 'fake-2'], sorted(data['drivers']))
+        self.assertEqual({'total': 2,
+                          'provision_state': {states.ACTIVE: 2},
+                          'power_state': {states.POWER_ON: 2},
+                          'maintenance': 0, 'associated': 2},
+                         data['drivers']['fake'])
+        self.assertEqual({'total': 1,
+                          'provision_state': {'None': 1},
+                          'power_state': {states.POWER_OFF: 1},
+                          'maintenance': 1, 'associated': 0},
+                         data['drivers']['fake-2'])
+
+    def test_statistics_no_nodes(self):
+        data = self.get_json('/nodes/statistics')
+        self.assertEqual(0, data['total'])
+        self.assertEqual({}, data['drivers'])
+
+    def test_statistics_uses_slave(self):
+        with mock.patch.object(self.dbapi, 'get_node_statistics',
+                               return_value=[]) as mock_gns:
+            self.get_json('/nodes/statistics')
+            mock_gns.assert_called_once_with(use_slave=True)
+
+    def test_statistics_not_cached(self):
+        with mock.patch.object(self.dbapi, 'get_node_statistics',
+                               return_value=[]) as mock_gns:
+            self.get_json('/nodes/statistics')
+            self.get_json('/nodes/statistics')
+            self.assertEqual(2, mock_gns.call_count)
+
+    @mock.patch.object(api_node.time, 'time')
+    def test_statistics_cached(self, mock_time):
+        self.config(node_statistics_cache_ttl=60, group='api')
+        rows = [('fake', None, states.POWER_OFF, False, False, 1)]
+        with mock.patch.object(self.dbapi, 'get_node_statistics',
+                               return_value=rows) as mock_gns:
+            mock_time.return_value = 100
+            self.get_json('/nodes/statistics')
+            mock_time.return_value = 159
+            data = self.get_json('/nodes/statistics')
+            self.assertEqual(1, data['total'])
+            self.assertEqual(1, mock_gns.call_count)
+            mock_time.return_value = 160
+            self.get_json('/nodes/statistics')
+            self.assertEqual(2, mock_gns.call_count)
+
+    def test_statistics_from_chassis(self):
+        chassis = obj_utils.create_test_chassis(self.context)
+        response = self.get_json('/chassis/%s/nodes/statistics'
+                                 % chassis.uuid, expect_errors=True)
+        self.assertEqual(403, response.status_int)
+
+
+class TestBulkStates(api_base.FunctionalTest):
+
+    def setUp(self):
+        super(TestBulkStates, self).setUp()
+        self.nodes = [
+            obj_utils.create_test_node(self.context, id=i + 1,
+                                       uuid=utils.generate_uuid(),
+                                       driver=driver)
+            for i, driver in enumerate(['fake', 'fake', 'other'])]
+
+        def get_topic_for(node):
+            if node.driver == 'bad-driver':
+                raise exception.NoValidHost(reason='no conductor')
+            return 'test-topic.%s' % node.driver
+
+        p = mock.patch.object(rpcapi.ConductorAPI, 'get_topic_for')
+        self.mock_gtf = p.start()
+        self.mock_gtf.side_effect = get_topic_for
+        self.addCleanup(p.stop)
+        p = mock.patch.object(rpcapi.ConductorAPI, 'change_node_states')
+        self.mock_cns = p.start()
+        self.addCleanup(p.stop)
+
+    def test_bulk_states(self):
+        self.mock_cns.side_effect = lambda context, node_ids, target, topic: (
+            dict((node_id, None) for node_id in node_ids))
+        uuids = [n.uuid for n in self.nodes]
+
+        response = self.put_json('/nodes/bulk_states',
+                                 {'nodes': uuids, 'target': states.POWER_OFF})
+
+        self.assertEqual(202, response.status_int)
+        self.assertEqual([{'uuid': u} for u in uuids],
+                         response.json['nodes'])
+        # One call for each conductor
+        self.assertEqual(2, self.mock_cns.call_count)
+        self.mock_cns.assert_any_call(mock.ANY, uuids[:2], states.POWER_OFF,
+                                      'test-topic.fake')
+        self.mock_cns.assert_any_call(mock.ANY, uuids[2:], states.POWER_OFF,
+                                      'test-topic.other')
+
+    def test_bulk_states_errors(self):
+        bad_node = obj_utils.create_test_node(self.context, id=4,
+                                              uuid=utils.generate_uuid(),
+                                              driver='bad-driver')
+
+        def change_node_states(context, node_ids, target, topic):
+            if topic == 'test-topic.other':
+                raise exception.IronicException('rpc failure')
+            return {node_ids[0]: None, node_ids[1]: 'node locked'}
+
+        self.mock_cns.side_effect = change_node_states
+        uuids = [n.uuid for n in self.nodes] + [bad_node.uuid,
+                                                 utils.generate_uuid()]
+
+        response = self.put_json('/nodes/bulk_states',
+                                 {'nodes': uuids, 'target': states.ACTIVE})
+
+        self.assertEqual(202, response.status_int)
+        results = response.json['nodes']
+        self.assertEqual(uuids, [r['uuid'] for r in results])
+        self.assertNotIn('error', results[0])
+        self.assertEqual('node locked', results[1]['error'])
+        self.assertIn('rpc failure', results[2]['error'])
+        self.assertIn('no conductor', results[3]['error'])
+        self.assertIn(uuids[4], results[4]['error'])
+
+    def test_bulk_states_timeout(self):
+        def change_node_states(context, node_ids, target, topic):
+            if topic == 'test-topic.other':
+                raise messaging.MessagingTimeout()
+            return dict((node_id, None) for node_id in node_ids)
+
+        self.mock_cns.side_effect = change_node_states
+        uuids = [n.uuid for n in self.nodes]
+
+        response = self.put_json('/nodes/bulk_states',
+                                 {'nodes': uuids, 'target': states.POWER_ON})
+
+        self.assertEqual(202, response.status_int)
+        self.assertEqual([{'uuid': uuids[0]}, {'uuid': uuids[1]},
+                          {'uuid': uuids[2], 'unknown': True}],
+                         response.json['nodes'])
+
+    def test_bulk_states_invalid_target(self):
+        response = self.put_json('/nodes/bulk_states',
+                                 {'nodes': [self.nodes[0].uuid],
+                                  'target': 'not-supported'},
+                                 expect_errors=True)
+        self.assertEqual(400, response.status_int)
+        self.assertFalse(self.mock_cns.called)
+
+    def test_bulk_states_too_many(self):
+        self.config(max_limit=2, group='api')
+        response = self.put_json('/nodes/bulk_states',
+                                 {'nodes': [n.uuid for n in self.nodes],
+                                  'target': states.POWER_ON},
+                                 expect_errors=True)
+        self.assertEqual(400, response.status_int)
+        self.assertFalse(self.mock_cns.called)
+
+
 class TestDelete(api_base.FunctionalTest):
 
     def setUp(self):
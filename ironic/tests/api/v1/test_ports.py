@@ -28,6 +28,7 @@ from ironic.api.controllers.v1 import port as api_port
 from ironic.common import exception
 from ironic.common import utils
 from ironic.conductor import rpcapi
+from ironic import objects
 from ironic.tests.api import base as api_base
 from ironic.tests.api import utils as apiutils
 from ironic.tests import base
@@ -91,6 +92,74 @@ class TestListPorts(api_base.FunctionalTest):
         # never expose the node_id
         self.assertNotIn('node_id', data['ports'][0])
 
+    def test_fields(self):
+        port = obj_utils.create_test_port(self.context, node_id=self.node.id)
+        for path in ('/ports', '/ports/detail'):
+            data = self.get_json(path + '?fields=address,node_uuid')
+            self.assertEqual(['address', 'links', 'node_uuid', 'uuid'],
+                             sorted(data['ports'][0]))
+            self.assertEqual(port.uuid, data['ports'][0]['uuid'])
+            self.assertEqual(self.node.uuid, data['ports'][0]['node_uuid'])
+
+    def test_fields_by_node(self):
+        port = obj_utils.create_test_port(self.context, node_id=self.node.id)
+        data = self.get_json('/ports?node_uuid=%s&fields=extra'
+                             % self.node.uuid)
+        self.assertEqual([{'uuid': port.uuid, 'extra': port.extra}],
+                         [{'uuid': p['uuid'], 'extra': p['extra']}
+                          for p in data['ports']])
+        self.assertNotIn('address', data['ports'][0])
+
+    def test_get_one_fields(self):
+        port = obj_utils.create_test_port(self.context, node_id=self.node.id)
+        data = self.get_json('/ports/%s?fields=address' % port.uuid)
+        self.assertEqual(['address', 'links', 'uuid'], sorted(data))
+
+    def test_get_one_etag(self):
+        port = obj_utils.create_test_port(self.context, node_id=self.node.id)
+        with mock.patch.object(self.dbapi, 'get_portinfo_list') as mock_gpl:
+            response = self.get_json('/ports/%s' % port.uuid,
+                                     expect_errors=True)
+            self.assertFalse(mock_gpl.called)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        with mock.patch.object(objects.Port, 'get_by_uuid') as mock_get:
+            response = self.get_json('/ports/%s' % port.uuid,
+                                     headers={'If-None-Match': etag},
+                                     expect_errors=True)
+            self.assertFalse(mock_get.called)
+        self.assertEqual(304, response.status_int)
+        self.assertEqual(b'', response.body)
+
+        self.dbapi.update_port(port.id, {'extra': {'foo': 'bar'}})
+        response = self.get_json('/ports/%s' % port.uuid,
+                                 headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(200, response.status_int)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+    def test_collection_etag(self):
+        port = obj_utils.create_test_port(self.context, node_id=self.node.id)
+        response = self.get_json('/ports', expect_errors=True)
+        etag = response.headers['ETag']
+
+        response = self.get_json('/ports', headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(304, response.status_int)
+
+        self.dbapi.destroy_port(port.uuid)
+        response = self.get_json('/ports', headers={'If-None-Match': etag},
+                                 expect_errors=True)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual([], response.json['ports'])
+
+    def test_fields_invalid(self):
+        response = self.get_json('/ports?fields=address,node_id',
+                                 expect_errors=True)
+        self.assertEqual(400, response.status_int)
+        self.assertIn('node_id', response.json['error_message'])
+
     def test_detail_against_single(self):
         port = obj_utils.create_test_port(self.context, node_id=self.node.id)
         response = self.get_json('/ports/%s/detail' % port.uuid,
@@ -196,3 +196,18 @@ class TestBooleanType(base.TestCase):
         v = types.BooleanType()
         self.assertRaises(exception.Invalid, v.validate, "invalid-value")
         self.assertRaises(exception.Invalid, v.validate, "01")
+
+
+class TestListType(base.TestCase):
+
+    def test_list_type(self):
+        v = types.ListType()
+        self.assertEqual(['uuid'], v.validate('uuid'))
+        self.assertEqual(['uuid', 'power_state', 'provision_state'],
+                         v.validate('uuid, power_state,provision_state'))
+
+    def test_list_type_distinct_non_empty(self):
+        v = types.ListType()
+        self.assertEqual(['uuid', 'driver'],
+                         v.validate(',uuid,driver,,uuid,'))
+        self.assertEqual([], v.validate(''))
@@ -13,6 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+import mock
+from oslo.utils import timeutils
 import wsme
 
 from ironic.api.controllers.v1 import utils
@@ -39,6 +43,64 @@ class TestApiUtils(base.TestCase):
         # zero
         self.assertRaises(wsme.exc.ClientSideError, utils.validate_limit, 0)
 
+    def test_validate_fields(self):
+        self.assertEqual(['a', 'b'],
+                         utils.validate_fields(['a', 'b'], ['a', 'b', 'c']))
+        self.assertRaises(wsme.exc.ClientSideError,
+                          utils.validate_fields, ['a', 'd'], ['a', 'b'])
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_validate_changes_since(self, mock_utcnow):
+        self.config(node_deletion_log_retention=60, group='database')
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 1)
+
+        since = datetime.datetime(2000, 1, 1, 0, 0)
+        self.assertEqual(since, utils.validate_changes_since(since))
+
+        # normalized to a naive UTC datetime
+        since = timeutils.parse_isotime('2000-01-01T01:00:30+01:00')
+        self.assertEqual(datetime.datetime(2000, 1, 1, 0, 0, 30),
+                         utils.validate_changes_since(since))
+
+        # older than the deletion log
+        self.assertRaises(wsme.exc.ClientSideError,
+                          utils.validate_changes_since,
+                          datetime.datetime(2000, 1, 1, 0, 0) -
+                          datetime.timedelta(seconds=1))
+
+    @mock.patch.object(utils, 'pecan')
+    def test_get_etag(self, mock_pecan):
+        mock_pecan.request.url = 'http://localhost/v1/nodes'
+        time = datetime.datetime(2000, 1, 1, 0, 0)
+        etag = utils.get_etag('1.0', [('uuid', time, None)])
+        self.assertEqual(etag, utils.get_etag('1.0', [('uuid', time, None)]))
+        # aware and naive UTC times give the same tag
+        aware = timeutils.parse_isotime('2000-01-01T01:00:00+01:00')
+        self.assertEqual(etag, utils.get_etag('1.0', [('uuid', aware, None)]))
+
+        self.assertNotEqual(etag, utils.get_etag('1.1',
+                                                 [('uuid', time, None)]))
+        self.assertNotEqual(etag, utils.get_etag('1.0',
+                                                 [('uuid', time, time)]))
+        self.assertNotEqual(etag, utils.get_etag('1.0', []))
+        mock_pecan.request.url = 'http://localhost/v1/nodes?fields=uuid'
+        self.assertNotEqual(etag, utils.get_etag('1.0',
+                                                 [('uuid', time, None)]))
+
+    @mock.patch.object(utils, 'pecan')
+    def test_use_streaming(self, mock_pecan):
+        mock_pecan.request.accept.best_match.return_value = 'application/json'
+        self.config(collection_stream_threshold=100, group='api')
+        self.assertFalse(utils.use_streaming(100))
+        self.assertTrue(utils.use_streaming(101))
+
+        mock_pecan.request.accept.best_match.return_value = 'application/xml'
+        self.assertFalse(utils.use_streaming(101))
+
+        mock_pecan.request.accept.best_match.return_value = 'application/json'
+        self.config(collection_stream_threshold=0, group='api')
+        self.assertFalse(utils.use_streaming(101))
+
     def test_validate_sort_dir(self):
         sort_dir = utils.validate_sort_dir('asc')
         self.assertEqual('asc', sort_dir)
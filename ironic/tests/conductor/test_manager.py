@@ -27,12 +27,16 @@ from oslo import messaging
 from ironic.common import boot_devices
 from ironic.common import driver_factory
 from ironic.common import exception
+from ironic.common import hash_ring
 from ironic.common import keystone
+from ironic.common import metrics
 from ironic.common import states
 from ironic.common import utils as ironic_utils
 from ironic.conductor import manager
+from ironic.conductor import periodic
 from ironic.conductor import task_manager
 from ironic.conductor import utils as conductor_utils
+from ironic.conductor import workers
 from ironic.db import api as dbapi
 from ironic.drivers import base as drivers_base
 from ironic import objects
@@ -70,6 +74,23 @@ class _CommonMixIn(object):
         task.node = node
         return task
 
+    @staticmethod
+    def _map_all_nodes(node_uuids, driver):
+        """Map all the nodes to this conductor.
+
+        A side effect for mocks of _get_nodes_mapped_to_this_conductor().
+        """
+        return set(node_uuids)
+
+    def _mock_hash_ranges(self):
+        """Mock the 'hash_ranges' node filter of the periodic tasks."""
+        hash_ranges = {'fake': [(None, None)]}
+        p = mock.patch.object(manager.ConductorManager, '_get_hash_ranges',
+                              return_value=hash_ranges)
+        p.start()
+        self.addCleanup(p.stop)
+        return hash_ranges
+
     def _get_nodeinfo_list_response(self, nodes=None):
         if nodes is None:
             nodes = [self.node]
@@ -209,6 +230,19 @@ class StartStopTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
                                                     self.hostname)
             self.assertEqual(restart_names, res['drivers'])
 
+    def test_start_workers_queue_size(self):
+        self.config(workers_queue_size=10, group='conductor')
+        self._start_service()
+        self.assertEqual(10, self.service._worker_pool._queue_size)
+
+    @mock.patch.object(manager, 'LOG')
+    def test_start_caps_workers_queue_size(self, log_mock):
+        # Half of the default RPC thread pool size, 64
+        self.config(workers_queue_size=100, group='conductor')
+        self._start_service()
+        self.assertEqual(32, self.service._worker_pool._queue_size)
+        self.assertTrue(log_mock.warning.called)
+
     @mock.patch.object(driver_factory.DriverFactory, '__init__')
     def test_start_fails_on_missing_driver(self, mock_df):
         mock_df.side_effect = exception.DriverNotFound('test')
@@ -218,6 +252,34 @@ class StartStopTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
             self.assertTrue(mock_df.called)
             self.assertFalse(mock_reg.called)
 
+    @mock.patch.object(periodic.PeriodicTaskScheduler, 'start')
+    def test_start_independent_periodic_tasks(self, mock_start):
+        self.config(independent_periodic_tasks=True, group='conductor')
+        self._start_service()
+        mock_start.assert_called_once_with()
+        with mock.patch.object(self.service,
+                               'run_periodic_tasks') as mock_run:
+            self.service.periodic_tasks(self.context)
+            self.assertFalse(mock_run.called)
+        self.assertIn('_sync_power_states',
+                      self.service.get_periodic_task_stats())
+
+        with mock.patch.object(periodic.PeriodicTaskScheduler,
+                               'stop') as mock_stop:
+            self.service.del_host()
+            mock_stop.assert_called_once_with()
+        self.assertIsNone(self.service._periodic_scheduler)
+
+    def test_start_serial_periodic_tasks(self):
+        self._start_service()
+        self.assertIsNone(self.service._periodic_scheduler)
+        self.assertEqual({}, self.service.get_periodic_task_stats())
+        with mock.patch.object(self.service,
+                               'run_periodic_tasks') as mock_run:
+            self.service.periodic_tasks(self.context)
+            mock_run.assert_called_once_with(self.context,
+                                             raise_on_error=False)
+
 
 class KeepAliveTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
     def test__conductor_service_record_keepalive(self):
@@ -225,11 +287,14 @@ class KeepAliveTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
         # avoid wasting time at the event.wait()
         CONF.set_override('heartbeat_interval', 0, 'conductor')
         with mock.patch.object(self.dbapi, 'touch_conductor') as mock_touch:
-            with mock.patch.object(self.service._keepalive_evt,
-                                   'is_set') as mock_is_set:
-                mock_is_set.side_effect = [False, True]
-                self.service._conductor_service_record_keepalive()
+            with mock.patch.object(self.dbapi,
+                                   'expire_conductors') as mock_expire:
+                with mock.patch.object(self.service._keepalive_evt,
+                                       'is_set') as mock_is_set:
+                    mock_is_set.side_effect = [False, True]
+                    self.service._conductor_service_record_keepalive()
             mock_touch.assert_called_once_with(self.hostname)
+            mock_expire.assert_called_once_with()
 
     def test__conductor_service_record_keepalive_failed_db_conn(self):
         self._start_service()
@@ -238,11 +303,32 @@ class KeepAliveTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
         with mock.patch.object(self.dbapi, 'touch_conductor') as mock_touch:
             mock_touch.side_effect = [None, db_exception.DBConnectionError(),
                                       None]
-            with mock.patch.object(self.service._keepalive_evt,
-                                   'is_set') as mock_is_set:
-                mock_is_set.side_effect = [False, False, False, True]
-                self.service._conductor_service_record_keepalive()
+            with mock.patch.object(self.dbapi,
+                                   'expire_conductors') as mock_expire:
+                with mock.patch.object(self.service._keepalive_evt,
+                                       'is_set') as mock_is_set:
+                    mock_is_set.side_effect = [False, False, False, True]
+                    self.service._conductor_service_record_keepalive()
+            self.assertEqual(3, mock_touch.call_count)
+            self.assertEqual(1, mock_expire.call_count)
+
+    @mock.patch.object(manager.time, 'time')
+    def test__conductor_service_record_keepalive_expire_interval(
+            self, mock_time):
+        self._start_service()
+        CONF.set_override('heartbeat_interval', 0, 'conductor')
+        self.config(heartbeat_timeout=60, group='conductor')
+        mock_time.side_effect = [1000, 1030, 1060]
+        with mock.patch.object(self.dbapi, 'touch_conductor') as mock_touch:
+            with mock.patch.object(self.dbapi,
+                                   'expire_conductors') as mock_expire:
+                with mock.patch.object(self.service._keepalive_evt,
+                                       'is_set') as mock_is_set:
+                    mock_is_set.side_effect = [False, False, False, True]
+                    self.service._conductor_service_record_keepalive()
             self.assertEqual(3, mock_touch.call_count)
+            # not expired again 30 seconds later
+            self.assertEqual(2, mock_expire.call_count)
 
 
 @_mock_record_keepalive
@@ -396,6 +482,100 @@ class ChangeNodePowerStateTestCase(_ServiceSetUpMixin,
             self.assertIsNone(node.last_error)
 
 
+@_mock_record_keepalive
+class ChangeNodeStatesTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
+
+    def test_change_node_states_power(self):
+        node1 = obj_utils.create_test_node(self.context, driver='fake',
+                                           power_state=states.POWER_OFF)
+        node2 = obj_utils.create_test_node(self.context, driver='fake',
+                                           id=2,
+                                           uuid=ironic_utils.generate_uuid(),
+                                           power_state=states.POWER_OFF,
+                                           reservation='fake-reserv')
+        self._start_service()
+
+        with mock.patch.object(self.driver.power,
+                               'get_power_state') as get_power_mock:
+            get_power_mock.return_value = states.POWER_OFF
+            results = self.service.change_node_states(
+                self.context, [node1.uuid, node2.uuid], states.POWER_ON)
+            self.service._worker_pool.waitall()
+
+        self.assertEqual(set([node1.uuid, node2.uuid]), set(results))
+        self.assertIsNone(results[node1.uuid])
+        self.assertIn(node2.uuid, results[node2.uuid])
+        node1.refresh()
+        self.assertEqual(states.POWER_ON, node1.power_state)
+        node2.refresh()
+        self.assertEqual(states.POWER_OFF, node2.power_state)
+        self.assertEqual('fake-reserv', node2.reservation)
+
+    @mock.patch.object(manager.ConductorManager, '_start_tear_down')
+    @mock.patch.object(manager.ConductorManager, '_start_deploy')
+    def test_change_node_states_provision(self, deploy_mock,
+                                          tear_down_mock):
+        node1 = obj_utils.create_test_node(self.context, driver='fake')
+        node2 = obj_utils.create_test_node(self.context, driver='fake',
+                                           id=2,
+                                           uuid=ironic_utils.generate_uuid())
+        self._start_service()
+        deploy_mock.side_effect = [
+            None, exception.InstanceDeployFailure(reason='boom')]
+
+        results = self.service.change_node_states(
+            self.context, [node1.uuid, node2.uuid], states.REBUILD)
+        self.assertEqual({node1.uuid: None, node2.uuid: mock.ANY}, results)
+        self.assertIn('boom', results[node2.uuid])
+        deploy_mock.assert_has_calls(
+            [mock.call(mock.ANY, True, self.service._spawn_worker_nowait)] * 2)
+
+        results = self.service.change_node_states(self.context, [node1.uuid],
+                                                  states.DELETED)
+        self.assertEqual({node1.uuid: None}, results)
+        tear_down_mock.assert_called_once_with(
+            mock.ANY, self.service._spawn_worker_nowait)
+
+    def test_change_node_states_no_free_worker(self):
+        node = obj_utils.create_test_node(self.context, driver='fake',
+                                          power_state=states.POWER_OFF)
+        self._start_service()
+
+        with mock.patch.object(self.service._worker_pool,
+                               'spawn') as spawn_mock:
+            with mock.patch.object(self.service._worker_pool,
+                                   'free') as free_mock:
+                free_mock.return_value = 0
+                results = self.service.change_node_states(
+                    self.context, [node.uuid], states.POWER_ON)
+        # The action was not queued
+        self.assertFalse(spawn_mock.called)
+        self.assertIn('worker', results[node.uuid])
+        node.refresh()
+        self.assertIsNone(node.target_power_state)
+        self.assertIsNone(node.reservation)
+
+    @mock.patch('time.sleep')
+    def test_change_node_states_locked_no_retry(self, sleep_mock):
+        node = obj_utils.create_test_node(self.context, driver='fake',
+                                          reservation='fake-reserv')
+        self._start_service()
+
+        with mock.patch.object(objects.Node, 'reserve',
+                               wraps=objects.Node.reserve) as reserve_mock:
+            results = self.service.change_node_states(
+                self.context, [node.uuid], states.POWER_ON)
+        self.assertEqual(1, reserve_mock.call_count)
+        self.assertIn('fake-reserv', results[node.uuid])
+
+    def test_change_node_states_invalid_target(self):
+        self._start_service()
+        exc = self.assertRaises(messaging.rpc.ExpectedException,
+                                self.service.change_node_states,
+                                self.context, ['a'], 'foo')
+        self.assertEqual(exception.InvalidParameterValue, exc.exc_info[0])
+
+
 @_mock_record_keepalive
 class UpdateNodeTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
     def test_update_node(self):
@@ -676,6 +856,105 @@ class VendorPassthruTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
         task.spawn_after.assert_called_once_with(mock.ANY, vendor_passthru_ref,
             task, bar='baz', method='test_method')
 
+    @mock.patch.object(task_manager, 'acquire')
+    def test_vendor_passthru_shared_lock(self, acquire_mock):
+        node = obj_utils.create_test_node(self.context, driver='fake')
+        test_method = mock.Mock(return_value='ok')
+        self._start_service()
+
+        driver = mock.Mock(spec=drivers_base.BaseDriver)
+        driver.vendor = mock.Mock(spec=drivers_base.VendorInterface)
+        driver.vendor.vendor_routes = {'test_method':
+                                       {'func': test_method,
+                                        'async': False,
+                                        'http_methods': ['POST'],
+                                        'require_exclusive_lock': False}}
+
+        task = mock.Mock()
+        task.node = node
+        task.driver = driver
+        acquire_mock.return_value.__enter__.return_value = task
+
+        with mock.patch.object(self.service, '_get_driver',
+                               return_value=driver):
+            response = self.service.vendor_passthru(
+                self.context, node.uuid, 'test_method', 'POST',
+                {'bar': 'baz'})
+
+        self.assertEqual(('ok', False), response)
+        acquire_mock.assert_called_once_with(self.context, node.uuid,
+                                             shared=True)
+        self.assertFalse(task.upgrade_lock.called)
+        test_method.assert_called_once_with(task, bar='baz',
+                                            http_method='POST')
+
+    @mock.patch.object(task_manager, 'acquire')
+    def test_vendor_passthru_exclusive_lock(self, acquire_mock):
+        node = obj_utils.create_test_node(self.context, driver='fake')
+        test_method = mock.Mock(return_value='ok')
+        self._start_service()
+
+        driver = mock.Mock(spec=drivers_base.BaseDriver)
+        driver.vendor = mock.Mock(spec=drivers_base.VendorInterface)
+        driver.vendor.vendor_routes = {'test_method':
+                                       {'func': test_method,
+                                        'async': False,
+                                        'http_methods': ['POST'],
+                                        'require_exclusive_lock': True}}
+
+        task = mock.Mock()
+        task.node = node
+        task.driver = driver
+        acquire_mock.return_value.__enter__.return_value = task
+
+        with mock.patch.object(self.service, '_get_driver',
+                               return_value=driver):
+            self.service.vendor_passthru(
+                self.context, node.uuid, 'test_method', 'POST',
+                {'bar': 'baz'})
+
+        # The lock is taken exclusively up front
+        acquire_mock.assert_called_once_with(self.context, node.uuid,
+                                             shared=False)
+        test_method.assert_called_once_with(task, bar='baz',
+                                            http_method='POST')
+
+    def test_vendor_passthru_unknown_method_exclusive_lock(self):
+        node = obj_utils.create_test_node(self.context, driver='fake')
+        self._start_service()
+
+        with mock.patch.object(task_manager, 'acquire',
+                               wraps=task_manager.acquire) as acquire_mock:
+            exc = self.assertRaises(messaging.rpc.ExpectedException,
+                                    self.service.vendor_passthru,
+                                    self.context, node.uuid,
+                                    'unsupported_method', 'POST', {})
+        self.assertEqual(exception.InvalidParameterValue, exc.exc_info[0])
+        acquire_mock.assert_called_once_with(self.context, node.uuid,
+                                             shared=False)
+
+    def test__vendor_passthru_requires_exclusive_lock(self):
+        node = obj_utils.create_test_node(self.context, driver='fake')
+        self._start_service()
+        routes = {'test_method': {'require_exclusive_lock': False}}
+
+        with mock.patch.dict(self.driver.vendor.vendor_routes, routes):
+            with mock.patch.object(self.dbapi, 'get_node_by_id') as get_mock:
+                self.assertFalse(
+                    self.service._vendor_passthru_requires_exclusive_lock(
+                        self.context, node.id, 'test_method'))
+                self.assertFalse(get_mock.called)
+        self.assertTrue(
+            self.service._vendor_passthru_requires_exclusive_lock(
+                self.context, node.uuid, 'unknown_method'))
+
+    def test__vendor_passthru_requires_exclusive_lock_not_found(self):
+        self._start_service()
+        self.assertRaises(
+            exception.NodeNotFound,
+            self.service._vendor_passthru_requires_exclusive_lock,
+            self.context, ironic_utils.generate_uuid(), 'test_method')
+
     def test_get_node_vendor_passthru_methods(self):
         node = obj_utils.create_test_node(self.context, driver='fake')
         fake_routes = {'test_method': {'async': True,
@@ -1167,13 +1446,92 @@ class MiscTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
         self.assertRaises(exception.DriverNotFound,
                           self.service._get_driver, 'unknown_driver')
 
-    def test__mapped_to_this_conductor(self):
+    def test__get_nodes_mapped_to_this_conductor(self):
         self._start_service()
         n = utils.get_test_node()
-        self.assertTrue(self.service._mapped_to_this_conductor(n['uuid'],
-                                                               'fake'))
-        self.assertFalse(self.service._mapped_to_this_conductor(n['uuid'],
-                                                                'otherdriver'))
+        self.assertEqual(set([n['uuid']]),
+                         self.service._get_nodes_mapped_to_this_conductor(
+                             [n['uuid']], 'fake'))
+        self.assertEqual(set(),
+                         self.service._get_nodes_mapped_to_this_conductor(
+                             [n['uuid']], 'otherdriver'))
+
+    def test__get_nodes_mapped_to_this_conductor_other_host(self):
+        self._start_service()
+        ring = hash_ring.HashRing([self.hostname, 'other'])
+        uuids = [ironic_utils.generate_uuid() for i in range(20)]
+        expected = set(u for u in uuids
+                       if self.hostname in ring.get_hosts(u))
+        with mock.patch.object(hash_ring.HashRingManager, '__getitem__',
+                               return_value=ring):
+            self.assertEqual(
+                expected,
+                self.service._get_nodes_mapped_to_this_conductor(uuids,
+                                                                 'fake'))
+
+    def test__filter_mapped_to_this_conductor(self):
+        self._start_service()
+        rows = [('a', 'fake'), ('b', 'other'), ('c', 'fake'), ('d', 'fake')]
+        mapped = {'fake': set(['a', 'd']), 'other': set(['b'])}
+        with mock.patch.object(manager, 'MAPPING_CHUNK_SIZE', 2):
+            with mock.patch.object(
+                    self.service, '_get_nodes_mapped_to_this_conductor',
+                    side_effect=lambda uuids, driver: mapped[driver]
+                    ) as mapped_mock:
+                result = list(self.service._filter_mapped_to_this_conductor(
+                    iter(rows), 0, 1))
+        self.assertEqual([('a', 'fake'), ('b', 'other'), ('d', 'fake')],
+                         result)
+        self.assertEqual([mock.call(['a'], 'fake'),
+                          mock.call(['b'], 'other'),
+                          mock.call(['c', 'd'], 'fake')],
+                         mapped_mock.call_args_list)
+
+    def test__get_hash_ranges(self):
+        self._start_service()
+        rings = {'fake': hash_ring.HashRing([self.hostname, 'other']),
+                 'other': hash_ring.HashRing(['other'])}
+        with mock.patch.object(self.service, 'ring_manager') as rm_mock:
+            rm_mock.ring = rings
+            self.assertEqual(
+                {'fake': rings['fake'].get_key_ranges(self.hostname)},
+                self.service._get_hash_ranges())
+
+    def test__get_hash_ranges_too_many(self):
+        self._start_service()
+        rings = {'fake': hash_ring.HashRing([self.hostname, 'other'])}
+        with mock.patch.object(self.service, 'ring_manager') as rm_mock:
+            rm_mock.ring = rings
+            with mock.patch.object(manager, 'MAX_HASH_RANGES', 0):
+                self.assertEqual({'fake': None},
+                                 self.service._get_hash_ranges())
+
+    def test__dump_metrics(self):
+        self._start_service()
+        self.config(dump_file='/fake/metrics.json', group='metrics')
+        with mock.patch.object(metrics.Registry, 'dump') as dump_mock:
+            self.service._dump_metrics(self.context)
+            dump_mock.assert_called_once_with('/fake/metrics.json')
+
+    def test__dump_metrics_disabled(self):
+        self._start_service()
+        with mock.patch.object(metrics.Registry, 'dump') as dump_mock:
+            self.service._dump_metrics(self.context)
+            self.assertFalse(dump_mock.called)
+
+    def test__dump_metrics_error(self):
+        self._start_service()
+        self.config(dump_file='/fake/metrics.json', group='metrics')
+        with mock.patch.object(metrics.Registry, 'dump') as dump_mock:
+            dump_mock.side_effect = IOError('boom')
+            self.service._dump_metrics(self.context)
+
+    def test_worker_pool_gauges(self):
+        self._start_service()
+        gauges = metrics.get_registry().snapshot()['gauges']
+        self.assertEqual(self.service._worker_pool.free(),
+                         gauges['conductor.workers.free'])
+        self.assertEqual(0, gauges['conductor.workers.queue_depth'])
 
     def test_validate_driver_interfaces(self):
         node = obj_utils.create_test_node(self.context, driver='fake')
@@ -1504,11 +1862,12 @@ class UpdatePortTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
         expected_result = {}
         self.assertEqual(expected_result, actual_result)
 
-    @mock.patch.object(manager.ConductorManager, '_mapped_to_this_conductor')
-    @mock.patch.object(dbapi.IMPL, 'get_nodeinfo_list')
+    @mock.patch.object(manager.ConductorManager,
+                       '_get_nodes_mapped_to_this_conductor')
+    @mock.patch.object(dbapi.IMPL, 'iter_nodeinfo_list')
     @mock.patch.object(task_manager, 'acquire')
     def test___send_sensor_data(self, acquire_mock, get_nodeinfo_list_mock,
-         _mapped_to_this_conductor_mock):
+         mapped_mock):
         node = obj_utils.create_test_node(self.context,
                                           driver='fake')
         self._start_service()
@@ -1519,21 +1878,22 @@ class UpdatePortTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
             with mock.patch.object(self.driver.management,
                                    'validate') as validate_mock:
                 get_sensors_data_mock.return_value = 'fake-sensor-data'
-                _mapped_to_this_conductor_mock.return_value = True
+                mapped_mock.side_effect = lambda uuids, driver: set(uuids)
                 get_nodeinfo_list_mock.return_value = [(node.uuid, node.driver,
                                                      node.instance_uuid)]
                 self.service._send_sensor_data(self.context)
                 self.assertTrue(get_nodeinfo_list_mock.called)
-                self.assertTrue(_mapped_to_this_conductor_mock.called)
+                self.assertTrue(mapped_mock.called)
                 self.assertTrue(acquire_mock.called)
                 self.assertTrue(get_sensors_data_mock.called)
                 self.assertTrue(validate_mock.called)
 
-    @mock.patch.object(manager.ConductorManager, '_mapped_to_this_conductor')
-    @mock.patch.object(dbapi.IMPL, 'get_nodeinfo_list')
+    @mock.patch.object(manager.ConductorManager,
+                       '_get_nodes_mapped_to_this_conductor')
+    @mock.patch.object(dbapi.IMPL, 'iter_nodeinfo_list')
     @mock.patch.object(task_manager, 'acquire')
     def test___send_sensor_data_disabled(self, acquire_mock,
-        get_nodeinfo_list_mock, _mapped_to_this_conductor_mock):
+        get_nodeinfo_list_mock, mapped_mock):
         node = obj_utils.create_test_node(self.context,
                                           driver='fake')
         self._start_service()
@@ -1543,12 +1903,12 @@ class UpdatePortTestCase(_ServiceSetUpMixin, tests_db_base.DbTestCase):
             with mock.patch.object(self.driver.management,
                                    'validate') as validate_mock:
                 get_sensors_data_mock.return_value = 'fake-sensor-data'
-                _mapped_to_this_conductor_mock.return_value = True
+                mapped_mock.side_effect = lambda uuids, driver: set(uuids)
                 get_nodeinfo_list_mock.return_value = [(node.uuid, node.driver,
                                                      node.instance_uuid)]
                 self.service._send_sensor_data(self.context)
                 self.assertFalse(get_nodeinfo_list_mock.called)
-                self.assertFalse(_mapped_to_this_conductor_mock.called)
+                self.assertFalse(mapped_mock.called)
                 self.assertFalse(acquire_mock.called)
                 self.assertFalse(get_sensors_data_mock.called)
                 self.assertFalse(validate_mock.called)
@@ -1654,24 +2014,30 @@ class ManagerSpawnWorkerTestCase(tests_base.TestCase):
         self.service = manager.ConductorManager('hostname', 'test-topic')
 
     def test__spawn_worker(self):
-        worker_pool = mock.Mock(spec_set=['free', 'spawn'])
-        worker_pool.free.return_value = True
+        worker_pool = mock.Mock(spec_set=['spawn'])
         self.service._worker_pool = worker_pool
 
         self.service._spawn_worker('fake', 1, 2, foo='bar', cat='meow')
 
         worker_pool.spawn.assert_called_once_with(
-                'fake', 1, 2, foo='bar', cat='meow')
+                workers.USER_PRIORITY, 'fake', 1, 2, foo='bar', cat='meow')
 
     def test__spawn_worker_none_free(self):
-        worker_pool = mock.Mock(spec_set=['free', 'spawn'])
-        worker_pool.free.return_value = False
+        worker_pool = mock.Mock(spec_set=['spawn'])
+        worker_pool.spawn.side_effect = exception.NoFreeConductorWorker()
         self.service._worker_pool = worker_pool
 
         self.assertRaises(exception.NoFreeConductorWorker,
                           self.service._spawn_worker, 'fake')
 
-        self.assertFalse(worker_pool.spawn.called)
+    def test__spawn_periodic_worker(self):
+        worker_pool = mock.Mock(spec_set=['spawn'])
+        self.service._worker_pool = worker_pool
+
+        self.service._spawn_periodic_worker('fake', 1, foo='bar')
+
+        worker_pool.spawn.assert_called_once_with(
+                workers.PERIODIC_PRIORITY, 'fake', 1, foo='bar')
 
 
 @mock.patch.object(conductor_utils, 'node_power_action')
@@ -1870,104 +2236,61 @@ class ManagerDoSyncPowerStateTestCase(tests_db_base.DbTestCase):
 
 @mock.patch.object(manager.ConductorManager, '_do_sync_power_state')
 @mock.patch.object(task_manager, 'acquire')
-@mock.patch.object(manager.ConductorManager, '_mapped_to_this_conductor')
-@mock.patch.object(objects.Node, 'get_by_id')
-@mock.patch.object(dbapi.IMPL, 'get_nodeinfo_list')
+@mock.patch.object(manager.ConductorManager,
+                   '_get_nodes_mapped_to_this_conductor')
+@mock.patch.object(dbapi.IMPL, 'iter_nodeinfo_list')
 class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_db_base.DbTestCase):
     def setUp(self):
         super(ManagerSyncPowerStatesTestCase, self).setUp()
         self.service = manager.ConductorManager('hostname', 'test-topic')
         self.service.dbapi = self.dbapi
         self.node = self._create_node()
-        self.filters = {'reserved': False, 'maintenance': False}
+        self.filters = {'reserved': False, 'maintenance': False,
+                        'hash_ranges': self._mock_hash_ranges()}
+        self.reserve_filters = {'maintenance': False,
+                                'provision_state_not_in': [states.DEPLOYWAIT]}
         self.columns = ['id', 'uuid', 'driver']
 
-    def test_node_not_mapped(self, get_nodeinfo_mock, get_node_mock,
-                             mapped_mock, acquire_mock, sync_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        mapped_mock.return_value = False
-
-        self.service._sync_power_states(self.context)
-
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        self.assertFalse(get_node_mock.called)
-        self.assertFalse(acquire_mock.called)
-        self.assertFalse(sync_mock.called)
-
-    def test_node_disappeared(self, get_nodeinfo_mock, get_node_mock,
-                              mapped_mock, acquire_mock, sync_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        mapped_mock.return_value = True
-        get_node_mock.side_effect = exception.NodeNotFound(node=self.node.uuid)
-
-        self.service._sync_power_states(self.context)
-
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(acquire_mock.called)
-        self.assertFalse(sync_mock.called)
-
-    def test_node_in_deploywait(self, get_nodeinfo_mock, get_node_mock,
-                                mapped_mock, acquire_mock, sync_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        self.node.provision_state = states.DEPLOYWAIT
-
-        self.service._sync_power_states(self.context)
+    def _acquire_call(self, node_id):
+        return mock.call(self.context, node_id,
+                         filters=self.reserve_filters, retry=False)
 
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(acquire_mock.called)
-        self.assertFalse(sync_mock.called)
-
-    def test_node_in_maintenance(self, get_nodeinfo_mock, get_node_mock,
-                                 mapped_mock, acquire_mock, sync_mock):
+    def test_node_not_mapped(self, get_nodeinfo_mock, mapped_mock,
+                             acquire_mock, sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        self.node.maintenance = True
+        mapped_mock.return_value = set()
 
         self.service._sync_power_states(self.context)
 
         get_nodeinfo_mock.assert_called_once_with(
                 columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
+        mapped_mock.assert_called_once_with([self.node.uuid],
                                             self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
         self.assertFalse(acquire_mock.called)
         self.assertFalse(sync_mock.called)
 
-    def test_node_has_reservation(self, get_nodeinfo_mock, get_node_mock,
-                                  mapped_mock, acquire_mock, sync_mock):
+    def test_node_filters_not_matched_on_acquire(self, get_nodeinfo_mock,
+                                                 mapped_mock, acquire_mock,
+                                                 sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        self.node.reservation = 'fake'
+        mapped_mock.side_effect = self._map_all_nodes
+        acquire_mock.side_effect = exception.NodeFiltersNotMatched(
+                node=self.node.uuid)
 
         self.service._sync_power_states(self.context)
 
         get_nodeinfo_mock.assert_called_once_with(
                 columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
+        mapped_mock.assert_called_once_with([self.node.uuid],
                                             self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(acquire_mock.called)
+        self.assertEqual([self._acquire_call(self.node.id)],
+                         acquire_mock.call_args_list)
         self.assertFalse(sync_mock.called)
 
-    def test_node_locked_on_acquire(self, get_nodeinfo_mock, get_node_mock,
-                                    mapped_mock, acquire_mock, sync_mock):
+    def test_node_locked_on_acquire(self, get_nodeinfo_mock, mapped_mock,
+                                    acquire_mock, sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = exception.NodeLocked(node=self.node.uuid,
                                                         host='fake')
 
@@ -1975,59 +2298,17 @@ class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_db_base.DbTestCase):
 
         get_nodeinfo_mock.assert_called_once_with(
                 columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(sync_mock.called)
-
-    def test_node_in_deploywait_on_acquire(self, get_nodeinfo_mock,
-                                           get_node_mock, mapped_mock,
-                                           acquire_mock, sync_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        mapped_mock.return_value = True
-        task = self._create_task(
-                node_attrs=dict(provision_state=states.DEPLOYWAIT,
-                                id=self.node.id))
-        acquire_mock.side_effect = self._get_acquire_side_effect(task)
-
-        self.service._sync_power_states(self.context)
-
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
+        mapped_mock.assert_called_once_with([self.node.uuid],
                                             self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(sync_mock.called)
-
-    def test_node_in_maintenance_on_acquire(self, get_nodeinfo_mock,
-                                            get_node_mock, mapped_mock,
-                                            acquire_mock, sync_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        mapped_mock.return_value = True
-        task = self._create_task(
-                node_attrs=dict(maintenance=True, id=self.node.id))
-        acquire_mock.side_effect = self._get_acquire_side_effect(task)
-
-        self.service._sync_power_states(self.context)
-
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
+        self.assertEqual([self._acquire_call(self.node.id)],
+                         acquire_mock.call_args_list)
         self.assertFalse(sync_mock.called)
 
     def test_node_disappears_on_acquire(self, get_nodeinfo_mock,
-                                        get_node_mock, mapped_mock,
-                                        acquire_mock, sync_mock):
+                                        mapped_mock, acquire_mock,
+                                        sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = exception.NodeNotFound(node=self.node.uuid,
                                                           host='fake')
 
@@ -2035,17 +2316,16 @@ class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_db_base.DbTestCase):
 
         get_nodeinfo_mock.assert_called_once_with(
                 columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
+        mapped_mock.assert_called_once_with([self.node.uuid],
                                             self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
+        self.assertEqual([self._acquire_call(self.node.id)],
+                         acquire_mock.call_args_list)
         self.assertFalse(sync_mock.called)
 
-    def test_single_node(self, get_nodeinfo_mock, get_node_mock,
-                         mapped_mock, acquire_mock, sync_mock):
+    def test_single_node(self, get_nodeinfo_mock, mapped_mock,
+                         acquire_mock, sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         task = self._create_task(node_attrs=dict(id=self.node.id))
         acquire_mock.side_effect = self._get_acquire_side_effect(task)
 
@@ -2053,89 +2333,224 @@ class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_db_base.DbTestCase):
 
         get_nodeinfo_mock.assert_called_once_with(
                 columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
+        mapped_mock.assert_called_once_with([self.node.uuid],
                                             self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
+        self.assertEqual([self._acquire_call(self.node.id)],
+                         acquire_mock.call_args_list)
         sync_mock.assert_called_once_with(task)
 
     def test__sync_power_state_multiple_nodes(self, get_nodeinfo_mock,
-                                              get_node_mock, mapped_mock,
-                                              acquire_mock, sync_mock):
-        # Create 11 nodes:
+                                              mapped_mock, acquire_mock,
+                                              sync_mock):
+        # Create 6 nodes:
         # 1st node: Should acquire and try to sync
         # 2nd node: Not mapped to this conductor
-        # 3rd node: In DEPLOYWAIT provision_state
-        # 4th node: In maintenance mode
-        # 5th node: Has a reservation
-        # 6th node: Disappears after getting nodeinfo list.
-        # 7th node: task_manger.acquire() fails due to lock
-        # 8th node: task_manger.acquire() fails due to node disappearing
-        # 9th node: In DEPLOYWAIT provision_state acquire()
-        # 10th node: In maintenance mode on acquire()
-        # 11th node: Should acquire and try to sync
+        # 3rd node: task_manger.acquire() fails due to lock
+        # 4th node: task_manger.acquire() fails due to node disappearing
+        # 5th node: task_manger.acquire() fails due to the node not
+        #           matching the filters
+        # 6th node: Should acquire and try to sync
         nodes = []
-        get_node_map = {}
         mapped_map = {}
-        for i in range(1, 12):
-            attrs = {'id': i,
-                     'uuid': ironic_utils.generate_uuid()}
-            if i == 3:
-                attrs['provision_state'] = states.DEPLOYWAIT
-            elif i == 4:
-                attrs['maintenance'] = True
-            elif i == 5:
-                attrs['reservation'] = 'fake'
-
-            n = self._create_node(**attrs)
+        for i in range(1, 7):
+            n = self._create_node(id=i, uuid=ironic_utils.generate_uuid(),
+                                  driver='fake')
             nodes.append(n)
             mapped_map[n.uuid] = False if i == 2 else True
-            get_node_map[n.uuid] = n
 
         tasks = [self._create_task(node_attrs=dict(id=1)),
-                 exception.NodeLocked(node=7, host='fake'),
-                 exception.NodeNotFound(node=8, host='fake'),
-                 self._create_task(
-                     node_attrs=dict(id=9,
-                                     provision_state=states.DEPLOYWAIT)),
-                 self._create_task(
-                     node_attrs=dict(id=10, maintenance=True)),
-                 self._create_task(node_attrs=dict(id=11))]
-
-        def _get_node_side_effect(ctxt, node_id):
-            if node_id == 6:
-                # Make this node disappear
-                raise exception.NodeNotFound(node=node_id)
-            return nodes[node_id - 1]
+                 exception.NodeLocked(node=3, host='fake'),
+                 exception.NodeNotFound(node=4, host='fake'),
+                 exception.NodeFiltersNotMatched(node=5),
+                 self._create_task(node_attrs=dict(id=6))]
 
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
                 nodes)
-        mapped_mock.side_effect = lambda x, y: mapped_map[x]
-        get_node_mock.side_effect = _get_node_side_effect
+        mapped_mock.side_effect = lambda uuids, driver: set(
+                u for u in uuids if mapped_map[u])
         acquire_mock.side_effect = self._get_acquire_side_effect(tasks)
 
         with mock.patch.object(eventlet, 'sleep') as sleep_mock:
             self.service._sync_power_states(self.context)
-            # Ensure we've yielded on every iteration
-            self.assertEqual(len(nodes), sleep_mock.call_count)
+            # Ensure we've yielded on every iteration over a mapped node
+            self.assertEqual(len(nodes) - 1, sleep_mock.call_count)
 
         get_nodeinfo_mock.assert_called_once_with(
                 columns=self.columns, filters=self.filters)
-        mapped_calls = [mock.call(x.uuid, x.driver) for x in nodes]
-        self.assertEqual(mapped_calls, mapped_mock.call_args_list)
-        get_node_calls = [mock.call(self.context, x.id)
-                for x in nodes[:1] + nodes[2:]]
-        self.assertEqual(get_node_calls,
-                         get_node_mock.call_args_list)
-        acquire_calls = [mock.call(self.context, x.id)
-                for x in nodes[:1] + nodes[6:]]
+        # All the nodes are mapped at once
+        mapped_mock.assert_called_once_with([x.uuid for x in nodes], 'fake')
+        acquire_calls = [self._acquire_call(x.id)
+                         for x in nodes[:1] + nodes[2:]]
         self.assertEqual(acquire_calls, acquire_mock.call_args_list)
-        sync_calls = [mock.call(tasks[0]), mock.call(tasks[5])]
+        sync_calls = [mock.call(tasks[0]), mock.call(tasks[4])]
         self.assertEqual(sync_calls, sync_mock.call_args_list)
 
+    def test_node_unexpected_error(self, get_nodeinfo_mock, mapped_mock,
+                                   acquire_mock, sync_mock):
+        nodes = [self._create_node(id=1, uuid=ironic_utils.generate_uuid()),
+                 self._create_node(id=2, uuid=ironic_utils.generate_uuid())]
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                nodes)
+        mapped_mock.side_effect = self._map_all_nodes
+        tasks = [self._create_task(node_attrs=dict(id=1)),
+                 self._create_task(node_attrs=dict(id=2))]
+        acquire_mock.side_effect = self._get_acquire_side_effect(tasks)
+        sync_mock.side_effect = [Exception('boom'), None]
 
+        self.service._sync_power_states(self.context)
+
+        # The failure of the first node must not abort the whole pass
+        self.assertEqual([mock.call(tasks[0]), mock.call(tasks[1])],
+                         sync_mock.call_args_list)
+
+    def test_multiple_nodes_concurrent(self, get_nodeinfo_mock, mapped_mock,
+                                       acquire_mock, sync_mock):
+        self.config(sync_power_state_workers=4, group='conductor')
+        nodes = [self._create_node(id=i, uuid=ironic_utils.generate_uuid())
+                 for i in range(1, 6)]
+        tasks = [self._create_task(node_attrs=dict(id=i))
+                 for i in range(1, 6)]
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                nodes)
+        mapped_mock.side_effect = self._map_all_nodes
+        acquire_mock.side_effect = self._get_acquire_side_effect(tasks)
+
+        with mock.patch.object(manager.greenpool, 'GreenPool',
+                               autospec=True) as pool_mock:
+            pool = pool_mock.return_value
+            pool.spawn_n.side_effect = lambda func, *args: func(*args)
+            self.service._sync_power_states(self.context)
+
+        pool_mock.assert_called_once_with(size=4)
+        self.assertEqual(len(nodes), pool.spawn_n.call_count)
+        pool.waitall.assert_called_once_with()
+        self.assertEqual([mock.call(t) for t in tasks],
+                         sync_mock.call_args_list)
+
+
+@mock.patch.object(manager.ConductorManager, '_sync_power_state_for_node')
 @mock.patch.object(task_manager, 'acquire')
-@mock.patch.object(manager.ConductorManager, '_mapped_to_this_conductor')
+@mock.patch.object(manager.ConductorManager,
+                   '_get_nodes_mapped_to_this_conductor')
+@mock.patch.object(dbapi.IMPL, 'iter_nodeinfo_list')
+class ManagerSyncPowerStatesBatchTestCase(_CommonMixIn,
+                                          tests_db_base.DbTestCase):
+    def setUp(self):
+        super(ManagerSyncPowerStatesBatchTestCase, self).setUp()
+        self.service = manager.ConductorManager('hostname', 'test-topic')
+        self.service.dbapi = self.dbapi
+        self.columns = ['id', 'uuid', 'driver']
+        self._mock_hash_ranges()
+        self.power = mock.Mock(spec_set=['get_power_states'])
+        self.nodes = [self._create_node(id=i, driver='fake_batch',
+                                        uuid=ironic_utils.generate_uuid(),
+                                        power_state=states.POWER_ON)
+                      for i in range(1, 4)]
+        self.tasks = [self._create_batch_task(n) for n in self.nodes]
+        supports_batch_patch = mock.patch.object(
+                manager.ConductorManager, '_supports_batch_power_state',
+                return_value=True)
+        supports_batch_patch.start()
+        self.addCleanup(supports_batch_patch.stop)
+
+    def _create_batch_task(self, node):
+        task = mock.Mock(spec_set=['node', 'driver', 'release_resources'])
+        task.node = node
+        task.driver.power = self.power
+        return task
+
+    def test_all_in_sync(self, get_nodeinfo_mock, mapped_mock,
+                         acquire_mock, sync_mock):
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                self.nodes)
+        mapped_mock.side_effect = self._map_all_nodes
+        acquire_mock.side_effect = self.tasks
+        self.power.get_power_states.return_value = dict(
+                (n.uuid, states.POWER_ON) for n in self.nodes)
+
+        self.service._sync_power_states(self.context)
+
+        self.assertEqual([mock.call(self.context, n.id, shared=True)
+                          for n in self.nodes],
+                         acquire_mock.call_args_list)
+        self.power.get_power_states.assert_called_once_with(self.tasks)
+        for task in self.tasks:
+            task.release_resources.assert_called_once_with()
+        self.assertFalse(sync_mock.called)
+
+    def test_mismatch_falls_back_to_single_sync(self, get_nodeinfo_mock,
+                                                mapped_mock, acquire_mock,
+                                                sync_mock):
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                self.nodes)
+        mapped_mock.side_effect = self._map_all_nodes
+        acquire_mock.side_effect = self.tasks
+        # The second node is off and the third one was not found.
+        self.power.get_power_states.return_value = {
+                self.nodes[0].uuid: states.POWER_ON,
+                self.nodes[1].uuid: states.POWER_OFF}
+
+        self.service._sync_power_states(self.context)
+
+        self.power.get_power_states.assert_called_once_with(self.tasks)
+        self.assertEqual([mock.call(self.context, n.id, n.uuid, mock.ANY)
+                          for n in self.nodes[1:]],
+                         sync_mock.call_args_list)
+
+    def test_skips_ineligible_nodes(self, get_nodeinfo_mock, mapped_mock,
+                                    acquire_mock, sync_mock):
+        self.nodes[1].maintenance = True
+        self.nodes[2].provision_state = states.DEPLOYWAIT
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                self.nodes)
+        mapped_mock.side_effect = self._map_all_nodes
+        acquire_mock.side_effect = self.tasks
+        self.power.get_power_states.return_value = {
+                self.nodes[0].uuid: states.POWER_ON}
+
+        self.service._sync_power_states(self.context)
+
+        self.power.get_power_states.assert_called_once_with(self.tasks[:1])
+        for task in self.tasks:
+            task.release_resources.assert_called_once_with()
+        self.assertFalse(sync_mock.called)
+
+    def test_driver_error_falls_back_to_single_sync(self, get_nodeinfo_mock,
+                                                    mapped_mock,
+                                                    acquire_mock, sync_mock):
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                self.nodes)
+        mapped_mock.side_effect = self._map_all_nodes
+        acquire_mock.side_effect = self.tasks
+        self.power.get_power_states.side_effect = Exception('boom')
+
+        self.service._sync_power_states(self.context)
+
+        for task in self.tasks:
+            task.release_resources.assert_called_once_with()
+        self.assertEqual(len(self.nodes), sync_mock.call_count)
+
+    def test_batch_size(self, get_nodeinfo_mock, mapped_mock,
+                        acquire_mock, sync_mock):
+        self.config(sync_power_state_batch_size=2, group='conductor')
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                self.nodes)
+        mapped_mock.side_effect = self._map_all_nodes
+        acquire_mock.side_effect = self.tasks
+        self.power.get_power_states.return_value = dict(
+                (n.uuid, states.POWER_ON) for n in self.nodes)
+
+        self.service._sync_power_states(self.context)
+
+        self.assertEqual([mock.call(self.tasks[:2]),
+                          mock.call(self.tasks[2:])],
+                         self.power.get_power_states.call_args_list)
+        self.assertFalse(sync_mock.called)
+
+
+@mock.patch.object(task_manager, 'acquire')
+@mock.patch.object(manager.ConductorManager,
+                   '_get_nodes_mapped_to_this_conductor')
 @mock.patch.object(dbapi.IMPL, 'get_nodeinfo_list')
 class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn,
                                          tests_db_base.DbTestCase):
@@ -2153,7 +2568,11 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn,
 
         self.filters = {'reserved': False, 'maintenance': False,
                         'provisioned_before': 300,
-                        'provision_state': states.DEPLOYWAIT}
+                        'provision_state': states.DEPLOYWAIT,
+                        'hash_ranges': self._mock_hash_ranges()}
+        self.reserve_filters = {'maintenance': False,
+                                'provisioned_before': 300,
+                                'provision_state': states.DEPLOYWAIT}
         self.columns = ['uuid', 'driver']
 
     def _assert_get_nodeinfo_args(self, get_nodeinfo_mock):
@@ -2173,32 +2592,35 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn,
 
     def test_not_mapped(self, get_nodeinfo_mock, mapped_mock, acquire_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = False
+        mapped_mock.return_value = set()
 
         self.service._check_deploy_timeouts(self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        mapped_mock.assert_called_once_with(self.node.uuid, self.node.driver)
+        mapped_mock.assert_called_once_with([self.node.uuid],
+                                            self.node.driver)
         self.assertFalse(acquire_mock.called)
 
     def test_timeout(self, get_nodeinfo_mock, mapped_mock, acquire_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = self._get_acquire_side_effect(self.task)
 
         self.service._check_deploy_timeouts(self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        mapped_mock.assert_called_once_with(self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context, self.node.uuid)
+        mapped_mock.assert_called_once_with([self.node.uuid],
+                                            self.node.driver)
+        acquire_mock.assert_called_once_with(
+                self.context, self.node.uuid, filters=self.reserve_filters)
         self.task.spawn_after.assert_called_with(
-                self.service._spawn_worker,
+                self.service._spawn_periodic_worker,
                 conductor_utils.cleanup_after_timeout, self.task)
 
     def test_acquire_node_disappears(self, get_nodeinfo_mock, mapped_mock,
                                      acquire_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = exception.NodeNotFound(node='fake')
 
         # Exception eaten
@@ -2206,15 +2628,15 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn,
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
         mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
+                [self.node.uuid], self.node.driver)
+        acquire_mock.assert_called_once_with(
+                self.context, self.node.uuid, filters=self.reserve_filters)
         self.assertFalse(self.task.spawn_after.called)
 
     def test_acquire_node_locked(self, get_nodeinfo_mock, mapped_mock,
                                  acquire_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = exception.NodeLocked(node='fake',
                                                         host='fake')
 
@@ -2223,62 +2645,41 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn,
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
         mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
+                [self.node.uuid], self.node.driver)
+        acquire_mock.assert_called_once_with(
+                self.context, self.node.uuid, filters=self.reserve_filters)
         self.assertFalse(self.task.spawn_after.called)
 
-    def test_no_deploywait_after_lock(self, get_nodeinfo_mock, mapped_mock,
-                                      acquire_mock):
-        task = self._create_task(
-                node_attrs=dict(provision_state=states.NOSTATE,
-                                uuid=self.node.uuid))
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = True
-        acquire_mock.side_effect = self._get_acquire_side_effect(task)
-
-        self.service._check_deploy_timeouts(self.context)
-
-        self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
-        self.assertFalse(task.spawn_after.called)
-
-    def test_maintenance_after_lock(self, get_nodeinfo_mock, mapped_mock,
-                                    acquire_mock):
-        task = self._create_task(
-                node_attrs=dict(provision_state=states.DEPLOYWAIT,
-                                maintenance=True,
-                                uuid=self.node.uuid))
+    def test_acquire_node_filters_not_matched(self, get_nodeinfo_mock,
+                                              mapped_mock, acquire_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
-                [task.node, self.node2])
-        mapped_mock.return_value = True
+                [self.node, self.node2])
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = self._get_acquire_side_effect(
-                [task, self.task2])
+                [exception.NodeFiltersNotMatched(node='fake'), self.task2])
 
         self.service._check_deploy_timeouts(self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        self.assertEqual([mock.call(self.node.uuid, task.node.driver),
-                          mock.call(self.node2.uuid, self.node2.driver)],
+        self.assertEqual([mock.call([self.node.uuid], self.node.driver),
+                          mock.call([self.node2.uuid], self.node2.driver)],
                          mapped_mock.call_args_list)
-        self.assertEqual([mock.call(self.context, self.node.uuid),
-                          mock.call(self.context, self.node2.uuid)],
+        self.assertEqual([mock.call(self.context, self.node.uuid,
+                                    filters=self.reserve_filters),
+                          mock.call(self.context, self.node2.uuid,
+                                    filters=self.reserve_filters)],
                          acquire_mock.call_args_list)
-        # First node skipped
-        self.assertFalse(task.spawn_after.called)
-        # Second node spawned
+        # First node skipped, second node spawned
+        self.assertFalse(self.task.spawn_after.called)
         self.task2.spawn_after.assert_called_with(
-                self.service._spawn_worker,
+                self.service._spawn_periodic_worker,
                 conductor_utils.cleanup_after_timeout, self.task2)
 
     def test_exiting_no_worker_avail(self, get_nodeinfo_mock, mapped_mock,
                                      acquire_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
                 [self.node, self.node2])
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = self._get_acquire_side_effect(
                 [(self.task, exception.NoFreeConductorWorker()), self.task2])
 
@@ -2286,21 +2687,19 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn,
         self.service._check_deploy_timeouts(self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        # mapped should be only called for the first node as we should
+        # acquire should be only called for the first node as we should
         # have exited the loop early due to NoFreeConductorWorker
-        mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
+        acquire_mock.assert_called_once_with(
+                self.context, self.node.uuid, filters=self.reserve_filters)
         self.task.spawn_after.assert_called_with(
-                self.service._spawn_worker,
+                self.service._spawn_periodic_worker,
                 conductor_utils.cleanup_after_timeout, self.task)
 
     def test_exiting_with_other_exception(self, get_nodeinfo_mock,
                                           mapped_mock, acquire_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
                 [self.node, self.node2])
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = self._get_acquire_side_effect(
                 [(self.task, exception.IronicException('foo')), self.task2])
 
@@ -2310,14 +2709,12 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn,
                           self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        # mapped should be only called for the first node as we should
+        # acquire should be only called for the first node as we should
         # have exited the loop early due to unknown exception
-        mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
+        acquire_mock.assert_called_once_with(
+                self.context, self.node.uuid, filters=self.reserve_filters)
         self.task.spawn_after.assert_called_with(
-                self.service._spawn_worker,
+                self.service._spawn_periodic_worker,
                 conductor_utils.cleanup_after_timeout, self.task)
 
     def test_worker_limit(self, get_nodeinfo_mock, mapped_mock, acquire_mock):
@@ -2328,18 +2725,17 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn,
 
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
                 [self.node] * 3)
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = self._get_acquire_side_effect(
                 [self.task] * 3)
 
         self.service._check_deploy_timeouts(self.context)
 
         # Should only have ran 2.
-        self.assertEqual([mock.call(self.node.uuid, self.node.driver)] * 2,
-                         mapped_mock.call_args_list)
-        self.assertEqual([mock.call(self.context, self.node.uuid)] * 2,
+        self.assertEqual([mock.call(self.context, self.node.uuid,
+                                    filters=self.reserve_filters)] * 2,
                          acquire_mock.call_args_list)
-        spawn_after_call = mock.call(self.service._spawn_worker,
+        spawn_after_call = mock.call(self.service._spawn_periodic_worker,
                                      conductor_utils.cleanup_after_timeout,
                                      self.task)
         self.assertEqual([spawn_after_call] * 2,
@@ -2480,8 +2876,9 @@ class ManagerTestProperties(tests_db_base.DbTestCase):
 
 @mock.patch.object(keystone, 'get_admin_auth_token')
 @mock.patch.object(task_manager, 'acquire')
-@mock.patch.object(manager.ConductorManager, '_mapped_to_this_conductor')
-@mock.patch.object(dbapi.IMPL, 'get_nodeinfo_list')
+@mock.patch.object(manager.ConductorManager,
+                   '_get_nodes_mapped_to_this_conductor')
+@mock.patch.object(dbapi.IMPL, 'iter_nodeinfo_list')
 class ManagerSyncLocalStateTestCase(_CommonMixIn, tests_db_base.DbTestCase):
 
     def setUp(self):
@@ -2498,7 +2895,10 @@ class ManagerSyncLocalStateTestCase(_CommonMixIn, tests_db_base.DbTestCase):
 
         self.filters = {'reserved': False,
                         'maintenance': False,
-                        'provision_state': states.ACTIVE}
+                        'provision_state': states.ACTIVE,
+                        'hash_ranges': self._mock_hash_ranges()}
+        self.reserve_filters = {'maintenance': False,
+                                'provision_state': states.ACTIVE}
         self.columns = ['id', 'uuid', 'driver', 'conductor_affinity']
 
     def _assert_get_nodeinfo_args(self, get_nodeinfo_mock):
@@ -2508,15 +2908,16 @@ class ManagerSyncLocalStateTestCase(_CommonMixIn, tests_db_base.DbTestCase):
     def test_not_mapped(self, get_nodeinfo_mock, mapped_mock, acquire_mock,
                         get_authtoken_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = False
+        mapped_mock.return_value = set()
 
         self.service._sync_local_state(self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        mapped_mock.assert_called_once_with(self.node.uuid, self.node.driver)
+        mapped_mock.assert_called_once_with([self.node.uuid],
+                                            self.node.driver)
         self.assertFalse(acquire_mock.called)
         self.assertFalse(get_authtoken_mock.called)
-        self.service.ring_manager.reset.assert_called_once_with()
+        self.service.ring_manager.update.assert_called_once_with()
 
     def test_already_mapped(self, get_nodeinfo_mock, mapped_mock,
                              acquire_mock, get_authtoken_mock):
@@ -2525,40 +2926,56 @@ class ManagerSyncLocalStateTestCase(_CommonMixIn, tests_db_base.DbTestCase):
         self.service.conductor.id = 123
 
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
 
         self.service._sync_local_state(self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        mapped_mock.assert_called_once_with(self.node.uuid, self.node.driver)
+        mapped_mock.assert_called_once_with([self.node.uuid],
+                                            self.node.driver)
         self.assertFalse(acquire_mock.called)
         self.assertFalse(get_authtoken_mock.called)
-        self.service.ring_manager.reset.assert_called_once_with()
+        self.service.ring_manager.update.assert_called_once_with()
+
+    def test_rings_unchanged(self, get_nodeinfo_mock, mapped_mock,
+                             acquire_mock, get_authtoken_mock):
+        # Nodes may need a takeover without any change of the rings, eg.
+        # when they leave maintenance, so they are still scanned.
+        self.service.ring_manager.update.return_value = False
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
+        mapped_mock.return_value = set()
+
+        self.service._sync_local_state(self.context)
+
+        self.service.ring_manager.update.assert_called_once_with()
+        self._assert_get_nodeinfo_args(get_nodeinfo_mock)
 
     @mock.patch.object(context, 'get_admin_context')
     def test_good(self, get_ctx_mock, get_nodeinfo_mock, mapped_mock,
                   acquire_mock, get_authtoken_mock):
         get_ctx_mock.return_value = self.context
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = self._get_acquire_side_effect(self.task)
 
         self.service._sync_local_state(self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        mapped_mock.assert_called_once_with(self.node.uuid, self.node.driver)
+        mapped_mock.assert_called_once_with([self.node.uuid],
+                                            self.node.driver)
         get_authtoken_mock.assert_called_once_with()
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
+        acquire_mock.assert_called_once_with(
+                self.context, self.node.id, filters=self.reserve_filters)
         # assert spawn_after has been called
         self.task.spawn_after.assert_called_once_with(
-                self.service._spawn_worker,
+                self.service._spawn_periodic_worker,
                 self.service._do_takeover, self.task)
 
     @mock.patch.object(context, 'get_admin_context')
     def test_no_free_worker(self, get_ctx_mock, get_nodeinfo_mock, mapped_mock,
                             acquire_mock, get_authtoken_mock):
         get_ctx_mock.return_value = self.context
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = self._get_acquire_side_effect(
                                        [self.task] * 3)
         self.task.spawn_after.side_effect = [
@@ -2574,22 +2991,21 @@ class ManagerSyncLocalStateTestCase(_CommonMixIn, tests_db_base.DbTestCase):
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
 
-        # assert  _mapped_to_this_conductor() gets called 2 times only
-        # instead of 3. When NoFreeConductorWorker is raised the loop
-        # should be broken
-        expected = [mock.call(self.node.uuid, self.node.driver)] * 2
-        self.assertEqual(expected, mapped_mock.call_args_list)
+        # assert the mapping is looked up once for the whole chunk
+        mapped_mock.assert_called_once_with([self.node.uuid] * 3,
+                                            self.node.driver)
 
         # assert  acquire() gets called 2 times only instead of 3. When
         # NoFreeConductorWorker is raised the loop should be broken
-        expected = [mock.call(self.context, self.node.id)] * 2
+        expected = [mock.call(self.context, self.node.id,
+                              filters=self.reserve_filters)] * 2
         self.assertEqual(expected, acquire_mock.call_args_list)
 
         # Only one auth token needed for all runs
         get_authtoken_mock.assert_called_once_with()
 
         # assert spawn_after has been called twice
-        expected = [mock.call(self.service._spawn_worker,
+        expected = [mock.call(self.service._spawn_periodic_worker,
                     self.service._do_takeover, self.task)] * 2
         self.assertEqual(expected, self.task.spawn_after.call_args_list)
 
@@ -2597,7 +3013,7 @@ class ManagerSyncLocalStateTestCase(_CommonMixIn, tests_db_base.DbTestCase):
     def test_node_locked(self, get_ctx_mock, get_nodeinfo_mock, mapped_mock,
                             acquire_mock, get_authtoken_mock):
         get_ctx_mock.return_value = self.context
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = self._get_acquire_side_effect(
                 [self.task, exception.NodeLocked('error'), self.task])
         self.task.spawn_after.side_effect = [None, None]
@@ -2610,19 +3026,20 @@ class ManagerSyncLocalStateTestCase(_CommonMixIn, tests_db_base.DbTestCase):
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
 
-        # assert _mapped_to_this_conductor() gets called 3 times
-        expected = [mock.call(self.node.uuid, self.node.driver)] * 3
-        self.assertEqual(expected, mapped_mock.call_args_list)
+        # assert the mapping is looked up once for the whole chunk
+        mapped_mock.assert_called_once_with([self.node.uuid] * 3,
+                                            self.node.driver)
 
         # assert acquire() gets called 3 times
-        expected = [mock.call(self.context, self.node.id)] * 3
+        expected = [mock.call(self.context, self.node.id,
+                              filters=self.reserve_filters)] * 3
         self.assertEqual(expected, acquire_mock.call_args_list)
 
         # Only one auth token needed for all runs
         get_authtoken_mock.assert_called_once_with()
 
         # assert spawn_after has been called only 2 times
-        expected = [mock.call(self.service._spawn_worker,
+        expected = [mock.call(self.service._spawn_periodic_worker,
                     self.service._do_takeover, self.task)] * 2
         self.assertEqual(expected, self.task.spawn_after.call_args_list)
 
@@ -2632,7 +3049,7 @@ class ManagerSyncLocalStateTestCase(_CommonMixIn, tests_db_base.DbTestCase):
         # Limit to only 1 worker
         self.config(periodic_max_workers=1, group='conductor')
         get_ctx_mock.return_value = self.context
-        mapped_mock.return_value = True
+        mapped_mock.side_effect = self._map_all_nodes
         acquire_mock.side_effect = self._get_acquire_side_effect(
                                        [self.task] * 3)
         self.task.spawn_after.side_effect = [None] * 3
@@ -2645,17 +3062,18 @@ class ManagerSyncLocalStateTestCase(_CommonMixIn, tests_db_base.DbTestCase):
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
 
-        # assert _mapped_to_this_conductor() gets called only once
-        # because of the worker limit
-        mapped_mock.assert_called_once_with(self.node.uuid, self.node.driver)
+        # assert the nodes are mapped at once
+        mapped_mock.assert_called_once_with([self.node.uuid] * 3,
+                                            self.node.driver)
 
         # assert acquire() gets called only once because of the worker limit
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
+        acquire_mock.assert_called_once_with(
+                self.context, self.node.id, filters=self.reserve_filters)
 
         # Only one auth token needed for all runs
         get_authtoken_mock.assert_called_once_with()
 
         # assert spawn_after has been called
         self.task.spawn_after.assert_called_once_with(
-                self.service._spawn_worker,
+                self.service._spawn_periodic_worker,
                 self.service._do_takeover, self.task)
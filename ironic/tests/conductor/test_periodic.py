@@ -0,0 +1,99 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for :class:`ironic.conductor.periodic.PeriodicTaskScheduler`."""
+
+import itertools
+
+import mock
+
+from ironic.conductor import periodic
+from ironic.openstack.common import periodic_task
+from ironic.tests import base
+
+
+class FakeTasks(periodic_task.PeriodicTasks):
+
+    def __init__(self):
+        super(FakeTasks, self).__init__()
+        self.calls = []
+
+    @periodic_task.periodic_task(spacing=10, run_immediately=True)
+    def _task(self, context):
+        self.calls.append(context)
+
+
+class PeriodicTaskSchedulerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(PeriodicTaskSchedulerTestCase, self).setUp()
+        self.obj = FakeTasks()
+        self.context = mock.sentinel.context
+        self.scheduler = periodic.PeriodicTaskScheduler(self.obj,
+                                                        self.context)
+        self.task = dict(FakeTasks._periodic_tasks)['_task']
+
+    @mock.patch.object(periodic.time, 'time')
+    def test__run_task(self, mock_time):
+        mock_time.side_effect = [102, 105]
+        self.scheduler._run_task('_task', self.task, 100)
+        self.assertEqual([self.context], self.obj.calls)
+        self.assertEqual({'runs': 1, 'failures': 0, 'overruns': 0,
+                          'last_run': 102, 'last_duration': 3,
+                          'last_lag': 2},
+                         self.scheduler.get_stats()['_task'])
+
+    def test__run_task_failure(self):
+        task = mock.Mock(side_effect=Exception('boom'))
+        self.scheduler._run_task('_task', task, 100)
+        task.assert_called_once_with(self.obj, self.context)
+        stats = self.scheduler.get_stats()['_task']
+        self.assertEqual(1, stats['runs'])
+        self.assertEqual(1, stats['failures'])
+
+    def test__run_task_already_running(self):
+        self.scheduler._locks['_task'].acquire()
+        self.scheduler._run_task('_task', self.task, 100)
+        self.assertEqual([], self.obj.calls)
+        stats = self.scheduler.get_stats()['_task']
+        self.assertEqual(0, stats['runs'])
+        self.assertEqual(1, stats['overruns'])
+
+    @mock.patch.object(periodic.time, 'time')
+    def test__run_loop_overrun(self, mock_time):
+        # Runs at 0, finishes at 25: the runs due at 10 and 20 are skipped,
+        # and the next one is scheduled at 30.
+        mock_time.side_effect = itertools.chain([0, 0, 0, 25, 25],
+                                                itertools.repeat(26))
+
+        def _wait(delay):
+            self.assertEqual(4, delay)
+            self.scheduler._stop_evt.set()
+
+        with mock.patch.object(self.scheduler._stop_evt, 'wait',
+                               side_effect=_wait):
+            self.scheduler._run_loop('_task', self.task, 10)
+
+        self.assertEqual(1, len(self.obj.calls))
+        stats = self.scheduler.get_stats()['_task']
+        self.assertEqual(1, stats['runs'])
+        self.assertEqual(2, stats['overruns'])
+        self.assertEqual(25, stats['last_duration'])
+
+    @mock.patch.object(periodic.eventlet, 'spawn')
+    def test_start_stop(self, mock_spawn):
+        self.scheduler.start()
+        mock_spawn.assert_called_once_with(self.scheduler._run_loop,
+                                           '_task', self.task, 10)
+        self.assertFalse(self.scheduler._stop_evt.is_set())
+        self.scheduler.stop()
+        self.assertTrue(self.scheduler._stop_evt.is_set())
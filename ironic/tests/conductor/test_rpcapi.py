@@ -22,6 +22,7 @@ import copy
 
 import mock
 from oslo.config import cfg
+from oslo import messaging
 
 from ironic.common import boot_devices
 from ironic.common import exception
@@ -128,6 +129,46 @@ class RPCAPITestCase(base.DbTestCase):
         self.assertEqual('fake-topic.fake-host',
                          rpcapi.get_topic_for_driver('fake-driver'))
 
+    def test_get_topic_for_caches_ring(self):
+        CONF.set_override('host', 'fake-host')
+        self.dbapi.register_conductor({'hostname': 'fake-host',
+                                       'drivers': ['fake-driver']})
+        rpcapi = conductor_rpcapi.ConductorAPI(topic='fake-topic')
+        rpcapi.get_topic_for(self.fake_node_obj)
+
+        with mock.patch.object(self.dbapi,
+                               'get_active_driver_dict') as get_dict_mock:
+            rpcapi = conductor_rpcapi.ConductorAPI(topic='fake-topic')
+            self.assertEqual('fake-topic.fake-host',
+                             rpcapi.get_topic_for(self.fake_node_obj))
+            self.assertFalse(get_dict_mock.called)
+
+    def test_rpc_timeout_resets_ring(self):
+        rpcapi = conductor_rpcapi.ConductorAPI(topic='fake-topic')
+        with mock.patch.object(rpcapi.client, 'prepare') as prepare_mock:
+            prepare_mock.return_value.call.side_effect = (
+                messaging.MessagingTimeout())
+            with mock.patch.object(rpcapi.ring_manager,
+                                   'reset') as reset_mock:
+                self.assertRaises(messaging.MessagingTimeout,
+                                  rpcapi.update_node, self.context,
+                                  self.fake_node_obj,
+                                  topic='fake-topic.fake-host')
+                reset_mock.assert_called_once_with()
+
+    def test_change_node_states_timeout_keeps_ring(self):
+        rpcapi = conductor_rpcapi.ConductorAPI(topic='fake-topic')
+        with mock.patch.object(rpcapi.client, 'prepare') as prepare_mock:
+            prepare_mock.return_value.call.side_effect = (
+                messaging.MessagingTimeout())
+            with mock.patch.object(rpcapi.ring_manager,
+                                   'reset') as reset_mock:
+                self.assertRaises(messaging.MessagingTimeout,
+                                  rpcapi.change_node_states, self.context,
+                                  [self.fake_node['uuid']], states.POWER_ON,
+                                  topic='fake-topic.fake-host')
+                self.assertFalse(reset_mock.called)
+
     def _test_rpcapi(self, method, rpc_method, **kwargs):
         rpcapi = conductor_rpcapi.ConductorAPI(topic='fake-topic')
 
@@ -270,6 +311,13 @@ class RPCAPITestCase(base.DbTestCase):
                           version='1.17',
                           node_id=self.fake_node['uuid'])
 
+    def test_change_node_states(self):
+        self._test_rpcapi('change_node_states',
+                          'call',
+                          version='1.22',
+                          node_ids=[self.fake_node['uuid']],
+                          target=states.POWER_OFF)
+
     def test_get_node_vendor_passthru_methods(self):
         self._test_rpcapi('get_node_vendor_passthru_methods',
                           'call',
@@ -23,6 +23,7 @@ import mock
 
 from ironic.common import driver_factory
 from ironic.common import exception
+from ironic.common import metrics
 from ironic.common import utils
 from ironic.conductor import task_manager
 from ironic import objects
@@ -56,7 +57,7 @@ class TaskManagerTestCase(tests_db_base.DbTestCase):
             self.assertFalse(task.shared)
 
         reserve_mock.assert_called_once_with(self.context, self.host,
-                                             'fake-node-id')
+                                             'fake-node-id', filters=None)
         get_ports_mock.assert_called_once_with(self.context, self.node.id)
         get_driver_mock.assert_called_once_with(self.node.driver)
         release_mock.assert_called_once_with(self.context, self.host,
@@ -76,7 +77,7 @@ class TaskManagerTestCase(tests_db_base.DbTestCase):
             self.assertFalse(task.shared)
 
         reserve_mock.assert_called_once_with(self.context, self.host,
-                                             'fake-node-id')
+                                             'fake-node-id', filters=None)
         get_ports_mock.assert_called_once_with(self.context, self.node.id)
         get_driver_mock.assert_called_once_with('fake-driver')
         release_mock.assert_called_once_with(self.context, self.host,
@@ -110,8 +111,10 @@ class TaskManagerTestCase(tests_db_base.DbTestCase):
                 self.assertEqual(mock.sentinel.driver2, task2.driver)
                 self.assertFalse(task2.shared)
 
-        self.assertEqual([mock.call(self.context, self.host, 'node-id1'),
-                          mock.call(self.context, self.host, 'node-id2')],
+        self.assertEqual([mock.call(self.context, self.host, 'node-id1',
+                                    filters=None),
+                          mock.call(self.context, self.host, 'node-id2',
+                                    filters=None)],
                          reserve_mock.call_args_list)
         self.assertEqual([mock.call(self.context, self.node.id),
                           mock.call(self.context, node2.id)],
@@ -158,28 +161,146 @@ class TaskManagerTestCase(tests_db_base.DbTestCase):
                           'fake-node-id')
 
         reserve_mock.assert_called_with(self.context, self.host,
-                                        'fake-node-id')
+                                        'fake-node-id', filters=None)
         self.assertEqual(retry_attempts, reserve_mock.call_count)
         self.assertFalse(get_ports_mock.called)
         self.assertFalse(get_driver_mock.called)
         self.assertFalse(release_mock.called)
         self.assertFalse(node_get_mock.called)
 
+    def test_excl_lock_reserve_exception_no_retry(self, get_ports_mock,
+                                                  get_driver_mock,
+                                                  reserve_mock, release_mock,
+                                                  node_get_mock):
+        self.config(node_locked_retry_attempts=3, group='conductor')
+        reserve_mock.side_effect = exception.NodeLocked(node='foo',
+                                                        host='foo')
+
+        self.assertRaises(exception.NodeLocked,
+                          task_manager.TaskManager,
+                          self.context,
+                          'fake-node-id',
+                          retry=False)
+
+        reserve_mock.assert_called_once_with(self.context, self.host,
+                                             'fake-node-id', filters=None)
+        self.assertFalse(release_mock.called)
+
+    @mock.patch.object(metrics, 'incr')
+    def test_excl_lock_reserve_exception_metrics(self, incr_mock,
+                                                 get_ports_mock,
+                                                 get_driver_mock,
+                                                 reserve_mock, release_mock,
+                                                 node_get_mock):
+        self.config(node_locked_retry_attempts=2, group='conductor')
+        reserve_mock.side_effect = exception.NodeLocked(node='foo',
+                                                        host='foo')
+
+        self.assertRaises(exception.NodeLocked,
+                          task_manager.TaskManager,
+                          self.context,
+                          'fake-node-id')
+
+        self.assertEqual([mock.call('conductor.task.node_locked')] * 2,
+                         incr_mock.call_args_list)
+
+    @mock.patch.object(metrics, 'observe')
+    def test_excl_lock_held_metrics(self, observe_mock, get_ports_mock,
+                                    get_driver_mock, reserve_mock,
+                                    release_mock, node_get_mock):
+        reserve_mock.return_value = self.node
+        with task_manager.TaskManager(self.context, 'fake-node-id'):
+            self.assertFalse(observe_mock.called)
+
+        observe_mock.assert_called_once_with('conductor.task.lock_held',
+                                             mock.ANY)
+
+    def test_excl_lock_with_filters(self, get_ports_mock, get_driver_mock,
+                                    reserve_mock, release_mock,
+                                    node_get_mock):
+        reserve_mock.return_value = self.node
+        filters = {'maintenance': False}
+        with task_manager.TaskManager(self.context, 'fake-node-id',
+                                      filters=filters) as task:
+            self.assertEqual(self.node, task.node)
+
+        reserve_mock.assert_called_once_with(self.context, self.host,
+                                             'fake-node-id', filters=filters)
+        release_mock.assert_called_once_with(self.context, self.host,
+                                             self.node.id)
+
+    def test_excl_lock_filters_not_matched(self, get_ports_mock,
+                                           get_driver_mock, reserve_mock,
+                                           release_mock, node_get_mock):
+        self.config(node_locked_retry_attempts=3, group='conductor')
+        reserve_mock.side_effect = exception.NodeFiltersNotMatched(
+                node='foo')
+        filters = {'maintenance': False}
+
+        self.assertRaises(exception.NodeFiltersNotMatched,
+                          task_manager.TaskManager,
+                          self.context,
+                          'fake-node-id',
+                          filters=filters)
+
+        # Not retried
+        reserve_mock.assert_called_once_with(self.context, self.host,
+                                             'fake-node-id', filters=filters)
+        self.assertFalse(get_ports_mock.called)
+        self.assertFalse(release_mock.called)
+
+    def test_excl_lock_ports_loaded_lazily(self, get_ports_mock,
+                                           get_driver_mock, reserve_mock,
+                                           release_mock, node_get_mock):
+        reserve_mock.return_value = self.node
+        with task_manager.TaskManager(self.context, 'fake-node-id') as task:
+            self.assertFalse(get_ports_mock.called)
+            self.assertEqual(get_ports_mock.return_value, task.ports)
+            self.assertEqual(get_ports_mock.return_value, task.ports)
+
+        get_ports_mock.assert_called_once_with(self.context, self.node.id)
+        self.assertIsNone(task.ports)
+
+    def test_excl_lock_ports_not_accessed(self, get_ports_mock,
+                                          get_driver_mock, reserve_mock,
+                                          release_mock, node_get_mock):
+        reserve_mock.return_value = self.node
+        with task_manager.TaskManager(self.context, 'fake-node-id'):
+            pass
+
+        self.assertFalse(get_ports_mock.called)
+
+    @mock.patch.object(objects.Node, 'reserve_with_ports')
+    def test_excl_lock_load_ports(self, reserve_ports_mock, get_ports_mock,
+                                  get_driver_mock, reserve_mock,
+                                  release_mock, node_get_mock):
+        reserve_ports_mock.return_value = (self.node, mock.sentinel.ports)
+        with task_manager.TaskManager(self.context, 'fake-node-id',
+                                      load_ports=True) as task:
+            self.assertEqual(self.node, task.node)
+            self.assertEqual(mock.sentinel.ports, task.ports)
+
+        reserve_ports_mock.assert_called_once_with(self.context, self.host,
+                                                   'fake-node-id',
+                                                   filters=None)
+        self.assertFalse(reserve_mock.called)
+        self.assertFalse(get_ports_mock.called)
+        release_mock.assert_called_once_with(self.context, self.host,
+                                             self.node.id)
+
     def test_excl_lock_get_ports_exception(self, get_ports_mock,
                                            get_driver_mock, reserve_mock,
                                            release_mock, node_get_mock):
         reserve_mock.return_value = self.node
         get_ports_mock.side_effect = exception.IronicException('foo')
 
-        self.assertRaises(exception.IronicException,
-                          task_manager.TaskManager,
-                          self.context,
-                          'fake-node-id')
+        with task_manager.TaskManager(self.context, 'fake-node-id') as task:
+            self.assertRaises(exception.IronicException,
+                              getattr, task, 'ports')
 
         reserve_mock.assert_called_once_with(self.context, self.host,
-                                             'fake-node-id')
+                                             'fake-node-id', filters=None)
         get_ports_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(get_driver_mock.called)
         release_mock.assert_called_once_with(self.context, self.host,
                                              self.node.id)
         self.assertFalse(node_get_mock.called)
@@ -197,8 +318,8 @@ class TaskManagerTestCase(tests_db_base.DbTestCase):
                           'fake-node-id')
 
         reserve_mock.assert_called_once_with(self.context, self.host,
-                                             'fake-node-id')
-        get_ports_mock.assert_called_once_with(self.context, self.node.id)
+                                             'fake-node-id', filters=None)
+        self.assertFalse(get_ports_mock.called)
         get_driver_mock.assert_called_once_with(self.node.driver)
         release_mock.assert_called_once_with(self.context, self.host,
                                              self.node.id)
@@ -258,23 +379,39 @@ class TaskManagerTestCase(tests_db_base.DbTestCase):
         self.assertFalse(get_ports_mock.called)
         self.assertFalse(get_driver_mock.called)
 
+    @mock.patch.object(objects.Node, 'get_with_ports')
+    def test_shared_lock_load_ports(self, get_with_ports_mock,
+                                    get_ports_mock, get_driver_mock,
+                                    reserve_mock, release_mock,
+                                    node_get_mock):
+        get_with_ports_mock.return_value = (self.node, mock.sentinel.ports)
+        with task_manager.TaskManager(self.context, 'fake-node-id',
+                                      shared=True, load_ports=True) as task:
+            self.assertEqual(self.node, task.node)
+            self.assertEqual(mock.sentinel.ports, task.ports)
+
+        get_with_ports_mock.assert_called_once_with(self.context,
+                                                    'fake-node-id')
+        self.assertFalse(node_get_mock.called)
+        self.assertFalse(get_ports_mock.called)
+        self.assertFalse(reserve_mock.called)
+        self.assertFalse(release_mock.called)
+
     def test_shared_lock_get_ports_exception(self, get_ports_mock,
                                              get_driver_mock, reserve_mock,
                                              release_mock, node_get_mock):
         node_get_mock.return_value = self.node
         get_ports_mock.side_effect = exception.IronicException('foo')
 
-        self.assertRaises(exception.IronicException,
-                          task_manager.TaskManager,
-                          self.context,
-                          'fake-node-id',
-                          shared=True)
+        with task_manager.TaskManager(self.context, 'fake-node-id',
+                                      shared=True) as task:
+            self.assertRaises(exception.IronicException,
+                              getattr, task, 'ports')
 
         self.assertFalse(reserve_mock.called)
         self.assertFalse(release_mock.called)
         node_get_mock.assert_called_once_with(self.context, 'fake-node-id')
         get_ports_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(get_driver_mock.called)
 
     def test_shared_lock_get_driver_exception(self, get_ports_mock,
                                               get_driver_mock, reserve_mock,
@@ -292,9 +429,45 @@ class TaskManagerTestCase(tests_db_base.DbTestCase):
         self.assertFalse(reserve_mock.called)
         self.assertFalse(release_mock.called)
         node_get_mock.assert_called_once_with(self.context, 'fake-node-id')
-        get_ports_mock.assert_called_once_with(self.context, self.node.id)
+        self.assertFalse(get_ports_mock.called)
         get_driver_mock.assert_called_once_with(self.node.driver)
 
+    def test_upgrade_lock(self, get_ports_mock, get_driver_mock,
+                          reserve_mock, release_mock, node_get_mock):
+        node_get_mock.return_value = self.node
+        reserve_mock.return_value = self.node
+        with task_manager.TaskManager(self.context, 'fake-node-id',
+                                      shared=True) as task:
+            self.assertEqual(self.context, task.context)
+            self.assertEqual(self.node, task.node)
+            self.assertTrue(task.shared)
+            self.assertFalse(reserve_mock.called)
+
+            task.upgrade_lock(filters={'maintenance': False})
+            self.assertFalse(task.shared)
+            # second upgrade does nothing
+            task.upgrade_lock()
+            self.assertFalse(task.shared)
+
+        reserve_mock.assert_called_once_with(self.context, self.host,
+                                             self.node.id,
+                                             filters={'maintenance': False})
+        release_mock.assert_called_once_with(self.context, self.host,
+                                             self.node.id)
+
+    def test_upgrade_lock_node_locked(self, get_ports_mock, get_driver_mock,
+                                      reserve_mock, release_mock,
+                                      node_get_mock):
+        node_get_mock.return_value = self.node
+        reserve_mock.side_effect = exception.NodeLocked(node='foo',
+                                                        host='foo')
+        with task_manager.TaskManager(self.context, 'fake-node-id',
+                                      shared=True) as task:
+            self.assertRaises(exception.NodeLocked, task.upgrade_lock)
+            self.assertTrue(task.shared)
+
+        self.assertFalse(release_mock.called)
+
     def test_spawn_after(self, get_ports_mock, get_driver_mock,
                          reserve_mock, release_mock, node_get_mock):
         thread_mock = mock.Mock(spec_set=['link', 'cancel'])
@@ -0,0 +1,117 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for :class:`ironic.conductor.workers.WorkerPool`."""
+
+import eventlet
+from eventlet import event
+
+from ironic.common import exception
+from ironic.conductor import workers
+from ironic.tests import base
+
+
+class WorkerPoolTestCase(base.TestCase):
+
+    def setUp(self):
+        super(WorkerPoolTestCase, self).setUp()
+        self.pool = workers.WorkerPool(size=1, queue_size=2,
+                                       queue_timeout=5)
+        # Keep the only worker busy until release is sent
+        self.release = event.Event()
+        self.pool.spawn(workers.USER_PRIORITY, self.release.wait)
+        self.calls = []
+
+    def _spawn_later(self, priority, name):
+        def _spawn():
+            try:
+                self.pool.spawn(priority, self.calls.append, name)
+            except exception.NoFreeConductorWorker:
+                self.calls.append('%s failed' % name)
+        return eventlet.spawn(_spawn)
+
+    def test_spawn_free(self):
+        pool = workers.WorkerPool(size=1)
+        pool.spawn(workers.USER_PRIORITY, self.calls.append, 'foo')
+        pool.waitall()
+        self.assertEqual(['foo'], self.calls)
+        self.assertEqual(0, pool.get_stats()['queued'])
+
+    def test_spawn_queue_disabled(self):
+        pool = workers.WorkerPool(size=1)
+        pool.spawn(workers.USER_PRIORITY, self.release.wait)
+        self.assertRaises(exception.NoFreeConductorWorker,
+                          pool.spawn, workers.USER_PRIORITY,
+                          self.calls.append, 'foo')
+        self.assertEqual(1, pool.get_stats()['rejected'])
+        self.release.send()
+
+    def test_spawn_waits_for_worker_by_priority(self):
+        threads = [self._spawn_later(workers.PERIODIC_PRIORITY, 'periodic'),
+                   self._spawn_later(workers.USER_PRIORITY, 'user')]
+        eventlet.sleep(0)
+        stats = self.pool.get_stats()
+        self.assertEqual(2, stats['queue_depth'])
+        self.assertEqual(1, stats['running'])
+
+        self.release.send()
+        for thread in threads:
+            thread.wait()
+        self.pool.waitall()
+
+        self.assertEqual(['user', 'periodic'], self.calls)
+        stats = self.pool.get_stats()
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertEqual(2, stats['queued'])
+        self.assertEqual(2, stats['max_queue_depth'])
+
+    def test_spawn_queue_full(self):
+        threads = [self._spawn_later(workers.USER_PRIORITY, 'foo'),
+                   self._spawn_later(workers.USER_PRIORITY, 'bar')]
+        eventlet.sleep(0)
+        self.assertRaises(exception.NoFreeConductorWorker,
+                          self.pool.spawn, workers.USER_PRIORITY,
+                          self.calls.append, 'baz')
+        self.assertEqual(1, self.pool.get_stats()['rejected'])
+
+        self.release.send()
+        for thread in threads:
+            thread.wait()
+        self.pool.waitall()
+        self.assertEqual(['foo', 'bar'], self.calls)
+
+    def test_spawn_timeout(self):
+        self.pool._queue_timeout = 0.01
+        self._spawn_later(workers.USER_PRIORITY, 'foo').wait()
+        self.assertEqual(['foo failed'], self.calls)
+        stats = self.pool.get_stats()
+        self.assertEqual(1, stats['timed_out'])
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertTrue(stats['last_wait'] > 0)
+        self.release.send()
+
+    def test_spawn_nowait_free(self):
+        pool = workers.WorkerPool(size=1, queue_size=2, queue_timeout=5)
+        pool.spawn_nowait(self.calls.append, 'foo')
+        pool.waitall()
+        self.assertEqual(['foo'], self.calls)
+        self.release.send()
+
+    def test_spawn_nowait_busy(self):
+        self.assertRaises(exception.NoFreeConductorWorker,
+                          self.pool.spawn_nowait, self.calls.append, 'foo')
+        stats = self.pool.get_stats()
+        self.assertEqual(1, stats['rejected'])
+        self.assertEqual(0, stats['queued'])
+        self.release.send()
+        self.pool.waitall()
+        self.assertEqual([], self.calls)
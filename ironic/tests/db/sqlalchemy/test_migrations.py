@@ -51,6 +51,7 @@ from oslo.db.sqlalchemy import utils as db_utils
 import sqlalchemy
 import sqlalchemy.exc
 
+from ironic.common import hash_ring
 from ironic.common.i18n import _LE
 from ironic.common import utils
 from ironic.db.sqlalchemy import migration
@@ -328,6 +329,74 @@ class MigrationCheckersMixin(object):
         self.assertIsInstance(nodes.c.maintenance_reason.type,
                               sqlalchemy.types.String)
 
+    def _check_1e1d5ace7dc6(self, engine, data):
+        membership = db_utils.get_table(engine, 'conductor_membership')
+        col_names = [column.name for column in membership.c]
+        self.assertIn('generation', col_names)
+        self.assertIsInstance(membership.c.generation.type,
+                              sqlalchemy.types.Integer)
+        rows = membership.select().execute().fetchall()
+        self.assertEqual([(1, 0)], [(r['id'], r['generation'])
+                                    for r in rows])
+
+    def _pre_upgrade_4f399b21ae71(self, engine):
+        nodes = db_utils.get_table(engine, 'nodes')
+        data = {'driver': 'fake', 'uuid': utils.generate_uuid()}
+        nodes.insert().values(data).execute()
+        return data
+
+    def _check_4f399b21ae71(self, engine, data):
+        nodes = db_utils.get_table(engine, 'nodes')
+        col_names = [column.name for column in nodes.c]
+        self.assertIn('hash_partition_key', col_names)
+        self.assertIsInstance(nodes.c.hash_partition_key.type,
+                              sqlalchemy.types.BigInteger)
+        node = nodes.select(nodes.c.uuid == data['uuid']).execute().first()
+        self.assertEqual(hash_ring.get_partition_key(data['uuid']),
+                         node['hash_partition_key'])
+
+    def _check_2984a88447d3(self, engine, data):
+        insp = sqlalchemy.engine.reflection.Inspector.from_engine(engine)
+        node_indexes = dict((index['name'], index['column_names'])
+                            for index in insp.get_indexes('nodes'))
+        self.assertEqual(['driver', 'hash_partition_key'],
+                         node_indexes['node_driver_hash_partition_key_idx'])
+        self.assertEqual(['reservation', 'maintenance'],
+                         node_indexes['node_reservation_maintenance_idx'])
+        self.assertEqual(['provision_state', 'provision_updated_at'],
+                         node_indexes['node_provision_state_updated_at_idx'])
+        port_indexes = dict((index['name'], index['column_names'])
+                            for index in insp.get_indexes('ports'))
+        self.assertEqual(['node_id'], port_indexes['port_node_id_idx'])
+
+    def _check_5a8c4a1d3b27(self, engine, data):
+        heartbeats = db_utils.get_table(engine, 'agent_heartbeats')
+        col_names = [column.name for column in heartbeats.c]
+        self.assertIn('node_id', col_names)
+        self.assertIn('last_heartbeat', col_names)
+        self.assertIsInstance(heartbeats.c.last_heartbeat.type,
+                              sqlalchemy.types.DateTime)
+
+    def _check_3f8a2e5c7b14(self, engine, data):
+        insp = sqlalchemy.engine.reflection.Inspector.from_engine(engine)
+        node_indexes = dict((index['name'], index['column_names'])
+                            for index in insp.get_indexes('nodes'))
+        self.assertEqual(['created_at'], node_indexes['node_created_at_idx'])
+        self.assertEqual(['updated_at'], node_indexes['node_updated_at_idx'])
+        deletions = db_utils.get_table(engine, 'node_deletions')
+        col_names = [column.name for column in deletions.c]
+        self.assertIn('node_uuid', col_names)
+        self.assertIsInstance(deletions.c.node_uuid.type,
+                              sqlalchemy.types.String)
+        self.assertIn('deleted_at', col_names)
+        self.assertIsInstance(deletions.c.deleted_at.type,
+                              sqlalchemy.types.DateTime)
+        deletion_indexes = dict(
+            (index['name'], index['column_names'])
+            for index in insp.get_indexes('node_deletions'))
+        self.assertEqual(['deleted_at'],
+                         deletion_indexes['node_deletion_deleted_at_idx'])
+
     def test_upgrade_and_version(self):
         with patch_with_engine(self.engine):
             self.migration_api.upgrade('head')
@@ -0,0 +1,83 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests that the frequent queries on nodes and ports use indexes.
+
+The query plans are those of SQLite, on an empty database, without
+statistics; a query which uses an index in these conditions is very
+likely to use it on a large database too.
+"""
+
+from ironic.common import states
+import ironic.db.sqlalchemy.api as sa_api
+from ironic.db.sqlalchemy import models
+from ironic.tests.db import base
+
+
+class QueryPlansTestCase(base.DbTestCase):
+
+    def _get_plan(self, query):
+        engine = sa_api.get_engine()
+        compiled = query.statement.compile(dialect=engine.dialect)
+        params = [compiled.params[key] for key in compiled.positiontup]
+        rows = engine.execute('EXPLAIN QUERY PLAN %s' % compiled, params)
+        return ' '.join(row['detail'] for row in rows)
+
+    def _get_nodes_plan(self, filters):
+        query = sa_api.model_query(models.Node.id, models.Node.uuid,
+                                   models.Node.driver)
+        return self._get_plan(self.dbapi._add_nodes_filters(query, filters))
+
+    def _assert_uses_index(self, index, plan):
+        self.assertIn('INDEX %s' % index, plan)
+        self.assertNotIn('SCAN', plan)
+
+    def _assert_no_scan(self, plan):
+        self.assertIn('INDEX', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_sync_power_states(self):
+        plan = self._get_nodes_plan({'reserved': False,
+                                     'maintenance': False,
+                                     'hash_ranges': {'fake': [(None, 10),
+                                                              (20, None)]}})
+        self._assert_no_scan(plan)
+
+    def test_check_deploy_timeouts(self):
+        plan = self._get_nodes_plan({'reserved': False,
+                                     'maintenance': False,
+                                     'provision_state': states.DEPLOYWAIT,
+                                     'provisioned_before': 60})
+        self._assert_uses_index('node_provision_state_updated_at_idx', plan)
+
+    def test_sync_local_state(self):
+        plan = self._get_nodes_plan({'reserved': False,
+                                     'maintenance': False,
+                                     'provision_state': states.ACTIVE})
+        self._assert_no_scan(plan)
+
+    def test_reserved_maintenance(self):
+        plan = self._get_nodes_plan({'reserved': False,
+                                     'maintenance': False})
+        self._assert_uses_index('node_reservation_maintenance_idx', plan)
+
+    def test_driver(self):
+        plan = self._get_nodes_plan({'driver': 'fake'})
+        self._assert_uses_index('node_driver_hash_partition_key_idx', plan)
+
+    def test_hash_ranges(self):
+        plan = self._get_nodes_plan({'hash_ranges': {'fake': [(None, 10)]}})
+        self._assert_uses_index('node_driver_hash_partition_key_idx', plan)
+
+    def test_ports_by_node_id(self):
+        query = sa_api.model_query(models.Port).filter_by(node_id=1)
+        self._assert_uses_index('port_node_id_idx', self._get_plan(query))
@@ -0,0 +1,129 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for routing read-only queries to the slave database.
+
+The main and the slave databases are two distinct SQLite files, which
+are not replicated, so each test can tell which database a query used.
+"""
+
+import os
+
+import fixtures
+
+from ironic.common import exception
+from ironic.db.sqlalchemy import api as sa_api
+from ironic.db.sqlalchemy import models
+from ironic.tests import base
+from ironic.tests.db import utils
+
+
+class SlaveConnectionTestCase(base.TestCase):
+
+    def setUp(self):
+        super(SlaveConnectionTestCase, self).setUp()
+        self.tempdir = self.useFixture(fixtures.TempDir()).path
+        self.useFixture(fixtures.MonkeyPatch(
+            'ironic.db.sqlalchemy.api._FACADE', None))
+        self.addCleanup(self._dispose_engines)
+        self.dbapi = sa_api.get_backend()
+
+    def _dispose_engines(self):
+        if sa_api._FACADE is not None:
+            sa_api.get_engine().dispose()
+            sa_api.get_engine(use_slave=True).dispose()
+
+    def _setup_databases(self, slave=True):
+        self.config(connection='sqlite:///%s' %
+                    os.path.join(self.tempdir, 'main.sqlite'),
+                    group='database')
+        if slave:
+            self.config(slave_connection='sqlite:///%s' %
+                        os.path.join(self.tempdir, 'slave.sqlite'),
+                        group='database')
+        models.Base.metadata.create_all(sa_api.get_engine())
+        if slave:
+            models.Base.metadata.create_all(sa_api.get_engine(use_slave=True))
+
+    def _create_slave_row(self, model, values):
+        ref = model()
+        ref.update(values)
+        session = sa_api.get_session(use_slave=True)
+        with session.begin():
+            session.add(ref)
+
+    def test_node_reads(self):
+        self._setup_databases()
+        node = self.dbapi.create_node(utils.get_test_node(driver='main'))
+        self._create_slave_row(models.Node, utils.get_test_node(
+                                                driver='slave'))
+
+        self.assertEqual('main', self.dbapi.get_node_by_uuid(node.uuid).driver)
+        self.assertEqual('slave',
+                         self.dbapi.get_node_by_uuid(node.uuid,
+                                                     use_slave=True).driver)
+        self.assertEqual('slave',
+                         self.dbapi.get_node_by_id(node.id,
+                                                   use_slave=True).driver)
+        self.assertEqual(['slave'],
+                         [n.driver for n in
+                          self.dbapi.get_node_list(use_slave=True)])
+        self.assertEqual([('slave',)],
+                         self.dbapi.get_nodeinfo_list(columns=['driver'],
+                                                      use_slave=True))
+
+    def test_port_reads(self):
+        self._setup_databases()
+        port = self.dbapi.create_port(utils.get_test_port(
+                                          extra={'db': 'main'}))
+        self._create_slave_row(models.Port, utils.get_test_port(
+                                                extra={'db': 'slave'}))
+
+        self.assertEqual({'db': 'main'},
+                         self.dbapi.get_port_by_uuid(port.uuid).extra)
+        self.assertEqual({'db': 'slave'},
+                         self.dbapi.get_port_by_uuid(port.uuid,
+                                                     use_slave=True).extra)
+        self.assertEqual([{'db': 'slave'}],
+                         [p.extra for p in
+                          self.dbapi.get_port_list(use_slave=True)])
+
+    def test_slave_not_up_to_date(self):
+        self._setup_databases()
+        node = self.dbapi.create_node(utils.get_test_node())
+
+        self.assertRaises(exception.NodeNotFound,
+                          self.dbapi.get_node_by_uuid, node.uuid,
+                          use_slave=True)
+        self.assertEqual([], self.dbapi.get_node_list(use_slave=True))
+
+    def test_reserve_uses_main(self):
+        self._setup_databases()
+        node = self.dbapi.create_node(utils.get_test_node(driver='main'))
+        self._create_slave_row(models.Node, utils.get_test_node(
+                                                driver='slave'))
+
+        reserved = self.dbapi.reserve_node('fake-tag', node.uuid)
+
+        self.assertEqual('main', reserved.driver)
+        self.assertEqual('fake-tag',
+                         self.dbapi.get_node_by_uuid(node.uuid).reservation)
+        self.assertIsNone(self.dbapi.get_node_by_uuid(
+                              node.uuid, use_slave=True).reservation)
+
+    def test_no_slave_connection(self):
+        self._setup_databases(slave=False)
+        node = self.dbapi.create_node(utils.get_test_node())
+
+        self.assertEqual(node.uuid,
+                         self.dbapi.get_node_by_uuid(node.uuid,
+                                                     use_slave=True).uuid)
@@ -12,6 +12,7 @@
 
 """Tests for custom SQLAlchemy types via Ironic DB."""
 
+import mock
 from oslo.db import exception as db_exc
 
 from ironic.common import utils as ironic_utils
@@ -78,3 +79,46 @@ class SqlAlchemyCustomTypesTestCase(base.DbTestCase):
                           self.dbapi.register_conductor,
                           {'hostname': 'test_host3',
                            'drivers': {'this is not a list': 'test'}})
+
+    def test_LazyJSONEncodedDict_default_value(self):
+        node_id = self.dbapi.create_node({}).id
+        node = (sa_api
+                .model_query(models.Node)
+                .filter_by(id=node_id)
+                .one())
+        self.assertEqual({}, node.extra)
+
+    def test_LazyJSONEncodedDict_type_check(self):
+        self.assertRaises(TypeError,
+                          self.dbapi.create_node,
+                          {'extra': ['this is not a dict']})
+
+    def test_LazyJSONEncodedDict_decoded_on_access(self):
+        extra = {'foo': 'bar'}
+        node_id = self.dbapi.create_node({'extra': extra}).id
+        with mock.patch.object(models.json, 'loads',
+                               wraps=models.json.loads) as loads_mock:
+            node = (sa_api
+                    .model_query(models.Node)
+                    .filter_by(id=node_id)
+                    .one())
+            self.assertIsNone(node.provision_state)
+            self.assertFalse(loads_mock.called)
+
+            self.assertEqual(extra, node.extra)
+            self.assertEqual(extra, node.extra)
+            loads_mock.assert_called_once_with(node._extra)
+
+    def test_LazyJSONEncodedDict_set(self):
+        node_id = self.dbapi.create_node({'extra': {'foo': 'bar'}}).id
+        with mock.patch.object(models.json, 'loads') as loads_mock:
+            self.dbapi.update_node(node_id, {'extra': {'foo': 'baz'},
+                                             'power_state': 'power on'})
+            self.assertFalse(loads_mock.called)
+
+        node = (sa_api
+                .model_query(models.Node)
+                .filter_by(id=node_id)
+                .one())
+        self.assertEqual({'foo': 'baz'}, node.extra)
+        self.assertEqual('{"foo": "baz"}', node._extra)
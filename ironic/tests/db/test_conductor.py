@@ -64,6 +64,57 @@ class DbConductorTestCase(base.DbTestCase):
                 self.dbapi.unregister_conductor,
                 c.hostname)
 
+    def test_register_conductor_bumps_generation(self):
+        generation = self.dbapi.get_conductor_generation()
+        self._create_test_cdr()
+        self.assertEqual(generation + 1,
+                         self.dbapi.get_conductor_generation())
+
+    def test_unregister_conductor_bumps_generation(self):
+        c = self._create_test_cdr()
+        generation = self.dbapi.get_conductor_generation()
+        self.dbapi.unregister_conductor(c.hostname)
+        self.assertEqual(generation + 1,
+                         self.dbapi.get_conductor_generation())
+
+    def test_touch_conductor_keeps_generation(self):
+        c = self._create_test_cdr()
+        generation = self.dbapi.get_conductor_generation()
+        self.dbapi.touch_conductor(c.hostname)
+        self.assertEqual(generation, self.dbapi.get_conductor_generation())
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_touch_expired_conductor_bumps_generation(self, mock_utcnow):
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 0)
+        c = self._create_test_cdr()
+        generation = self.dbapi.get_conductor_generation()
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 1, 0)
+        self.dbapi.touch_conductor(c.hostname)
+        self.assertEqual(generation + 1,
+                         self.dbapi.get_conductor_generation())
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_expire_conductors(self, mock_utcnow):
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 0)
+        c = self._create_test_cdr()
+        self._create_test_cdr(id=2, hostname='alive-host')
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 1)
+        self.dbapi.touch_conductor('alive-host')
+        generation = self.dbapi.get_conductor_generation()
+
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 1, 30)
+        self.assertEqual(1, self.dbapi.expire_conductors(interval=60))
+        self.assertEqual(generation + 1,
+                         self.dbapi.get_conductor_generation())
+        self.assertRaises(exception.ConductorNotFound,
+                          self.dbapi.get_conductor, c.hostname)
+        self.dbapi.get_conductor('alive-host')
+
+        # Nothing left to expire, the generation is unchanged
+        self.assertEqual(0, self.dbapi.expire_conductors(interval=60))
+        self.assertEqual(generation + 1,
+                         self.dbapi.get_conductor_generation())
+
     @mock.patch.object(timeutils, 'utcnow')
     def test_touch_conductor(self, mock_utcnow):
         test_time = datetime.datetime(2000, 1, 1, 0, 0)
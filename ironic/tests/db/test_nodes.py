@@ -22,8 +22,11 @@ from oslo.utils import timeutils
 import six
 
 from ironic.common import exception
+from ironic.common import hash_ring
 from ironic.common import states
 from ironic.common import utils as ironic_utils
+import ironic.db.sqlalchemy.api as sa_api
+from ironic.db.sqlalchemy import models
 from ironic.tests.db import base
 from ironic.tests.db import utils
 
@@ -50,6 +53,84 @@ class DbNodeTestCase(base.DbTestCase):
                           uuid=ironic_utils.generate_uuid(),
                           instance_uuid=instance)
 
+    def _get_new_node_values(self, **kw):
+        values = utils.get_test_node(uuid=ironic_utils.generate_uuid(), **kw)
+        del values['id']
+        return values
+
+    def test_create_nodes(self):
+        ports = [{'address': '52:54:00:cf:2d:01'},
+                 {'address': '52:54:00:cf:2d:02', 'extra': {'foo': 'bar'}}]
+        values_list = [self._get_new_node_values(ports=ports),
+                       self._get_new_node_values()]
+
+        results = self.dbapi.create_nodes(values_list)
+
+        self.assertEqual(2, len(results))
+        for values, (node, ports) in zip(values_list, results):
+            self.assertEqual(values['uuid'], node.uuid)
+            self.assertEqual(
+                hash_ring.get_partition_key(node.uuid),
+                self.dbapi.get_node_by_id(node.id).hash_partition_key)
+        node, ports = results[0]
+        self.assertEqual(['52:54:00:cf:2d:01', '52:54:00:cf:2d:02'],
+                         [p.address for p in ports])
+        res = self.dbapi.get_ports_by_node_id(node.id)
+        self.assertEqual(sorted(p.uuid for p in ports),
+                         sorted(p.uuid for p in res))
+        self.assertEqual({'foo': 'bar'},
+                         self.dbapi.get_port_by_address(
+                             '52:54:00:cf:2d:02').extra)
+        self.assertEqual([], results[1][1])
+        # The values given are not modified
+        self.assertIn('ports', values_list[0])
+
+    def test_create_nodes_conflicts(self):
+        existing = utils.create_test_node(
+                        uuid=ironic_utils.generate_uuid(),
+                        instance_uuid=ironic_utils.generate_uuid())
+        utils.create_test_port(node_id=existing.id,
+                               address='52:54:00:cf:2d:01')
+        taken_uuid = self._get_new_node_values()
+        values_list = [
+            self._get_new_node_values(uuid=existing.uuid),
+            self._get_new_node_values(instance_uuid=existing.instance_uuid),
+            self._get_new_node_values(ports=[{'address':
+                                              '52:54:00:cf:2d:01'}]),
+            self._get_new_node_values(ports=[{'address':
+                                              '52:54:00:cf:2d:02'}]),
+            self._get_new_node_values(ports=[{'address':
+                                              '52:54:00:cf:2d:02'}]),
+            taken_uuid,
+            dict(taken_uuid, ports=[{'address': '52:54:00:cf:2d:03'}]),
+            self._get_new_node_values(ports=[{'address':
+                                              '52:54:00:cf:2d:03'}]),
+        ]
+
+        results = self.dbapi.create_nodes(values_list)
+
+        self.assertIsInstance(results[0], exception.NodeAlreadyExists)
+        self.assertIsInstance(results[1], exception.InstanceAssociated)
+        self.assertIsInstance(results[2], exception.MACAlreadyExists)
+        self.assertIsInstance(results[3], tuple)
+        self.assertIsInstance(results[4], exception.MACAlreadyExists)
+        self.assertIsInstance(results[5], tuple)
+        self.assertIsInstance(results[6], exception.NodeAlreadyExists)
+        # The port of a node which was not created does not conflict
+        self.assertIsInstance(results[7], tuple)
+        self.assertEqual(4, len(self.dbapi.get_node_list()))
+
+    def test_create_nodes_concurrent_conflict(self):
+        values = self._get_new_node_values()
+        with mock.patch.object(sa_api, '_get_existing_values',
+                               autospec=True) as mock_existing:
+            mock_existing.return_value = set()
+            utils.create_test_node(uuid=values['uuid'])
+            self.assertRaises(exception.Conflict,
+                              self.dbapi.create_nodes,
+                              [self._get_new_node_values(), values])
+        self.assertEqual(1, len(self.dbapi.get_node_list()))
+
     def test_get_node_by_id(self):
         node = utils.create_test_node()
         res = self.dbapi.get_node_by_id(node.id)
@@ -90,6 +171,40 @@ class DbNodeTestCase(base.DbTestCase):
         self.assertEqual(extras, dict((r[0], r[1]) for r in res))
         self.assertEqual(uuids, dict((r[0], r[2]) for r in res))
 
+    def test_iter_nodeinfo_list_defaults(self):
+        node_id_list = []
+        for i in range(1, 6):
+            node = utils.create_test_node(uuid=ironic_utils.generate_uuid())
+            node_id_list.append(node.id)
+        res = [i[0] for i in self.dbapi.iter_nodeinfo_list()]
+        self.assertEqual(sorted(node_id_list), res)
+
+    def test_iter_nodeinfo_list_chunks(self):
+        uuids = []
+        for i in range(1, 6):
+            node = utils.create_test_node(id=i, driver='driver-one',
+                                          uuid=ironic_utils.generate_uuid())
+            uuids.append(node.uuid)
+        utils.create_test_node(id=6, driver='driver-two',
+                               uuid=ironic_utils.generate_uuid())
+
+        res = self.dbapi.iter_nodeinfo_list(columns=['uuid'],
+                                            filters={'driver': 'driver-one'},
+                                            chunk_size=2)
+        with mock.patch.object(sa_api, 'eventlet') as eventlet_mock:
+            res = list(res)
+
+        self.assertEqual([(uuid,) for uuid in uuids], res)
+        # Yielded after each of the 2 full chunks
+        self.assertEqual(2, eventlet_mock.sleep.call_count)
+
+    def test_iter_nodeinfo_list_with_id(self):
+        node = utils.create_test_node(driver='driver-one')
+        res = self.dbapi.iter_nodeinfo_list(columns=['driver', 'id'],
+                                            chunk_size=1)
+        self.assertEqual([('driver-one', node.id)],
+                         [tuple(r) for r in res])
+
     def test_get_nodeinfo_list_with_filters(self):
         node1 = utils.create_test_node(driver='driver-one',
             instance_uuid=ironic_utils.generate_uuid(),
@@ -105,6 +220,17 @@ class DbNodeTestCase(base.DbTestCase):
         res = self.dbapi.get_nodeinfo_list(filters={'driver': 'bad-driver'})
         self.assertEqual([], [r[0] for r in res])
 
+        res = self.dbapi.get_nodeinfo_list(filters={'uuid': node2.uuid})
+        self.assertEqual([node2.id], [r[0] for r in res])
+
+        res = self.dbapi.get_nodeinfo_list(columns=['uuid'],
+                                           filters={'id': node2.id})
+        self.assertEqual([node2.uuid], [r[0] for r in res])
+
+        res = self.dbapi.get_nodeinfo_list(
+            filters={'uuid_in': [node1.uuid, node2.uuid, 'foo']})
+        self.assertEqual([node1.id, node2.id], sorted(r[0] for r in res))
+
         res = self.dbapi.get_nodeinfo_list(filters={'associated': True})
         self.assertEqual([node1.id], [r[0] for r in res])
 
@@ -148,6 +274,67 @@ class DbNodeTestCase(base.DbTestCase):
                                                     states.DEPLOYWAIT})
         self.assertEqual([node2.id], [r[0] for r in res])
 
+        res = self.dbapi.get_nodeinfo_list(
+                filters={'provision_state_not_in': [states.DEPLOYWAIT]})
+        self.assertNotIn(node2.id, [r[0] for r in res])
+        self.assertIn(node1.id, [r[0] for r in res])
+
+    def test_create_node_sets_hash_partition_key(self):
+        node = utils.create_test_node()
+        self.assertEqual(hash_ring.get_partition_key(node.uuid),
+                         node.hash_partition_key)
+
+    def test_get_nodeinfo_list_hash_ranges(self):
+        nodes = [utils.create_test_node(id=i, driver='fake',
+                                        uuid=ironic_utils.generate_uuid())
+                 for i in range(1, 7)]
+        other = utils.create_test_node(id=7, driver='other',
+                                       uuid=ironic_utils.generate_uuid())
+        keys = sorted(n.hash_partition_key for n in nodes)
+        # Nodes with the 2 lowest and 2 highest keys
+        ranges = [(None, keys[2]), (keys[4], None)]
+        expected = [n.id for n in nodes
+                    if n.hash_partition_key in keys[:2] + keys[4:]]
+
+        res = self.dbapi.get_nodeinfo_list(
+                filters={'hash_ranges': {'fake': ranges}})
+        self.assertEqual(sorted(expected), sorted(r[0] for r in res))
+
+        res = self.dbapi.get_nodeinfo_list(
+                filters={'hash_ranges': {'fake': [(keys[1], keys[2])],
+                                         'other': None}})
+        expected = [n.id for n in nodes if n.hash_partition_key == keys[1]]
+        self.assertEqual(sorted(expected + [other.id]),
+                         sorted(r[0] for r in res))
+
+        res = self.dbapi.get_nodeinfo_list(filters={'hash_ranges': {}})
+        self.assertEqual([], res)
+
+    def test_get_node_statistics(self):
+        for i in range(2):
+            utils.create_test_node(uuid=ironic_utils.generate_uuid(),
+                                   provision_state=states.ACTIVE,
+                                   power_state=states.POWER_ON,
+                                   instance_uuid=ironic_utils.generate_uuid())
+        utils.create_test_node(uuid=ironic_utils.generate_uuid(),
+                               power_state=states.POWER_OFF,
+                               maintenance=True)
+        utils.create_test_node(uuid=ironic_utils.generate_uuid(),
+                               driver='fake-2',
+                               power_state=states.POWER_OFF)
+
+        res = self.dbapi.get_node_statistics()
+
+        self.assertEqual(
+            sorted([('fake', states.ACTIVE, states.POWER_ON, False, True, 2),
+                    ('fake', states.NOSTATE, states.POWER_OFF, True, False, 1),
+                    ('fake-2', states.NOSTATE, states.POWER_OFF, False, False,
+                     1)]),
+            sorted(res))
+
+    def test_get_node_statistics_no_nodes(self):
+        self.assertEqual([], self.dbapi.get_node_statistics())
+
     def test_get_node_list(self):
         uuids = []
         for i in range(1, 6):
@@ -203,11 +390,66 @@ class DbNodeTestCase(base.DbTestCase):
         res = self.dbapi.get_node_list(filters={'maintenance': False})
         self.assertEqual([node1.id], [r.id for r in res])
 
+    def test_get_node_list_changes_since(self):
+        before = datetime.datetime(2000, 1, 1, 0, 0)
+        since = datetime.datetime(2000, 1, 1, 0, 1)
+        after = datetime.datetime(2000, 1, 1, 0, 2)
+        utils.create_test_node(id=1, uuid=ironic_utils.generate_uuid(),
+                               created_at=before)
+        utils.create_test_node(id=2, uuid=ironic_utils.generate_uuid(),
+                               created_at=before, updated_at=since)
+        utils.create_test_node(id=3, uuid=ironic_utils.generate_uuid(),
+                               created_at=after)
+        utils.create_test_node(id=4, uuid=ironic_utils.generate_uuid(),
+                               created_at=before, updated_at=before)
+
+        res = self.dbapi.get_node_list(filters={'changes_since': since})
+        self.assertEqual([2, 3], sorted(r.id for r in res))
+
+        res = self.dbapi.get_node_list(filters={'changes_since': after})
+        self.assertEqual([3], [r.id for r in res])
+
     def test_get_node_list_chassis_not_found(self):
         self.assertRaises(exception.ChassisNotFound,
                           self.dbapi.get_node_list,
                           {'chassis_uuid': ironic_utils.generate_uuid()})
 
+    def test_get_node_by_port_addresses(self):
+        node = utils.create_test_node()
+        utils.create_test_port(node_id=node.id, address='aa:bb:cc:dd:ee:ff')
+        utils.create_test_port(id=2, node_id=node.id,
+                               uuid=ironic_utils.generate_uuid(),
+                               address='aa:bb:cc:dd:ee:fe')
+
+        res = self.dbapi.get_node_by_port_addresses(['aa:bb:cc:dd:ee:ff',
+                                                     'aa:bb:cc:dd:ee:fe',
+                                                     '11:22:33:44:55:66'])
+        self.assertEqual(node.uuid, res.uuid)
+
+    def test_get_node_by_port_addresses_not_found(self):
+        node = utils.create_test_node()
+        utils.create_test_port(node_id=node.id, address='aa:bb:cc:dd:ee:ff')
+
+        self.assertRaises(exception.NodeNotFound,
+                          self.dbapi.get_node_by_port_addresses,
+                          ['11:22:33:44:55:66'])
+        self.assertRaises(exception.NodeNotFound,
+                          self.dbapi.get_node_by_port_addresses, [])
+
+    def test_get_node_by_port_addresses_multiple_nodes(self):
+        node1 = utils.create_test_node(id=1,
+                                       uuid=ironic_utils.generate_uuid())
+        node2 = utils.create_test_node(id=2,
+                                       uuid=ironic_utils.generate_uuid())
+        utils.create_test_port(node_id=node1.id, address='aa:bb:cc:dd:ee:ff')
+        utils.create_test_port(id=2, node_id=node2.id,
+                               uuid=ironic_utils.generate_uuid(),
+                               address='aa:bb:cc:dd:ee:fe')
+
+        self.assertRaises(exception.NodeNotFound,
+                          self.dbapi.get_node_by_port_addresses,
+                          ['aa:bb:cc:dd:ee:ff', 'aa:bb:cc:dd:ee:fe'])
+
     def test_get_node_by_instance(self):
         node = utils.create_test_node(
                 instance_uuid='12345678-9999-0000-aaaa-123456789012')
@@ -242,11 +484,86 @@ class DbNodeTestCase(base.DbTestCase):
         self.assertRaises(exception.NodeNotFound,
                           self.dbapi.get_node_by_uuid, node.uuid)
 
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_destroy_node_records_deletion(self, mock_utcnow):
+        node = utils.create_test_node()
+        deleted_at = datetime.datetime(2000, 1, 1, 0, 0)
+        mock_utcnow.return_value = deleted_at
+
+        self.dbapi.destroy_node(node.id)
+
+        res = self.dbapi.get_node_deletions(deleted_at)
+        self.assertEqual([(node.uuid, deleted_at)],
+                         [(d.node_uuid, d.deleted_at) for d in res])
+        self.assertEqual([], self.dbapi.get_node_deletions(
+                             deleted_at + datetime.timedelta(seconds=1)))
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_destroy_node_prunes_deletions(self, mock_utcnow):
+        self.config(node_deletion_log_retention=60, group='database')
+        node1 = utils.create_test_node(id=1, uuid=ironic_utils.generate_uuid())
+        node2 = utils.create_test_node(id=2, uuid=ironic_utils.generate_uuid())
+        node3 = utils.create_test_node(id=3, uuid=ironic_utils.generate_uuid())
+        first = datetime.datetime(2000, 1, 1, 0, 0)
+
+        mock_utcnow.return_value = first
+        self.dbapi.destroy_node(node1.id)
+        mock_utcnow.return_value = first + datetime.timedelta(seconds=30)
+        self.dbapi.destroy_node(node2.id)
+        mock_utcnow.return_value = first + datetime.timedelta(seconds=61)
+        self.dbapi.destroy_node(node3.id)
+
+        res = self.dbapi.get_node_deletions(first)
+        self.assertEqual([node2.uuid, node3.uuid],
+                         [d.node_uuid for d in res])
+
     def test_destroy_node_that_does_not_exist(self):
         self.assertRaises(exception.NodeNotFound,
                           self.dbapi.destroy_node,
                           '12345678-9999-0000-aaaa-123456789012')
 
+    def _get_agent_heartbeats(self, node_id):
+        return (sa_api.model_query(models.AgentHeartbeat)
+                .filter_by(node_id=node_id)
+                .all())
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_touch_agent_heartbeat(self, mock_utcnow):
+        node = utils.create_test_node()
+        first = datetime.datetime(2000, 1, 1, 0, 0)
+        second = datetime.datetime(2000, 1, 1, 0, 1)
+
+        mock_utcnow.return_value = first
+        self.dbapi.touch_agent_heartbeat(node.id)
+        mock_utcnow.return_value = second
+        self.dbapi.touch_agent_heartbeat(node.id)
+
+        heartbeats = self._get_agent_heartbeats(node.id)
+        self.assertEqual([second],
+                         [h.last_heartbeat for h in heartbeats])
+        # The node itself is left untouched
+        res = self.dbapi.get_node_by_id(node.id)
+        self.assertIsNone(res.reservation)
+        self.assertIsNone(res.updated_at)
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_get_agent_heartbeat(self, mock_utcnow):
+        node = utils.create_test_node()
+        self.assertIsNone(self.dbapi.get_agent_heartbeat(node.id))
+
+        mock_utcnow.return_value = datetime.datetime(2000, 1, 1, 0, 0)
+        self.dbapi.touch_agent_heartbeat(node.id)
+        self.assertEqual(datetime.datetime(2000, 1, 1, 0, 0),
+                         self.dbapi.get_agent_heartbeat(node.id))
+
+    def test_agent_heartbeat_destroyed_after_destroying_a_node(self):
+        node = utils.create_test_node()
+        self.dbapi.touch_agent_heartbeat(node.id)
+
+        self.dbapi.destroy_node(node.uuid)
+
+        self.assertEqual([], self._get_agent_heartbeats(node.id))
+
     def test_ports_get_destroyed_after_destroying_a_node(self):
         node = utils.create_test_node()
 
@@ -344,6 +661,90 @@ class DbNodeTestCase(base.DbTestCase):
         res = self.dbapi.get_node_by_uuid(uuid)
         self.assertEqual(r1, res.reservation)
 
+    def test_reserve_node_with_filters(self):
+        node = utils.create_test_node(maintenance=False,
+                                      provision_state=states.ACTIVE)
+
+        filters = {'maintenance': False,
+                   'provision_state_not_in': [states.DEPLOYWAIT]}
+        self.dbapi.reserve_node('fake-reservation', node.uuid,
+                                filters=filters)
+
+        res = self.dbapi.get_node_by_uuid(node.uuid)
+        self.assertEqual('fake-reservation', res.reservation)
+
+    def test_reserve_node_filters_not_matched(self):
+        node = utils.create_test_node(maintenance=True,
+                                      provision_state=states.DEPLOYWAIT)
+
+        for filters in ({'maintenance': False},
+                        {'provision_state_not_in': [states.DEPLOYWAIT]}):
+            self.assertRaises(exception.NodeFiltersNotMatched,
+                              self.dbapi.reserve_node,
+                              'fake-reservation', node.uuid, filters=filters)
+
+        res = self.dbapi.get_node_by_uuid(node.uuid)
+        self.assertIsNone(res.reservation)
+
+    def test_reserve_node_with_ports(self):
+        node = utils.create_test_node()
+        port = utils.create_test_port(node_id=node.id)
+
+        res, ports = self.dbapi.reserve_node_with_ports('fake-reservation',
+                                                        node.uuid)
+
+        self.assertEqual(node.uuid, res.uuid)
+        self.assertEqual([port.uuid], [p.uuid for p in ports])
+        res = self.dbapi.get_node_by_uuid(node.uuid)
+        self.assertEqual('fake-reservation', res.reservation)
+
+    def test_reserve_node_with_ports_locked(self):
+        node = utils.create_test_node()
+        self.dbapi.reserve_node('fake-reservation', node.uuid)
+
+        self.assertRaises(exception.NodeLocked,
+                          self.dbapi.reserve_node_with_ports,
+                          'another-reservation', node.uuid)
+
+    def test_get_node_with_ports(self):
+        node = utils.create_test_node()
+        port1 = utils.create_test_port(node_id=node.id)
+        port2 = utils.create_test_port(id=2, node_id=node.id,
+                                       uuid=ironic_utils.generate_uuid(),
+                                       address='aa:bb:cc:dd:ee:fe')
+        other = utils.create_test_node(id=2,
+                                       uuid=ironic_utils.generate_uuid())
+        utils.create_test_port(id=3, node_id=other.id,
+                               uuid=ironic_utils.generate_uuid(),
+                               address='aa:bb:cc:dd:ee:fd')
+
+        res, ports = self.dbapi.get_node_with_ports(node.id)
+
+        self.assertEqual(node.uuid, res.uuid)
+        self.assertEqual([port1.uuid, port2.uuid], [p.uuid for p in ports])
+
+    def test_get_node_with_ports_no_ports(self):
+        node = utils.create_test_node()
+
+        res, ports = self.dbapi.get_node_with_ports(node.uuid)
+
+        self.assertEqual(node.uuid, res.uuid)
+        self.assertEqual([], ports)
+
+    def test_get_node_with_ports_not_found(self):
+        self.assertRaises(exception.NodeNotFound,
+                          self.dbapi.get_node_with_ports,
+                          ironic_utils.generate_uuid())
+
+    def test_reserve_reserved_node_with_filters_fails(self):
+        node = utils.create_test_node(maintenance=False)
+        self.dbapi.reserve_node('fake-reservation', node.uuid)
+
+        self.assertRaises(exception.NodeLocked,
+                          self.dbapi.reserve_node,
+                          'another-reservation', node.uuid,
+                          filters={'maintenance': False})
+
     def test_release_reservation(self):
         node = utils.create_test_node()
         uuid = node.uuid
@@ -61,6 +61,27 @@ class DbPortTestCase(base.DbTestCase):
     def test_get_ports_by_node_id_that_does_not_exist(self):
         self.assertEqual([], self.dbapi.get_ports_by_node_id(99))
 
+    def test_get_portinfo_list(self):
+        port2 = db_utils.create_test_port(uuid=ironic_utils.generate_uuid(),
+                                          address='52:54:00:cf:2d:41',
+                                          node_id=None, extra={'foo': 'bar'})
+
+        res = self.dbapi.get_portinfo_list(columns=['uuid', 'extra'])
+        self.assertEqual(sorted([(self.port.uuid, self.port.extra),
+                                 (port2.uuid, {'foo': 'bar'})]),
+                         sorted(tuple(r) for r in res))
+
+        res = self.dbapi.get_portinfo_list(columns=['address'],
+                                           filters={'node_id': self.node.id})
+        self.assertEqual([(self.port.address,)], [tuple(r) for r in res])
+
+        res = self.dbapi.get_portinfo_list()
+        self.assertEqual(sorted([(self.port.id,), (port2.id,)]),
+                         sorted(tuple(r) for r in res))
+
+        res = self.dbapi.get_portinfo_list(filters={'uuid': port2.uuid})
+        self.assertEqual([(port2.id,)], [tuple(r) for r in res])
+
     def test_destroy_port(self):
         self.dbapi.destroy_port(self.port.id)
         self.assertRaises(exception.PortNotFound,
@@ -108,3 +129,44 @@ class DbPortTestCase(base.DbTestCase):
                           uuid=self.port.uuid,
                           node_id=self.node.id,
                           address='aa-bb-cc-33-11-22')
+
+    def test_create_ports(self):
+        values_list = [{'node_id': self.node.id,
+                        'address': '52:54:00:cf:2d:01'},
+                       {'node_id': self.node.id,
+                        'address': '52:54:00:cf:2d:02',
+                        'uuid': ironic_utils.generate_uuid()}]
+
+        results = self.dbapi.create_ports(values_list)
+
+        self.assertEqual(['52:54:00:cf:2d:01', '52:54:00:cf:2d:02'],
+                         [p.address for p in results])
+        self.assertEqual(values_list[1]['uuid'], results[1].uuid)
+        res = self.dbapi.get_ports_by_node_id(self.node.id)
+        self.assertEqual(3, len(res))
+
+    def test_create_ports_conflicts(self):
+        new_uuid = ironic_utils.generate_uuid()
+        values_list = [{'node_id': self.node.id,
+                        'address': self.port.address},
+                       {'node_id': self.node.id,
+                        'address': '52:54:00:cf:2d:01',
+                        'uuid': self.port.uuid},
+                       {'node_id': self.node.id,
+                        'address': '52:54:00:cf:2d:02',
+                        'uuid': new_uuid},
+                       {'node_id': self.node.id,
+                        'address': '52:54:00:cf:2d:02'},
+                       {'node_id': self.node.id,
+                        'address': '52:54:00:cf:2d:03',
+                        'uuid': new_uuid}]
+
+        results = self.dbapi.create_ports(values_list)
+
+        self.assertIsInstance(results[0], exception.MACAlreadyExists)
+        self.assertIsInstance(results[1], exception.PortAlreadyExists)
+        self.assertEqual(new_uuid, results[2].uuid)
+        self.assertIsInstance(results[3], exception.MACAlreadyExists)
+        self.assertIsInstance(results[4], exception.PortAlreadyExists)
+        res = self.dbapi.get_ports_by_node_id(self.node.id)
+        self.assertEqual(2, len(res))
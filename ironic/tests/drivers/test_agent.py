@@ -254,109 +254,29 @@ class TestAgentVendor(db_base.DbTestCase):
                               version='2',
                               inventory={'interfaces': []})
 
-    @mock.patch.object(objects.Port, 'get_by_address')
-    def test_find_ports_by_macs(self, mock_get_port):
-        fake_port = object_utils.get_test_port(self.context)
-        mock_get_port.return_value = fake_port
-
-        macs = ['aa:bb:cc:dd:ee:ff']
-
-        with task_manager.acquire(
-                self.context, self.node['uuid'], shared=True) as task:
-            ports = self.passthru._find_ports_by_macs(task, macs)
-        self.assertEqual(1, len(ports))
-        self.assertEqual(fake_port.uuid, ports[0].uuid)
-        self.assertEqual(fake_port.node_id, ports[0].node_id)
-
-    @mock.patch.object(objects.Port, 'get_by_address')
-    def test_find_ports_by_macs_bad_params(self, mock_get_port):
-        mock_get_port.side_effect = exception.PortNotFound(port="123")
-
-        macs = ['aa:bb:cc:dd:ee:ff']
-        with task_manager.acquire(
-                self.context, self.node['uuid'], shared=True) as task:
-            empty_ids = self.passthru._find_ports_by_macs(task, macs)
-        self.assertEqual([], empty_ids)
-
-    @mock.patch('ironic.objects.node.Node.get_by_id')
-    @mock.patch('ironic.drivers.modules.agent.AgentVendorInterface'
-                '._get_node_id')
-    @mock.patch('ironic.drivers.modules.agent.AgentVendorInterface'
-                '._find_ports_by_macs')
-    def test_find_node_by_macs(self, ports_mock, node_id_mock, node_mock):
-        ports_mock.return_value = object_utils.get_test_port(self.context)
-        node_id_mock.return_value = '1'
+    @mock.patch.object(objects.Node, 'get_by_port_addresses')
+    def test_find_node_by_macs(self, node_mock):
         node_mock.return_value = self.node
 
         macs = ['aa:bb:cc:dd:ee:ff']
         with task_manager.acquire(
                 self.context, self.node['uuid'], shared=True) as task:
-            node = self.passthru._find_node_by_macs(task, macs)
-        self.assertEqual(node, node)
-
-    @mock.patch('ironic.drivers.modules.agent.AgentVendorInterface'
-                '._find_ports_by_macs')
-    def test_find_node_by_macs_no_ports(self, ports_mock):
-        ports_mock.return_value = []
-
-        macs = ['aa:bb:cc:dd:ee:ff']
-        with task_manager.acquire(
-                self.context, self.node['uuid'], shared=True) as task:
-            self.assertRaises(exception.NodeNotFound,
-                              self.passthru._find_node_by_macs,
-                              task,
-                              macs)
+            node = self.passthru._find_node_by_macs(task.context, macs)
+        self.assertEqual(self.node, node)
+        node_mock.assert_called_once_with(task.context, macs)
 
-    @mock.patch('ironic.objects.node.Node.get_by_uuid')
-    @mock.patch('ironic.drivers.modules.agent.AgentVendorInterface'
-                '._get_node_id')
-    @mock.patch('ironic.drivers.modules.agent.AgentVendorInterface'
-                '._find_ports_by_macs')
-    def test_find_node_by_macs_nodenotfound(self, ports_mock, node_id_mock,
-                                            node_mock):
-        port = object_utils.get_test_port(self.context)
-        ports_mock.return_value = [port]
-        node_id_mock.return_value = self.node['uuid']
-        node_mock.side_effect = [self.node,
-                                 exception.NodeNotFound(node=self.node)]
+    @mock.patch.object(objects.Node, 'get_by_port_addresses')
+    def test_find_node_by_macs_nodenotfound(self, node_mock):
+        node_mock.side_effect = exception.NodeNotFound(node='fake')
 
         macs = ['aa:bb:cc:dd:ee:ff']
         with task_manager.acquire(
                 self.context, self.node['uuid'], shared=True) as task:
             self.assertRaises(exception.NodeNotFound,
                               self.passthru._find_node_by_macs,
-                              task,
+                              task.context,
                               macs)
 
-    def test_get_node_id(self):
-        fake_port1 = object_utils.get_test_port(self.context,
-                                                node_id=123,
-                                                address="aa:bb:cc:dd:ee:fe")
-        fake_port2 = object_utils.get_test_port(self.context,
-                                                node_id=123,
-                                                id=42,
-                                                address="aa:bb:cc:dd:ee:fb",
-                                                uuid='1be26c0b-03f2-4d2e-ae87-'
-                                                     'c02d7f33c782')
-
-        node_id = self.passthru._get_node_id([fake_port1, fake_port2])
-        self.assertEqual(fake_port2.node_id, node_id)
-
-    def test_get_node_id_exception(self):
-        fake_port1 = object_utils.get_test_port(self.context,
-                                                node_id=123,
-                                                address="aa:bb:cc:dd:ee:fc")
-        fake_port2 = object_utils.get_test_port(self.context,
-                                                node_id=321,
-                                                id=42,
-                                                address="aa:bb:cc:dd:ee:fd",
-                                                uuid='1be26c0b-03f2-4d2e-ae87-'
-                                                     'c02d7f33c782')
-
-        self.assertRaises(exception.NodeNotFound,
-                          self.passthru._get_node_id,
-                          [fake_port1, fake_port2])
-
     def test_get_interfaces(self):
         fake_inventory = {
             'interfaces': [
@@ -374,13 +294,88 @@ class TestAgentVendor(db_base.DbTestCase):
                           self.passthru._get_interfaces,
                           inventory={})
 
-    def test_heartbeat(self):
+    @mock.patch.object(objects.Node, 'touch_agent_heartbeat')
+    def test_heartbeat(self, touch_mock):
         kwargs = {
             'agent_url': 'http://127.0.0.1:9999/bar'
         }
         with task_manager.acquire(
                 self.context, self.node['uuid'], shared=True) as task:
             self.passthru.heartbeat(task, **kwargs)
+            touch_mock.assert_called_once_with()
+            # The new agent_url was saved under an exclusive lock
+            self.assertFalse(task.shared)
+            self.assertEqual('http://127.0.0.1:9999/bar',
+                             task.node.driver_info['agent_url'])
+
+        self.node.refresh()
+        self.assertEqual('http://127.0.0.1:9999/bar',
+                         self.node.driver_info['agent_url'])
+
+    @mock.patch.object(objects.Node, 'touch_agent_heartbeat')
+    def test_heartbeat_shared_lock(self, touch_mock):
+        kwargs = {
+            'agent_url': DRIVER_INFO['agent_url']
+        }
+        with task_manager.acquire(
+                self.context, self.node['uuid'], shared=True) as task:
+            with mock.patch.object(task, 'upgrade_lock') as upgrade_mock:
+                self.passthru.heartbeat(task, **kwargs)
+            touch_mock.assert_called_once_with()
+            self.assertFalse(upgrade_mock.called)
+            self.assertTrue(task.shared)
+
+    @mock.patch.object(objects.Node, 'touch_agent_heartbeat')
+    def test_heartbeat_removes_stale_last_heartbeat(self, touch_mock):
+        driver_info = dict(self.node.driver_info,
+                           agent_last_heartbeat=1234567890)
+        self.node.driver_info = driver_info
+        self.node.save()
+        kwargs = {
+            'agent_url': DRIVER_INFO['agent_url']
+        }
+        with task_manager.acquire(
+                self.context, self.node['uuid'], shared=True) as task:
+            self.passthru.heartbeat(task, **kwargs)
+            self.assertFalse(task.shared)
+
+        self.node.refresh()
+        self.assertNotIn('agent_last_heartbeat', self.node.driver_info)
+        self.assertEqual(DRIVER_INFO['agent_url'],
+                         self.node.driver_info['agent_url'])
+
+    @mock.patch.object(agent.AgentVendorInterface, '_continue_deploy')
+    def test_heartbeat_continue_deploy(self, continue_mock):
+        self.node.provision_state = states.DEPLOYWAIT
+        self.node.save()
+        kwargs = {
+            'agent_url': DRIVER_INFO['agent_url']
+        }
+        with task_manager.acquire(
+                self.context, self.node['uuid'], shared=True) as task:
+            self.passthru.heartbeat(task, **kwargs)
+            self.assertFalse(task.shared)
+            continue_mock.assert_called_once_with(task, **kwargs)
+
+    @mock.patch.object(deploy_utils, 'set_failed_state')
+    @mock.patch.object(agent.AgentVendorInterface, '_continue_deploy')
+    def test_heartbeat_continue_deploy_node_locked(self, continue_mock,
+                                                   failed_mock):
+        self.node.provision_state = states.DEPLOYWAIT
+        self.node.save()
+        kwargs = {
+            'agent_url': DRIVER_INFO['agent_url']
+        }
+        with task_manager.acquire(
+                self.context, self.node['uuid'], shared=True) as task:
+            with mock.patch.object(task, 'upgrade_lock') as upgrade_mock:
+                upgrade_mock.side_effect = exception.NodeLocked(
+                    node=self.node.uuid, host='other-host')
+                self.passthru.heartbeat(task, **kwargs)
+            upgrade_mock.assert_called_once_with(
+                filters={'provision_state': states.DEPLOYWAIT})
+        self.assertFalse(continue_mock.called)
+        self.assertFalse(failed_mock.called)
 
     def test_heartbeat_bad(self):
         kwargs = {}
@@ -393,7 +388,7 @@ class TestAgentVendor(db_base.DbTestCase):
     @mock.patch.object(agent.AgentVendorInterface, '_deploy_is_done')
     def test_heartbeat_deploy_done_fails(self, done_mock, failed_mock):
         kwargs = {
-            'agent_url': 'http://127.0.0.1:9999/bar'
+            'agent_url': DRIVER_INFO['agent_url']
         }
         done_mock.side_effect = Exception
         with task_manager.acquire(
@@ -401,6 +396,43 @@ class TestAgentVendor(db_base.DbTestCase):
             task.node.provision_state = states.DEPLOYING
             self.passthru.heartbeat(task, **kwargs)
             failed_mock.assert_called_once_with(task, mock.ANY)
+            self.assertFalse(task.shared)
+
+    @mock.patch.object(objects.Node, 'touch_agent_heartbeat')
+    def test_heartbeat_agent_url_node_locked(self, touch_mock):
+        kwargs = {
+            'agent_url': 'http://127.0.0.1:9999/bar'
+        }
+        with task_manager.acquire(
+                self.context, self.node['uuid'], shared=True) as task:
+            with mock.patch.object(task, 'upgrade_lock') as upgrade_mock:
+                upgrade_mock.side_effect = exception.NodeLocked(
+                    node=self.node.uuid, host='other-host')
+                self.passthru.heartbeat(task, **kwargs)
+            upgrade_mock.assert_called_once_with()
+            touch_mock.assert_called_once_with()
+
+        self.node.refresh()
+        self.assertEqual(DRIVER_INFO['agent_url'],
+                         self.node.driver_info['agent_url'])
+
+    @mock.patch.object(deploy_utils, 'set_failed_state')
+    @mock.patch.object(agent.AgentVendorInterface, '_deploy_is_done')
+    def test_heartbeat_deploy_done_fails_node_locked(self, done_mock,
+                                                     failed_mock):
+        kwargs = {
+            'agent_url': DRIVER_INFO['agent_url']
+        }
+        done_mock.side_effect = Exception
+        with task_manager.acquire(
+                self.context, self.node['uuid'], shared=True) as task:
+            task.node.provision_state = states.DEPLOYING
+            with mock.patch.object(task, 'upgrade_lock') as upgrade_mock:
+                upgrade_mock.side_effect = exception.NodeLocked(
+                    node=self.node.uuid, host='other-host')
+                self.passthru.heartbeat(task, **kwargs)
+            upgrade_mock.assert_called_once_with()
+        self.assertFalse(failed_mock.called)
 
     def test_vendor_passthru_vendor_routes(self):
         expected = ['heartbeat']
@@ -361,6 +361,74 @@ class SSHPrivateMethodsTestCase(db_base.DbTestCase):
                           info)
         self.assertEqual(expected, exec_ssh_mock.call_args_list)
 
+    @mock.patch.object(processutils, 'ssh_execute')
+    def test__get_hosts_names_for_nodes(self, exec_ssh_mock):
+        info = ssh._parse_driver_info(self.node)
+        info['macs'] = ["52:54:00:cf:2d:31"]
+        info2 = dict(info, uuid='other-uuid', macs=["11:11:11:11:11:11"])
+        info3 = dict(info, uuid='missing-uuid', macs=["22:22:22:22:22:22"])
+        exec_ssh_mock.side_effect = [('NodeName\nNodeName2', ''),
+                                     ('52:54:00:cf:2d:31', ''),
+                                     ('11:11:11:11:11:11', '')]
+        list_cmd = "%s %s" % (info['cmd_set']['base_cmd'],
+                              info['cmd_set']['list_all'])
+        macs_cmd = "%s %s" % (info['cmd_set']['base_cmd'],
+                              info['cmd_set']['get_node_macs'])
+        expected = [mock.call(self.sshclient, list_cmd),
+                    mock.call(self.sshclient,
+                              macs_cmd.replace('{_NodeName_}', 'NodeName')),
+                    mock.call(self.sshclient,
+                              macs_cmd.replace('{_NodeName_}', 'NodeName2'))]
+
+        names = ssh._get_hosts_names_for_nodes(self.sshclient,
+                                               [info, info2, info3])
+
+        self.assertEqual({info['uuid']: 'NodeName',
+                          'other-uuid': 'NodeName2'}, names)
+        self.assertEqual(expected, exec_ssh_mock.call_args_list)
+
+    @mock.patch.object(processutils, 'ssh_execute')
+    @mock.patch.object(ssh, '_get_hosts_names_for_nodes')
+    def test__get_power_statuses(self, get_hosts_names_mock, exec_ssh_mock):
+        info = ssh._parse_driver_info(self.node)
+        info['macs'] = ["11:11:11:11:11:11", "52:54:00:cf:2d:31"]
+        info2 = dict(info, uuid='other-uuid')
+        info3 = dict(info, uuid='missing-uuid')
+        get_hosts_names_mock.return_value = {info['uuid']: 'NodeName',
+                                             'other-uuid': 'NodeName2'}
+        exec_ssh_mock.return_value = (
+            '"NodeName" {b43c4982-110c-4c29-9325-d5f41b053513}', '')
+
+        pstates = ssh._get_power_statuses(self.sshclient,
+                                          [info, info2, info3])
+
+        ssh_cmd = "%s %s" % (info['cmd_set']['base_cmd'],
+                             info['cmd_set']['list_running'])
+        self.assertEqual({info['uuid']: states.POWER_ON,
+                          'other-uuid': states.POWER_OFF}, pstates)
+        exec_ssh_mock.assert_called_once_with(self.sshclient, ssh_cmd)
+        get_hosts_names_mock.assert_called_once_with(self.sshclient,
+                                                     [info, info2, info3])
+
+    @mock.patch.object(processutils, 'ssh_execute')
+    @mock.patch.object(ssh, '_get_hosts_names_for_nodes')
+    def test__get_power_statuses_vmware(self, get_hosts_names_mock,
+                                        exec_ssh_mock):
+        self.node['driver_info']['ssh_virt_type'] = 'vmware'
+        info = ssh._parse_driver_info(self.node)
+        info2 = dict(info, uuid='other-uuid')
+        get_hosts_names_mock.return_value = {info['uuid']: 'NodeName',
+                                             'other-uuid': 'NodeName2'}
+        exec_ssh_mock.side_effect = lambda client, cmd: (
+            ('"NodeName"', '') if 'NodeName ' in cmd else ('', ''))
+
+        pstates = ssh._get_power_statuses(self.sshclient, [info, info2])
+
+        self.assertEqual({info['uuid']: states.POWER_ON,
+                          'other-uuid': states.POWER_OFF}, pstates)
+        # The running VMs are listed once per node
+        self.assertEqual(2, exec_ssh_mock.call_count)
+
     @mock.patch.object(processutils, 'ssh_execute')
     @mock.patch.object(ssh, '_get_power_status')
     @mock.patch.object(ssh, '_get_hosts_name_for_node')
@@ -954,3 +1022,61 @@ class SSHDriverTestCase(db_base.DbTestCase):
         with task_manager.acquire(self.context, node.uuid) as task:
             self.assertRaises(exception.MissingParameterValue,
                               task.driver.management.validate, task)
+
+    @mock.patch.object(ssh, '_get_connection')
+    @mock.patch.object(ssh, '_get_power_statuses')
+    def test_get_power_states(self, get_power_statuses_mock,
+                              get_conn_mock):
+        node2 = obj_utils.create_test_node(
+                self.context, uuid=utils.generate_uuid(), driver='fake_ssh',
+                driver_info=db_utils.get_test_ssh_info())
+        other_host_info = db_utils.get_test_ssh_info()
+        other_host_info['ssh_address'] = '5.6.7.8'
+        node3 = obj_utils.create_test_node(
+                self.context, uuid=utils.generate_uuid(), driver='fake_ssh',
+                driver_info=other_host_info)
+        get_conn_mock.return_value = self.sshclient
+        get_power_statuses_mock.side_effect = lambda client, infos: dict(
+                (i['uuid'], states.POWER_ON) for i in infos)
+        tasks = [task_manager.acquire(self.context, n.uuid, shared=True)
+                 for n in (self.node, node2, node3)]
+
+        pstates = self.driver.power.get_power_states(tasks)
+
+        self.assertEqual(dict((n.uuid, states.POWER_ON)
+                              for n in (self.node, node2, node3)),
+                         pstates)
+        # One connection per host
+        self.assertEqual(2, get_conn_mock.call_count)
+        self.assertEqual(2, get_power_statuses_mock.call_count)
+        infos_by_host = dict((c[0][1][0]['host'], c[0][1]) for c in
+                             get_power_statuses_mock.call_args_list)
+        self.assertEqual([self.node.uuid, node2.uuid],
+                         [i['uuid'] for i in infos_by_host['1.2.3.4']])
+        self.assertEqual([node3.uuid],
+                         [i['uuid'] for i in infos_by_host['5.6.7.8']])
+
+    @mock.patch.object(ssh, '_get_connection')
+    @mock.patch.object(ssh, '_get_power_statuses')
+    def test_get_power_states_bad_driver_info(self, get_power_statuses_mock,
+                                              get_conn_mock):
+        node2 = obj_utils.create_test_node(
+                self.context, uuid=utils.generate_uuid(), driver='fake_ssh')
+        get_conn_mock.return_value = self.sshclient
+        get_power_statuses_mock.side_effect = lambda client, infos: dict(
+                (i['uuid'], states.POWER_OFF) for i in infos)
+        tasks = [task_manager.acquire(self.context, n.uuid, shared=True)
+                 for n in (self.node, node2)]
+
+        pstates = self.driver.power.get_power_states(tasks)
+
+        self.assertEqual({self.node.uuid: states.POWER_OFF}, pstates)
+        get_conn_mock.assert_called_once_with(tasks[0].node)
+
+    @mock.patch.object(ssh, '_get_connection')
+    def test_get_power_states_connect_failed(self, get_conn_mock):
+        get_conn_mock.side_effect = exception.SSHConnectFailed(host='fake')
+        with task_manager.acquire(self.context, self.node.uuid,
+                                  shared=True) as task:
+            self.assertEqual({},
+                             self.driver.power.get_power_states([task]))
@@ -36,7 +36,7 @@ class TestNodeObject(base.DbTestCase):
 
             node = objects.Node.get(self.context, node_id)
 
-            mock_get_node.assert_called_once_with(node_id)
+            mock_get_node.assert_called_once_with(node_id, use_slave=False)
             self.assertEqual(self.context, node._context)
 
     def test_get_by_uuid(self):
@@ -47,8 +47,35 @@ class TestNodeObject(base.DbTestCase):
 
             node = objects.Node.get(self.context, uuid)
 
-            mock_get_node.assert_called_once_with(uuid)
+            mock_get_node.assert_called_once_with(uuid, use_slave=False)
+            self.assertEqual(self.context, node._context)
+
+    def test_get_by_port_addresses(self):
+        addresses = ['aa:bb:cc:dd:ee:ff']
+        with mock.patch.object(self.dbapi, 'get_node_by_port_addresses',
+                               autospec=True) as mock_get_node:
+            mock_get_node.return_value = self.fake_node
+
+            node = objects.Node.get_by_port_addresses(self.context,
+                                                      addresses)
+
+            mock_get_node.assert_called_once_with(addresses)
+            self.assertEqual(self.context, node._context)
+
+    def test_get_with_ports(self):
+        node_id = self.fake_node['id']
+        fake_port = utils.get_test_port()
+        with mock.patch.object(self.dbapi, 'get_node_with_ports',
+                               autospec=True) as mock_get_node:
+            mock_get_node.return_value = (self.fake_node, [fake_port])
+
+            node, ports = objects.Node.get_with_ports(self.context, node_id)
+
+            mock_get_node.assert_called_once_with(node_id)
             self.assertEqual(self.context, node._context)
+            self.assertThat(ports, HasLength(1))
+            self.assertIsInstance(ports[0], objects.Port)
+            self.assertEqual(self.context, ports[0]._context)
 
     def test_get_bad_id_and_uuid(self):
         self.assertRaises(exception.InvalidIdentity,
@@ -66,7 +93,7 @@ class TestNodeObject(base.DbTestCase):
                 n.properties = {"fake": "property"}
                 n.save()
 
-                mock_get_node.assert_called_once_with(uuid)
+                mock_get_node.assert_called_once_with(uuid, use_slave=False)
                 mock_update_node.assert_called_once_with(
                         uuid, {'properties': {"fake": "property"}})
                 self.assertEqual(self.context, n._context)
@@ -75,7 +102,8 @@ class TestNodeObject(base.DbTestCase):
         uuid = self.fake_node['uuid']
         returns = [dict(self.fake_node, properties={"fake": "first"}),
                    dict(self.fake_node, properties={"fake": "second"})]
-        expected = [mock.call(uuid), mock.call(uuid)]
+        expected = [mock.call(uuid, use_slave=False),
+                    mock.call(uuid, use_slave=False)]
         with mock.patch.object(self.dbapi, 'get_node_by_uuid',
                                side_effect=returns,
                                autospec=True) as mock_get_node:
@@ -86,6 +114,60 @@ class TestNodeObject(base.DbTestCase):
             self.assertEqual(expected, mock_get_node.call_args_list)
             self.assertEqual(self.context, n._context)
 
+    def test_refresh_not_decoded(self):
+        uuid = self.fake_node['uuid']
+        returns = [dict(self.fake_node, properties={"fake": "first"}),
+                   dict(self.fake_node, properties={"fake": "second"})]
+        with mock.patch.object(self.dbapi, 'get_node_by_uuid',
+                               side_effect=returns,
+                               autospec=True):
+            n = objects.Node.get(self.context, uuid)
+            n.refresh()
+            self.assertEqual({"fake": "second"}, n.properties)
+            self.assertEqual(set(), n.obj_what_changed())
+
+    def test_json_fields_decoded_on_access(self):
+        uuid = self.fake_node['uuid']
+        with mock.patch.object(self.dbapi, 'get_node_by_uuid',
+                               autospec=True) as mock_get_node:
+            mock_get_node.return_value = self.fake_node
+
+            n = objects.Node.get(self.context, uuid)
+
+            self.assertFalse(hasattr(n, '_extra'))
+            self.assertTrue(n.obj_attr_is_set('extra'))
+            self.assertIn('extra', n)
+            self.assertEqual(self.fake_node['extra'], n.extra)
+            self.assertEqual(set(), n.obj_what_changed())
+
+    def test_json_fields_to_primitive(self):
+        uuid = self.fake_node['uuid']
+        with mock.patch.object(self.dbapi, 'get_node_by_uuid',
+                               autospec=True) as mock_get_node:
+            mock_get_node.return_value = self.fake_node
+
+            n = objects.Node.get(self.context, uuid)
+            primitive = n.obj_to_primitive()['ironic_object.data']
+
+            for field in ('driver_info', 'instance_info', 'properties',
+                          'extra'):
+                self.assertEqual(self.fake_node[field], primitive[field])
+
+    def test_save_json_fields_not_accessed(self):
+        uuid = self.fake_node['uuid']
+        with mock.patch.object(self.dbapi, 'get_node_by_uuid',
+                               autospec=True) as mock_get_node:
+            mock_get_node.return_value = self.fake_node
+            with mock.patch.object(self.dbapi, 'update_node',
+                                   autospec=True) as mock_update_node:
+
+                n = objects.Node.get(self.context, uuid)
+                n.provision_state = 'fake-state'
+                n.save()
+
+                mock_update_node.assert_called_once_with(
+                        uuid, {'provision_state': 'fake-state'})
+
     def test_list(self):
         with mock.patch.object(self.dbapi, 'get_node_list',
                                autospec=True) as mock_get_list:
@@ -95,6 +177,25 @@ class TestNodeObject(base.DbTestCase):
             self.assertIsInstance(nodes[0], objects.Node)
             self.assertEqual(self.context, nodes[0]._context)
 
+    def test_list_fields(self):
+        with mock.patch.object(self.dbapi, 'get_nodeinfo_list',
+                               autospec=True) as mock_get_list:
+            mock_get_list.return_value = [(self.fake_node['uuid'],
+                                           self.fake_node['properties'])]
+            nodes = objects.Node.list(self.context,
+                                      fields=['uuid', 'properties'])
+            mock_get_list.assert_called_once_with(
+                columns=['uuid', 'properties'], filters=None, limit=None,
+                marker=None, sort_key=None, sort_dir=None, use_slave=False)
+            self.assertThat(nodes, HasLength(1))
+            self.assertEqual(self.fake_node['uuid'], nodes[0].uuid)
+            self.assertEqual(self.fake_node['properties'],
+                             nodes[0].properties)
+            self.assertFalse(nodes[0].obj_attr_is_set('driver_info'))
+            self.assertEqual({'uuid': self.fake_node['uuid'],
+                              'properties': self.fake_node['properties']},
+                             nodes[0].as_dict())
+
     def test_reserve(self):
         with mock.patch.object(self.dbapi, 'reserve_node',
                                autospec=True) as mock_reserve:
@@ -103,9 +204,24 @@ class TestNodeObject(base.DbTestCase):
             fake_tag = 'fake-tag'
             node = objects.Node.reserve(self.context, fake_tag, node_id)
             self.assertIsInstance(node, objects.Node)
-            mock_reserve.assert_called_once_with(fake_tag, node_id)
+            mock_reserve.assert_called_once_with(fake_tag, node_id,
+                                                 filters=None)
             self.assertEqual(self.context, node._context)
 
+    def test_reserve_with_ports(self):
+        fake_port = utils.get_test_port()
+        with mock.patch.object(self.dbapi, 'reserve_node_with_ports',
+                               autospec=True) as mock_reserve:
+            mock_reserve.return_value = (self.fake_node, [fake_port])
+            node_id = self.fake_node['id']
+            node, ports = objects.Node.reserve_with_ports(
+                self.context, 'fake-tag', node_id)
+            self.assertIsInstance(node, objects.Node)
+            mock_reserve.assert_called_once_with('fake-tag', node_id,
+                                                 filters=None)
+            self.assertThat(ports, HasLength(1))
+            self.assertIsInstance(ports[0], objects.Port)
+
     def test_reserve_node_not_found(self):
         with mock.patch.object(self.dbapi, 'reserve_node',
                                autospec=True) as mock_reserve:
@@ -131,3 +247,47 @@ class TestNodeObject(base.DbTestCase):
             self.assertRaises(exception.NodeNotFound,
                               objects.Node.release, self.context,
                               'fake-tag', node_id)
+
+    def test_touch_agent_heartbeat(self):
+        with mock.patch.object(self.dbapi, 'get_node_by_uuid',
+                               autospec=True) as mock_get_node:
+            mock_get_node.return_value = self.fake_node
+            with mock.patch.object(self.dbapi, 'touch_agent_heartbeat',
+                                   autospec=True) as mock_touch:
+                n = objects.Node.get(self.context, self.fake_node['uuid'])
+                n.touch_agent_heartbeat()
+                mock_touch.assert_called_once_with(self.fake_node['id'])
+
+    def test_get_agent_heartbeat(self):
+        with mock.patch.object(self.dbapi, 'get_node_by_uuid',
+                               autospec=True) as mock_get_node:
+            mock_get_node.return_value = self.fake_node
+            with mock.patch.object(self.dbapi, 'get_agent_heartbeat',
+                                   autospec=True) as mock_get_heartbeat:
+                mock_get_heartbeat.return_value = 'fake-time'
+                n = objects.Node.get(self.context, self.fake_node['uuid'])
+                self.assertEqual('fake-time', n.get_agent_heartbeat())
+                mock_get_heartbeat.assert_called_once_with(
+                    self.fake_node['id'], use_slave=False)
+
+
+        nodes_values = [{'driver': 'fake', 'ports': [{'address':
+                                                      'aa:bb:cc:dd:ee:ff'}]},
+                        {'driver': 'fake'}]
+        fake_port = utils.get_test_port()
+        error = exception.NodeAlreadyExists(uuid=self.fake_node['uuid'])
+        with mock.patch.object(self.dbapi, 'create_nodes',
+                               autospec=True) as mock_create:
+            mock_create.return_value = [(self.fake_node, [fake_port]), error]
+
+            results = objects.Node.create_bulk(self.context, nodes_values)
+
+            mock_create.assert_called_once_with(nodes_values)
+            self.assertThat(results, HasLength(2))
+            node, ports = results[0]
+            self.assertIsInstance(node, objects.Node)
+            self.assertEqual(self.fake_node['uuid'], node.uuid)
+            self.assertEqual(self.context, node._context)
+            self.assertThat(ports, HasLength(1))
+            self.assertIsInstance(ports[0], objects.Port)
+            self.assertEqual(error, results[1])
@@ -36,7 +36,7 @@ class TestPortObject(base.DbTestCase):
 
             port = objects.Port.get(self.context, port_id)
 
-            mock_get_port.assert_called_once_with(port_id)
+            mock_get_port.assert_called_once_with(port_id, use_slave=False)
             self.assertEqual(self.context, port._context)
 
     def test_get_by_uuid(self):
@@ -47,7 +47,7 @@ class TestPortObject(base.DbTestCase):
 
             port = objects.Port.get(self.context, uuid)
 
-            mock_get_port.assert_called_once_with(uuid)
+            mock_get_port.assert_called_once_with(uuid, use_slave=False)
             self.assertEqual(self.context, port._context)
 
     def test_get_by_address(self):
@@ -58,7 +58,7 @@ class TestPortObject(base.DbTestCase):
 
             port = objects.Port.get(self.context, address)
 
-            mock_get_port.assert_called_once_with(address)
+            mock_get_port.assert_called_once_with(address, use_slave=False)
             self.assertEqual(self.context, port._context)
 
     def test_get_bad_id_and_uuid_and_address(self):
@@ -76,7 +76,7 @@ class TestPortObject(base.DbTestCase):
                 p.address = "b2:54:00:cf:2d:40"
                 p.save()
 
-                mock_get_port.assert_called_once_with(uuid)
+                mock_get_port.assert_called_once_with(uuid, use_slave=False)
                 mock_update_port.assert_called_once_with(
                         uuid, {'address': "b2:54:00:cf:2d:40"})
                 self.assertEqual(self.context, p._context)
@@ -85,7 +85,8 @@ class TestPortObject(base.DbTestCase):
         uuid = self.fake_port['uuid']
         returns = [self.fake_port,
                    utils.get_test_port(address="c3:54:00:cf:2d:40")]
-        expected = [mock.call(uuid), mock.call(uuid)]
+        expected = [mock.call(uuid, use_slave=False),
+                    mock.call(uuid, use_slave=False)]
         with mock.patch.object(self.dbapi, 'get_port_by_uuid',
                                side_effect=returns,
                                autospec=True) as mock_get_port:
@@ -105,3 +106,30 @@ class TestPortObject(base.DbTestCase):
             self.assertThat(ports, HasLength(1))
             self.assertIsInstance(ports[0], objects.Port)
             self.assertEqual(self.context, ports[0]._context)
+
+    def test_list_fields(self):
+        with mock.patch.object(self.dbapi, 'get_portinfo_list',
+                               autospec=True) as mock_get_list:
+            mock_get_list.return_value = [(self.fake_port['uuid'],
+                                           self.fake_port['address'])]
+            ports = objects.Port.list(self.context,
+                                      fields=['uuid', 'address'])
+            mock_get_list.assert_called_once_with(
+                columns=['uuid', 'address'], filters=None, limit=None,
+                marker=None, sort_key=None, sort_dir=None, use_slave=False)
+            self.assertThat(ports, HasLength(1))
+            self.assertEqual({'uuid': self.fake_port['uuid'],
+                              'address': self.fake_port['address']},
+                             ports[0].as_dict())
+
+    def test_list_by_node_id_fields(self):
+        with mock.patch.object(self.dbapi, 'get_portinfo_list',
+                               autospec=True) as mock_get_list:
+            mock_get_list.return_value = [(self.fake_port['uuid'],)]
+            ports = objects.Port.list_by_node_id(self.context, 42,
+                                                 fields=['uuid'])
+            mock_get_list.assert_called_once_with(
+                columns=['uuid'], filters={'node_id': 42}, limit=None,
+                marker=None, sort_key=None, sort_dir=None, use_slave=False)
+            self.assertEqual([self.fake_port['uuid']],
+                             [p.uuid for p in ports])
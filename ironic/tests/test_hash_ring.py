@@ -47,8 +47,8 @@ class HashRingTestCase(base.TestCase):
         replicas = 1
         ring = hash_ring.HashRing(hosts, replicas=replicas)
 
-        self.assertIn(int(r1, 16), ring._host_hashes)
-        self.assertIn(int(r2, 16), ring._host_hashes)
+        self.assertIn(int(r1[:15], 16), ring._partitions)
+        self.assertIn(int(r2[:15], 16), ring._partitions)
 
     def test_create_ring(self):
         hosts = ['foo', 'bar']
@@ -196,6 +196,59 @@ class HashRingTestCase(base.TestCase):
         self.assertEqual(['foo'], ring.get_hosts('fake',
                                                  ignore_hosts=['baz']))
 
+    def test_get_hosts_bulk(self):
+        hosts = ['foo', 'bar', 'baz']
+        ring = hash_ring.HashRing(hosts, replicas=1)
+        data = ['fake', 'fake-again'] + ['node-%d' % i for i in range(50)]
+        expected = dict((d, ring.get_hosts(d)) for d in data)
+        self.assertEqual(expected, ring.get_hosts_bulk(data))
+
+    def test_get_hosts_bulk_replicas_and_ignore_hosts(self):
+        hosts = ['foo', 'bar', 'baz']
+        ring = hash_ring.HashRing(hosts, replicas=2)
+        data = ['fake', 'fake-again'] + ['node-%d' % i for i in range(50)]
+        expected = dict((d, ring.get_hosts(d, ignore_hosts=['foo']))
+                        for d in data)
+        self.assertEqual(expected,
+                         ring.get_hosts_bulk(data, ignore_hosts=['foo']))
+
+    def test_get_hosts_bulk_invalid_data(self):
+        hosts = ['foo', 'bar']
+        ring = hash_ring.HashRing(hosts)
+        self.assertRaises(exception.Invalid,
+                          ring.get_hosts_bulk,
+                          ['fake', None])
+
+    def test_get_partition_key(self):
+        hosts = ['foo', 'bar']
+        ring = hash_ring.HashRing(hosts)
+        self.assertEqual(ring._hash2int(hashlib.md5('fake')),
+                         hash_ring.get_partition_key('fake'))
+
+    def _in_ranges(self, key, ranges):
+        return any((start is None or key >= start) and
+                   (end is None or key < end) for start, end in ranges)
+
+    def test_get_key_ranges(self):
+        hosts = ['foo', 'bar', 'baz']
+        data = ['node-%d' % i for i in range(100)]
+        for replicas in (1, 2):
+            ring = hash_ring.HashRing(hosts, replicas=replicas)
+            for host in hosts:
+                ranges = ring.get_key_ranges(host)
+                for d in data:
+                    key = hash_ring.get_partition_key(d)
+                    self.assertEqual(host in ring.get_hosts(d),
+                                     self._in_ranges(key, ranges))
+
+    def test_get_key_ranges_single_host(self):
+        ring = hash_ring.HashRing(['foo'])
+        self.assertEqual([(None, None)], ring.get_key_ranges('foo'))
+
+    def test_get_key_ranges_unknown_host(self):
+        ring = hash_ring.HashRing(['foo'])
+        self.assertEqual([], ring.get_key_ranges('bar'))
+
     def test_create_ring_invalid_data(self):
         hosts = None
         self.assertRaises(exception.Invalid,
@@ -248,3 +301,43 @@ class HashRingManagerTestCase(db_base.DbTestCase):
         self.assertRaises(exception.DriverNotFound,
                           self.ring_manager.__getitem__,
                           'driver1')
+
+    def test_hash_ring_manager_refresh_after_interval(self):
+        self.config(hash_ring_reset_interval=30)
+        self.assertRaises(exception.DriverNotFound,
+                          self.ring_manager.__getitem__,
+                          'driver1')
+        self.register_conductors()
+        with mock.patch.object(hash_ring.time, 'time') as time_mock:
+            time_mock.return_value = (
+                    hash_ring.HashRingManager._updated_at + 31)
+            ring = self.ring_manager['driver1']
+        self.assertEqual(sorted(['host1', 'host2']), sorted(ring.hosts))
+
+    def test_hash_ring_manager_reset(self):
+        self.assertRaises(exception.DriverNotFound,
+                          self.ring_manager.__getitem__,
+                          'driver1')
+        self.register_conductors()
+        self.ring_manager.reset()
+        ring = self.ring_manager['driver1']
+        self.assertEqual(sorted(['host1', 'host2']), sorted(ring.hosts))
+
+    def test_hash_ring_manager_update_unchanged(self):
+        self.register_conductors()
+        self.assertTrue(self.ring_manager.update())
+        with mock.patch.object(self.ring_manager.dbapi,
+                               'get_active_driver_dict') as get_dict_mock:
+            self.assertFalse(self.ring_manager.update())
+            self.assertFalse(get_dict_mock.called)
+
+    def test_hash_ring_manager_update_changed(self):
+        self.dbapi.register_conductor({'hostname': 'host1',
+                                       'drivers': ['driver1']})
+        self.ring_manager.update()
+        self.assertEqual(['host1'], list(self.ring_manager['driver1'].hosts))
+        self.dbapi.register_conductor({'hostname': 'host2',
+                                       'drivers': ['driver1']})
+        self.assertTrue(self.ring_manager.update())
+        self.assertEqual(sorted(['host1', 'host2']),
+                         sorted(self.ring_manager['driver1'].hosts))
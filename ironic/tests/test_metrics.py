@@ -0,0 +1,137 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import tempfile
+
+import mock
+
+from ironic.common import metrics
+from ironic.drivers import base as driver_base
+from ironic.drivers.modules import fake
+from ironic.tests import base
+
+
+class FakeDriver(driver_base.BaseDriver):
+
+    def __init__(self):
+        self.power = fake.FakePower()
+        self.deploy = fake.FakeDeploy()
+
+
+class HistogramTestCase(base.TestCase):
+
+    def test_add(self):
+        histogram = metrics.Histogram()
+        for value in (0.0005, 0.002, 0.002, 1000):
+            histogram.add(value)
+        result = histogram.to_dict()
+        self.assertEqual(4, result['count'])
+        self.assertEqual(1000.0045, result['sum'])
+        self.assertEqual(0.0005, result['min'])
+        self.assertEqual(1000, result['max'])
+        self.assertEqual(1, result['buckets']['le_0.001'])
+        self.assertEqual(2, result['buckets']['le_0.005'])
+        self.assertEqual(0, result['buckets']['le_300'])
+        self.assertEqual(1, result['buckets']['inf'])
+
+    def test_bucket_bound_inclusive(self):
+        histogram = metrics.Histogram()
+        histogram.add(1)
+        self.assertEqual(1, histogram.to_dict()['buckets']['le_1'])
+
+
+class RegistryTestCase(base.TestCase):
+
+    def setUp(self):
+        super(RegistryTestCase, self).setUp()
+        self.registry = metrics.Registry()
+
+    def test_incr(self):
+        self.registry.incr('foo')
+        self.registry.incr('foo', 2)
+        self.assertEqual({'foo': 3}, self.registry.snapshot()['counters'])
+
+    @mock.patch.object(metrics.time, 'time')
+    def test_timed(self, mock_time):
+        mock_time.side_effect = [10, 12, 13]
+
+        @self.registry.timed('foo')
+        def func(arg):
+            return arg
+
+        self.assertEqual('bar', func('bar'))
+        self.assertEqual('func', func.__name__)
+        histogram = self.registry.snapshot()['histograms']['foo']
+        self.assertEqual(1, histogram['count'])
+        self.assertEqual(2, histogram['sum'])
+
+    def test_timer_exception(self):
+        def func():
+            with self.registry.timer('foo'):
+                raise ValueError()
+
+        self.assertRaises(ValueError, func)
+        histogram = self.registry.snapshot()['histograms']['foo']
+        self.assertEqual(1, histogram['count'])
+
+    def test_gauges(self):
+        self.registry.register_gauge('foo', lambda: 42)
+        self.registry.register_gauge('bar', mock.Mock(side_effect=Exception))
+        self.assertEqual({'foo': 42}, self.registry.snapshot()['gauges'])
+        self.registry.unregister_gauge('foo')
+        self.assertEqual({}, self.registry.snapshot()['gauges'])
+
+    def test_dump(self):
+        self.registry.incr('foo')
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, tmp_dir)
+        path = os.path.join(tmp_dir, 'metrics.json')
+        self.addCleanup(os.unlink, path)
+
+        self.registry.dump(path)
+
+        with open(path) as f:
+            result = json.load(f)
+        self.assertEqual({'foo': 1}, result['counters'])
+        self.assertEqual(['metrics.json'], os.listdir(tmp_dir))
+
+
+class InstrumentDriverTestCase(base.TestCase):
+
+    def setUp(self):
+        super(InstrumentDriverTestCase, self).setUp()
+        self.registry = metrics.Registry()
+        p = mock.patch.object(metrics, '_REGISTRY', self.registry)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def test_instrument_driver(self):
+        driver = FakeDriver()
+        metrics.instrument_driver('fake', driver)
+
+        driver.power.get_power_state(mock.Mock())
+        driver.deploy.deploy(mock.Mock())
+
+        histograms = self.registry.snapshot()['histograms']
+        self.assertEqual(
+            set(['driver.fake.power.get_power_state',
+                 'driver.fake.deploy.deploy']),
+            set(histograms))
+
+    def test_instrument_driver_twice(self):
+        driver = FakeDriver()
+        metrics.instrument_driver('fake', driver)
+        wrapper = driver.power.get_power_state
+        metrics.instrument_driver('fake', driver)
+        self.assertIs(wrapper, driver.power.get_power_state)
@@ -0,0 +1,72 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from eventlet import event
+from six.moves.urllib import request as urllib_request
+
+from ironic.common import service
+from ironic.tests import base
+
+
+class WSGIServiceTestCase(base.TestCase):
+
+    def setUp(self):
+        super(WSGIServiceTestCase, self).setUp()
+        self.release = event.Event()
+        self.service = service.WSGIService(self._app, '127.0.0.1', 0)
+        self.addCleanup(self.service.server.server_close)
+
+    def _app(self, environ, start_response):
+        if environ['PATH_INFO'] == '/slow':
+            self.release.wait()
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    def _get(self, path):
+        url = 'http://127.0.0.1:%d%s' % (self.service.server.server_port,
+                                         path)
+        return urllib_request.urlopen(url).read()
+
+    def test_serve(self):
+        self.service.start()
+        self.addCleanup(self.service.stop)
+
+        self.assertEqual(b'ok', self._get('/'))
+
+    def test_stop_completes_requests(self):
+        self.service.start()
+        slow = eventlet.spawn(self._get, '/slow')
+        # Let the request reach the application
+        while not self.service.server.pool.running():
+            eventlet.sleep(0.01)
+
+        stopping = eventlet.spawn(self.service.stop)
+        # Longer than the polling interval of serve_forever()
+        eventlet.sleep(1)
+        self.assertFalse(stopping.dead)
+        self.release.send()
+
+        stopping.wait()
+        self.assertEqual(b'ok', slow.wait())
+
+    def test_stop_not_started(self):
+        self.service.stop()
+
+    def test_restart(self):
+        self.service.start()
+        self.service.stop()
+        self.service.reset()
+        self.service.start()
+        self.addCleanup(self.service.stop)
+
+        self.assertEqual(b'ok', self._get('/'))
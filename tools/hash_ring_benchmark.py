@@ -0,0 +1,81 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Micro-benchmark for ironic.common.hash_ring.HashRing.
+
+Reports the time taken to build a ring, and the number of lookups per
+second with get_hosts() and get_hosts_bulk(), for several numbers of
+conductors and partition exponents. Usage:
+
+    python tools/hash_ring_benchmark.py [--hosts 10,100,500]
+        [--exponents 5,8,12] [--nodes 10000]
+"""
+
+import argparse
+import sys
+import time
+import uuid
+
+from oslo.config import cfg
+
+from ironic.common import hash_ring
+
+CONF = cfg.CONF
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+def _timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+
+def run(num_hosts, exponent, node_uuids):
+    CONF.set_override('hash_partition_exponent', exponent)
+    hosts = ['conductor-%d' % i for i in range(num_hosts)]
+
+    ring, build_time = _timed(hash_ring.HashRing, hosts)
+    _, single_time = _timed(lambda: [ring.get_hosts(u) for u in node_uuids])
+    _, bulk_time = _timed(ring.get_hosts_bulk, node_uuids)
+
+    print('%6d %4d %10d %10.3f %14.0f %14.0f' % (
+          num_hosts, exponent, num_hosts * 2 ** exponent, build_time,
+          len(node_uuids) / single_time, len(node_uuids) / bulk_time))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--hosts', type=_int_list, default=[10, 100, 500],
+                        help='Comma-separated numbers of conductors.')
+    parser.add_argument('--exponents', type=_int_list, default=[5, 8, 12],
+                        help='Comma-separated hash partition exponents.')
+    parser.add_argument('--nodes', type=int, default=10000,
+                        help='Number of node UUIDs to look up.')
+    args = parser.parse_args()
+
+    CONF([], project='ironic')
+    node_uuids = [str(uuid.uuid4()) for i in range(args.nodes)]
+
+    print('%6s %4s %10s %10s %14s %14s' % ('hosts', 'exp', 'partitions',
+                                           'build (s)', 'get_hosts/s',
+                                           'bulk/s'))
+    for num_hosts in args.hosts:
+        for exponent in args.exponents:
+            run(num_hosts, exponent, node_uuids)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Micro-benchmark for loading and saving Node objects.
+
+Reports the time taken per node to load a Node object and to save it,
+using a temporary SQLite database. The JSON fields of a node are decoded
+when they are first accessed, so each operation is measured twice: once
+touching only provision_state, and once also accessing, or saving, all
+the JSON fields, as every load and save did before. Usage:
+
+    python tools/node_json_benchmark.py [--nodes 1000] [--keys 50]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from oslo.config import cfg
+
+from ironic.common import states
+from ironic.common import utils
+from ironic.db import api as db_api
+from ironic.db.sqlalchemy import api as sa_api
+from ironic.db.sqlalchemy import models
+from ironic import objects
+from ironic.openstack.common import context
+
+CONF = cfg.CONF
+
+JSON_FIELDS = ('driver_info', 'instance_info', 'properties', 'extra')
+
+
+def _json_value(num_keys):
+    return dict(('key-%d' % i, 'value-%d' % i) for i in range(num_keys))
+
+
+def _per_node(func, node_ids):
+    start = time.time()
+    for node_id in node_ids:
+        func(node_id)
+    return (time.time() - start) / len(node_ids) * 1000000
+
+
+def run(ctxt, node_ids):
+    def load_lazy(node_id):
+        node = objects.Node.get_by_id(ctxt, node_id)
+        node.provision_state
+
+    def load_all(node_id):
+        node = objects.Node.get_by_id(ctxt, node_id)
+        node.provision_state
+        for field in JSON_FIELDS:
+            getattr(node, field)
+
+    def save_lazy(node_id):
+        node = objects.Node.get_by_id(ctxt, node_id)
+        node.provision_state = states.ACTIVE
+        node.save()
+
+    def save_all(node_id):
+        node = objects.Node.get_by_id(ctxt, node_id)
+        node.provision_state = states.ACTIVE
+        for field in JSON_FIELDS:
+            node[field] = node[field]
+        node.save()
+
+    print('%-28s %12s %12s' % ('operation', 'lazy (us)', 'all (us)'))
+    print('%-28s %12.1f %12.1f' % ('load + read provision_state',
+                                   _per_node(load_lazy, node_ids),
+                                   _per_node(load_all, node_ids)))
+    print('%-28s %12.1f %12.1f' % ('load + save provision_state',
+                                   _per_node(save_lazy, node_ids),
+                                   _per_node(save_all, node_ids)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--nodes', type=int, default=1000,
+                        help='Number of nodes to load and save.')
+    parser.add_argument('--keys', type=int, default=50,
+                        help='Number of keys in each JSON field.')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    try:
+        CONF([], project='ironic')
+        CONF.set_override('connection', 'sqlite:///%s' % db_path,
+                          group='database')
+        models.Base.metadata.create_all(sa_api.get_engine())
+
+        dbapi = db_api.get_instance()
+        value = _json_value(args.keys)
+        node_ids = []
+        for i in range(args.nodes):
+            values = dict((field, value) for field in JSON_FIELDS)
+            values.update(uuid=utils.generate_uuid(), driver='fake',
+                          provision_state=states.DEPLOYWAIT)
+            node_ids.append(dbapi.create_node(values).id)
+
+        run(context.get_admin_context(), node_ids)
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())